@@ -16,6 +16,13 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Pool de conexiones según el entorno; las opciones explícitas tienen prioridad
+    from app.utils.database import engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
@@ -24,11 +31,14 @@ def create_app(config_class=Config):
     def inject_now():
         return {'now': datetime.utcnow()}
     
-    from app.models.users import User
+    # current_user: usuario, perfil de profesor y asignaciones desde una caché
+    # invalidada al escribir usuarios, profesores o asignaciones
+    from app.services.auth_context_service import AuthContextService
+    AuthContextService.install(db.session)
     
     @login_manager.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        return AuthContextService.load_user(int(id))
     
     # Registrar blueprints
     from app.routes.auth import auth as auth_bp
@@ -49,6 +59,44 @@ def create_app(config_class=Config):
     from app.routes.data_import import data_import as data_import_bp
     app.register_blueprint(data_import_bp, url_prefix='/import')
     
+    from app.routes.jobs import jobs as jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+    
+    # Registrar los manejadores de trabajos en segundo plano
+    from app.services import job_handlers
+    
+    # Resúmenes de calificaciones (grade_rollups) mantenidos en cada commit
+    from app.services.statistics_service import StatisticsService
+    StatisticsService.install(db.session)
+    
+    # Instantáneas de analítica (/reports/analytics) invalidadas al escribir calificaciones
+    from app.services.analytics_service import AnalyticsService
+    AnalyticsService.install(db.session)
+    
+    # Datos de referencia (grados, secciones, asignaturas, años, períodos) invalidados al escribirlos
+    from app.services.reference_data_service import ReferenceDataService
+    ReferenceDataService.install(db.session)
+    
+    # Versiones de datos por sección y período para la caché de reportes en disco
+    from app.services.report_cache_service import ReportCacheService
+    ReportCacheService.install(db.session)
+    
+    # Versión de las plantillas Excel para la caché de plantillas compiladas
+    from app.services.template_cache import TemplateCache
+    TemplateCache.install(db.session)
+    
+    # Índice de búsqueda de estudiantes (students.search_text)
+    from app.services.student_search_service import StudentSearchService
+    StudentSearchService.install()
+    
+    # Comandos de consola (flask rebuild-statistics, flask rebuild-search-index, flask pool-check, flask clear-report-cache)
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Medición de consultas por solicitud (solo con PERF_PROFILING)
+    from app.utils.profiling import init_profiling
+    init_profiling(app, db)
+    
     # Ruta raíz que maneja DEMO_MODE
     from flask import redirect, url_for, current_app
     from flask_login import login_user, current_user, logout_user
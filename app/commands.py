@@ -0,0 +1,93 @@
+from flask.cli import with_appcontext
+import click
+
+
+@click.command('rebuild-statistics')
+@click.option('--period-id', type=int, default=None, help='Reconstruir solo este período')
+@with_appcontext
+def rebuild_statistics(period_id):
+    """Reconstruye la tabla grade_rollups desde las calificaciones finales"""
+
+    from app.services.statistics_service import StatisticsService
+
+    rows = StatisticsService.rebuild(period_id=period_id)
+    click.echo(f'Estadísticas reconstruidas: {rows} filas')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index():
+    """Recalcula students.search_text y el índice de búsqueda de estudiantes"""
+
+    from app.services.student_search_service import StudentSearchService
+
+    rows = StudentSearchService.rebuild_index()
+    click.echo(f'Índice de búsqueda reconstruido: {rows} estudiantes')
+
+
+@click.command('pool-check')
+@click.option('--threads', type=int, default=8, help='Hilos que piden conexiones a la vez')
+@click.option('--seconds', type=float, default=5.0, help='Duración de la prueba')
+@click.option('--hold-ms', type=int, default=20, help='Milisegundos que cada hilo retiene la conexión')
+@with_appcontext
+def pool_check(threads, seconds, hold_ms):
+    """Ejercita el pool de conexiones con varios hilos y muestra esperas y saturación"""
+
+    from flask import current_app
+    from app import db
+    from app.utils.database import pool_status, reset_pool_metrics
+    from sqlalchemy import text, exc
+    import threading
+    import time
+
+    app = current_app._get_current_object()
+    deadline = time.monotonic() + seconds
+    errors = []
+
+    def worker():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    db.session.execute(text('SELECT 1'))
+                    time.sleep(hold_ms / 1000)
+                    db.session.commit()
+                except exc.TimeoutError as error:
+                    errors.append(error)
+                finally:
+                    db.session.remove()
+
+    reset_pool_metrics()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    for item in pool_status():
+        click.echo(f"{item['url']} ({item['pool']})")
+        click.echo(f"  {item['status']}")
+        for key, value in (item['metrics'] or {}).items():
+            click.echo(f'  {key}: {value}')
+    if errors:
+        click.echo(f'Checkouts agotados: {len(errors)}')
+
+
+@click.command('clear-report-cache')
+@with_appcontext
+def clear_report_cache():
+    """Elimina los reportes guardados en REPORT_CACHE_FOLDER"""
+
+    from app.services.report_cache_service import ReportCacheService
+
+    files = ReportCacheService.stats()['files']
+    ReportCacheService.clear()
+    click.echo(f'Caché de reportes vaciada: {files} archivos')
+
+
+def register_commands(app):
+    """Comandos de `flask` propios de la aplicación"""
+
+    app.cli.add_command(rebuild_statistics)
+    app.cli.add_command(rebuild_search_index)
+    app.cli.add_command(pool_check)
+    app.cli.add_command(clear_report_cache)
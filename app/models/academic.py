@@ -107,6 +107,7 @@ class Student(db.Model):
     section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    search_text = db.Column(db.String(200), nullable=True)  # Apellido, nombre y cédula normalizados (StudentSearchService)
     
     # Relaciones
     student_grades = db.relationship('StudentGrade', backref='student', lazy='dynamic', cascade='all, delete-orphan')
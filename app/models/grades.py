@@ -3,6 +3,9 @@ from datetime import datetime
 
 class GradeType(db.Model):
     __tablename__ = 'grade_types'
+    __table_args__ = (
+        db.Index('ix_grade_types_subject_period_section', 'subject_id', 'period_id', 'section_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
@@ -23,6 +26,12 @@ class GradeType(db.Model):
 
 class StudentGrade(db.Model):
     __tablename__ = 'student_grades'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'grade_type_id', name='uq_student_grades_student_grade_type'),
+        db.Index('ix_student_grades_student_subject_period', 'student_id', 'subject_id', 'period_id'),
+        db.Index('ix_student_grades_grade_type_student', 'grade_type_id', 'student_id'),
+        db.Index('ix_student_grades_subject_period', 'subject_id', 'period_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -40,6 +49,10 @@ class StudentGrade(db.Model):
 
 class FinalGrade(db.Model):
     __tablename__ = 'final_grades'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'subject_id', 'period_id', name='uq_final_grades_student_subject_period'),
+        db.Index('ix_final_grades_period_subject', 'period_id', 'subject_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -0,0 +1,87 @@
+from app import db
+from datetime import datetime
+import json
+
+class Job(db.Model):
+    """Trabajo en segundo plano (importaciones, exportaciones, recálculos)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_created', 'status', 'created_at'),
+        db.Index('ix_jobs_created_by', 'created_by'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=PENDING)
+    params = db.Column(db.Text)                       # JSON con los parámetros del trabajo
+    result = db.Column(db.Text)                       # JSON con el resumen del resultado
+    error = db.Column(db.Text)
+    message = db.Column(db.String(255))               # Último mensaje de progreso
+    progress_current = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer, default=0)
+    result_path = db.Column(db.String(255))           # Archivo generado en uploads/exports
+    result_name = db.Column(db.String(255))           # Nombre de descarga del archivo
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)             # Última señal de vida del proceso que lo ejecuta
+
+    # Relaciones
+    creator = db.relationship('User', backref='jobs')
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type}: {self.status}>'
+
+    def get_params(self):
+        if self.params:
+            return json.loads(self.params)
+        return {}
+
+    def set_params(self, params):
+        self.params = json.dumps(params)
+
+    def get_result(self):
+        if self.result:
+            return json.loads(self.result)
+        return {}
+
+    def set_result(self, result):
+        self.result = json.dumps(result, default=str)
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    @property
+    def percent(self):
+        if not self.progress_total:
+            return 100 if self.status == self.COMPLETED else 0
+        return min(100, int(self.progress_current * 100 / self.progress_total))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'message': self.message,
+            'error': self.error,
+            'progress_current': self.progress_current or 0,
+            'progress_total': self.progress_total or 0,
+            'percent': self.percent,
+            'result': self.get_result(),
+            'has_file': bool(self.result_path),
+            'cancel_requested': bool(self.cancel_requested),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,70 @@
+from app import db
+from datetime import datetime
+import json
+
+class GradeRollup(db.Model):
+    """
+    Resumen precalculado de las calificaciones finales por período, sección y asignatura
+
+    Lo mantiene StatisticsService cada vez que cambian filas de final_grades;
+    `flask rebuild-statistics` lo reconstruye desde cero.
+    """
+    __tablename__ = 'grade_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('period_id', 'section_id', 'subject_id', name='uq_grade_rollups_period_section_subject'),
+    )
+
+    # Histograma de 10 rangos de 10 puntos: [0-10), [10-20), ..., [90-100]
+    HISTOGRAM_BINS = 10
+    BIN_WIDTH = 10
+
+    id = db.Column(db.Integer, primary_key=True)
+    period_id = db.Column(db.Integer, db.ForeignKey('periods.id', ondelete='CASCADE'), nullable=False)
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id', ondelete='CASCADE'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    student_count = db.Column(db.Integer, nullable=False, default=0)   # Estudiantes con calificación final
+    grade_sum = db.Column(db.Float, nullable=False, default=0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    passing_count = db.Column(db.Integer, nullable=False, default=0)
+    failing_count = db.Column(db.Integer, nullable=False, default=0)
+    passing_grade = db.Column(db.Float)                                # Nota aprobatoria usada en el cálculo
+    histogram = db.Column(db.Text)                                     # JSON con los conteos por rango
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<GradeRollup period={self.period_id} section={self.section_id} subject={self.subject_id}>'
+
+    @property
+    def average(self):
+        if not self.student_count:
+            return 0
+        return round(self.grade_sum / self.student_count, 2)
+
+    def get_histogram(self):
+        if self.histogram:
+            return json.loads(self.histogram)
+        return [0] * self.HISTOGRAM_BINS
+
+
+class ReportVersion(db.Model):
+    """
+    Versión de los datos de una sección en un período
+
+    ReportCacheService la incrementa en la misma transacción que escribe
+    calificaciones, estudiantes o evaluaciones de la sección; forma parte de
+    la clave de los reportes guardados en disco. Sin fila, la versión es 0.
+    """
+    __tablename__ = 'report_versions'
+    __table_args__ = (
+        db.UniqueConstraint('section_id', 'period_id', name='uq_report_versions_section_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id', ondelete='CASCADE'), nullable=False)
+    period_id = db.Column(db.Integer, db.ForeignKey('periods.id', ondelete='CASCADE'), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReportVersion section={self.section_id} period={self.period_id} v{self.version}>'
@@ -14,11 +14,13 @@ class ExcelTemplate(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     is_active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Cambia con el archivo o la metadata (TemplateCache)
     
     # Relaciones
     creator = db.relationship('User', backref='excel_templates')
     cells = db.relationship('TemplateCell', backref='template', cascade='all, delete-orphan')
     styles = db.relationship('TemplateStyle', backref='template', cascade='all, delete-orphan')
+    cell_styles = db.relationship('TemplateCellStyle', cascade='all, delete-orphan')
     ranges = db.relationship('TemplateRange', backref='template', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
@@ -88,16 +90,47 @@ class TemplateCell(db.Model):
     data_type = db.Column(db.String(50))                     # cedula, nombre, apellido, nota, etc.
     content_type = db.Column(db.String(50))                  # ← AGREGAR ESTA LÍNEA
     default_value = db.Column(db.Text)
-    style_config = db.Column(db.Text)                        # JSON con estilos
+    _style_config = db.Column('style_config', db.Text)       # JSON con estilos propio de la celda
+    cell_style_id = db.Column(db.Integer, db.ForeignKey('template_cell_styles.id'), index=True)  # Estilo compartido (análisis del archivo)
     extra_config = db.Column(db.Text)
     
     # Relación
     # template = db.relationship('ExcelTemplate', backref='cells')
+    cell_style = db.relationship('TemplateCellStyle', lazy='selectin')
+    
+    @property
+    def style_config(self):
+        """JSON de estilos: el propio de la celda o, si no tiene, el estilo compartido"""
+        if self._style_config is not None:
+            return self._style_config
+        return self.cell_style.style_config if self.cell_style else None
+    
+    @style_config.setter
+    def style_config(self, value):
+        # Un estilo asignado directamente reemplaza al compartido
+        self._style_config = value
+        self.cell_style = None
     
     def __repr__(self):
         return f'<TemplateCell {self.cell_address}: {self.data_type}>'
 
 
+class TemplateCellStyle(db.Model):
+    """Configuración de estilo compartida por las celdas de una plantilla con el mismo formato"""
+    __tablename__ = 'template_cell_styles'
+    __table_args__ = (
+        db.UniqueConstraint('template_id', 'style_hash', name='uq_template_cell_styles_template_hash'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('excel_templates.id'), nullable=False)
+    style_hash = db.Column(db.String(64), nullable=False)  # SHA-256 de style_config
+    style_config = db.Column(db.Text, nullable=False)      # JSON con estilos
+    
+    def __repr__(self):
+        return f'<TemplateCellStyle {self.id}>'
+
+
 class TemplateStyle(db.Model):
     __tablename__ = 'template_styles'
     
@@ -40,3 +40,8 @@ class User(UserMixin, db.Model):
     
     def get_full_name(self):
         return f'{self.first_name} {self.last_name}'
+    
+    @property
+    def teacher_id(self):
+        # Igual que AuthUser.teacher_id (current_user)
+        return self.teacher_profile.id if self.teacher_profile else None
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, jsonify, current_app, abort
 from io import BytesIO
 import pandas as pd
 from flask_login import login_required, current_user, login_user
@@ -7,8 +7,21 @@ from datetime import datetime
 from wtforms import StringField, TextAreaField, IntegerField, SelectField, BooleanField, PasswordField, SubmitField, DateField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, ValidationError
 from app.models.users import User
-from app.models.academic import AcademicYear, Period, Grade, Section, Subject, Student, Teacher, TeacherAssignment, Admin
+from app.models.academic import AcademicYear, Period, Grade, Section, Subject, Student, Teacher, TeacherAssignment, Admin, subject_grade
 from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.models.statistics import GradeRollup
+from app.services.final_grade_service import FinalGradeService
+from app.services.grade_entry_service import GradeEntryService
+from app.services.student_transcript_service import StudentTranscriptService
+from app.services.job_service import JobService
+from app.services.student_import_service import StudentImportService
+from app.services.statistics_service import StatisticsService
+from app.services.student_search_service import StudentSearchService
+from app.services.reference_data_service import ReferenceDataService
+from app.services.report_cache_service import ReportCacheService
+from app.utils.listing import keyset_paginate, grouped_counts
+from app.utils.profiling import recent_requests, clear_requests, summarize_by_endpoint
+from app.utils.database import pool_status, reset_pool_metrics
 from app.forms.admin_forms import UserForm, AcademicYearForm, PeriodForm, GradeForm, SectionForm, SubjectForm, StudentForm, TeacherForm, TeacherAssignmentForm, SettingsForm, GradeTypeForm, StudentGradeForm, FinalGradeForm, TeacherPreRegistrationForm
 from app import db
 from sqlalchemy.orm import joinedload
@@ -32,16 +45,11 @@ def check_admin():
 @admin.route('/dashboard')
 # @login_required  # DEMO MODE: comentado temporalmente
 def dashboard():
-    # Estadísticas para el dashboard
-    stats = {
-        'students': Student.query.filter_by(is_active=True).count(),
-        'teachers': Teacher.query.count(),
-        'subjects': Subject.query.count(),
-        'grades': Grade.query.count()
-    }
+    # Estadísticas para el dashboard (una sola consulta)
+    stats = StatisticsService.school_counts()
     
     # Año académico activo
-    active_year = AcademicYear.query.filter_by(is_active=True).first()
+    active_year = ReferenceDataService.get().active_year
     
     return render_template('admin/dashboard.html', title='Panel de Administración', stats=stats, active_year=active_year)
 
@@ -49,11 +57,55 @@ def dashboard():
 @admin.route('/users')
 # @login_required  # DEMO MODE: comentado temporalmente
 def users():
-    users = User.query.all()
+    role = request.args.get('role', '')
+    status = request.args.get('status', '')
+    search = request.args.get('search', '').strip()
+    
+    # Solo las columnas que muestra la vista (y la especialización del perfil de profesor)
+    query = db.session.query(
+        User.id, User.identification_number, User.username, User.email,
+        User.first_name, User.last_name, User.role, User.is_active,
+        User.is_registered, User.created_at,
+        Teacher.id.label('teacher_id'), Teacher.specialization
+    ).outerjoin(Teacher, Teacher.user_id == User.id)
+    
+    if role:
+        query = query.filter(User.role == role)
+    
+    if status == 'active':
+        query = query.filter(User.is_active == True)
+    elif status == 'inactive':
+        query = query.filter(User.is_active == False)
+    elif status == 'registered':
+        query = query.filter(User.is_registered == True)
+    elif status == 'unregistered':
+        query = query.filter(User.is_registered == False)
     
-    print(users)
-
-    return render_template('admin/users.html', title='Gestión de Usuarios', users=users)
+    if search:
+        query = query.filter(db.or_(
+            User.first_name.ilike(f'%{search}%'),
+            User.last_name.ilike(f'%{search}%'),
+            User.email.ilike(f'%{search}%'),
+            User.identification_number.ilike(f'%{search}%')
+        ))
+    
+    pagination = keyset_paginate(
+        query, [User.last_name, User.first_name, User.id],
+        cursor=request.args.get('cursor'), with_total=True
+    )
+    users = pagination.items
+    
+    # Conteos de las pestañas y asignaciones por profesor con GROUP BY
+    role_counts = grouped_counts(User.role)
+    pending_count = grouped_counts(User.is_registered).get(False, 0)
+    teacher_ids = [user.teacher_id for user in users if user.teacher_id]
+    assignment_counts = grouped_counts(
+        TeacherAssignment.teacher_id, TeacherAssignment.teacher_id.in_(teacher_ids)
+    ) if teacher_ids else {}
+    
+    return render_template('admin/users.html', title='Gestión de Usuarios', users=users,
+                           pagination=pagination, role_counts=role_counts,
+                           pending_count=pending_count, assignment_counts=assignment_counts)
 
 @admin.route('/users/new', methods=['GET', 'POST'])
 # @login_required  # DEMO MODE: comentado temporalmente
@@ -241,8 +293,21 @@ def resend_invitation(id):
 @admin.route('/academic-years')
 # @login_required  # DEMO MODE: comentado temporalmente
 def academic_years():
-    years = AcademicYear.query.all()
-    return render_template('admin/academic_years.html', title='Años Académicos', years=years)
+    query = db.session.query(
+        AcademicYear.id, AcademicYear.name, AcademicYear.start_date,
+        AcademicYear.end_date, AcademicYear.is_active
+    )
+    pagination = keyset_paginate(
+        query, [AcademicYear.start_date.desc(), AcademicYear.id.desc()],
+        cursor=request.args.get('cursor')
+    )
+    years = pagination.items
+    
+    year_ids = [year.id for year in years]
+    period_counts = grouped_counts(Period.academic_year_id, Period.academic_year_id.in_(year_ids)) if year_ids else {}
+    
+    return render_template('admin/academic_years.html', title='Años Académicos', years=years,
+                           pagination=pagination, period_counts=period_counts)
 
 @admin.route('/academic-years/new', methods=['GET', 'POST'])
 # @login_required  # DEMO MODE: comentado temporalmente
@@ -270,8 +335,26 @@ def new_academic_year():
 @admin.route('/grades')
 # @login_required  # DEMO MODE: comentado temporalmente
 def grades():
-    grades = Grade.query.all()
-    return render_template('admin/grades.html', title='Grados y Secciones', grades=grades)
+    query = db.session.query(Grade.id, Grade.name, Grade.level)
+    pagination = keyset_paginate(query, [Grade.level, Grade.name, Grade.id], cursor=request.args.get('cursor'))
+    grades = pagination.items
+    
+    # Secciones de los grados de la página y estudiantes por sección, sin cargas por fila
+    sections_by_grade = {}
+    student_counts = {}
+    grade_ids = [grade.id for grade in grades]
+    if grade_ids:
+        sections = db.session.query(Section.id, Section.name, Section.grade_id).filter(
+            Section.grade_id.in_(grade_ids)
+        ).order_by(Section.name).all()
+        for section in sections:
+            sections_by_grade.setdefault(section.grade_id, []).append(section)
+        if sections:
+            student_counts = grouped_counts(Student.section_id, Student.section_id.in_([section.id for section in sections]))
+    
+    return render_template('admin/grades.html', title='Grados y Secciones', grades=grades,
+                           pagination=pagination, sections_by_grade=sections_by_grade,
+                           student_counts=student_counts)
 
 # Ruta para obtener secciones de un grado
 @admin.route('/grades/<int:id>/sections', methods=['GET'])
@@ -400,16 +483,34 @@ def sections():
     # Obtener el parámetro grade_id si existe
     grade_id = request.args.get('grade_id', type=int)
     
-    # Filtrar secciones por grado si se proporciona grade_id
+    query = db.session.query(
+        Section.id, Section.name, Section.grade_id,
+        Grade.name.label('grade_name'), Grade.level.label('grade_level')
+    ).join(Grade, Section.grade_id == Grade.id)
+    
+    grade = None
+    grades = []
     if grade_id:
-        grade = Grade.query.get_or_404(grade_id)
-        sections = Section.query.filter_by(grade_id=grade_id).all()
-        return render_template('admin/sections.html', title='Secciones', sections=sections, grade=grade)
+        # Filtrar secciones por grado si se proporciona grade_id
+        grade = ReferenceDataService.get().grade(grade_id)
+        if grade is None:
+            abort(404)
+        query = query.filter(Section.grade_id == grade_id)
+    else:
+        # Si no hay grade_id, mostrar todas las secciones con el filtro de grados
+        grades = ReferenceDataService.get().grades
+    
+    pagination = keyset_paginate(
+        query, [Grade.level, Grade.name, Section.name, Section.id],
+        cursor=request.args.get('cursor')
+    )
+    sections = pagination.items
+    
+    section_ids = [section.id for section in sections]
+    student_counts = grouped_counts(Student.section_id, Student.section_id.in_(section_ids)) if section_ids else {}
     
-    # Si no hay grade_id, mostrar todas las secciones
-    sections = Section.query.all()
-    grades = Grade.query.all()
-    return render_template('admin/sections.html', title='Secciones', sections=sections, grades=grades)
+    return render_template('admin/sections.html', title='Secciones', sections=sections, grade=grade,
+                           grades=grades, pagination=pagination, student_counts=student_counts)
 
 # Ruta para crear una sección por AJAX
 @admin.route('/sections/create', methods=['POST'])
@@ -514,15 +615,58 @@ def delete_section_ajax(id):
 @admin.route('/subjects')
 # @login_required  # DEMO MODE: comentado temporalmente
 def subjects():
-    subjects = Subject.query.all()
-    grades = Grade.query.all()
+    search = request.args.get('search', '').strip()
+    grade_id = request.args.get('grade_id', type=int)
+    
+    query = db.session.query(Subject.id, Subject.name, Subject.code)
     
-    # Obtener las asignaciones para cada asignatura
-    for subject in subjects:
-        # Asegurarse de que las relaciones estén cargadas
-        subject.teacher_assignments.all()
+    if search:
+        query = query.filter(db.or_(Subject.name.ilike(f'%{search}%'), Subject.code.ilike(f'%{search}%')))
     
-    return render_template('admin/subjects.html', title='Asignaturas', subjects=subjects, grades=grades)
+    if grade_id:
+        query = query.filter(Subject.id.in_(
+            db.session.query(subject_grade.c.subject_id).filter(subject_grade.c.grade_id == grade_id)
+        ))
+    
+    pagination = keyset_paginate(query, [Subject.name, Subject.id], cursor=request.args.get('cursor'), with_total=True)
+    subjects = pagination.items
+    grades = ReferenceDataService.get().grades
+    
+    # Asignaciones de las asignaturas de la página: conteo agrupado, grados
+    # distintos y detalle para el modal, en tres consultas en total
+    subject_ids = [subject.id for subject in subjects]
+    assignment_counts = {}
+    grades_by_subject = {}
+    assignments_by_subject = {}
+    if subject_ids:
+        assignment_counts = grouped_counts(TeacherAssignment.subject_id, TeacherAssignment.subject_id.in_(subject_ids))
+        
+        assigned_grades = db.session.query(
+            TeacherAssignment.subject_id, Grade.id, Grade.name, Grade.level
+        ).join(Section, TeacherAssignment.section_id == Section.id).join(
+            Grade, Section.grade_id == Grade.id
+        ).filter(TeacherAssignment.subject_id.in_(subject_ids)).distinct().order_by(Grade.level, Grade.name)
+        for row in assigned_grades:
+            grades_by_subject.setdefault(row.subject_id, []).append(row)
+        
+        assignments = db.session.query(
+            TeacherAssignment.subject_id,
+            User.first_name.label('teacher_first_name'), User.last_name.label('teacher_last_name'),
+            Grade.name.label('grade_name'), Section.name.label('section_name'),
+            AcademicYear.name.label('year_name')
+        ).join(Teacher, TeacherAssignment.teacher_id == Teacher.id).join(
+            User, Teacher.user_id == User.id
+        ).join(Section, TeacherAssignment.section_id == Section.id).join(
+            Grade, Section.grade_id == Grade.id
+        ).join(AcademicYear, TeacherAssignment.academic_year_id == AcademicYear.id).filter(
+            TeacherAssignment.subject_id.in_(subject_ids)
+        ).order_by(AcademicYear.start_date.desc(), User.last_name, User.first_name)
+        for row in assignments:
+            assignments_by_subject.setdefault(row.subject_id, []).append(row)
+    
+    return render_template('admin/subjects.html', title='Asignaturas', subjects=subjects, grades=grades,
+                           pagination=pagination, assignment_counts=assignment_counts,
+                           grades_by_subject=grades_by_subject, assignments_by_subject=assignments_by_subject)
 
 @admin.route('/subjects/new', methods=['POST'])
 # @login_required  # DEMO MODE: comentado temporalmente
@@ -611,48 +755,41 @@ def students():
     section_id = request.args.get('section_id', type=int)
     search = request.args.get('search', '')
     
-    # Consulta base
-    query = Student.query
+    # Consulta base: solo las columnas que muestra el listado, con grado y sección
+    query = db.session.query(
+        Student.id, Student.student_id, Student.first_name, Student.last_name,
+        Student.birth_date, Student.gender, Student.address, Student.phone, Student.email,
+        Student.section_id, Student.is_active, Student.created_at,
+        Section.name.label('section_name'), Grade.name.label('grade_name'), Grade.level.label('grade_level')
+    ).join(Section, Student.section_id == Section.id).join(Grade, Section.grade_id == Grade.id)
     
     # Aplicar filtros
     if grade_id:
-        sections = Section.query.filter_by(grade_id=grade_id).all()
-        section_ids = [section.id for section in sections]
-        query = query.filter(Student.section_id.in_(section_ids))
+        query = query.filter(Section.grade_id == grade_id)
     
     if section_id:
-        query = query.filter_by(section_id=section_id)
+        query = query.filter(Student.section_id == section_id)
     
     if search:
-        query = query.filter(
-            db.or_(
-                Student.first_name.ilike(f'%{search}%'),
-                Student.last_name.ilike(f'%{search}%'),
-                Student.student_id.ilike(f'%{search}%')
-            )
-        )
+        query, _ = StudentSearchService.filter_term(query, search)
     
-    # Ordenar y paginar
-    page = request.args.get('page', 1, type=int)
-    pagination = query.order_by(Student.last_name, Student.first_name).paginate(
-        page=page, per_page=20, error_out=False
+    # Ordenar y paginar por clave
+    pagination = keyset_paginate(
+        query, [Student.last_name, Student.first_name, Student.id],
+        cursor=request.args.get('cursor'), with_total=True
     )
     students = pagination.items
     
-    # Obtener grados y secciones para los filtros
-    grades = Grade.query.all()
-    sections = Section.query.filter_by(grade_id=grade_id).all() if grade_id else []
-    
-    # Obtener año académico activo y asignaturas
-    active_year = AcademicYear.query.filter_by(is_active=True).first()
-    subjects = Subject.query.all()
+    # Grados, secciones y períodos del año activo desde la caché de referencia
+    reference = ReferenceDataService.get()
+    grades = reference.grades
+    sections = reference.sections_of(grade_id)
+    active_year = reference.active_year
+    periods = reference.active_periods
     
     # Crear formulario para nuevo estudiante
     form = StudentForm()
-    form.section_id.choices = [(s.id, f"{s.grade.name} '{s.name}'") for s in Section.query.join(Grade).all()]
-    
-    # Configuración
-    passing_grade = 70  # Nota de aprobación (esto podría venir de la configuración)
+    form.section_id.choices = reference.section_choices()
     
     return render_template(
         'admin/students.html', 
@@ -662,9 +799,8 @@ def students():
         grades=grades,
         sections=sections,
         active_year=active_year,
-        subjects=subjects,
+        periods=periods,
         form=form,
-        passing_grade=passing_grade,
         now=datetime.now()
         
     )
@@ -674,7 +810,7 @@ def students():
 # @login_required  # DEMO MODE: comentado temporalmente
 def new_student():
     form = StudentForm()
-    form.section_id.choices = [(s.id, f"{s.grade.name} '{s.name}'") for s in Section.query.join(Grade).all()]
+    form.section_id.choices = ReferenceDataService.get().section_choices()
     
     if form.validate_on_submit():
         student = Student(
@@ -706,7 +842,7 @@ def new_student():
 def edit_student(id):
     student = Student.query.get_or_404(id)
     form = StudentForm()
-    form.section_id.choices = [(s.id, f"{s.grade.name} '{s.name}'") for s in Section.query.join(Grade).all()]
+    form.section_id.choices = ReferenceDataService.get().section_choices()
     
     # Guardar el ID de la base de datos para validación
     form.student_id_db = student.id
@@ -756,7 +892,7 @@ def get_student_details(id):
 def get_student_edit_form(id):
     student = Student.query.get_or_404(id)
     form = StudentForm(obj=student)
-    form.section_id.choices = [(s.id, f"{s.grade.name} '{s.name}'") for s in Section.query.join(Grade).all()]
+    form.section_id.choices = ReferenceDataService.get().section_choices()
     return render_template('admin/partials/student_edit_form.html', form=form, student=student)
 
 # Ruta para obtener el formulario de confirmación de eliminación
@@ -772,7 +908,7 @@ def get_student_delete_form(id):
 def edit_student_ajax(id):
     student = Student.query.get_or_404(id)
     form = StudentForm()
-    form.section_id.choices = [(s.id, f"{s.grade.name} '{s.name}'") for s in Section.query.join(Grade).all()]
+    form.section_id.choices = ReferenceDataService.get().section_choices()
     
     if form.validate_on_submit():
         student.first_name = form.first_name.data
@@ -838,61 +974,17 @@ def import_students():
         # Leer archivo Excel
         df = pd.read_excel(file)
         
-        # Validar columnas requeridas
-        required_columns = ['Cédula', 'Nombre', 'Apellido']
-        for col in required_columns:
-            if col not in df.columns:
-                flash(f'El archivo no contiene la columna requerida: {col}', 'danger')
-                return redirect(url_for('admin.students'))
+        # Solo altas: las cédulas ya registradas se reportan como error
+        result = StudentImportService.import_frame(
+            df, StudentImportService.ADMIN_COLUMNS, section_id, is_active=is_active
+        )
         
-        # Procesar datos
-        count = 0
-        errors = 0
-        for _, row in df.iterrows():
-            try:
-                # Verificar si ya existe un estudiante con esa cédula
-                existing = Student.query.filter_by(student_id=str(row['Cédula'])).first()
-                if existing:
-                    flash(f'Ya existe un estudiante con la cédula {row["Cédula"]}', 'warning')
-                    errors += 1
-                    continue
-                
-                # Crear nuevo estudiante
-                student = Student(
-                    first_name=row['Nombre'],
-                    last_name=row['Apellido'],
-                    student_id=str(row['Cédula']),
-                    section_id=section_id,
-                    is_active=is_active
-                )
-                
-                # Campos opcionales
-                if 'Fecha de Nacimiento' in df.columns and not pd.isna(row['Fecha de Nacimiento']):
-                    if isinstance(row['Fecha de Nacimiento'], str):
-                        student.birth_date = datetime.strptime(row['Fecha de Nacimiento'], '%d/%m/%Y').date()
-                    else:
-                        student.birth_date = row['Fecha de Nacimiento']
-                
-                if 'Género' in df.columns and not pd.isna(row['Género']):
-                    student.gender = row['Género']
-                
-                if 'Dirección' in df.columns and not pd.isna(row['Dirección']):
-                    student.address = row['Dirección']
-                
-                if 'Teléfono' in df.columns and not pd.isna(row['Teléfono']):
-                    student.phone = str(row['Teléfono'])
-                
-                if 'Email' in df.columns and not pd.isna(row['Email']):
-                    student.email = row['Email']
-                
-                db.session.add(student)
-                count += 1
-            except Exception as e:
-                errors += 1
-                flash(f'Error al procesar la fila {_+2}: {str(e)}', 'danger')
+        for error in result['errors'][:10]:  # Mostrar solo los primeros errores
+            flash(error, 'warning')
         
-        db.session.commit()
-        flash(f'Se importaron {count} estudiantes correctamente. Errores: {errors}', 'success')
+        flash(f"Se importaron {result['students_created']} estudiantes correctamente. Errores: {len(result['errors'])}", 'success')
+    except ValueError as e:
+        flash(str(e), 'danger')
     except Exception as e:
         flash(f'Error al procesar el archivo: {str(e)}', 'danger')
     
@@ -1115,42 +1207,53 @@ def assignments():
     subject_id = request.args.get('subject', type=int)
     section_id = request.args.get('section', type=int)
     
-    # Consulta base para asignaciones
-    query = TeacherAssignment.query
+    # Consulta base: asignación con los nombres de profesor, asignatura, sección y año
+    query = db.session.query(
+        TeacherAssignment.id, TeacherAssignment.teacher_id, TeacherAssignment.subject_id,
+        TeacherAssignment.section_id, TeacherAssignment.academic_year_id,
+        User.first_name.label('teacher_first_name'), User.last_name.label('teacher_last_name'),
+        Teacher.specialization,
+        Subject.code.label('subject_code'), Subject.name.label('subject_name'),
+        Section.name.label('section_name'), Grade.name.label('grade_name'), Grade.level.label('grade_level'),
+        AcademicYear.name.label('year_name'), AcademicYear.is_active.label('year_is_active')
+    ).join(Teacher, TeacherAssignment.teacher_id == Teacher.id
+    ).join(User, Teacher.user_id == User.id
+    ).join(Subject, TeacherAssignment.subject_id == Subject.id
+    ).join(Section, TeacherAssignment.section_id == Section.id
+    ).join(Grade, Section.grade_id == Grade.id
+    ).join(AcademicYear, TeacherAssignment.academic_year_id == AcademicYear.id)
     
     # Aplicar filtros si se proporcionan
     if academic_year_id:
-        query = query.filter_by(academic_year_id=academic_year_id)
+        query = query.filter(TeacherAssignment.academic_year_id == academic_year_id)
     if teacher_id:
-        query = query.filter_by(teacher_id=teacher_id)
+        query = query.filter(TeacherAssignment.teacher_id == teacher_id)
     if subject_id:
-        query = query.filter_by(subject_id=subject_id)
+        query = query.filter(TeacherAssignment.subject_id == subject_id)
     if section_id:
-        query = query.filter_by(section_id=section_id)
+        query = query.filter(TeacherAssignment.section_id == section_id)
     
-    # Ordenar por año académico, profesor, asignatura y sección
-    query = query.order_by(
+    # Ordenar por año académico, profesor, asignatura y sección, y paginar por clave
+    pagination = keyset_paginate(query, [
         TeacherAssignment.academic_year_id.desc(),
         TeacherAssignment.teacher_id,
         TeacherAssignment.subject_id,
-        TeacherAssignment.section_id
-    )
-    
-    # Paginar resultados
-    page = request.args.get('page', 1, type=int)
-    pagination = query.paginate(page=page, per_page=20, error_out=False)
+        TeacherAssignment.section_id,
+        TeacherAssignment.id
+    ], cursor=request.args.get('cursor'), with_total=True)
     assignments = pagination.items
     
-    # Obtener datos para los selectores de filtro
-    academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
-    teachers = Teacher.query.join(User).order_by(User.last_name, User.first_name).all()
-    subjects = Subject.query.order_by(Subject.name).all()
-    
-    # Obtener todas las secciones con sus grados para mostrar en el filtro
-    sections = Section.query.join(Grade).order_by(Grade.level, Grade.name, Section.name).all()
+    # Obtener datos para los selectores de filtro (solo las columnas que se muestran)
+    reference = ReferenceDataService.get()
+    academic_years = reference.academic_years
+    teachers = db.session.query(
+        Teacher.id, Teacher.specialization, User.first_name, User.last_name
+    ).join(User, Teacher.user_id == User.id).order_by(User.last_name, User.first_name).all()
+    subjects = reference.subjects
     
-    # Obtener todos los grados para el modal de nueva asignación
-    grades = Grade.query.order_by(Grade.level, Grade.name).all()
+    # Grados con sus secciones para el modal de nueva asignación y el filtro de sección
+    grades = reference.grades
+    sections = reference.sections
     
     return render_template(
         'admin/assignments.html',
@@ -1344,46 +1447,12 @@ def save_student_grades():
                     except ValueError:
                         flash(f'Valor inválido para {student.get_full_name()}', 'danger')
         
-        # Calcular y actualizar calificaciones finales
-        for student in students:
-            # Obtener todas las calificaciones del estudiante para esta asignatura y período
-            student_grades = StudentGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=subject_id,
-                period_id=period_id
-            ).all()
-            
-            # Calcular promedio ponderado
-            total_weighted_grade = 0
-            total_weight = 0
-            
-            for grade in student_grades:
-                total_weighted_grade += grade.value * grade.grade_type.weight
-                total_weight += grade.grade_type.weight
-            
-            # Solo actualizar si hay calificaciones
-            if total_weight > 0:
-                final_grade_value = total_weighted_grade / total_weight
-                
-                # Buscar si ya existe una calificación final
-                existing_final = FinalGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject_id,
-                    period_id=period_id
-                ).first()
-                
-                if existing_final:
-                    # Actualizar calificación final existente
-                    existing_final.value = final_grade_value
-                else:
-                    # Crear nueva calificación final
-                    new_final = FinalGrade(
-                        student_id=student.id,
-                        subject_id=subject_id,
-                        period_id=period_id,
-                        value=final_grade_value
-                    )
-                    db.session.add(new_final)
+        # Calcular y actualizar calificaciones finales en bloque
+        FinalGradeService.recalculate(
+            subject_id, period_id,
+            student_ids=[student.id for student in students],
+            commit=False
+        )
         
         db.session.commit()
         flash('Calificaciones guardadas correctamente', 'success')
@@ -1688,43 +1757,17 @@ def import_students_from_excel():
                 section_id = request.form.get('section_id', type=int)
                 section = Section.query.get_or_404(section_id)
                 
-                # Validar columnas requeridas
-                required_columns = ['first_name', 'last_name', 'student_id', 'date_of_birth', 'gender']
-                if not all(col in df.columns for col in required_columns):
+                # Las cédulas ya registradas se omiten
+                try:
+                    result = StudentImportService.import_frame(
+                        df, StudentImportService.MODEL_COLUMNS, section.id,
+                        required=('student_id', 'first_name', 'last_name', 'birth_date', 'gender')
+                    )
+                except ValueError:
                     flash('El archivo no tiene el formato correcto. Faltan columnas requeridas.', 'danger')
                     return redirect(request.url)
                 
-                # Importar estudiantes
-                count = 0
-                for _, row in df.iterrows():
-                    # Verificar si ya existe un estudiante con ese ID
-                    existing = Student.query.filter_by(student_id=row['student_id']).first()
-                    if existing:
-                        continue
-                    
-                    student = Student(
-                        first_name=row['first_name'],
-                        last_name=row['last_name'],
-                        student_id=row['student_id'],
-                        date_of_birth=row['date_of_birth'],
-                        gender=row['gender'],
-                        section_id=section_id,
-                        is_active=True
-                    )
-                    
-                    # Campos opcionales
-                    if 'address' in df.columns and not pd.isna(row['address']):
-                        student.address = row['address']
-                    if 'phone' in df.columns and not pd.isna(row['phone']):
-                        student.phone = row['phone']
-                    if 'email' in df.columns and not pd.isna(row['email']):
-                        student.email = row['email']
-                    
-                    db.session.add(student)
-                    count += 1
-                
-                db.session.commit()
-                flash(f'Se importaron {count} estudiantes correctamente', 'success')
+                flash(f"Se importaron {result['students_created']} estudiantes correctamente", 'success')
                 return redirect(url_for('admin.students'))
                 
             except Exception as e:
@@ -1793,49 +1836,103 @@ def settings():
     
     return render_template('admin/settings.html', title='Configuración del Sistema', form=form)
 
+# Medición de consultas y tiempos por ruta
+@admin.route('/perf')
+def perf():
+    if not current_user.is_authenticated or not current_user.is_admin():
+        flash('Acceso no autorizado. Se requieren privilegios de administrador.', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    
+    records = recent_requests()
+    endpoint = request.args.get('route')
+    
+    return render_template('admin/perf.html', title='Rendimiento',
+                           enabled=current_app.config.get('PERF_PROFILING'),
+                           summary=summarize_by_endpoint(records),
+                           records=[r for r in records if not endpoint or r['endpoint'] == endpoint][:100],
+                           endpoint=endpoint,
+                           pools=pool_status(),
+                           report_cache=ReportCacheService.stats())
+
+@admin.route('/perf/pool')
+def perf_pool():
+    """Estado del pool de conexiones en JSON (para pruebas de carga y monitoreo)"""
+    if not current_user.is_authenticated or not current_user.is_admin():
+        return jsonify({'success': False, 'error': 'Acceso no autorizado'}), 403
+    
+    return jsonify({'success': True, 'pools': pool_status()})
+
+@admin.route('/perf/clear', methods=['POST'])
+def perf_clear():
+    if not current_user.is_authenticated or not current_user.is_admin():
+        flash('Acceso no autorizado. Se requieren privilegios de administrador.', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    
+    clear_requests()
+    reset_pool_metrics()
+    flash('Mediciones eliminadas', 'success')
+    return redirect(url_for('admin.perf'))
+
 # Ruta para ver estadísticas
 @admin.route('/statistics')
 # @login_required  # DEMO MODE: comentado temporalmente
 def statistics():
     # Obtener año académico activo
-    active_year = AcademicYear.query.filter_by(is_active=True).first()
+    reference = ReferenceDataService.get()
+    active_year = reference.active_year
     if not active_year:
         flash('No hay un año académico activo', 'warning')
         return redirect(url_for('admin.dashboard'))
     
-    # Estadísticas generales
+    # Estadísticas generales (una sola consulta)
+    counts = StatisticsService.school_counts()
     stats = {
-        'students_count': Student.query.filter_by(is_active=True).count(),
-        'teachers_count': Teacher.query.count(),
-        'subjects_count': Subject.query.count(),
-        'sections_count': Section.query.count()
+        'students_count': counts['students'],
+        'teachers_count': counts['teachers'],
+        'subjects_count': counts['subjects'],
+        'sections_count': len(reference.sections)
     }
     
-    # Estadísticas de calificaciones por período
-    periods = Period.query.filter_by(academic_year_id=active_year.id).all()
-    period_stats = []
-    
-    for period in periods:
-        # Promedio general por período
-        avg_grade = db.session.query(db.func.avg(FinalGrade.value)).filter_by(period_id=period.id).scalar() or 0
-        
-        # Cantidad de aprobados y reprobados
-        passing_grade = 70  # Nota de aprobación (ajustar según necesidad)
-        passing_count = FinalGrade.query.filter(FinalGrade.period_id == period.id, FinalGrade.value >= passing_grade).count()
-        failing_count = FinalGrade.query.filter(FinalGrade.period_id == period.id, FinalGrade.value < passing_grade).count()
-        
-        period_stats.append({
-            'period': period,
-            'avg_grade': round(avg_grade, 2),
-            'passing_count': passing_count,
-            'failing_count': failing_count
-        })
+    # Estadísticas de calificaciones por período, leídas de grade_rollups
+    periods = reference.periods_of(active_year.id)
+    summaries = StatisticsService.period_summaries(period.id for period in periods)
+    
+    empty = {
+        'grade_count': 0,
+        'avg_grade': 0,
+        'min_grade': None,
+        'max_grade': None,
+        'passing_count': 0,
+        'failing_count': 0,
+        'passing_rate': 0,
+        'histogram': [0] * GradeRollup.HISTOGRAM_BINS
+    }
+    period_stats = [
+        dict(summaries.get(period.id, empty), period=period)
+        for period in periods
+    ]
+    
+    # Detalle por asignatura del período seleccionado (por defecto el último con calificaciones)
+    selected_period_id = request.args.get('period_id', type=int)
+    if not selected_period_id:
+        with_grades = [item['period'].id for item in period_stats if item['grade_count']]
+        selected_period_id = with_grades[-1] if with_grades else None
+    
+    subject_stats = []
+    if selected_period_id:
+        by_subject = StatisticsService.subject_summaries(selected_period_id)
+        subjects = [subject for subject in reference.subjects if subject.id in by_subject]
+        subject_stats = [dict(by_subject[subject.id], subject=subject) for subject in subjects]
     
     return render_template(
         'admin/statistics.html', 
         title='Estadísticas', 
         stats=stats, 
         period_stats=period_stats,
+        subject_stats=subject_stats,
+        selected_period_id=selected_period_id,
+        histogram_labels=StatisticsService.histogram_labels(),
+        passing_grade=current_app.config.get('PASSING_GRADE', 70),
         active_year=active_year
     )
 
@@ -1907,10 +2004,21 @@ def evaluations():
         period_id = request.args.get('period_id', type=int)
         grade_id = request.args.get('grade_id', type=int)
         section_id = request.args.get('section_id', type=int)
-        page = request.args.get('page', 1, type=int)
         
-        # Query base
-        query = GradeType.query
+        # Query base: columnas de la evaluación con los nombres que muestra el listado
+        query = db.session.query(
+            GradeType.id, GradeType.name, GradeType.weight, GradeType.section_id,
+            Subject.name.label('subject_name'),
+            Section.name.label('section_name'), Grade.name.label('grade_name'),
+            (User.first_name + ' ' + User.last_name).label('teacher_name'),
+            Period.name.label('period_name'), AcademicYear.name.label('year_name')
+        ).join(Subject, GradeType.subject_id == Subject.id
+        ).join(Section, GradeType.section_id == Section.id
+        ).join(Grade, Section.grade_id == Grade.id
+        ).join(Period, GradeType.period_id == Period.id
+        ).join(AcademicYear, Period.academic_year_id == AcademicYear.id
+        ).outerjoin(Teacher, GradeType.teacher_id == Teacher.id
+        ).outerjoin(User, Teacher.user_id == User.id)
         
         # Aplicar filtros
         if subject_id:
@@ -1920,28 +2028,48 @@ def evaluations():
         if section_id:
             query = query.filter(GradeType.section_id == section_id)
         elif grade_id:
-            query = query.join(Section).filter(Section.grade_id == grade_id)
+            query = query.filter(Section.grade_id == grade_id)
         
-        # Paginar: 15 evaluaciones por página
-        pagination = query.order_by(GradeType.created_at.desc()).paginate(
-            page=page, per_page=15, error_out=False
+        # Paginar por clave: 15 evaluaciones por página, las más recientes primero
+        pagination = keyset_paginate(
+            query, [GradeType.id.desc()], cursor=request.args.get('cursor'), per_page=15, with_total=True
         )
         grade_types = pagination.items
         
+        # Estudiantes activos de las secciones de la página y notas ya cargadas
+        # para los modales de calificación (dos consultas para toda la página)
+        section_ids = {grade_type.section_id for grade_type in grade_types}
+        section_students = {}
+        if section_ids:
+            for student in db.session.query(
+                Student.id, Student.student_id, Student.first_name, Student.last_name, Student.section_id
+            ).filter(
+                Student.section_id.in_(section_ids), Student.is_active == True
+            ).order_by(Student.last_name, Student.first_name):
+                section_students.setdefault(student.section_id, []).append(student)
+        
+        existing_grades = {}
+        if grade_types:
+            existing_grades = {
+                (row.grade_type_id, row.student_id): row
+                for row in db.session.query(
+                    StudentGrade.grade_type_id, StudentGrade.student_id, StudentGrade.value, StudentGrade.comments
+                ).filter(StudentGrade.grade_type_id.in_([grade_type.id for grade_type in grade_types]))
+            }
+        
         # Obtener datos para filtros y formularios
-        subjects = Subject.query.order_by(Subject.name).all()
-        academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
-        grades = Grade.query.order_by(Grade.level, Grade.name).all()
-        teachers = Teacher.query.join(User).order_by(User.last_name, User.first_name).all()
+        reference = ReferenceDataService.get()
         
         return render_template(
             'admin/grade_types.html',
             grade_types=grade_types,
             pagination=pagination,
-            subjects=subjects,
-            academic_years=academic_years,
-            grades=grades,
-            teachers=teachers
+            section_students=section_students,
+            existing_grades=existing_grades,
+            subjects=reference.subjects,
+            academic_years=reference.academic_years,
+            reference=reference,
+            grades=reference.grades
         )
         
     except Exception as e:
@@ -2072,260 +2200,102 @@ def delete_evaluation(id):
 @admin.route('/evaluations/<int:grade_type_id>/grades', methods=['POST'])
 # @login_required  # DEMO MODE: comentado temporalmente
 def enter_grades(grade_type_id):
-    try:
-        grade_type = GradeType.query.get_or_404(grade_type_id)
-        
-        if not grade_type.section:
-            flash('Esta evaluación no tiene una sección asignada', 'error')
-            return redirect(url_for('admin.evaluations'))
-        
-        students = grade_type.section.students.filter_by(is_active=True).all()
-        
-        for student in students:
-            grade_value = request.form.get(f'grade_{student.id}')
-            comment = request.form.get(f'comment_{student.id}')
-            
-            if grade_value:
-                # Convertir NP a 0
-                if grade_value.upper() == 'NP':
-                    numeric_value = 0.0
-                else:
-                    numeric_value = float(grade_value)
-                
-                # Buscar calificación existente
-                existing_grade = StudentGrade.query.filter_by(
-                    student_id=student.id,
-                    grade_type_id=grade_type_id
-                ).first()
-                
-                if existing_grade:
-                    existing_grade.value = numeric_value
-                    existing_grade.comments = comment or ''
-                else:
-                    new_grade = StudentGrade(
-                        student_id=student.id,
-                        subject_id=grade_type.subject_id,  # Agregar subject_id
-                        grade_type_id=grade_type_id,
-                        period_id=grade_type.period_id,   # Agregar period_id
-                        teacher_id=grade_type.teacher_id, # Agregar teacher_id
-                        value=numeric_value,
-                        comments=comment or ''
-                    )
-                    db.session.add(new_grade)
-        
-        db.session.commit()
+    grade_type = GradeType.query.get_or_404(grade_type_id)
+    
+    if not grade_type.section:
+        flash('Esta evaluación no tiene una sección asignada', 'error')
+        return redirect(url_for('admin.evaluations'))
+    
+    student_ids = [row[0] for row in db.session.query(Student.id).filter_by(
+        section_id=grade_type.section_id,
+        is_active=True
+    )]
+    
+    entries = [{
+        'student_id': student_id,
+        'value': request.form.get(f'grade_{student_id}'),
+        'comment': request.form.get(f'comment_{student_id}') or ''
+    } for student_id in student_ids]
+    
+    result = GradeEntryService.save_grade_sheet(grade_type, entries, teacher_id=grade_type.teacher_id)
+    
+    if result['success']:
         flash('Calificaciones guardadas exitosamente', 'success')
-        
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Error al guardar calificaciones: {str(e)}")
+    else:
+        current_app.logger.error(f"Error al guardar calificaciones: {result['errors']}")
         flash('Error al guardar las calificaciones', 'error')
     
     return redirect(url_for('admin.evaluations'))
 
-def calculate_final_grades(subject_id, period_id, section_id):
-    """
-    Calcula las calificaciones finales para una asignatura, período y sección específicos.
-    """
-    try:
-        # Obtener todos los estudiantes de la sección
-        students = Student.query.filter_by(section_id=section_id, is_active=True).all()
-        
-        # Obtener todos los tipos de evaluación para esta asignatura y período
-        grade_types = GradeType.query.filter_by(
-            subject_id=subject_id,
-            period_id=period_id,
-            section_id=section_id
-        ).all()
-        
-        # Calcular la suma total de pesos
-        total_weight = sum(gt.weight for gt in grade_types)
-        
-        if total_weight == 0:
-            return
-        
-        for student in students:
-            final_value = 0
-            has_grades = False
-            
-            # Calcular la calificación final ponderada
-            for grade_type in grade_types:
-                student_grade = StudentGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject_id,
-                    grade_type_id=grade_type.id,
-                    period_id=period_id
-                ).first()
-                
-                if student_grade:
-                    has_grades = True
-                    # Calcular la contribución ponderada de esta evaluación
-                    weighted_value = (student_grade.value * grade_type.weight) / total_weight
-                    final_value += weighted_value
-            
-            if has_grades:
-                # Redondear a 2 decimales
-                final_value = round(final_value, 2)
-                
-                # Buscar si ya existe una calificación final
-                existing_final = FinalGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject_id,
-                    period_id=period_id
-                ).first()
-                
-                if existing_final:
-                    # Actualizar calificación final existente
-                    existing_final.value = final_value
-                else:
-                    # Crear nueva calificación final
-                    new_final = FinalGrade(
-                        student_id=student.id,
-                        subject_id=subject_id,
-                        period_id=period_id,
-                        value=final_value
-                    )
-                    db.session.add(new_final)
-            
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Error al calcular calificaciones finales: {str(e)}")
-
 @admin.route('/save-grades', methods=['POST'])
 # @login_required  # DEMO MODE: comentado temporalmente
 def save_grades():
-    if request.method == 'POST':
-        evaluation_id = request.form.get('evaluation_id', type=int)
-        if not evaluation_id:
-            flash('Evaluación no especificada', 'danger')
-            return redirect(url_for('admin.evaluations', tab='grades'))
-        
-        # Obtener la evaluación
-        grade_type = GradeType.query.get_or_404(evaluation_id)
-        
-        # Obtener el profesor actual (si es un profesor quien está asignando calificaciones)
-        teacher_id = None
-        if current_user.is_teacher():
-            teacher_id = current_user.teacher_profile.id
-        
-        # Procesar cada calificación de estudiante
-        for key, value in request.form.items():
-            if key.startswith('grade_'):
-                student_id = int(key.split('_')[1])
-                grade_value = float(value) if value else None
-                comment_key = f'comment_{student_id}'
-                comment = request.form.get(comment_key, '')
-                
-                if grade_value is not None:
-                    # Buscar si ya existe una calificación para este estudiante y evaluación
-                    student_grade = StudentGrade.query.filter_by(
-                        student_id=student_id,
-                        grade_type_id=evaluation_id
-                    ).first()
-                    
-                    if student_grade:
-                        # Actualizar calificación existente
-                        student_grade.value = grade_value
-                        student_grade.comments = comment
-                        student_grade.updated_at = datetime.utcnow()
-                    else:
-                        # Crear nueva calificación
-                        student = Student.query.get(student_id)
-                        if not student:
-                            continue
-                        
-                        # Si no se especificó un profesor, intentar encontrar uno asignado
-                        if not teacher_id:
-                            assignment = TeacherAssignment.query.filter_by(
-                                subject_id=grade_type.subject_id,
-                                section_id=student.section_id
-                            ).first()
-                            
-                            if assignment:
-                                teacher_id = assignment.teacher_id
-                            else:
-                                flash(f'No se encontró un profesor asignado para el estudiante {student.get_full_name()}', 'warning')
-                                continue
-                        
-                        # Crear nueva calificación
-                        new_grade = StudentGrade(
-                            student_id=student_id,
-                            subject_id=grade_type.subject_id,
-                            grade_type_id=evaluation_id,
-                            period_id=grade_type.period_id,
-                            teacher_id=teacher_id,
-                            value=grade_value,
-                            comments=comment
-                        )
-                        db.session.add(new_grade)
-        
-        # Guardar cambios
-        db.session.commit()
-        
-        # Actualizar calificaciones finales
-        update_final_grades(grade_type.subject_id, grade_type.period_id)
-        
+    evaluation_id = request.form.get('evaluation_id', type=int)
+    if not evaluation_id:
+        flash('Evaluación no especificada', 'danger')
+        return redirect(url_for('admin.evaluations', tab='grades'))
+    
+    # Obtener la evaluación
+    grade_type = GradeType.query.get_or_404(evaluation_id)
+    
+    # Convertir los campos grade_<id> / comment_<id> en una planilla
+    entries = []
+    for key, value in request.form.items():
+        if key.startswith('grade_'):
+            student_id = key.split('_', 1)[1]
+            entries.append({
+                'student_id': student_id,
+                'value': value,
+                'comment': request.form.get(f'comment_{student_id}', '')
+            })
+    
+    result = GradeEntryService.save_grade_sheet(grade_type, entries, user=current_user)
+    
+    for error in result['errors']:
+        flash(error, 'warning')
+    
+    if result['success']:
         flash('Calificaciones guardadas correctamente', 'success')
-        return redirect(url_for('admin.evaluations', tab='grades', evaluation=evaluation_id))
+    else:
+        flash('Error al guardar las calificaciones', 'danger')
     
-    return redirect(url_for('admin.evaluations', tab='grades'))
+    return redirect(url_for('admin.evaluations', tab='grades', evaluation=evaluation_id))
 
-def update_final_grades(subject_id, period_id):
-    """Actualiza las calificaciones finales para una asignatura y período"""
-    # Obtener todos los estudiantes que tienen calificaciones para esta asignatura y período
-    student_ids = db.session.query(StudentGrade.student_id).filter_by(
-        subject_id=subject_id,
-        period_id=period_id
-    ).distinct().all()
+@admin.route('/api/evaluations/<int:grade_type_id>/grades', methods=['POST'])
+# @login_required  # DEMO MODE: comentado temporalmente
+def api_save_grade_sheet(grade_type_id):
+    """
+    Guarda la planilla completa de una evaluación en una sola transacción.
     
-    student_ids = [id[0] for id in student_ids]
+    Espera JSON: {"grades": [{"student_id": 1, "value": 85, "comment": "..."}, ...]}
     
-    # Para cada estudiante, calcular su calificación final
-    for student_id in student_ids:
-        # Obtener todas las calificaciones del estudiante para esta asignatura y período
-        grades = StudentGrade.query.filter_by(
-            student_id=student_id,
-            subject_id=subject_id,
-            period_id=period_id
-        ).all()
-        
-        # Calcular promedio ponderado
-        total_weighted_grade = 0
-        total_weight = 0
-        
-        for grade in grades:
-            grade_type = GradeType.query.get(grade.grade_type_id)
-            total_weighted_grade += grade.value * grade_type.weight
-            total_weight += grade_type.weight
-        
-        # Si hay ponderación, calcular promedio
-        if total_weight > 0:
-            final_value = round(total_weighted_grade / total_weight, 2)
-            
-            # Buscar si ya existe una calificación final
-            final_grade = FinalGrade.query.filter_by(
-                student_id=student_id,
-                subject_id=subject_id,
-                period_id=period_id
-            ).first()
-            
-            if final_grade:
-                # Actualizar calificación final existente
-                final_grade.value = final_value
-                final_grade.updated_at = datetime.utcnow()
-            else:
-                # Crear nueva calificación final
-                new_final = FinalGrade(
-                    student_id=student_id,
-                    subject_id=subject_id,
-                    period_id=period_id,
-                    value=final_value
-                )
-                db.session.add(new_final)
+    Responde 422 con la lista errors si alguna fila es inválida (las filas
+    válidas se guardan) y 500 solo si falla la base de datos.
+    """
+    grade_type = GradeType.query.get_or_404(grade_type_id)
     
-    # Guardar cambios
-    db.session.commit()
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        entries = payload.get('grades')
+    else:
+        entries = payload
+    
+    if not isinstance(entries, list):
+        return jsonify({
+            'success': False,
+            'error': 'Se esperaba una lista de calificaciones en "grades"'
+        }), 400
+    
+    result = GradeEntryService.save_grade_sheet(grade_type, entries, user=current_user)
+    
+    if result['database_error']:
+        status = 500
+    elif result['errors']:
+        status = 422
+    else:
+        status = 200
+    
+    return jsonify(result), status
 
 # API endpoints para el frontend
 @admin.route('/api/section/<int:section_id>/teachers')
@@ -2374,12 +2344,11 @@ def api_teacher_section_subjects(teacher_id, section_id):
 def api_section_subject_evaluations(section_id, subject_id):
     """Obtiene las evaluaciones para una sección y asignatura"""
     # Primero obtenemos los períodos activos
-    active_year = AcademicYear.query.filter_by(is_active=True).first()
-    if not active_year:
+    reference = ReferenceDataService.get()
+    if not reference.active_year:
         return jsonify({'evaluations': []})
     
-    periods = Period.query.filter_by(academic_year_id=active_year.id).all()
-    period_ids = [p.id for p in periods]
+    period_ids = [p.id for p in reference.active_periods]
     
     # Luego obtenemos las evaluaciones
     evaluations = GradeType.query.filter(
@@ -2408,44 +2377,18 @@ def search_students():
         section_id = request.args.get('section_id', type=int)
         search_term = request.args.get('search_term', '').strip()
         
-        # Construir query base con JOIN único
-        query = Student.query.join(Section).join(Grade).filter(Student.is_active == True)
-        
-        # Aplicar filtros en orden de especificidad
-        if section_id:
-            # Filtro más específico: sección exacta
-            query = query.filter(Student.section_id == section_id)
-        elif grade_id:
-            # Filtro por grado: todas las secciones de ese grado
-            query = query.filter(Section.grade_id == grade_id)
-        elif year_id:
-            # Filtro por año académico: buscar secciones que tengan evaluaciones en este año
-            sections_with_evaluations = db.session.query(GradeType.section_id).join(Period).filter(
-                Period.academic_year_id == year_id
-            ).distinct()
-            
-            query = query.filter(Student.section_id.in_(sections_with_evaluations))
-        
-        # Filtrar por término de búsqueda (detección automática)
-        if search_term:
-            # Detectar si es búsqueda por cédula (solo números, o con V-/E-)
-            clean_term = ''.join(filter(str.isdigit, search_term))
-            
-            if clean_term and len(clean_term) >= 2:  # Si tiene al menos 2 dígitos, buscar por cédula
-                query = query.filter(Student.student_id.ilike(f'%{clean_term}%'))
-            else:  # Si no, buscar por nombre
-                search_filter = or_(
-                    Student.first_name.ilike(f'%{search_term}%'),
-                    Student.last_name.ilike(f'%{search_term}%'),
-                    func.concat(Student.first_name, ' ', Student.last_name).ilike(f'%{search_term}%'),
-                    func.concat(Student.last_name, ' ', Student.first_name).ilike(f'%{search_term}%')
-                )
-                query = query.filter(search_filter)
-        
-        # Ejecutar query con orden
-        students = query.order_by(Student.last_name, Student.first_name).all()
+        # Búsqueda indexada y paginada por clave (ver StudentSearchService)
+        page = StudentSearchService.search(
+            search_term=search_term,
+            section_id=section_id,
+            grade_id=grade_id,
+            year_id=year_id,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        students = page['students']
         
-        # Formatear resultados
+        # Formatear resultados (sección y grado ya vienen cargados)
         students_data = []
         for student in students:
             # Calcular edad si tiene fecha de nacimiento
@@ -2476,12 +2419,15 @@ def search_students():
             'success': True,
             'students': students_data,
             'total': len(students_data),
+            'has_more': page['has_more'],
+            'next_cursor': page['next_cursor'],
+            'limit': page['limit'],
             'filters_applied': {
                 'year_id': year_id,
                 'grade_id': grade_id,
                 'section_id': section_id,
                 'search_term': search_term,
-                'search_type': 'auto_detected'
+                'search_type': page['search_type'] or 'auto_detected'
             }
         })
         
@@ -2498,119 +2444,25 @@ def search_students():
 @admin.route('/api/student/<int:student_id>/grades')
 # @login_required  # DEMO MODE: comentado temporalmente
 def get_student_grades(student_id):
+    """
+    Calificaciones del año activo de un estudiante en JSON
+
+    passing_grade es PASSING_GRADE de la configuración (70 por defecto; antes
+    la respuesta fijaba 10). Para conservar el valor anterior, definir
+    PASSING_GRADE=10.
+    """
     try:
-        student = Student.query.get_or_404(student_id)
+        student = Student.query.options(
+            joinedload(Student.section).joinedload(Section.grade)
+        ).get_or_404(student_id)
         
         # Obtener el año académico activo
         active_year = AcademicYear.query.filter_by(is_active=True).first()
         if not active_year:
             return jsonify({'error': 'No hay año académico activo'}), 400
         
-        # Obtener todas las asignaturas que tienen evaluaciones para este estudiante
-        subjects_with_grades = db.session.query(Subject).join(
-            GradeType, Subject.id == GradeType.subject_id
-        ).join(
-            StudentGrade, GradeType.id == StudentGrade.grade_type_id
-        ).filter(
-            StudentGrade.student_id == student_id
-        ).distinct().all()
-        
-        # Si no hay calificaciones, obtener asignaturas del grado del estudiante
-        if not subjects_with_grades:
-            # Buscar asignaturas que tengan evaluaciones para el grado del estudiante
-            subjects_with_grades = db.session.query(Subject).join(
-                GradeType, Subject.id == GradeType.subject_id
-            ).join(
-                Section, GradeType.section_id == Section.id
-            ).filter(
-                Section.grade_id == student.section.grade_id
-            ).distinct().all()
-        
-        # Obtener todos los períodos del año activo
-        periods = active_year.periods.order_by(Period.start_date).all()
-        
-        # Estructura para organizar las calificaciones
-        grades_data = {}
-        
-        for subject in subjects_with_grades:
-            grades_data[subject.id] = {
-                'subject_name': subject.name,
-                'subject_code': subject.code,
-                'periods': {},
-                'final_average': 0
-            }
-            
-            period_totals = []
-            
-            for period in periods:
-                # Obtener evaluaciones (GradeType) para esta asignatura, período y sección
-                grade_types = GradeType.query.filter_by(
-                    subject_id=subject.id,
-                    period_id=period.id,
-                    section_id=student.section_id
-                ).all()
-                
-                # Obtener calificaciones del estudiante para estas evaluaciones
-                student_grades = []
-                for grade_type in grade_types:
-                    grade = StudentGrade.query.filter_by(
-                        student_id=student_id,
-                        grade_type_id=grade_type.id
-                    ).first()
-                    if grade:
-                        student_grades.append(grade)
-                
-                # Obtener calificación final del período si existe
-                final_grade = FinalGrade.query.filter_by(
-                    student_id=student_id,
-                    subject_id=subject.id,
-                    period_id=period.id
-                ).first()
-                
-                # Organizar evaluaciones del período
-                evaluations = []
-                total_weighted = 0
-                total_weight = 0
-                
-                for grade in student_grades:
-                    evaluation_data = {
-                        'evaluation_name': grade.grade_type.name,
-                        'weight': grade.grade_type.weight,
-                        'value': grade.value,
-                        'comments': grade.comments or '',
-                        'date_recorded': grade.created_at.strftime('%d/%m/%Y') if hasattr(grade, 'created_at') and grade.created_at else ''
-                    }
-                    evaluations.append(evaluation_data)
-                    
-                    # Calcular promedio ponderado
-                    total_weighted += grade.value * grade.grade_type.weight
-                    total_weight += grade.grade_type.weight
-                
-                # Calcular promedio del período
-                period_average = 0
-                if total_weight > 0:
-                    period_average = total_weighted / total_weight
-                elif final_grade:
-                    period_average = final_grade.value
-                
-                if evaluations or final_grade:  # Solo agregar si hay evaluaciones o calificación final
-                    grades_data[subject.id]['periods'][period.id] = {
-                        'period_name': period.name,
-                        'evaluations': evaluations,
-                        'period_average': round(period_average, 1),
-                        'final_grade': final_grade.value if final_grade else None
-                    }
-                    
-                    if period_average > 0:
-                        period_totals.append(period_average)
-            
-            # Calcular promedio final de la asignatura
-            if period_totals:
-                grades_data[subject.id]['final_average'] = round(sum(period_totals) / len(period_totals), 1)
-            
-            # Si no hay calificaciones para esta asignatura, eliminarla
-            if not any(grades_data[subject.id]['periods'].values()):
-                del grades_data[subject.id]
+        # Notas, evaluaciones y calificaciones finales del año en pocas consultas
+        periods, grades_data = StudentTranscriptService.build_year_transcript(student, active_year)
         
         return jsonify({
             'success': True,
@@ -2626,7 +2478,7 @@ def get_student_grades(student_id):
             },
             'periods': [{'id': p.id, 'name': p.name} for p in periods],
             'grades': grades_data,
-            'passing_grade': 10  # Nota mínima para aprobar
+            'passing_grade': current_app.config.get('PASSING_GRADE', 70)  # Nota mínima para aprobar
         })
         
     except Exception as e:
@@ -2706,18 +2558,41 @@ def api_section_subject_teachers(section_id, subject_id):
 @admin.route('/periods')
 # @login_required  # DEMO MODE: comentado temporalmente
 def periods():
-    academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
+    # Años académicos para los selectores de los modales
+    reference = ReferenceDataService.get()
+    academic_years = reference.academic_years
+    
+    # Años de la página, paginados por clave, con sus períodos y evaluaciones
+    pagination = keyset_paginate(
+        db.session.query(
+            AcademicYear.id, AcademicYear.name, AcademicYear.is_active, AcademicYear.start_date, AcademicYear.end_date
+        ),
+        [AcademicYear.start_date.desc(), AcademicYear.id.desc()],
+        cursor=request.args.get('cursor'), per_page=10
+    )
+    periods_by_year = {year.id: reference.periods_of(year.id) for year in pagination.items}
+    evaluation_counts = grouped_counts(GradeType.period_id)
+    
     # Crear un formulario vacío para usar en los modales
     form = PeriodForm()
-    form.academic_year_id.choices = [(y.id, y.name) for y in academic_years]
+    form.academic_year_id.choices = reference.year_choices()
     
-    return render_template('admin/periods.html', title='Períodos Académicos', academic_years=academic_years, form=form)
+    return render_template(
+        'admin/periods.html',
+        title='Períodos Académicos',
+        academic_years=academic_years,
+        years=pagination.items,
+        pagination=pagination,
+        periods_by_year=periods_by_year,
+        evaluation_counts=evaluation_counts,
+        form=form
+    )
 
 @admin.route('/periods/new', methods=['POST'])
 # @login_required  # DEMO MODE: comentado temporalmente
 def new_period():
     form = PeriodForm()
-    form.academic_year_id.choices = [(y.id, y.name) for y in AcademicYear.query.all()]
+    form.academic_year_id.choices = ReferenceDataService.get().year_choices()
     
     if form.validate_on_submit():
         period = Period(
@@ -2745,7 +2620,7 @@ def edit_period(id):
     
     # Crear el formulario y establecer las opciones para academic_year_id
     form = PeriodForm()
-    form.academic_year_id.choices = [(y.id, y.name) for y in AcademicYear.query.all()]
+    form.academic_year_id.choices = ReferenceDataService.get().year_choices()
     
     # Procesar el formulario manualmente ya que viene de un modal
     if request.method == 'POST':
@@ -2795,15 +2670,31 @@ def delete_period(id):
     flash('Período eliminado correctamente', 'success')
     return redirect(url_for('admin.periods'))
 
+@admin.route('/periods/<int:id>/recalculate', methods=['POST'])
+# @login_required  # DEMO MODE: comentado temporalmente
+def recalculate_period_final_grades(id):
+    """Recalcula en segundo plano las calificaciones finales de todo el período"""
+    period = Period.query.get_or_404(id)
+    
+    job = JobService.submit('recalculate_final_grades', {
+        'period_id': period.id,
+        'section_id': request.form.get('section_id', type=int)
+    }, user_id=current_user.id if current_user.is_authenticated else None)
+    
+    flash(f'Recalculando las calificaciones finales de {period.name}', 'info')
+    return redirect(url_for('jobs.view', job_id=job.id))
+
 @admin.route('/api/academic-year/<int:year_id>/periods')
 # @login_required  # DEMO MODE: comentado temporalmente
 def api_periods(year_id):
     try:
         # Verificar que el año académico existe
-        academic_year = AcademicYear.query.get_or_404(year_id)
+        reference = ReferenceDataService.get()
+        if reference.academic_year(year_id) is None:
+            abort(404)
         
         # Obtener períodos del año académico
-        periods = Period.query.filter_by(academic_year_id=year_id).order_by(Period.start_date).all()
+        periods = reference.periods_of(year_id)
         
         return jsonify({
             'success': True,
@@ -2884,11 +2775,13 @@ def api_available_weight(subject_id, period_id):
 def api_subject_grades(subject_id):
     try:
         # Verificar que la asignatura existe
-        subject = Subject.query.get_or_404(subject_id)
+        reference = ReferenceDataService.get()
+        if reference.subject(subject_id) is None:
+            abort(404)
         
         # En un sistema real, aquí obtendrías los grados asociados a la asignatura
         # Por ahora, simplemente devolvemos todos los grados
-        grades = Grade.query.order_by(Grade.level, Grade.name).all()
+        grades = reference.grades
         
         return jsonify({
             'success': True,
@@ -2913,7 +2806,7 @@ def api_subject_grades(subject_id):
 # @login_required  # DEMO MODE: comentado temporalmente
 def api_grade_sections(grade_id):
     try:
-        sections = Section.query.filter_by(grade_id=grade_id).order_by(Section.name).all()
+        sections = ReferenceDataService.get().sections_of(grade_id)
         return jsonify({
             'sections': [{'id': s.id, 'name': s.name} for s in sections]
         })
@@ -2940,7 +2833,7 @@ def api_assignments():
         
         # Si no se proporciona academic_year_id, usar el año académico activo
         if not academic_year_id:
-            active_year = AcademicYear.query.filter_by(is_active=True).first()
+            active_year = ReferenceDataService.get().active_year
             if active_year:
                 academic_year_id = active_year.id
             else:
@@ -2985,7 +2878,7 @@ def api_assignments():
 # @login_required  # DEMO MODE: comentado temporalmente
 def api_academic_years():
     try:
-        academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
+        academic_years = ReferenceDataService.get().academic_years
         
         return jsonify({
             'success': True,
@@ -3013,10 +2906,12 @@ def api_academic_years():
 def api_academic_year_periods(year_id):
     try:
         # Verificar que el año académico existe
-        year = AcademicYear.query.get_or_404(year_id)
+        reference = ReferenceDataService.get()
+        if reference.academic_year(year_id) is None:
+            abort(404)
         
         # Obtener períodos del año académico
-        periods = Period.query.filter_by(academic_year_id=year_id).order_by(Period.start_date).all()
+        periods = reference.periods_of(year_id)
         
         return jsonify({
             'success': True,
@@ -2,7 +2,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app.models.academic import AcademicYear, Period, Grade, Section, Subject
-from app import db
+from app.services.job_service import JobService
+from app.services.reference_data_service import ReferenceDataService
 import pandas as pd
 from io import BytesIO
 import os
@@ -20,9 +21,10 @@ def allowed_file(filename):
 @login_required
 def index():
     """Página principal de importación con datos reales"""
-    academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
-    grades = Grade.query.order_by(Grade.level, Grade.name).all()
-    subjects = Subject.query.order_by(Subject.name).all()
+    reference = ReferenceDataService.get()
+    academic_years = reference.academic_years
+    grades = reference.grades
+    subjects = reference.subjects
     
     return render_template('reports/uploads.html', 
                          academic_years=academic_years,
@@ -160,81 +162,14 @@ def process_upload():
         file_path = os.path.join(upload_dir, filename)
         file.save(file_path)
         
-        # Procesar archivo Excel
-        try:
-            # Leer archivo Excel
-            df = pd.read_excel(file_path, sheet_name='Estudiantes')
-            
-            # Validar columnas requeridas
-            required_columns = ['Nombre', 'Apellido', 'Cedula']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                flash(f'Columnas faltantes en el archivo: {", ".join(missing_columns)}', 'danger')
-                os.remove(file_path)  # Limpiar archivo
-                return redirect(url_for('data_import.index'))
-            
-            # Procesar estudiantes
-            students_created = 0
-            students_updated = 0
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    # Buscar estudiante existente
-                    existing_student = Student.query.filter_by(student_id=str(row['Cedula'])).first()
-                    
-                    if existing_student:
-                        # Actualizar estudiante existente
-                        existing_student.first_name = str(row['Nombre']).strip()
-                        existing_student.last_name = str(row['Apellido']).strip()
-                        existing_student.section_id = section.id
-                        existing_student.is_active = True
-                        students_updated += 1
-                    else:
-                        # Crear nuevo estudiante
-                        from app.models.academic import Student
-                        new_student = Student(
-                            student_id=str(row['Cedula']),
-                            first_name=str(row['Nombre']).strip(),
-                            last_name=str(row['Apellido']).strip(),
-                            section_id=section.id,
-                            email=str(row.get('Email', '')).strip() if pd.notna(row.get('Email')) else '',
-                            phone=str(row.get('Telefono', '')).strip() if pd.notna(row.get('Telefono')) else '',
-                            is_active=True
-                        )
-                        db.session.add(new_student)
-                        students_created += 1
-                        
-                except Exception as e:
-                    errors.append(f"Fila {index + 2}: {str(e)}")
-                    continue
-            
-            # Guardar cambios
-            db.session.commit()
-            
-            # Limpiar archivo temporal
-            os.remove(file_path)
-            
-            # Mostrar resultados
-            success_msg = f'Importación completada: {students_created} estudiantes creados, {students_updated} actualizados'
-            if errors:
-                success_msg += f'. {len(errors)} errores encontrados.'
-            
-            flash(success_msg, 'success')
-            
-            if errors:
-                for error in errors[:5]:  # Mostrar solo los primeros 5 errores
-                    flash(error, 'warning')
-            
-        except Exception as e:
-            # Limpiar archivo en caso de error
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            flash(f'Error procesando archivo: {str(e)}', 'danger')
-            return redirect(url_for('data_import.index'))
+        # La importación corre en segundo plano; el trabajo elimina el archivo al terminar
+        job = JobService.submit('import_students', {
+            'file_path': file_path,
+            'section_id': section.id
+        }, user_id=current_user.id)
         
-        return redirect(url_for('reports.index'))
+        flash('La importación se está procesando. Puedes seguir su avance en esta página.', 'info')
+        return redirect(url_for('jobs.view', job_id=job.id))
         
     except Exception as e:
         flash(f'Error inesperado: {str(e)}', 'danger')
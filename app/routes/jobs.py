@@ -0,0 +1,99 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask_login import login_required, current_user
+from app.models.jobs import Job
+from app.services.job_service import JobService
+from app.utils.excel import stream_file
+from app import db
+import mimetypes
+import os
+
+jobs = Blueprint('jobs', __name__)
+
+JOB_TYPE_LABELS = {
+    'import_students': 'Importación de estudiantes',
+    'batch_template_report': 'Reportes por lotes',
+    'school_excel_export': 'Exportación de calificaciones',
+    'recalculate_final_grades': 'Recálculo de calificaciones finales',
+    'report_cards': 'Boletas de calificaciones',
+    'analyze_template': 'Análisis de plantilla'
+}
+
+@jobs.before_request
+def check_access():
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth.login'))
+
+@jobs.context_processor
+def inject_job_labels():
+    return {'job_type_labels': JOB_TYPE_LABELS}
+
+def request_wants_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+def get_job_or_404(job_id):
+    """Trabajo solicitado, visible solo para quien lo creó o para un administrador"""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        abort(404)
+    if job.created_by != current_user.id and not current_user.is_admin():
+        abort(403)
+    return job
+
+@jobs.route('/')
+@login_required
+def index():
+    """Trabajos recientes del usuario (todos si es administrador)"""
+    query = Job.query
+    if not current_user.is_admin():
+        query = query.filter_by(created_by=current_user.id)
+
+    job_list = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(50).all()
+
+    return render_template('jobs/index.html', jobs=job_list)
+
+@jobs.route('/<int:job_id>')
+@login_required
+def view(job_id):
+    """Estado de un trabajo; la página consulta /jobs/api/<id> hasta que termina"""
+    job = get_job_or_404(job_id)
+    return render_template('jobs/view.html', job=job)
+
+@jobs.route('/api/<int:job_id>')
+@login_required
+def api_status(job_id):
+    """Estado y progreso del trabajo en JSON"""
+    job = get_job_or_404(job_id)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@jobs.route('/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel(job_id):
+    job = get_job_or_404(job_id)
+
+    if JobService.request_cancel(job):
+        message = 'Cancelación solicitada'
+        success = True
+    else:
+        message = 'El trabajo ya terminó'
+        success = False
+
+    if request_wants_json():
+        return jsonify({'success': success, 'error': None if success else message, 'job': job.to_dict()})
+
+    flash(message, 'info' if success else 'warning')
+    return redirect(url_for('jobs.view', job_id=job.id))
+
+@jobs.route('/<int:job_id>/download')
+@login_required
+def download(job_id):
+    """Descarga el archivo generado por el trabajo"""
+    job = get_job_or_404(job_id)
+
+    if job.status != Job.COMPLETED or not job.result_path or not os.path.exists(job.result_path):
+        flash('El archivo no está disponible o ya expiró', 'warning')
+        return redirect(url_for('jobs.view', job_id=job.id))
+
+    mimetype = mimetypes.guess_type(job.result_name or job.result_path)[0] or 'application/octet-stream'
+
+    # El archivo se conserva hasta que vence JOB_RESULT_RETENTION_HOURS
+    return stream_file(job.result_path, job.result_name, mimetype, delete_after=False)
@@ -1,24 +1,32 @@
-from flask import Blueprint, render_template, request, send_file, flash, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, send_file, flash, jsonify, redirect, url_for, abort
 from flask_login import login_required, current_user
 from app.models.users import User
-from app.models.academic import AcademicYear, Period, Grade, Section, Subject, Student, Teacher, TeacherAssignment
-from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.models.academic import AcademicYear, Period, Grade, Section, Student, Teacher, TeacherAssignment
 from app.models.templates import ExcelTemplate, TemplateCell, TemplateRange  # NUEVO
 from app import db
-import pandas as pd
+from sqlalchemy.orm import joinedload
 from io import BytesIO
-import tempfile
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
 from app.services.multi_sheet_excel_generator import MultiSheetExcelGenerator
 from app.services.template_processor import TemplateProcessor
+from app.services.template_cache import TemplateCache
+from app.services.section_gradebook import SectionGradebook
+from app.services.student_transcript_service import StudentTranscriptService
+from app.services.streaming_export_service import StreamingExportService
+from app.services.batch_report_service import BatchReportService
+from app.services.job_service import JobService
+from app.services.analytics_service import AnalyticsService
+from app.services.reference_data_service import ReferenceDataService
+from app.services.report_cache_service import ReportCacheService
+from app.utils.excel import XLSX_MIMETYPE
+from app.utils.pdf import (
+    PDF_MIMETYPE, render_section_pdf, report_card, report_cards,
+    render_report_card, render_report_cards_pdf, stream_report_cards_zip
+)
 from app.models.academic import TeacherAssignment
 import os
 import re
 import json
-from datetime import datetime
+from datetime import datetime, date
 
 reports = Blueprint('reports', __name__)
 
@@ -31,7 +39,8 @@ def check_access():
 @login_required
 def index():
     # Obtener año académico activo
-    active_year = AcademicYear.query.filter_by(is_active=True).first()
+    reference = ReferenceDataService.get()
+    active_year = reference.active_year
     
     if not active_year:
         flash('No hay un año académico activo', 'warning')
@@ -44,16 +53,16 @@ def index():
                              templates=[])  # NUEVO
     
     # Obtener períodos del año activo
-    periods = active_year.periods.order_by(Period.start_date).all()
+    periods = reference.active_periods
     
     # Obtener todas las secciones
-    sections = Section.query.join(Grade).order_by(Grade.name, Section.name).all()
+    sections = reference.sections
     
     # Obtener todos los años académicos para el filtro
-    academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
+    academic_years = reference.academic_years
     
     # Obtener todos los grados
-    grades = Grade.query.order_by(Grade.name).all()
+    grades = reference.grades
     
     # NUEVO: Obtener plantillas activas
     templates = ExcelTemplate.query.filter_by(is_active=True).order_by(ExcelTemplate.name).all()
@@ -87,90 +96,41 @@ def generate_with_template(template_id):
         
         # Verificar acceso (tu código de permisos existente)
         if not current_user.is_admin():
-            teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-            
-            if not teacher:
+            if not current_user.teacher_id:
                 flash('No se encontró un perfil de profesor para este usuario', 'warning')
                 return redirect(url_for('auth.logout'))
             
-            assignment = TeacherAssignment.query.filter_by(
-                teacher_id=teacher.id,
-                section_id=section_id,
-                academic_year_id=period.academic_year_id
-            ).first()
-            
-            if not assignment:
+            if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
                 flash('No tienes permiso para generar reportes de esta sección', 'danger')
                 return redirect(url_for('reports.index'))
         
-        # USAR EL NUEVO SISTEMA DE PLANTILLAS
-        from app.services.template_processor import TemplateProcessor
-        from datetime import datetime
-        
-        # Obtener estudiantes de la sección
-        students = Student.query.filter_by(
-            section_id=section_id,
-            is_active=True
-        ).order_by(Student.last_name).all()
-        
-        # Obtener asignaturas para esta sección
-        subject_ids = db.session.query(TeacherAssignment.subject_id).filter_by(
-            section_id=section_id,
-            academic_year_id=period.academic_year_id
-        ).distinct().all()
-        
-        subject_ids = [s[0] for s in subject_ids]
-        subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
-        
-        # Obtener calificaciones finales
-        grades_data = {}
-        for student in students:
-            grades_data[student.id] = {}
-            for subject in subjects:
-                final_grade = FinalGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    period_id=period.id
-                ).first()
-                
-                if final_grade:
-                    grades_data[student.id][subject.id] = final_grade.value
-                else:
-                    grades_data[student.id][subject.id] = None
-        
-        # Crear contexto para la plantilla
-        context = {
-            'template': template,
-            'section': section,
-            'grade': section.grade,
-            'period': period,
-            'academic_year': period.academic_year,
-            'students': students,
-            'subjects': subjects,
-            'grades_data': grades_data,
-            'current_date': datetime.now().strftime('%d/%m/%Y'),
-            'current_datetime': datetime.now(),
-            'total_students': len(students),
-            'total_subjects': len(subjects)
-        }
-        
-        # Procesar plantilla con el nuevo sistema
-        processor = TemplateProcessor(template)
-        workbook = processor.process_template(context)
-        
-        # Crear archivo en memoria
-        output = BytesIO()
-        workbook.save(output)
-        output.seek(0)
+        def build(path):
+            # Matriz de calificaciones finales de la sección (una sola consulta)
+            gradebook = SectionGradebook.load(section, period)
+            
+            # Crear contexto para la plantilla
+            context = TemplateProcessor.build_section_context(template, gradebook)
+            
+            # Procesar plantilla con el nuevo sistema
+            processor = TemplateProcessor(template)
+            workbook = processor.process_template(context)
+            workbook.save(path)
+        
+        # Mismo archivo mientras no cambien los datos de la sección, la plantilla ni la fecha impresa
+        path = ReportCacheService.fetch(
+            'template_report', section, period, 'xlsx', build,
+            template=(template.id, TemplateCache.get(template).fingerprint),
+            extra=(date.today(),)
+        )
         
         # Generar nombre de archivo
         filename = f'Reporte_{template.name}_{section.grade.name}{section.name}_{period.name}.xlsx'
         
         return send_file(
-            output,
+            path,
             as_attachment=True,
             download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            mimetype=XLSX_MIMETYPE
         )
         
     except Exception as e:
@@ -180,6 +140,47 @@ def generate_with_template(template_id):
         flash(f'Error generando reporte: {str(e)}', 'danger')
         return redirect(url_for('reports.index'))
 
+@reports.route('/batch/template')
+@login_required
+def batch_template_report():
+    """Genera un ZIP con el reporte de plantilla de todas las secciones de un grado, nivel o año"""
+    
+    if not current_user.is_admin():
+        flash('No tienes permiso para generar reportes por lotes', 'danger')
+        return redirect(url_for('reports.index'))
+    
+    template = ExcelTemplate.query.get_or_404(request.args.get('template_id', type=int))
+    period_id = request.args.get('period_id', type=int)
+    grade_id = request.args.get('grade_id', type=int)
+    level = request.args.get('level') or None
+    
+    # Sin período se generan todos los períodos del año activo
+    if period_id:
+        period = Period.query.get_or_404(period_id)
+        academic_year = period.academic_year
+        periods = [period]
+    else:
+        academic_year = AcademicYear.query.filter_by(is_active=True).first()
+        if not academic_year:
+            flash('No hay un año académico activo', 'warning')
+            return redirect(url_for('reports.index'))
+        periods = academic_year.periods.order_by(Period.start_date).all()
+    
+    sections = BatchReportService.resolve_sections(academic_year, grade_id=grade_id, level=level)
+    if not sections or not periods:
+        flash('No hay secciones o períodos para generar', 'warning')
+        return redirect(url_for('reports.index'))
+    
+    # Un lote grande supera el tiempo de espera del proxy: se genera en segundo plano
+    job = JobService.submit('batch_template_report', {
+        'template_id': template.id,
+        'period_ids': [period.id for period in periods],
+        'section_ids': [section.id for section in sections]
+    }, user_id=current_user.id)
+    
+    flash(f'Generando {len(periods) * len(sections)} reportes en segundo plano', 'info')
+    return redirect(url_for('jobs.view', job_id=job.id))
+
 # NUEVA RUTA: Vista previa de plantilla
 @reports.route('/template-preview/<int:template_id>')
 @login_required
@@ -212,131 +213,74 @@ def section_report(section_id, period_id):
     
     # Verificar acceso
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
         # Verificar si el profesor tiene asignaciones en esta sección
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para ver esta sección', 'danger')
             return redirect(url_for('reports.index'))
     
-    # Obtener estudiantes de la sección
-    students = Student.query.filter_by(
-        section_id=section_id,
-        is_active=True
-    ).order_by(Student.last_name).all()
-    
-    # Obtener asignaturas para esta sección (a través de las asignaciones)
-    subject_ids = db.session.query(TeacherAssignment.subject_id).filter_by(
-        section_id=section_id,
-        academic_year_id=period.academic_year_id
-    ).distinct().all()
-    
-    subject_ids = [s[0] for s in subject_ids]
-    subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
-    
-    # Obtener calificaciones finales
-    grades_data = {}
-    for student in students:
-        grades_data[student.id] = {}
-        for subject in subjects:
-            final_grade = FinalGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=subject.id,
-                period_id=period.id
-            ).first()
-            
-            if final_grade:
-                grades_data[student.id][subject.id] = final_grade.value
-    
+    # La tabla se carga desde section_report_data
     return render_template('reports/section_report.html',
                           title=f'Reporte - {section.grade.name}{section.name} - {period.name}',
                           section=section,
-                          period=period,
-                          students=students,
-                          subjects=subjects,
-                          grades_data=grades_data)
+                          period=period)
+
+@reports.route('/api/section/<int:section_id>/period/<int:period_id>/data')
+@login_required
+def section_report_data(section_id, period_id):
+    """Estudiantes, asignaturas y calificaciones finales de la tabla de section_report"""
+    
+    section = Section.query.get_or_404(section_id)
+    period = Period.query.get_or_404(period_id)
+    
+    if not current_user.is_admin() and not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
+        return jsonify({'success': False, 'error': 'No tienes permiso para ver esta sección'}), 403
+    
+    def build(path):
+        gradebook = SectionGradebook.load(section, period)
+        section_label = f"{section.grade.name} '{section.name}'"
+        data = {
+            'success': True,
+            'students': [{
+                'id': student.id,
+                'student_id': student.student_id,
+                'first_name': student.first_name,
+                'last_name': student.last_name,
+                'section': section_label
+            } for student in gradebook.students],
+            'subjects': [{'id': subject.id, 'name': subject.name} for subject in gradebook.subjects],
+            'grades': gradebook.grades_data()
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+    
+    path = ReportCacheService.fetch('section_data', section, period, 'json', build)
+    return send_file(path, mimetype='application/json')
 
 @reports.route('/student/<int:student_id>/period/<int:period_id>')
 @login_required
 def student_report(student_id, period_id):
-    student = Student.query.get_or_404(student_id)
+    student = Student.query.options(
+        joinedload(Student.section).joinedload(Section.grade)
+    ).get_or_404(student_id)
     period = Period.query.get_or_404(period_id)
     
     # Verificar acceso
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
         # Verificar si el profesor tiene asignaciones en la sección del estudiante
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=student.section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(student.section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para ver este estudiante', 'danger')
             return redirect(url_for('reports.index'))
     
-    # Obtener asignaturas para la sección del estudiante
-    subject_ids = db.session.query(TeacherAssignment.subject_id).filter_by(
-        section_id=student.section_id,
-        academic_year_id=period.academic_year_id
-    ).distinct().all()
-    
-    subject_ids = [s[0] for s in subject_ids]
-    subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
-    
-    # Obtener calificaciones detalladas
-    grades_data = {}
-    final_grades = {}
-    
-    for subject in subjects:
-        # Obtener tipos de calificación para esta asignatura
-        grade_types = GradeType.query.filter_by(
-            subject_id=subject.id,
-            period_id=period.id
-        ).order_by(GradeType.name).all()
-        
-        grades_data[subject.id] = {}
-        
-        for grade_type in grade_types:
-            grade = StudentGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=subject.id,
-                grade_type_id=grade_type.id,
-                period_id=period.id
-            ).first()
-            
-            if grade:
-                grades_data[subject.id][grade_type.id] = {
-                    'name': grade_type.name,
-                    'value': grade.value,
-                    'weight': grade_type.weight
-                }
-        
-        # Obtener calificación final
-        final_grade = FinalGrade.query.filter_by(
-            student_id=student.id,
-            subject_id=subject.id,
-            period_id=period.id
-        ).first()
-        
-        if final_grade:
-            final_grades[subject.id] = final_grade.value
+    # Asignaturas, evaluaciones y calificaciones finales en tres consultas
+    subjects, grades_data, final_grades = StudentTranscriptService.load_period_report(student, period)
     
     return render_template('reports/student_report.html',
                           title=f'Reporte - {student.first_name} {student.last_name} - {period.name}',
@@ -366,193 +310,161 @@ def export_section_excel(section_id, period_id):
     
     # Verificar acceso (mismo código que en section_report)
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para exportar esta sección', 'danger')
             return redirect(url_for('reports.index'))
     
-    # Obtener estudiantes de la sección
-    students = Student.query.filter_by(
-        section_id=section_id,
-        is_active=True
-    ).order_by(Student.last_name).all()
-    
-    # Obtener asignaturas para esta sección
-    subject_ids = db.session.query(TeacherAssignment.subject_id).filter_by(
-        section_id=section_id,
-        academic_year_id=period.academic_year_id
-    ).distinct().all()
-    
-    subject_ids = [s[0] for s in subject_ids]
-    subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
-    
-    # Crear DataFrame para Excel
-    data = []
-    for student in students:
-        row = {
-            'ID': student.student_id,
-            'Apellidos': student.last_name,
-            'Nombres': student.first_name
-        }
+    def build(path):
+        # Matriz de calificaciones finales de la sección (una sola consulta)
+        gradebook = SectionGradebook.load(section, period)
         
-        # Añadir calificaciones por asignatura
-        for subject in subjects:
-            final_grade = FinalGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=subject.id,
-                period_id=period.id
-            ).first()
-            
-            if final_grade:
-                row[subject.name] = final_grade.value
-            else:
-                row[subject.name] = ''
-        
-        data.append(row)
+        # Libro en modo write-only: las filas se escriben directamente desde la matriz
+        wb = StreamingExportService.build_section_workbook(gradebook)
+        wb.save(path)
+    
+    path = ReportCacheService.fetch('section_excel', section, period, 'xlsx', build)
+    
+    # Generar nombre de archivo
+    filename = f'Calificaciones_{section.grade.name}{section.name}_{period.name}.xlsx'
+    
+    return send_file(path, as_attachment=True, download_name=filename, mimetype=XLSX_MIMETYPE)
+
+@reports.route('/export/excel/school')
+@login_required
+def export_school_excel():
+    """Exporta todas las calificaciones finales del año, una hoja por período"""
+    
+    if not current_user.is_admin():
+        flash('No tienes permiso para exportar las calificaciones de toda la institución', 'danger')
+        return redirect(url_for('reports.index'))
+    
+    academic_year_id = request.args.get('academic_year_id', type=int)
+    if academic_year_id:
+        academic_year = AcademicYear.query.get_or_404(academic_year_id)
+    else:
+        academic_year = AcademicYear.query.filter_by(is_active=True).first()
+    
+    if not academic_year:
+        flash('No hay un año académico activo', 'warning')
+        return redirect(url_for('reports.index'))
+    
+    # Sin límite de MAX_EXPORT_RECORDS: las filas se leen y escriben por lotes
+    # en un trabajo en segundo plano, y el archivo queda disponible para descargar
+    job = JobService.submit('school_excel_export', {
+        'academic_year_id': academic_year.id
+    }, user_id=current_user.id)
+    
+    flash('La exportación se está generando en segundo plano', 'info')
+    return redirect(url_for('jobs.view', job_id=job.id))
+
+@reports.route('/export/pdf/section/<int:section_id>/period/<int:period_id>')
+@login_required
+def export_section_pdf(section_id, period_id):
+    section = Section.query.get_or_404(section_id)
+    period = Period.query.get_or_404(period_id)
     
-    # Crear Excel
-    df = pd.DataFrame(data)
+    # Verificar acceso (mismo código que en section_report)
+    if not current_user.is_admin():
+        if not current_user.teacher_id:
+            flash('No se encontró un perfil de profesor para este usuario', 'warning')
+            return redirect(url_for('auth.logout'))
+        
+        if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
+            flash('No tienes permiso para exportar esta sección', 'danger')
+            return redirect(url_for('reports.index'))
     
-    # Crear archivo Excel en memoria
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=f'{section.grade.name}{section.name}', index=False)
+    def build(path):
+        # Matriz de calificaciones finales de la sección (una sola consulta)
+        with open(path, 'wb') as file:
+            file.write(render_section_pdf(SectionGradebook.load(section, period)))
     
-    output.seek(0)
+    path = ReportCacheService.fetch('section_pdf', section, period, 'pdf', build)
     
     # Generar nombre de archivo
-    filename = f'Calificaciones_{section.grade.name}{section.name}_{period.name}.xlsx'
+    filename = f'Calificaciones_{section.grade.name}{section.name}_{period.name}.pdf'
     
     return send_file(
-        output,
+        path,
         as_attachment=True,
         download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        mimetype=PDF_MIMETYPE
     )
 
-@reports.route('/export/pdf/section/<int:section_id>/period/<int:period_id>')
+@reports.route('/export/pdf/section/<int:section_id>/period/<int:period_id>/report-cards')
 @login_required
-def export_section_pdf(section_id, period_id):
+def export_section_report_cards(section_id, period_id):
+    """Boletas de todos los estudiantes de una sección: un PDF (format=pdf) o un ZIP (format=zip)"""
+    
     section = Section.query.get_or_404(section_id)
     period = Period.query.get_or_404(period_id)
     
     # Verificar acceso (mismo código que en section_report)
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para exportar esta sección', 'danger')
             return redirect(url_for('reports.index'))
     
-    # Obtener estudiantes de la sección
-    students = Student.query.filter_by(
-        section_id=section_id,
-        is_active=True
-    ).order_by(Student.last_name).all()
-    
-    # Obtener asignaturas para esta sección
-    subject_ids = db.session.query(TeacherAssignment.subject_id).filter_by(
-        section_id=section_id,
-        academic_year_id=period.academic_year_id
-    ).distinct().all()
-    
-    subject_ids = [s[0] for s in subject_ids]
-    subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
-    
-    # Crear archivo temporal
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-        temp_filename = temp_file.name
-    
-    # Crear PDF con ReportLab
-    doc = SimpleDocTemplate(temp_filename, pagesize=letter)
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    
-    # Título
-    elements.append(Paragraph(f"Reporte de Calificaciones", title_style))
-    elements.append(Paragraph(f"Grado: {section.grade.name} Sección: {section.name}", subtitle_style))
-    elements.append(Paragraph(f"Período: {period.name}", subtitle_style))
-    
-    # Datos para la tabla
-    data = [['ID', 'Apellidos', 'Nombres'] + [subject.name for subject in subjects]]
-    
-    for student in students:
-        row = [
-            student.student_id,
-            student.last_name,
-            student.first_name
-        ]
-        
-        # Añadir calificaciones por asignatura
-        for subject in subjects:
-            final_grade = FinalGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=subject.id,
-                period_id=period.id
-            ).first()
-            
-            if final_grade:
-                row.append(str(final_grade.value))
-            else:
-                row.append('')
-        
-        data.append(row)
+    if not db.session.query(Student.query.filter_by(section_id=section_id, is_active=True).exists()).scalar():
+        flash('La sección no tiene estudiantes activos', 'warning')
+        return redirect(url_for('reports.section_report', section_id=section_id, period_id=period_id))
     
-    # Crear tabla
-    table = Table(data)
+    filename = f'Boletas_{section.grade.name}{section.name}_{period.name}'
     
-    # Estilo de la tabla
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ])
+    # ZIP con una boleta por estudiante, enviado a medida que se genera
+    if request.args.get('format') == 'zip':
+        # Las boletas salen de la misma matriz que el reporte de sección
+        cards = report_cards(SectionGradebook.load(section, period))
+        return stream_report_cards_zip(cards, f'{filename}.zip')
     
-    table.setStyle(style)
-    elements.append(table)
+    def build(path):
+        with open(path, 'wb') as file:
+            file.write(render_report_cards_pdf(report_cards(SectionGradebook.load(section, period))))
     
-    # Construir PDF
-    doc.build(elements)
-    
-    # Generar nombre de archivo
-    filename = f'Calificaciones_{section.grade.name}{section.name}_{period.name}.pdf'
+    path = ReportCacheService.fetch('report_cards_pdf', section, period, 'pdf', build)
     
     return send_file(
-        temp_filename,
+        path,
         as_attachment=True,
-        download_name=filename,
-        mimetype='application/pdf'
+        download_name=f'{filename}.pdf',
+        mimetype=PDF_MIMETYPE
     )
 
+@reports.route('/batch/report-cards')
+@login_required
+def batch_report_cards():
+    """Genera en segundo plano las boletas de todas las secciones de un grado, nivel o año"""
+    
+    if not current_user.is_admin():
+        flash('No tienes permiso para generar reportes por lotes', 'danger')
+        return redirect(url_for('reports.index'))
+    
+    period = Period.query.get_or_404(request.args.get('period_id', type=int))
+    grade_id = request.args.get('grade_id', type=int)
+    level = request.args.get('level') or None
+    output_format = 'pdf' if request.args.get('format') == 'pdf' else 'zip'
+    
+    sections = BatchReportService.resolve_sections(period.academic_year, grade_id=grade_id, level=level)
+    if not sections:
+        flash('No hay secciones para generar', 'warning')
+        return redirect(url_for('reports.index'))
+    
+    job = JobService.submit('report_cards', {
+        'period_id': period.id,
+        'section_ids': [section.id for section in sections],
+        'format': output_format
+    }, user_id=current_user.id)
+    
+    flash(f'Generando las boletas de {len(sections)} secciones en segundo plano', 'info')
+    return redirect(url_for('jobs.view', job_id=job.id))
+
 @reports.route('/export/pdf/student/<int:student_id>/period/<int:period_id>')
 @login_required
 def export_student_pdf(student_id, period_id):
@@ -561,105 +473,30 @@ def export_student_pdf(student_id, period_id):
     
     # Verificar acceso (mismo código que en student_report)
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=student.section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(student.section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para exportar este estudiante', 'danger')
             return redirect(url_for('reports.index'))
     
-    # Obtener asignaturas para la sección del estudiante
-    subject_ids = db.session.query(TeacherAssignment.subject_id).filter_by(
-        section_id=student.section_id,
-        academic_year_id=period.academic_year_id
-    ).distinct().all()
-    
-    subject_ids = [s[0] for s in subject_ids]
-    subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
-    
-    # Crear archivo temporal
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-        temp_filename = temp_file.name
-    
-    # Crear PDF con ReportLab
-    doc = SimpleDocTemplate(temp_filename, pagesize=letter)
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    subtitle_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Título
-    elements.append(Paragraph(f"Boleta de Calificaciones", title_style))
-    elements.append(Paragraph(f"Estudiante: {student.first_name} {student.last_name}", subtitle_style))
-    elements.append(Paragraph(f"C.I: {student.student_id}", normal_style))
-    elements.append(Paragraph(f"Grado: {student.section.grade.name} Sección: {student.section.name}", normal_style))
-    elements.append(Paragraph(f"Período: {period.name}", normal_style))
-    elements.append(Paragraph(" ", normal_style))  # Espacio
-    
-    # Datos para la tabla
-    data = [['Asignatura', 'Calificación']]
-    
-    for subject in subjects:
-        final_grade = FinalGrade.query.filter_by(
-            student_id=student.id,
-            subject_id=subject.id,
-            period_id=period.id
-        ).first()
-        
-        if final_grade:
-            data.append([subject.name, str(final_grade.value)])
-        else:
-            data.append([subject.name, ''])
-    
-    # Calcular promedio
-    final_grades = [row[1] for row in data[1:] if row[1]]
-    if final_grades:
-        try:
-            average = sum(float(grade) for grade in final_grades) / len(final_grades)
-            data.append(['Promedio', f'{average:.2f}'])
-        except ValueError:
-            data.append(['Promedio', 'N/A'])
-    
-    # Crear tabla
-    table = Table(data)
-    
-    # Estilo de la tabla
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ])
-    
-    table.setStyle(style)
-    elements.append(table)
-    
-    # Construir PDF
-    doc.build(elements)
+    # Asignaturas y calificaciones finales del período
+    subjects, _, final_grades = StudentTranscriptService.load_period_report(student, period)
+    
+    card = report_card(
+        student, student.section, period, subjects,
+        [final_grades.get(subject.id) for subject in subjects]
+    )
     
     # Generar nombre de archivo
     filename = f'Boleta_{student.last_name}_{student.first_name}_{period.name}.pdf'
     
     return send_file(
-        temp_filename,
+        BytesIO(render_report_card(card)),
         as_attachment=True,
         download_name=filename,
-        mimetype='application/pdf'
+        mimetype=PDF_MIMETYPE
     )
 
 # Agregar esta nueva ruta
@@ -673,18 +510,11 @@ def export_multi_sheet_section(section_id, period_id):
     
     # Verificar acceso
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para exportar esta sección', 'danger')
             return redirect(url_for('reports.index'))
     
@@ -722,9 +552,7 @@ def export_with_template(template_id, section_id, period_id):
     
     from app.models.templates import ExcelTemplate, TemplateCell
     from app.services.template_mapper import TemplateMapper
-    from openpyxl import load_workbook
     from openpyxl.styles import Font, PatternFill, Alignment
-    from io import BytesIO
     import json
     
     # Verificar acceso (mismo código que otras funciones)
@@ -733,18 +561,11 @@ def export_with_template(template_id, section_id, period_id):
     template = ExcelTemplate.query.get_or_404(template_id)
     
     if not current_user.is_admin():
-        teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-        if not teacher:
+        if not current_user.teacher_id:
             flash('No se encontró un perfil de profesor para este usuario', 'warning')
             return redirect(url_for('auth.logout'))
         
-        assignment = TeacherAssignment.query.filter_by(
-            teacher_id=teacher.id,
-            section_id=section_id,
-            academic_year_id=period.academic_year_id
-        ).first()
-        
-        if not assignment:
+        if not current_user.teaches(section_id, academic_year_id=period.academic_year_id):
             flash('No tienes permiso para exportar esta sección', 'danger')
             return redirect(url_for('reports.index'))
     
@@ -753,75 +574,82 @@ def export_with_template(template_id, section_id, period_id):
         flash('Archivo de plantilla no encontrado', 'danger')
         return redirect(url_for('reports.index'))
     
-    wb = load_workbook(template.file_path)
-    ws = wb.active
-    
-    # Obtener estudiantes
-    students = Student.query.filter_by(
-        section_id=section_id,
-        is_active=True
-    ).order_by(Student.last_name).all()
-    
-    # Obtener configuración de celdas
-    template_cells = TemplateCell.query.filter_by(template_id=template_id).all()
-    
-    # Preparar contexto
-    context = {
-        'section': section,
-        'grade': section.grade,
-        'period': period,
-        'period_id': period_id,
-        'current_date': datetime.now().strftime('%d/%m/%Y')
-    }
-    
-    # Encontrar la fila donde empiezan los datos de estudiantes
-    data_start_row = None
-    for cell in template_cells:
-        if cell.cell_type == 'data':
-            row_num = int(re.search(r'\d+', cell.cell_address).group())
-            if data_start_row is None or row_num < data_start_row:
-                data_start_row = row_num
-    
-    if data_start_row is None:
-        data_start_row = 2  # Por defecto empezar en fila 2
+    # Copia del libro y metadata desde la caché de plantillas compiladas
+    compiled = TemplateCache.get(template)
     
-    # Llenar datos de estudiantes
-    for student_index, student in enumerate(students):
-        current_row = data_start_row + student_index
+    def build(path):
+        wb = compiled.new_workbook()
+        ws = wb.active
+        
+        # Estudiantes y calificaciones finales de la sección
+        gradebook = SectionGradebook.load(section, period)
+        students = gradebook.students
+        
+        # Obtener configuración de celdas
+        template_cells = compiled.cells
+        
+        # Preparar contexto
+        context = {
+            'section': section,
+            'grade': section.grade,
+            'period': period,
+            'period_id': period_id,
+            'current_date': datetime.now().strftime('%d/%m/%Y'),
+            'gradebook': gradebook
+        }
         
-        # Llenar cada celda de datos para este estudiante
+        # Encontrar la fila donde empiezan los datos de estudiantes
+        data_start_row = None
         for cell in template_cells:
             if cell.cell_type == 'data':
-                # Calcular nueva posición
-                col_letter = re.search(r'[A-Z]+', cell.cell_address).group()
-                new_address = f"{col_letter}{current_row}"
-                
-                # Obtener valor
-                value = TemplateMapper.get_value_for_cell(cell.data_type, student, context)
-                
-                if value is not None:
-                    ws[new_address] = value
-                    
-                    # Aplicar estilo original si existe
-                    if cell.style_config:
-                        try:
-                            style_config = json.loads(cell.style_config)
-                            _apply_cell_style(ws[new_address], style_config)
-                        except:
-                            pass
-    
-    # Crear archivo en memoria
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+                row_num = int(re.search(r'\d+', cell.cell_address).group())
+                if data_start_row is None or row_num < data_start_row:
+                    data_start_row = row_num
+        
+        if data_start_row is None:
+            data_start_row = 2  # Por defecto empezar en fila 2
+        
+        # Llenar datos de estudiantes
+        for student_index, student in enumerate(students):
+            current_row = data_start_row + student_index
+        
+            # Llenar cada celda de datos para este estudiante
+            for cell in template_cells:
+                if cell.cell_type == 'data':
+                    # Calcular nueva posición
+                    col_letter = re.search(r'[A-Z]+', cell.cell_address).group()
+                    new_address = f"{col_letter}{current_row}"
+        
+                    # Obtener valor
+                    value = TemplateMapper.get_value_for_cell(cell.data_type, student, context)
+        
+                    if value is not None:
+                        ws[new_address] = value
+        
+                        # Aplicar estilo original si existe
+                        if cell.style_config:
+                            try:
+                                style_config = json.loads(cell.style_config)
+                                _apply_cell_style(ws[new_address], style_config)
+                            except:
+                                pass
+        
+        wb.save(path)
+    
+    # Mismo archivo mientras no cambien los datos de la sección, la plantilla ni la fecha impresa
+    path = ReportCacheService.fetch(
+        'template_export', section, period, 'xlsx', build,
+        template=(template.id, compiled.fingerprint),
+        extra=(date.today(),)
+    )
     
     filename = f'Reporte_{template.name}_{section.grade.name}{section.name}_{period.name}.xlsx'
     
     return send_file(
-        output,
+        path,
         as_attachment=True,
         download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        mimetype=XLSX_MIMETYPE
     )
 
 def _apply_cell_style(cell, style_config):
@@ -882,3 +710,72 @@ def templates_list():
                          periods=periods,
                          sections=sections,
                          templates=templates)
+
+def _analytics_arguments():
+    """Año académico y filtros de la analítica a partir de la query string"""
+    
+    reference = ReferenceDataService.get()
+    academic_year_id = request.args.get('academic_year_id', type=int)
+    if academic_year_id:
+        academic_year = reference.academic_year(academic_year_id)
+        if academic_year is None:
+            abort(404)
+    else:
+        academic_year = reference.active_year
+    
+    filters = {
+        'period_id': request.args.get('period_id', type=int),
+        'section_id': request.args.get('section_id', type=int),
+        'grade_id': request.args.get('grade_id', type=int)
+    }
+    
+    return academic_year, filters
+
+@reports.route('/analytics')
+@login_required
+def analytics():
+    """Distribución de calificaciones, comparaciones y estudiantes en riesgo"""
+    
+    if not current_user.is_admin():
+        flash('No tienes permiso para ver la analítica de calificaciones', 'danger')
+        return redirect(url_for('reports.index'))
+    
+    academic_year, filters = _analytics_arguments()
+    if not academic_year:
+        flash('No hay un año académico activo', 'warning')
+        return redirect(url_for('reports.index'))
+    
+    result = AnalyticsService.analyze(academic_year.id, **filters)
+    
+    reference = ReferenceDataService.get()
+    
+    return render_template('reports/analytics.html',
+                         academic_year=academic_year,
+                         periods=reference.periods_of(academic_year.id),
+                         grades=reference.grades,
+                         sections=reference.sections,
+                         filters=filters,
+                         analytics=result)
+
+@reports.route('/api/analytics')
+@login_required
+def analytics_api():
+    """La misma analítica de /reports/analytics en JSON"""
+    
+    if not current_user.is_admin():
+        return jsonify({
+            'success': False,
+            'error': 'No tienes permiso para ver la analítica de calificaciones'
+        }), 403
+    
+    academic_year, filters = _analytics_arguments()
+    if not academic_year:
+        return jsonify({
+            'success': False,
+            'error': 'No hay un año académico activo'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'analytics': AnalyticsService.analyze(academic_year.id, **filters)
+    })
@@ -1,12 +1,13 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from app.models.users import User
-from app.models.academic import AcademicYear, Period, Grade, Section, Subject, Student, Teacher, TeacherAssignment
-from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.models.academic import Period, Grade, Section, Subject, Student, Teacher, TeacherAssignment
+from app.models.grades import FinalGrade
 from app.forms.teacher_forms import GradeForm, FinalGradeForm
+from app.services.reference_data_service import ReferenceDataService
+from app.services.teacher_gradebook import TeacherGradebook
 from wtforms import FloatField
 from wtforms.validators import Optional, NumberRange
-from app import db
 
 teacher = Blueprint('teacher', __name__)
 
@@ -21,15 +22,13 @@ def check_teacher():
 @teacher.route('/dashboard')
 @login_required
 def dashboard():
-    # Obtener perfil de profesor
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-    
-    if not teacher:
+    # Perfil de profesor (cargado con current_user)
+    if not current_user.teacher_id:
         flash('No se encontró un perfil de profesor para este usuario', 'warning')
         return redirect(url_for('auth.logout'))
     
     # Año académico activo
-    active_year = AcademicYear.query.filter_by(is_active=True).first()
+    active_year = ReferenceDataService.get().active_year
     
     if not active_year:
         flash('No hay un año académico activo configurado', 'warning')
@@ -37,7 +36,7 @@ def dashboard():
     
     # Obtener asignaciones del profesor en el año activo
     assignments = TeacherAssignment.query.filter_by(
-        teacher_id=teacher.id,
+        teacher_id=current_user.teacher_id,
         academic_year_id=active_year.id
     ).all()
     
@@ -50,8 +49,7 @@ def assignment_students(assignment_id):
     assignment = TeacherAssignment.query.get_or_404(assignment_id)
     
     # Verificar que la asignación pertenece al profesor actual
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-    if assignment.teacher_id != teacher.id and not current_user.is_admin():
+    if assignment.teacher_id != current_user.teacher_id and not current_user.is_admin():
         flash('No tienes permiso para ver esta asignación', 'danger')
         return redirect(url_for('teacher.dashboard'))
     
@@ -62,9 +60,7 @@ def assignment_students(assignment_id):
     ).order_by(Student.last_name).all()
     
     # Obtener períodos del año académico
-    periods = Period.query.filter_by(
-        academic_year_id=assignment.academic_year_id
-    ).order_by(Period.start_date).all()
+    periods = ReferenceDataService.get().periods_of(assignment.academic_year_id)
     
     return render_template('teacher/assignment_students.html', 
                           title=f'Estudiantes - {assignment.subject.name} - {assignment.section.grade.name}{assignment.section.name}',
@@ -79,59 +75,18 @@ def view_grades(assignment_id, period_id):
     period = Period.query.get_or_404(period_id)
     
     # Verificar que la asignación pertenece al profesor actual
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-    if assignment.teacher_id != teacher.id and not current_user.is_admin():
+    if assignment.teacher_id != current_user.teacher_id and not current_user.is_admin():
         flash('No tienes permiso para ver esta asignación', 'danger')
         return redirect(url_for('teacher.dashboard'))
     
-    # Obtener estudiantes de la sección
-    students = Student.query.filter_by(
-        section_id=assignment.section_id,
-        is_active=True
-    ).order_by(Student.last_name).all()
-    
-    # Obtener tipos de calificación para esta asignatura y período
-    grade_types = GradeType.query.filter_by(
-        subject_id=assignment.subject_id,
-        period_id=period_id
-    ).order_by(GradeType.name).all()
-    
-    # Obtener calificaciones existentes
-    grades = {}
-    for student in students:
-        grades[student.id] = {}
-        for grade_type in grade_types:
-            grade = StudentGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=assignment.subject_id,
-                grade_type_id=grade_type.id,
-                period_id=period_id,
-                teacher_id=teacher.id
-            ).first()
-            
-            if grade:
-                grades[student.id][grade_type.id] = grade.value
-    
-    # Obtener calificaciones finales
-    final_grades = {}
-    for student in students:
-        final_grade = FinalGrade.query.filter_by(
-            student_id=student.id,
-            subject_id=assignment.subject_id,
-            period_id=period_id
-        ).first()
-        
-        if final_grade:
-            final_grades[student.id] = final_grade.value
+    # Estudiantes × evaluaciones y calificaciones finales en dos consultas
+    gradebook = TeacherGradebook.load(assignment, period_id)
     
     return render_template('teacher/view_grades.html',
                           title=f'Calificaciones - {assignment.subject.name} - {period.name}',
                           assignment=assignment,
                           period=period,
-                          students=students,
-                          grade_types=grade_types,
-                          grades=grades,
-                          final_grades=final_grades)
+                          gradebook=gradebook)
 
 @teacher.route('/assignments/<int:assignment_id>/student/<int:student_id>/period/<int:period_id>/grade', methods=['GET', 'POST'])
 @login_required
@@ -141,16 +96,12 @@ def enter_grade(assignment_id, student_id, period_id):
     period = Period.query.get_or_404(period_id)
     
     # Verificar que la asignación pertenece al profesor actual
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-    if assignment.teacher_id != teacher.id and not current_user.is_admin():
+    if assignment.teacher_id != current_user.teacher_id and not current_user.is_admin():
         flash('No tienes permiso para esta acción', 'danger')
         return redirect(url_for('teacher.dashboard'))
     
-    # Obtener tipos de calificación para esta asignatura y período
-    grade_types = GradeType.query.filter_by(
-        subject_id=assignment.subject_id,
-        period_id=period_id
-    ).order_by(GradeType.name).all()
+    gradebook = TeacherGradebook.load(assignment, period_id)
+    grade_types = gradebook.evaluations
     
     form = GradeForm()
     
@@ -164,53 +115,25 @@ def enter_grade(assignment_id, student_id, period_id):
         form = GradeForm()
     
     if form.validate_on_submit():
-        for grade_type in grade_types:
-            field_name = f'grade_{grade_type.id}'
-            value = getattr(form, field_name).data
-            
-            if value is not None:
-                # Buscar si ya existe una calificación
-                grade = StudentGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=assignment.subject_id,
-                    grade_type_id=grade_type.id,
-                    period_id=period_id,
-                    teacher_id=teacher.id
-                ).first()
-                
-                if grade:
-                    grade.value = value
-                    grade.comments = form.comments.data
-                else:
-                    grade = StudentGrade(
-                        student_id=student.id,
-                        subject_id=assignment.subject_id,
-                        grade_type_id=grade_type.id,
-                        period_id=period_id,
-                        teacher_id=teacher.id,
-                        value=value,
-                        comments=form.comments.data
-                    )
-                    db.session.add(grade)
+        # Solo se escriben las notas que difieren de la planilla
+        submitted = {
+            grade_type.id: getattr(form, f'grade_{grade_type.id}').data
+            for grade_type in grade_types
+        }
+        result = gradebook.save_student_grades(student.id, submitted, form.comments.data)
         
-        db.session.commit()
-        flash('Calificaciones guardadas correctamente', 'success')
+        for error in result['errors']:
+            flash(error, 'danger')
+        if result['success']:
+            flash('Calificaciones guardadas correctamente', 'success')
         return redirect(url_for('teacher.view_grades', assignment_id=assignment_id, period_id=period_id))
     
-    # Cargar valores existentes
+    # Cargar valores existentes desde la planilla
     for grade_type in grade_types:
-        field_name = f'grade_{grade_type.id}'
-        grade = StudentGrade.query.filter_by(
-            student_id=student.id,
-            subject_id=assignment.subject_id,
-            grade_type_id=grade_type.id,
-            period_id=period_id,
-            teacher_id=teacher.id
-        ).first()
-        
-        if grade and hasattr(form, field_name):
-            getattr(form, field_name).data = grade.value
-            form.comments.data = grade.comments
+        value = gradebook.get(student.id, grade_type.id)
+        if value is not None:
+            getattr(form, f'grade_{grade_type.id}').data = value
+            form.comments.data = gradebook.comment(student.id, grade_type.id)
     
     return render_template('teacher/enter_grade.html',
                           title=f'Calificaciones - {student.first_name} {student.last_name}',
@@ -227,105 +150,26 @@ def enter_final_grades(assignment_id, period_id):
     period = Period.query.get_or_404(period_id)
     
     # Verificar que la asignación pertenece al profesor actual
-    teacher = Teacher.query.filter_by(user_id=current_user.id).first()
-    if assignment.teacher_id != teacher.id and not current_user.is_admin():
+    if assignment.teacher_id != current_user.teacher_id and not current_user.is_admin():
         flash('No tienes permiso para esta acción', 'danger')
         return redirect(url_for('teacher.dashboard'))
     
-    # Obtener estudiantes de la sección
-    students = Student.query.filter_by(
-        section_id=assignment.section_id,
-        is_active=True
-    ).order_by(Student.last_name).all()
-    
-    # Obtener tipos de calificación para esta asignatura y período
-    grade_types = GradeType.query.filter_by(
-        subject_id=assignment.subject_id,
-        period_id=period_id
-    ).all()
+    # Planilla con las calificaciones finales guardadas y las propuestas
+    gradebook = TeacherGradebook.load(assignment, period_id)
     
     if request.method == 'POST':
-        for student in students:
-            final_value = request.form.get(f'final_{student.id}')
-            comments = request.form.get(f'comments_{student.id}')
-            
-            if final_value:
-                # Buscar si ya existe una calificación final
-                final_grade = FinalGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=assignment.subject_id,
-                    period_id=period_id
-                ).first()
-                
-                if final_grade:
-                    final_grade.value = float(final_value)
-                    final_grade.comments = comments
-                else:
-                    final_grade = FinalGrade(
-                        student_id=student.id,
-                        subject_id=assignment.subject_id,
-                        period_id=period_id,
-                        value=float(final_value),
-                        comments=comments
-                    )
-                    db.session.add(final_grade)
+        result = gradebook.save_finals(request.form)
         
-        db.session.commit()
-        flash('Calificaciones finales guardadas correctamente', 'success')
+        for error in result['errors']:
+            flash(error, 'warning')
+        if result['success']:
+            flash('Calificaciones finales guardadas correctamente', 'success')
+        else:
+            flash('Error al guardar las calificaciones finales', 'danger')
         return redirect(url_for('teacher.view_grades', assignment_id=assignment_id, period_id=period_id))
     
-    # Calcular calificaciones finales propuestas
-    proposed_finals = {}
-    existing_finals = {}
-    
-    for student in students:
-        # Obtener calificaciones existentes
-        student_grades = {}
-        for grade_type in grade_types:
-            grade = StudentGrade.query.filter_by(
-                student_id=student.id,
-                subject_id=assignment.subject_id,
-                grade_type_id=grade_type.id,
-                period_id=period_id
-            ).first()
-            
-            if grade:
-                student_grades[grade_type.id] = {
-                    'value': grade.value,
-                    'weight': grade_type.weight
-                }
-        
-        # Calcular promedio ponderado
-        if student_grades:
-            total_value = 0
-            total_weight = 0
-            
-            for grade_data in student_grades.values():
-                total_value += grade_data['value'] * grade_data['weight']
-                total_weight += grade_data['weight']
-            
-            if total_weight > 0:
-                proposed_finals[student.id] = round(total_value / total_weight, 2)
-        
-        # Obtener calificación final existente
-        final_grade = FinalGrade.query.filter_by(
-            student_id=student.id,
-            subject_id=assignment.subject_id,
-            period_id=period_id
-        ).first()
-        
-        if final_grade:
-            existing_finals[student.id] = {
-                'value': final_grade.value,
-                'comments': final_grade.comments
-            }
-    
     return render_template('teacher/enter_final_grades.html',
                           title=f'Calificaciones Finales - {assignment.subject.name} - {period.name}',
                           assignment=assignment,
                           period=period,
-                          students=students,
-                          proposed_finals=proposed_finals,
-                          existing_finals=existing_finals)
-
-
+                          gradebook=gradebook)
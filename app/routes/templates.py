@@ -5,6 +5,8 @@ from io import BytesIO
 from app.models.templates import ExcelTemplate, TemplateCell, TemplateStyle, TemplateRange
 from app.models.academic import Subject
 from app.services.template_service import TemplateService
+from app.services.template_cache import TemplateCache
+from app.services.job_service import JobService
 from app import db
 import os
 from datetime import datetime
@@ -79,9 +81,11 @@ def create():
             db.session.add(template)
             db.session.commit()
             
-            # Si se subió un archivo, analizar su estructura
+            # Si se subió un archivo, su estructura se analiza en segundo plano
             if file_path:
-                TemplateService.analyze_template_structure(template.id, file_path)
+                job = JobService.submit('analyze_template', {'template_id': template.id}, user_id=current_user.id)
+                flash('Plantilla creada. La estructura del archivo se está analizando en segundo plano.', 'success')
+                return redirect(url_for('jobs.view', job_id=job.id))
             
             flash('Plantilla creada exitosamente', 'success')
             return redirect(url_for('templates.view', id=template.id))
@@ -120,6 +124,7 @@ def edit(id):
         template.template_type = request.form.get('template_type', template.template_type)
         
         # Manejar nuevo archivo si se subió
+        file_path = None
         if 'template_file' in request.files:
             file = request.files['template_file']
             if file and file.filename.endswith('.xlsx'):
@@ -131,12 +136,17 @@ def edit(id):
                 file_path = os.path.join('uploads/templates', filename)
                 file.save(file_path)
                 template.file_path = file_path
-                
-                # Re-analizar estructura
-                TemplateService.analyze_template_structure(template.id, file_path)
         
         try:
             db.session.commit()
+            TemplateCache.invalidate(template.id)
+            
+            # Re-analizar estructura del archivo nuevo en segundo plano
+            if file_path:
+                job = JobService.submit('analyze_template', {'template_id': template.id}, user_id=current_user.id)
+                flash('Plantilla actualizada. La estructura del archivo nuevo se está analizando en segundo plano.', 'success')
+                return redirect(url_for('jobs.view', job_id=job.id))
+            
             flash('Plantilla actualizada exitosamente', 'success')
             return redirect(url_for('templates.view', id=template.id))
             
@@ -157,6 +167,7 @@ def delete(id):
     try:
         template.is_active = False
         db.session.commit()
+        TemplateCache.invalidate(template.id)
         flash('Plantilla eliminada exitosamente', 'success')
         
     except Exception as e:
@@ -331,6 +342,7 @@ def configure_template(template_id):
             db.session.add(cell)
         
         db.session.commit()
+        TemplateCache.invalidate(template_id)
         
         # Volver a obtener las celdas
         individual_cells = TemplateCell.query.filter_by(
@@ -467,6 +479,7 @@ def save_range_configuration(template_id):
             # Eliminar rangos existentes
             existing_ranges = TemplateRange.query.filter_by(template_id=template_id).all()
             print(f"Eliminando {len(existing_ranges)} rangos existentes")
+            TemplateCache.mark([template_id])
             TemplateRange.query.filter_by(template_id=template_id).delete()
             
             # Crear nuevos rangos
@@ -486,6 +499,7 @@ def save_range_configuration(template_id):
             print("NO se encontró 'ranges' en los datos")
         
         db.session.commit()
+        TemplateCache.invalidate(template_id)
         print("=== GUARDADO EXITOSO ===")
         
         return jsonify({
@@ -0,0 +1,558 @@
+from app.models.academic import Period, Section, Grade, Subject, Student, Teacher, TeacherAssignment
+from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.models.users import User
+from app import db
+from flask import current_app
+from sqlalchemy import event, select
+from datetime import datetime
+import numpy as np
+import threading
+import time
+
+
+# Percentiles reportados en cada distribución
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Histograma de 10 rangos de 10 puntos sobre la escala 0-100
+HISTOGRAM_EDGES = np.arange(0, 101, 10)
+
+
+def _compact(ids, values):
+    """Posición de cada valor de `values` dentro del arreglo `ids` (-1 si no está)"""
+
+    if len(ids) == 0 or len(values) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    positions = np.searchsorted(sorted_ids, values)
+    positions = np.clip(positions, 0, len(ids) - 1)
+    found = sorted_ids[positions] == values
+
+    return np.where(found, order[positions], -1)
+
+
+class GradeSnapshot:
+    """
+    Calificaciones de un año académico en arreglos NumPy columnares
+
+    Cada entidad (período, asignatura, sección, profesor, estudiante) se
+    identifica por su posición en el arreglo de IDs correspondiente; las
+    calificaciones guardan esas posiciones en arreglos int64 paralelos al
+    arreglo de valores. Los períodos van ordenados por fecha de inicio, así
+    que period_idx + 1 es el período siguiente.
+    """
+
+    def __init__(self, year_id):
+        self.year_id = year_id
+        self.loaded_at = datetime.utcnow()
+        self.generation = 0
+
+    @classmethod
+    def load(cls, year_id):
+        snapshot = cls(year_id)
+        started = time.perf_counter()
+
+        # Dimensiones
+        periods = db.session.execute(
+            select(Period.id, Period.name).where(Period.academic_year_id == year_id).order_by(Period.start_date, Period.id)
+        ).all()
+        snapshot.period_ids = np.array([row[0] for row in periods], dtype=np.int64)
+        snapshot.period_names = [row[1] for row in periods]
+
+        subjects = db.session.execute(select(Subject.id, Subject.name).order_by(Subject.id)).all()
+        snapshot.subject_ids = np.array([row[0] for row in subjects], dtype=np.int64)
+        snapshot.subject_names = [row[1] for row in subjects]
+
+        sections = db.session.execute(
+            select(Section.id, Section.name, Grade.id, Grade.name).join(Grade, Section.grade_id == Grade.id).order_by(Section.id)
+        ).all()
+        snapshot.section_ids = np.array([row[0] for row in sections], dtype=np.int64)
+        snapshot.section_names = [f'{row[3]} {row[1]}' for row in sections]
+        snapshot.section_grade_ids = np.array([row[2] for row in sections], dtype=np.int64)
+
+        teachers = db.session.execute(
+            select(Teacher.id, User.first_name, User.last_name).join(User, Teacher.user_id == User.id).order_by(Teacher.id)
+        ).all()
+        snapshot.teacher_ids = np.array([row[0] for row in teachers], dtype=np.int64)
+        snapshot.teacher_names = [f'{row[1]} {row[2]}' for row in teachers]
+
+        students = db.session.execute(
+            select(Student.id, Student.student_id, Student.first_name, Student.last_name, Student.section_id).order_by(Student.id)
+        ).all()
+        snapshot.student_ids = np.array([row[0] for row in students], dtype=np.int64)
+        snapshot.student_codes = [row[1] for row in students]
+        snapshot.student_names = [f'{row[3]}, {row[2]}' for row in students]
+        snapshot.student_section = _compact(
+            snapshot.section_ids, np.array([row[4] for row in students], dtype=np.int64)
+        )
+
+        # Profesor de cada (sección, asignatura) según las asignaciones del año
+        n_subjects = len(snapshot.subject_ids)
+        snapshot.assignment_teacher = np.full(len(snapshot.section_ids) * n_subjects, -1, dtype=np.int64)
+        assignments = np.array(db.session.execute(
+            select(TeacherAssignment.section_id, TeacherAssignment.subject_id, TeacherAssignment.teacher_id).where(
+                TeacherAssignment.academic_year_id == year_id
+            )
+        ).all(), dtype=np.int64).reshape(-1, 3)
+        if len(assignments):
+            section_idx = _compact(snapshot.section_ids, assignments[:, 0])
+            subject_idx = _compact(snapshot.subject_ids, assignments[:, 1])
+            teacher_idx = _compact(snapshot.teacher_ids, assignments[:, 2])
+            valid = (section_idx >= 0) & (subject_idx >= 0)
+            snapshot.assignment_teacher[section_idx[valid] * n_subjects + subject_idx[valid]] = teacher_idx[valid]
+
+        # Calificaciones finales
+        finals = np.array(db.session.execute(
+            select(FinalGrade.student_id, FinalGrade.subject_id, FinalGrade.period_id, FinalGrade.value).join(
+                Period, FinalGrade.period_id == Period.id
+            ).where(Period.academic_year_id == year_id)
+        ).all(), dtype=np.float64).reshape(-1, 4)
+
+        snapshot.final_student = _compact(snapshot.student_ids, finals[:, 0].astype(np.int64))
+        snapshot.final_subject = _compact(snapshot.subject_ids, finals[:, 1].astype(np.int64))
+        snapshot.final_period = _compact(snapshot.period_ids, finals[:, 2].astype(np.int64))
+        snapshot.final_value = finals[:, 3]
+        snapshot.final_section = snapshot.student_section[snapshot.final_student]
+
+        pair = snapshot.final_section * n_subjects + snapshot.final_subject
+        snapshot.final_teacher = np.where(
+            (snapshot.final_section >= 0) & (snapshot.final_subject >= 0),
+            snapshot.assignment_teacher[np.clip(pair, 0, None)] if len(snapshot.assignment_teacher) else -1,
+            -1
+        )
+
+        # Calificaciones de evaluaciones
+        evaluations = np.array(db.session.execute(
+            select(StudentGrade.student_id, StudentGrade.subject_id, StudentGrade.period_id,
+                   StudentGrade.teacher_id, StudentGrade.value).join(
+                Period, StudentGrade.period_id == Period.id
+            ).where(Period.academic_year_id == year_id)
+        ).all(), dtype=np.float64).reshape(-1, 5)
+
+        snapshot.eval_student = _compact(snapshot.student_ids, evaluations[:, 0].astype(np.int64))
+        snapshot.eval_subject = _compact(snapshot.subject_ids, evaluations[:, 1].astype(np.int64))
+        snapshot.eval_period = _compact(snapshot.period_ids, evaluations[:, 2].astype(np.int64))
+        snapshot.eval_teacher = _compact(snapshot.teacher_ids, evaluations[:, 3].astype(np.int64))
+        snapshot.eval_value = evaluations[:, 4]
+        snapshot.eval_section = snapshot.student_section[snapshot.eval_student]
+
+        snapshot.load_seconds = round(time.perf_counter() - started, 3)
+
+        return snapshot
+
+    @property
+    def final_count(self):
+        return len(self.final_value)
+
+    @property
+    def evaluation_count(self):
+        return len(self.eval_value)
+
+    def section_mask(self, section_idx, section_id=None, grade_id=None):
+        """Filtro booleano por sección o por grado sobre un arreglo de posiciones de sección"""
+
+        mask = np.ones(len(section_idx), dtype=bool)
+        if section_id:
+            target = _compact(self.section_ids, np.array([section_id], dtype=np.int64))[0]
+            mask &= section_idx == target
+        elif grade_id:
+            sections = np.flatnonzero(self.section_grade_ids == grade_id)
+            mask &= np.isin(section_idx, sections)
+        return mask
+
+    def period_index(self, period_id):
+        if not period_id:
+            return None
+        position = _compact(self.period_ids, np.array([period_id], dtype=np.int64))[0]
+        return int(position) if position >= 0 else None
+
+
+class AnalyticsService:
+    """
+    Analítica de calificaciones sobre instantáneas NumPy por año académico
+
+    La instantánea se carga una vez por año y proceso, y se descarta cuando
+    se confirma una transacción que escribe calificaciones (eventos de
+    sesión) o cuando supera ANALYTICS_SNAPSHOT_TTL segundos, lo que acota el
+    desfase entre procesos. Todos los cálculos (percentiles, desviación,
+    histogramas, comparaciones por asignatura y profesor, variación entre
+    períodos y estudiantes en riesgo) son operaciones vectorizadas.
+    """
+
+    SESSION_KEY = '_analytics_dirty'
+
+    _snapshots = {}
+    _lock = threading.Lock()
+    _generation = 0
+
+    hits = 0
+    misses = 0
+
+    # ------------------------------------------------------------------
+    # Caché de instantáneas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def snapshot(year_id):
+        """Instantánea del año desde la caché, cargándola si hace falta"""
+
+        ttl = current_app.config.get('ANALYTICS_SNAPSHOT_TTL', 300)
+
+        with AnalyticsService._lock:
+            cached = AnalyticsService._snapshots.get(year_id)
+            if cached is not None and (datetime.utcnow() - cached.loaded_at).total_seconds() < ttl:
+                AnalyticsService.hits += 1
+                return cached, True
+            generation = AnalyticsService._generation
+
+        snapshot = GradeSnapshot.load(year_id)
+        snapshot.generation = generation
+
+        with AnalyticsService._lock:
+            AnalyticsService.misses += 1
+            # Una escritura durante la carga deja la instantánea sin guardar
+            if AnalyticsService._generation == generation:
+                AnalyticsService._snapshots[year_id] = snapshot
+
+        return snapshot, False
+
+    @staticmethod
+    def invalidate():
+        with AnalyticsService._lock:
+            AnalyticsService._generation += 1
+            AnalyticsService._snapshots.clear()
+
+    @staticmethod
+    def stats():
+        with AnalyticsService._lock:
+            return {
+                'size': len(AnalyticsService._snapshots),
+                'hits': AnalyticsService.hits,
+                'misses': AnalyticsService.misses
+            }
+
+    @staticmethod
+    def mark_dirty(session=None):
+        """Marca la transacción actual como escritura de calificaciones"""
+
+        session = session or db.session
+        session.info[AnalyticsService.SESSION_KEY] = True
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        tracked = (FinalGrade, StudentGrade, GradeType, TeacherAssignment, Student)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, tracked):
+                session.info[AnalyticsService.SESSION_KEY] = True
+                return
+
+    @staticmethod
+    def _after_commit(session):
+        if session.info.pop(AnalyticsService.SESSION_KEY, False):
+            AnalyticsService.invalidate()
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop(AnalyticsService.SESSION_KEY, None)
+
+    @staticmethod
+    def install(session):
+        """Registra los eventos de sesión que invalidan las instantáneas"""
+
+        for name, handler in (
+            ('after_flush', AnalyticsService._after_flush),
+            ('after_commit', AnalyticsService._after_commit),
+            ('after_rollback', AnalyticsService._after_rollback),
+        ):
+            if not event.contains(session, name, handler):
+                event.listen(session, name, handler)
+
+    # ------------------------------------------------------------------
+    # Cálculos vectorizados
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def describe(values, passing_grade):
+        """Resumen de una distribución: conteo, media, desviación, percentiles e histograma"""
+
+        count = int(len(values))
+        if count == 0:
+            return {
+                'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None,
+                'percentiles': {str(p): None for p in PERCENTILES},
+                'histogram': [0] * (len(HISTOGRAM_EDGES) - 1),
+                'passing_rate': None
+            }
+
+        percentiles = np.percentile(values, PERCENTILES)
+        histogram, _ = np.histogram(np.clip(values, HISTOGRAM_EDGES[0], HISTOGRAM_EDGES[-1]), bins=HISTOGRAM_EDGES)
+
+        return {
+            'count': count,
+            'mean': round(float(values.mean()), 2),
+            'std': round(float(values.std()), 2),
+            'min': round(float(values.min()), 2),
+            'max': round(float(values.max()), 2),
+            'percentiles': {str(p): round(float(v), 2) for p, v in zip(PERCENTILES, percentiles)},
+            'histogram': histogram.tolist(),
+            'passing_rate': round(float((values >= passing_grade).mean()) * 100, 1)
+        }
+
+    @staticmethod
+    def group_stats(keys, values, n_groups, passing_grade):
+        """
+        Conteo, media, desviación, mediana y tasa de aprobación por grupo
+
+        Args:
+            keys: Posición del grupo de cada valor (enteros en [0, n_groups))
+            values: Valores
+            n_groups: Número de grupos
+
+        Returns:
+            dict de arreglos de longitud n_groups (NaN en grupos vacíos)
+        """
+
+        counts = np.bincount(keys, minlength=n_groups).astype(np.float64)
+        sums = np.bincount(keys, weights=values, minlength=n_groups)
+        squares = np.bincount(keys, weights=values * values, minlength=n_groups)
+        passing = np.bincount(keys, weights=(values >= passing_grade).astype(np.float64), minlength=n_groups)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+            stds = np.sqrt(np.maximum(squares / counts - means * means, 0))
+            rates = passing * 100 / counts
+
+        # Mediana por grupo: ordenar por (grupo, valor) y tomar el centro de cada tramo
+        medians = np.full(n_groups, np.nan)
+        if len(values):
+            order = np.lexsort((values, keys))
+            sorted_values = values[order]
+            starts = np.searchsorted(keys[order], np.arange(n_groups))
+            present = counts > 0
+            size = counts[present].astype(np.int64)
+            low = starts[present] + (size - 1) // 2
+            high = starts[present] + size // 2
+            medians[present] = (sorted_values[low] + sorted_values[high]) / 2
+
+        return {
+            'count': counts.astype(np.int64),
+            'mean': means,
+            'std': stds,
+            'median': medians,
+            'passing_rate': rates
+        }
+
+    @staticmethod
+    def _rows(names, ids, stats, order_by='mean'):
+        rows = []
+        for index in np.flatnonzero(stats['count'] > 0):
+            rows.append({
+                'id': int(ids[index]),
+                'name': names[index],
+                'count': int(stats['count'][index]),
+                'mean': round(float(stats['mean'][index]), 2),
+                'std': round(float(stats['std'][index]), 2),
+                'median': round(float(stats['median'][index]), 2),
+                'passing_rate': round(float(stats['passing_rate'][index]), 1)
+            })
+        return sorted(rows, key=lambda row: row[order_by], reverse=True)
+
+    @staticmethod
+    def period_trends(snapshot, mask, passing_grade):
+        """
+        Promedio por período y por asignatura, con la variación respecto al período anterior
+
+        Returns:
+            dict: {'periods': [...], 'subjects': [...]}
+        """
+
+        n_periods = len(snapshot.period_ids)
+        n_subjects = len(snapshot.subject_ids)
+        periods = snapshot.final_period[mask]
+        subjects = snapshot.final_subject[mask]
+        values = snapshot.final_value[mask]
+
+        by_period = AnalyticsService.group_stats(periods, values, n_periods, passing_grade)
+        period_deltas = np.concatenate([[np.nan], np.diff(by_period['mean'])]) if n_periods else np.array([])
+
+        period_rows = [
+            {
+                'id': int(snapshot.period_ids[index]),
+                'name': snapshot.period_names[index],
+                'count': int(by_period['count'][index]),
+                'mean': None if np.isnan(by_period['mean'][index]) else round(float(by_period['mean'][index]), 2),
+                'passing_rate': None if np.isnan(by_period['passing_rate'][index]) else round(float(by_period['passing_rate'][index]), 1),
+                'delta': None if np.isnan(period_deltas[index]) else round(float(period_deltas[index]), 2)
+            }
+            for index in range(n_periods)
+        ]
+
+        # Matriz asignatura × período de promedios
+        cells = AnalyticsService.group_stats(subjects * n_periods + periods, values, n_subjects * n_periods, passing_grade)
+        means = cells['mean'].reshape(n_subjects, n_periods)
+        deltas = np.diff(means, axis=1) if n_periods > 1 else np.full((n_subjects, 0), np.nan)
+
+        subject_rows = []
+        for index in np.flatnonzero(~np.all(np.isnan(means), axis=1)):
+            row_deltas = deltas[index]
+            known = row_deltas[~np.isnan(row_deltas)]
+            subject_rows.append({
+                'id': int(snapshot.subject_ids[index]),
+                'name': snapshot.subject_names[index],
+                'means': [None if np.isnan(v) else round(float(v), 2) for v in means[index]],
+                'last_delta': round(float(known[-1]), 2) if len(known) else None
+            })
+
+        subject_rows.sort(key=lambda row: row['last_delta'] if row['last_delta'] is not None else 0)
+
+        return {'periods': period_rows, 'subjects': subject_rows}
+
+    @staticmethod
+    def at_risk_students(snapshot, mask, period_idx, passing_grade, limit=100):
+        """
+        Estudiantes en riesgo en un período
+
+        Un estudiante está en riesgo si reprueba al menos
+        ANALYTICS_AT_RISK_FAILED asignaturas, si su promedio está por debajo
+        de la nota aprobatoria, o si su promedio cae ANALYTICS_AT_RISK_DROP
+        puntos o más respecto al período anterior.
+        """
+
+        if period_idx is None:
+            return []
+
+        failed_threshold = current_app.config.get('ANALYTICS_AT_RISK_FAILED', 2)
+        drop_threshold = current_app.config.get('ANALYTICS_AT_RISK_DROP', 10)
+
+        n_students = len(snapshot.student_ids)
+        students = snapshot.final_student[mask]
+        periods = snapshot.final_period[mask]
+        values = snapshot.final_value[mask]
+
+        current = periods == period_idx
+        stats = AnalyticsService.group_stats(students[current], values[current], n_students, passing_grade)
+        failed = np.bincount(students[current], weights=(values[current] < passing_grade).astype(np.float64),
+                             minlength=n_students).astype(np.int64)
+
+        drop = np.full(n_students, np.nan)
+        if period_idx > 0:
+            previous = periods == period_idx - 1
+            before = AnalyticsService.group_stats(students[previous], values[previous], n_students, passing_grade)
+            drop = before['mean'] - stats['mean']
+
+        has_grades = stats['count'] > 0
+        low_average = stats['mean'] < passing_grade
+        dropped = np.nan_to_num(drop, nan=0) >= drop_threshold
+        risky = has_grades & ((failed >= failed_threshold) | low_average | dropped)
+
+        indexes = np.flatnonzero(risky)
+        # Más asignaturas reprobadas primero; a igualdad, menor promedio
+        indexes = indexes[np.lexsort((stats['mean'][indexes], -failed[indexes]))][:limit]
+
+        rows = []
+        for index in indexes:
+            reasons = []
+            if failed[index] >= failed_threshold:
+                reasons.append(f'{failed[index]} asignaturas reprobadas')
+            if low_average[index]:
+                reasons.append('promedio bajo la nota aprobatoria')
+            if dropped[index]:
+                reasons.append(f'bajó {round(float(drop[index]), 1)} puntos')
+            section = snapshot.student_section[index]
+            rows.append({
+                'id': int(snapshot.student_ids[index]),
+                'student_id': snapshot.student_codes[index],
+                'name': snapshot.student_names[index],
+                'section': snapshot.section_names[section] if section >= 0 else None,
+                'mean': round(float(stats['mean'][index]), 2),
+                'failed_subjects': int(failed[index]),
+                'drop': None if np.isnan(drop[index]) else round(float(drop[index]), 2),
+                'reasons': reasons
+            })
+
+        return rows
+
+    @staticmethod
+    def analyze(year_id, period_id=None, section_id=None, grade_id=None):
+        """
+        Analítica completa de un año académico
+
+        Args:
+            year_id: Año académico
+            period_id: Limitar distribución y comparaciones a un período;
+                los estudiantes en riesgo usan este período o el último con datos
+            section_id / grade_id: Limitar a una sección o a un grado
+
+        Returns:
+            dict serializable a JSON
+        """
+
+        passing_grade = current_app.config.get('PASSING_GRADE', 70)
+        snapshot, cached = AnalyticsService.snapshot(year_id)
+        started = time.perf_counter()
+
+        scope = snapshot.section_mask(snapshot.final_section, section_id, grade_id)
+        eval_scope = snapshot.section_mask(snapshot.eval_section, section_id, grade_id)
+
+        period_idx = snapshot.period_index(period_id)
+        final_mask = scope.copy()
+        eval_mask = eval_scope.copy()
+        if period_idx is not None:
+            final_mask &= snapshot.final_period == period_idx
+            eval_mask &= snapshot.eval_period == period_idx
+
+        values = snapshot.final_value[final_mask]
+
+        subjects = AnalyticsService.group_stats(
+            snapshot.final_subject[final_mask], values, len(snapshot.subject_ids), passing_grade
+        )
+
+        # Profesores: calificaciones finales de sus asignaciones y notas de sus evaluaciones
+        with_teacher = final_mask & (snapshot.final_teacher >= 0)
+        teachers = AnalyticsService.group_stats(
+            snapshot.final_teacher[with_teacher], snapshot.final_value[with_teacher],
+            len(snapshot.teacher_ids), passing_grade
+        )
+        eval_with_teacher = eval_mask & (snapshot.eval_teacher >= 0)
+        teacher_evals = AnalyticsService.group_stats(
+            snapshot.eval_teacher[eval_with_teacher], snapshot.eval_value[eval_with_teacher],
+            len(snapshot.teacher_ids), passing_grade
+        )
+        teacher_rows = AnalyticsService._rows(snapshot.teacher_names, snapshot.teacher_ids, teachers)
+        for row in teacher_rows:
+            index = int(np.flatnonzero(snapshot.teacher_ids == row['id'])[0])
+            row['evaluation_count'] = int(teacher_evals['count'][index])
+            row['evaluation_mean'] = None if np.isnan(teacher_evals['mean'][index]) else round(float(teacher_evals['mean'][index]), 2)
+
+        # Estudiantes en riesgo: período pedido o el último con calificaciones
+        risk_period = period_idx
+        if risk_period is None:
+            with_data = np.unique(snapshot.final_period[scope])
+            risk_period = int(with_data[-1]) if len(with_data) else None
+
+        result = {
+            'year_id': year_id,
+            'period_id': period_id,
+            'section_id': section_id,
+            'grade_id': grade_id,
+            'passing_grade': passing_grade,
+            'histogram_edges': HISTOGRAM_EDGES.tolist(),
+            'distribution': AnalyticsService.describe(values, passing_grade),
+            'evaluation_distribution': AnalyticsService.describe(snapshot.eval_value[eval_mask], passing_grade),
+            'subjects': AnalyticsService._rows(snapshot.subject_names, snapshot.subject_ids, subjects),
+            'teachers': teacher_rows,
+            'trends': AnalyticsService.period_trends(snapshot, scope, passing_grade),
+            'at_risk_period_id': int(snapshot.period_ids[risk_period]) if risk_period is not None else None,
+            'at_risk': AnalyticsService.at_risk_students(snapshot, scope, risk_period, passing_grade),
+            'snapshot': {
+                'cached': cached,
+                'loaded_at': snapshot.loaded_at.isoformat(timespec='seconds'),
+                'load_seconds': snapshot.load_seconds,
+                'final_grades': snapshot.final_count,
+                'evaluations': snapshot.evaluation_count
+            }
+        }
+        result['snapshot']['compute_seconds'] = round(time.perf_counter() - started, 4)
+
+        return result
@@ -0,0 +1,200 @@
+from app.models.users import User
+from app.models.academic import Teacher, TeacherAssignment
+from app import db
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, select
+import threading
+import time
+
+
+# Entidades cuyas escrituras invalidan la caché
+TRACKED = (User, Teacher, TeacherAssignment)
+TRACKED_TABLES = frozenset(entity.__table__.name for entity in TRACKED)
+
+
+class AuthUser(UserMixin):
+    """
+    Usuario autenticado tal como lo ve cada solicitud (current_user)
+
+    Reúne los datos del usuario, el ID de su perfil de profesor y sus
+    asignaciones como (section_id, subject_id, academic_year_id). No es una
+    entidad del ORM: la misma instancia se comparte entre solicitudes, así
+    que es de solo lectura. Para modificar el usuario se carga User.
+    """
+
+    __slots__ = ('id', 'username', 'email', 'first_name', 'last_name', 'role', '_active',
+                 'teacher_id', 'specialization', 'assignments', 'version', 'loaded_at')
+
+    def __init__(self, id, username, email, first_name, last_name, role, active,
+                 teacher_id, specialization, assignments, version):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.role = role
+        self._active = active
+        self.teacher_id = teacher_id
+        self.specialization = specialization
+        self.assignments = assignments
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls, user_id, version):
+        """Usuario y perfil de profesor en una consulta, asignaciones en otra; None si no existe"""
+
+        row = db.session.execute(
+            select(User.id, User.username, User.email, User.first_name, User.last_name, User.role,
+                   User.is_active, Teacher.id, Teacher.specialization)
+            .outerjoin(Teacher, Teacher.user_id == User.id)
+            .where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+
+        teacher_id = row[7]
+        assignments = frozenset()
+        if teacher_id is not None:
+            assignments = frozenset(tuple(item) for item in db.session.execute(
+                select(TeacherAssignment.section_id, TeacherAssignment.subject_id, TeacherAssignment.academic_year_id)
+                .where(TeacherAssignment.teacher_id == teacher_id)
+            ))
+
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5], row[6] is not False,
+                   teacher_id, row[8], assignments, version)
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def is_teacher(self):
+        return self.role == 'teacher'
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'
+
+    def teaches(self, section_id, subject_id=None, academic_year_id=None):
+        """¿Tiene el profesor alguna asignación en la sección (y asignatura / año, si se indican)?"""
+
+        return any(
+            assigned_section == section_id
+            and (subject_id is None or assigned_subject == subject_id)
+            and (academic_year_id is None or assigned_year == academic_year_id)
+            for assigned_section, assigned_subject, assigned_year in self.assignments
+        )
+
+    def __repr__(self):
+        return f'<AuthUser {self.id}>'
+
+
+class AuthContextService:
+    """
+    Caché por proceso de los usuarios autenticados (login_manager.user_loader)
+
+    Cada entrada guarda la versión con la que se cargó; un commit que toque
+    usuarios, perfiles de profesor o asignaciones incrementa la versión
+    (eventos de sesión, incluidos los UPDATE / DELETE en bloque) y la
+    siguiente solicitud de cada usuario recarga. Flask-Login ya conserva
+    current_user durante la solicitud, así que una vista no consulta el
+    usuario más de una vez.
+
+    La invalidación solo llega al proceso que hizo la escritura; con varios
+    workers, AUTH_CONTEXT_TTL acota cuánto tiempo puede seguir vigente en
+    los demás un permiso retirado.
+    """
+
+    SESSION_KEY = 'auth_context_dirty'
+
+    _lock = threading.Lock()
+    _users = {}  # (id del motor, id del usuario) -> AuthUser
+    _version = 0
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def load_user(user_id):
+        """AuthUser del usuario, desde la caché si sigue vigente; None si no existe"""
+
+        ttl = current_app.config.get('AUTH_CONTEXT_TTL', 30)
+        key = (id(db.engine), user_id)
+
+        with AuthContextService._lock:
+            user = AuthContextService._users.get(key)
+            version = AuthContextService._version
+            if user is not None and user.version == version and time.monotonic() - user.loaded_at < ttl:
+                AuthContextService.hits += 1
+                return user
+
+        user = AuthUser.load(user_id, version)
+
+        with AuthContextService._lock:
+            AuthContextService.misses += 1
+            # Una escritura durante la carga deja la entrada sin guardar
+            if user is not None and AuthContextService._version == version:
+                AuthContextService._users[key] = user
+
+        return user
+
+    @staticmethod
+    def invalidate():
+        with AuthContextService._lock:
+            AuthContextService._version += 1
+            AuthContextService._users.clear()
+
+    @staticmethod
+    def stats():
+        with AuthContextService._lock:
+            return {
+                'version': AuthContextService._version,
+                'size': len(AuthContextService._users),
+                'hits': AuthContextService.hits,
+                'misses': AuthContextService.misses
+            }
+
+    @staticmethod
+    def mark_dirty(session=None):
+        """Marca la transacción actual como escritura de usuarios o asignaciones"""
+
+        session = session or db.session
+        session.info[AuthContextService.SESSION_KEY] = True
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, TRACKED):
+                session.info[AuthContextService.SESSION_KEY] = True
+                return
+
+    @staticmethod
+    def _do_orm_execute(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and mapper.local_table.name in TRACKED_TABLES:
+                AuthContextService.mark_dirty(orm_execute_state.session)
+
+    @staticmethod
+    def _after_commit(session):
+        if session.info.pop(AuthContextService.SESSION_KEY, False):
+            AuthContextService.invalidate()
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop(AuthContextService.SESSION_KEY, None)
+
+    @staticmethod
+    def install(session):
+        """Registra los eventos de sesión que invalidan la caché"""
+
+        for name, handler in (
+            ('after_flush', AuthContextService._after_flush),
+            ('do_orm_execute', AuthContextService._do_orm_execute),
+            ('after_commit', AuthContextService._after_commit),
+            ('after_rollback', AuthContextService._after_rollback),
+        ):
+            if not event.contains(session, name, handler):
+                event.listen(session, name, handler)
@@ -0,0 +1,257 @@
+from app.models.academic import Grade, Section, TeacherAssignment
+from app.services.section_gradebook import SectionGradebook
+from app.services.template_cache import TemplateCache, CompiledTemplate
+from app.services.template_processor import TemplateProcessor
+from app import db
+from flask import current_app
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import SimpleNamespace
+from io import BytesIO
+import multiprocessing
+import zipfile
+import os
+
+# Plantilla compilada de cada proceso del pool (se carga una vez por proceso)
+_worker_compiled = None
+
+
+def _init_worker(template_id, file_path, file_hash, cells, ranges, styles):
+    """Inicializa un proceso del pool cargando el libro de la plantilla una sola vez"""
+
+    global _worker_compiled
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path) if file_hash else None
+    _worker_compiled = CompiledTemplate(template_id, file_hash, workbook, cells, ranges, styles)
+
+
+def _render_section(payload):
+    """Genera el reporte de una sección en un proceso del pool; retorna los bytes del .xlsx"""
+
+    return BatchReportService.render_payload(_worker_compiled, payload)
+
+
+class BatchReportService:
+    """
+    Generación por lotes de reportes con plantilla para varias secciones y períodos
+
+    Todos los estudiantes y calificaciones finales se cargan al inicio
+    (SectionGradebook.load_many por período). Cada reporte se genera con
+    TemplateProcessor en un pool de procesos a partir de datos planos, sin
+    acceso a la base de datos, y el resultado se escribe en un único ZIP.
+    """
+
+    # Por debajo de este número de reportes no compensa arrancar el pool
+    POOL_THRESHOLD = 8
+
+    @staticmethod
+    def resolve_sections(academic_year, grade_id=None, level=None):
+        """
+        Secciones incluidas en el lote
+
+        Args:
+            academic_year: Año académico (se usan las secciones con asignaciones en el año)
+            grade_id: Limitar a un grado (opcional)
+            level: Limitar a un nivel, p. ej. 'Primaria' (opcional)
+        """
+
+        query = Section.query.join(Grade).filter(
+            Section.id.in_(
+                db.session.query(TeacherAssignment.section_id).filter_by(
+                    academic_year_id=academic_year.id
+                )
+            )
+        )
+
+        if grade_id:
+            query = query.filter(Section.grade_id == grade_id)
+        if level:
+            query = query.filter(Grade.level == level)
+
+        return query.order_by(Grade.name, Section.name).all()
+
+    @staticmethod
+    def build_payload(template, gradebook):
+        """Datos planos (serializables) necesarios para generar el reporte de una sección"""
+
+        section = gradebook.section
+        period = gradebook.period
+
+        return {
+            'template': {'id': template.id, 'name': template.name},
+            'section': {
+                'id': section.id,
+                'name': section.name,
+                'grade': {'id': section.grade.id, 'name': section.grade.name, 'level': section.grade.level}
+            },
+            'period': {
+                'id': period.id,
+                'name': period.name,
+                'academic_year_id': period.academic_year_id,
+                'academic_year': {'id': period.academic_year.id, 'name': period.academic_year.name}
+            },
+            'students': [{
+                'id': student.id,
+                'student_id': student.student_id,
+                'first_name': student.first_name,
+                'last_name': student.last_name,
+                'section_id': student.section_id
+            } for student in gradebook.students],
+            'subjects': [{
+                'id': subject.id,
+                'name': subject.name,
+                'code': subject.code,
+                'description': subject.description
+            } for subject in gradebook.subjects],
+            'matrix': gradebook.matrix,
+            'passing_grade': gradebook.passing_grade
+        }
+
+    @staticmethod
+    def _namespace(data):
+        """Convierte diccionarios anidados en objetos con atributos"""
+        return SimpleNamespace(**{
+            key: BatchReportService._namespace(value) if isinstance(value, dict) else value
+            for key, value in data.items()
+        })
+
+    @staticmethod
+    def render_payload(compiled, payload):
+        """
+        Genera un reporte a partir de los datos planos de build_payload
+
+        Reconstruye el SectionGradebook y el contexto que usa generate_with_template
+        y delega todo el llenado de celdas y rangos en TemplateProcessor.
+        """
+
+        template = BatchReportService._namespace(payload['template'])
+        section = BatchReportService._namespace(payload['section'])
+        period = BatchReportService._namespace(payload['period'])
+        students = [BatchReportService._namespace(student) for student in payload['students']]
+        subjects = [BatchReportService._namespace(subject) for subject in payload['subjects']]
+
+        for student in students:
+            student.section = section
+
+        gradebook = SectionGradebook(
+            section, period, students, subjects, payload['matrix'], payload['passing_grade']
+        )
+
+        context = TemplateProcessor.build_section_context(template, gradebook)
+
+        processor = TemplateProcessor(template, compiled=compiled)
+        workbook = processor.process_template(context)
+
+        output = BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    @staticmethod
+    def _max_workers():
+        configured = current_app.config.get('REPORT_BATCH_WORKERS')
+        if configured:
+            return int(configured)
+        return min(4, os.cpu_count() or 1)
+
+    @staticmethod
+    def report_filename(template, section, period):
+        """Ruta del reporte dentro del ZIP: una carpeta por período"""
+
+        def clean(text):
+            return str(text).replace('/', '-').replace('\\', '-')
+
+        return f'{clean(period.name)}/Reporte_{clean(template.name)}_{clean(section.grade.name)}{clean(section.name)}.xlsx'
+
+    @staticmethod
+    def generate(template, periods, sections, output_path, progress=None, max_workers=None):
+        """
+        Genera un ZIP con un reporte por sección y período
+
+        Args:
+            template: ExcelTemplate
+            periods: Lista de períodos
+            sections: Lista de secciones
+            output_path: Ruta del ZIP a crear
+            progress: Función opcional progress(done, total, label, error) llamada
+                al terminar cada reporte
+            max_workers: Procesos del pool (por defecto REPORT_BATCH_WORKERS)
+
+        Returns:
+            dict: {'total', 'generated', 'errors'}
+        """
+
+        compiled = TemplateCache.get(template)
+
+        # Prefetch de todas las secciones por período: tres consultas por período
+        jobs = []
+        for period in periods:
+            gradebooks = SectionGradebook.load_many(sections, period)
+            for section in sections:
+                payload = BatchReportService.build_payload(template, gradebooks[section.id])
+                filename = BatchReportService.report_filename(template, section, period)
+                jobs.append((filename, payload))
+
+        result = {'total': len(jobs), 'generated': 0, 'errors': []}
+
+        if not jobs:
+            return result
+
+        if max_workers is None:
+            max_workers = BatchReportService._max_workers()
+        max_workers = max(1, min(max_workers, len(jobs)))
+        if len(jobs) < BatchReportService.POOL_THRESHOLD:
+            max_workers = 1
+
+        def report_done(filename, error=None):
+            if error:
+                result['errors'].append(f'{filename}: {error}')
+            else:
+                result['generated'] += 1
+            if progress:
+                progress(result['generated'] + len(result['errors']), result['total'], filename, error)
+
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            if max_workers == 1:
+                for filename, payload in jobs:
+                    error = None
+                    try:
+                        archive.writestr(filename, BatchReportService.render_payload(compiled, payload))
+                    except Exception as e:
+                        error = str(e)
+                    report_done(filename, error)
+                return result
+
+            # Procesos nuevos (spawn): no heredan conexiones abiertas de la base de datos
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(
+                    compiled.template_id, template.file_path, compiled.file_hash,
+                    compiled.cells, compiled.ranges, compiled.styles
+                )
+            )
+
+            with executor:
+                futures = {
+                    executor.submit(_render_section, payload): filename
+                    for filename, payload in jobs
+                }
+
+                try:
+                    # Cada reporte se escribe en el ZIP apenas termina
+                    for future in as_completed(futures):
+                        filename = futures[future]
+                        error = None
+                        try:
+                            archive.writestr(filename, future.result())
+                        except Exception as e:
+                            error = str(e)
+                        report_done(filename, error)
+                except BaseException:
+                    # Si progress() interrumpe el lote (p. ej. cancelación), no esperar el resto
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+        return result
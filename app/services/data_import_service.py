@@ -1,14 +1,22 @@
 from app.models.academic import Student, Subject, Grade, Section, AcademicYear, Period
-from app.models.grades import FinalGrade
 from app.models.users import User
 from app.services.excel_data_extractor import ExcelDataExtractor
+from app.services.student_import_service import StudentImportService
+from app.services.final_grade_service import FinalGradeService
 from app import db
-from sqlalchemy.exc import IntegrityError
-import logging
+import pandas as pd
 
 class DataImportService:
     """Servicio para importar datos desde archivos Excel a la base de datos"""
     
+    # Campos que entrega ExcelDataExtractor para cada estudiante
+    STUDENT_COLUMNS = {
+        'student_id': 'student_id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email'
+    }
+    
     @staticmethod
     def import_students_and_grades(file_path, section_id, period_id, mapping_config=None):
         """
@@ -42,38 +50,68 @@ class DataImportService:
                 'warnings': []
             }
             
-            # Importar materias primero
-            subject_mapping = {}
+            # Importar materias primero: las existentes se buscan en una sola consulta
+            subject_names = [subject_data['name'] for subject_data in extracted_data['subjects']]
+            subject_mapping = {
+                subject.name: subject
+                for subject in Subject.query.filter(Subject.name.in_(subject_names)).all()
+            } if subject_names else {}
+            
             for subject_data in extracted_data['subjects']:
-                subject = DataImportService._create_or_get_subject(subject_data)
-                subject_mapping[subject_data['name']] = subject
-                if subject:
+                if subject_data['name'] not in subject_mapping:
+                    subject = Subject(
+                        name=subject_data['name'],
+                        code=subject_data.get('code', subject_data['name'][:4].upper()),
+                        description=f"Materia importada: {subject_data['name']}"
+                    )
+                    db.session.add(subject)
+                    subject_mapping[subject.name] = subject
                     result['subjects_created'] += 1
             
-            # Importar estudiantes y calificaciones
-            for student_data in extracted_data['students']:
-                try:
-                    # Crear o actualizar estudiante
-                    student, created = DataImportService._create_or_update_student(
-                        student_data, section
-                    )
+            # Commit antes de import_frame: cada bloque de estudiantes hace su
+            # propio commit o rollback, y un rollback descartaría las materias
+            # nuevas que luego usan las calificaciones finales
+            db.session.commit()
+            
+            # Importar estudiantes con el proceso compartido (altas y actualizaciones en bloque)
+            students = extracted_data['students']
+            students_df = pd.DataFrame(
+                students, columns=['row', 'student_id', 'first_name', 'last_name', 'email']
+            )
+            students_df.index = students_df.pop('row') - 2
+            
+            student_result = StudentImportService.import_frame(
+                students_df, DataImportService.STUDENT_COLUMNS, section.id,
+                update_fields=['first_name', 'last_name', 'email']
+            )
+            result['students_created'] = student_result['students_created']
+            result['students_updated'] = student_result['students_updated']
+            result['errors'].extend(student_result['errors'])
+            
+            # Calificaciones finales: un upsert en bloque por materia
+            student_ids = student_result['student_ids']
+            values_by_subject = {}
+            
+            for student_data in students:
+                student_pk = student_ids.get(student_data['student_id'])
+                if student_pk is None:
+                    continue
+                
+                for subject_name, grade_value in student_data['grades'].items():
+                    subject = subject_mapping.get(subject_name)
+                    if not subject:
+                        continue
                     
-                    if created:
-                        result['students_created'] += 1
+                    if isinstance(grade_value, (int, float)):
+                        values_by_subject.setdefault(subject.id, {})[student_pk] = float(grade_value)
                     else:
-                        result['students_updated'] += 1
-                    
-                    # Importar calificaciones del estudiante
-                    grades_imported = DataImportService._import_student_grades(
-                        student, student_data['grades'], subject_mapping, period
-                    )
-                    
-                    result['grades_imported'] += grades_imported
-                    
-                except Exception as e:
-                    error_msg = f"Error con estudiante {student_data.get('student_id', 'N/A')}: {str(e)}"
-                    result['errors'].append(error_msg)
-                    logging.error(error_msg)
+                        result['warnings'].append(
+                            f"Calificación no numérica omitida: {student_data['student_id']} - {subject_name} = {grade_value}"
+                        )
+            
+            for subject_id, values in values_by_subject.items():
+                FinalGradeService.save_final_grades(subject_id, period.id, values)
+                result['grades_imported'] += len(values)
             
             db.session.commit()
             return result
@@ -91,117 +129,6 @@ class DataImportService:
                 'warnings': []
             }
     
-    @staticmethod
-    def _create_or_get_subject(subject_data):
-        """Crea una nueva materia o obtiene una existente"""
-        
-        # Buscar materia existente por nombre
-        existing_subject = Subject.query.filter_by(name=subject_data['name']).first()
-        
-        if existing_subject:
-            return existing_subject
-        
-        # Crear nueva materia
-        try:
-            new_subject = Subject(
-                name=subject_data['name'],
-                code=subject_data.get('code', subject_data['name'][:4].upper()),
-                description=f"Materia importada: {subject_data['name']}"
-            )
-            
-            db.session.add(new_subject)
-            db.session.flush()  # Para obtener el ID
-            return new_subject
-            
-        except IntegrityError:
-            db.session.rollback()
-            # Si hay error de integridad, intentar obtener la materia nuevamente
-            return Subject.query.filter_by(name=subject_data['name']).first()
-    
-    @staticmethod
-    def _create_or_update_student(student_data, section):
-        """Crea un nuevo estudiante o actualiza uno existente"""
-        
-        # Buscar estudiante existente por ID
-        existing_student = Student.query.filter_by(
-            student_id=student_data['student_id']
-        ).first()
-        
-        if existing_student:
-            # Actualizar datos del estudiante existente
-            existing_student.first_name = student_data['first_name']
-            existing_student.last_name = student_data['last_name']
-            existing_student.email = student_data.get('email', existing_student.email)
-            existing_student.section_id = section.id
-            existing_student.is_active = True
-            
-            return existing_student, False  # False = no creado, actualizado
-        
-        # Crear nuevo estudiante
-        try:
-            new_student = Student(
-                student_id=student_data['student_id'],
-                first_name=student_data['first_name'],
-                last_name=student_data['last_name'],
-                email=student_data.get('email', ''),
-                section_id=section.id,
-                is_active=True
-            )
-            
-            db.session.add(new_student)
-            db.session.flush()  # Para obtener el ID
-            return new_student, True  # True = creado
-            
-        except IntegrityError:
-            db.session.rollback()
-            # Si hay error, intentar obtener el estudiante
-            existing = Student.query.filter_by(student_id=student_data['student_id']).first()
-            if existing:
-                return existing, False
-            else:
-                raise Exception(f"No se pudo crear el estudiante {student_data['student_id']}")
-    
-    @staticmethod
-    def _import_student_grades(student, grades_data, subject_mapping, period):
-        """Importa las calificaciones de un estudiante"""
-        
-        grades_imported = 0
-        
-        for subject_name, grade_value in grades_data.items():
-            subject = subject_mapping.get(subject_name)
-            
-            if not subject:
-                continue
-            
-            try:
-                # Buscar calificación final existente
-                existing_grade = FinalGrade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    period_id=period.id
-                ).first()
-                
-                if existing_grade:
-                    # Actualizar calificación existente
-                    existing_grade.value = grade_value
-                else:
-                    # Crear nueva calificación final
-                    new_grade = FinalGrade(
-                        student_id=student.id,
-                        subject_id=subject.id,
-                        period_id=period.id,
-                        value=grade_value
-                    )
-                    db.session.add(new_grade)
-                
-                grades_imported += 1
-                
-            except Exception as e:
-                logging.error(f"Error importando calificación: {str(e)}")
-                continue
-        
-        return grades_imported
-    
     @staticmethod
     def preview_import_data(file_path, sheet_name=None):
         """
@@ -2,6 +2,7 @@ from openpyxl import load_workbook
 import pandas as pd
 from datetime import datetime
 import re
+from app.services.student_import_service import StudentImportService
 
 class ExcelDataExtractor:
     """Servicio para extraer datos de archivos Excel y convertirlos en datos estructurados"""
@@ -24,9 +25,6 @@ class ExcelDataExtractor:
             if len(df.columns) < 3:
                 raise ValueError("El archivo debe tener al menos 3 columnas: ID, Apellidos, Nombres")
             
-            # Limpiar datos
-            df = df.dropna(subset=[df.columns[0]])  # Eliminar filas sin ID
-            
             extracted_data = {
                 'students': [],
                 'subjects': [],
@@ -38,48 +36,43 @@ class ExcelDataExtractor:
             id_col = columns[0]
             lastname_col = columns[1] 
             firstname_col = columns[2]
-            subject_cols = columns[3:]  # El resto son materias
+            subject_cols = [col for col in columns[3:] if pd.notna(col) and str(col).strip()]  # El resto son materias
             
             # Extraer materias
             for subject_col in subject_cols:
-                if pd.notna(subject_col) and str(subject_col).strip():
-                    extracted_data['subjects'].append({
-                        'name': str(subject_col).strip(),
-                        'code': ExcelDataExtractor._generate_subject_code(str(subject_col))
-                    })
-            
-            # Extraer estudiantes y calificaciones
-            for index, row in df.iterrows():
-                # Datos del estudiante
-                student_id = str(row[id_col]).strip()
-                last_name = str(row[lastname_col]).strip() if pd.notna(row[lastname_col]) else ''
-                first_name = str(row[firstname_col]).strip() if pd.notna(row[firstname_col]) else ''
-                
-                if not student_id or student_id.lower() == 'nan':
-                    continue
-                
-                student_data = {
-                    'student_id': student_id,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'email': ExcelDataExtractor._generate_email(first_name, last_name, student_id),
-                    'grades': {}
+                extracted_data['subjects'].append({
+                    'name': str(subject_col).strip(),
+                    'code': ExcelDataExtractor._generate_subject_code(str(subject_col))
+                })
+            
+            # Datos de los estudiantes, columna por columna
+            student_ids = StudentImportService.clean_text(df[id_col])
+            valid = student_ids.notna()  # Eliminar filas sin ID
+            
+            students = pd.DataFrame({
+                'row': df.index + 2,
+                'student_id': student_ids,
+                'first_name': StudentImportService.clean_text(df[firstname_col]).fillna(''),
+                'last_name': StudentImportService.clean_text(df[lastname_col]).fillna('')
+            }, index=df.index)[valid]
+            
+            students['email'] = ExcelDataExtractor._generate_emails(
+                students['first_name'], students['last_name'], students['student_id']
+            )
+            
+            # Calificaciones: numéricas entre 0 y 100; el resto se conserva como texto
+            raw_grades = df.loc[valid, subject_cols]
+            numeric = raw_grades.apply(pd.to_numeric, errors='coerce')
+            text = raw_grades.astype(str).apply(lambda column: column.str.strip())
+            grades = numeric.where((numeric >= 0) & (numeric <= 100))
+            grades = grades.astype(object).where(numeric.notna(), text.where(raw_grades.notna()))
+            grades.columns = [str(col).strip() for col in subject_cols]
+            
+            grade_records = grades.to_dict('records')
+            for student_data, student_grades in zip(students.to_dict('records'), grade_records):
+                student_data['grades'] = {
+                    subject: value for subject, value in student_grades.items() if pd.notna(value)
                 }
-                
-                # Extraer calificaciones
-                for i, subject_col in enumerate(subject_cols):
-                    if pd.notna(subject_col):
-                        grade_value = row[subject_col]
-                        if pd.notna(grade_value):
-                            try:
-                                # Intentar convertir a número
-                                numeric_grade = float(grade_value)
-                                if 0 <= numeric_grade <= 100:  # Validar rango
-                                    student_data['grades'][str(subject_col).strip()] = numeric_grade
-                            except (ValueError, TypeError):
-                                # Si no es numérico, guardar como texto
-                                student_data['grades'][str(subject_col).strip()] = str(grade_value).strip()
-                
                 extracted_data['students'].append(student_data)
             
             return extracted_data
@@ -98,18 +91,14 @@ class ExcelDataExtractor:
             return ''.join(word[0] for word in words if word)[:4]
     
     @staticmethod
-    def _generate_email(first_name, last_name, student_id):
-        """Genera un email básico para el estudiante"""
-        # Limpiar nombres
-        first_clean = re.sub(r'[^a-zA-Z]', '', first_name.lower())
-        last_clean = re.sub(r'[^a-zA-Z]', '', last_name.lower())
+    def _generate_emails(first_names, last_names, student_ids):
+        """Genera un email básico para cada estudiante (columnas completas)"""
+        first_clean = first_names.str.lower().str.replace(r'[^a-zA-Z]', '', regex=True)
+        last_clean = last_names.str.lower().str.replace(r'[^a-zA-Z]', '', regex=True)
         
-        if first_clean and last_clean:
-            return f"{first_clean}.{last_clean}@estudiante.edu"
-        elif first_clean:
-            return f"{first_clean}.{student_id}@estudiante.edu"
-        else:
-            return f"estudiante.{student_id}@estudiante.edu"
+        emails = 'estudiante.' + student_ids + '@estudiante.edu'
+        emails = emails.where(first_clean == '', first_clean + '.' + student_ids + '@estudiante.edu')
+        return emails.where((first_clean == '') | (last_clean == ''), first_clean + '.' + last_clean + '@estudiante.edu')
     
     @staticmethod
     def analyze_excel_structure(file_path):
@@ -1,6 +1,7 @@
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
 from app.models.templates import ExcelTemplate, TemplateCell, TemplateStyle
+from app.services.template_cache import TemplateCache
 import json
 import os
 
@@ -13,9 +14,11 @@ class ExcelGenerator:
         
         template = ExcelTemplate.query.get_or_404(template_id)
         
-        if template.file_path and os.path.exists(template.file_path):
-            # Cargar plantilla existente
-            wb = load_workbook(template.file_path)
+        compiled = TemplateCache.get(template)
+        
+        if compiled.has_workbook:
+            # Copia de la plantilla ya cargada en la caché
+            wb = compiled.new_workbook()
             ws = wb.active
         else:
             # Crear nuevo workbook
@@ -0,0 +1,126 @@
+from app.models.academic import Student
+from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.services.statistics_service import StatisticsService
+from app.services.report_cache_service import ReportCacheService
+from app.utils.database import bulk_upsert
+from app import db
+from sqlalchemy import func
+from datetime import datetime
+
+
+class FinalGradeService:
+    """Servicio para calcular calificaciones finales por conjuntos (sección, asignatura, período)"""
+
+    @staticmethod
+    def compute_weighted_averages(subject_id, period_id, section_id=None, student_ids=None):
+        """
+        Calcula el promedio ponderado de cada estudiante en una sola consulta agregada
+
+        Args:
+            subject_id: ID de la asignatura
+            period_id: ID del período
+            section_id: Limitar a los estudiantes de esta sección (opcional)
+            student_ids: Limitar a estos estudiantes (opcional)
+
+        Returns:
+            dict: {student_id: promedio ponderado redondeado a 2 decimales}
+        """
+
+        if student_ids is not None and not student_ids:
+            return {}
+
+        # SUM(valor * peso) / SUM(peso) agrupado por estudiante
+        query = db.session.query(
+            StudentGrade.student_id,
+            func.sum(StudentGrade.value * GradeType.weight),
+            func.sum(GradeType.weight)
+        ).join(
+            GradeType, StudentGrade.grade_type_id == GradeType.id
+        ).filter(
+            StudentGrade.subject_id == subject_id,
+            StudentGrade.period_id == period_id
+        )
+
+        if section_id:
+            query = query.join(Student, StudentGrade.student_id == Student.id).filter(
+                Student.section_id == section_id
+            )
+
+        if student_ids is not None:
+            query = query.filter(StudentGrade.student_id.in_(list(student_ids)))
+
+        averages = {}
+        for student_id, total_weighted, total_weight in query.group_by(StudentGrade.student_id):
+            if total_weight:
+                averages[student_id] = round(total_weighted / total_weight, 2)
+
+        return averages
+
+    @staticmethod
+    def recalculate(subject_id, period_id, section_id=None, student_ids=None, commit=True):
+        """
+        Recalcula y guarda las calificaciones finales de una asignatura y período
+
+        Args:
+            subject_id: ID de la asignatura
+            period_id: ID del período
+            section_id: Limitar a los estudiantes de esta sección (opcional)
+            student_ids: Limitar a estos estudiantes (opcional)
+            commit: Confirmar la transacción al terminar; usar False para
+                incluir el recálculo en una transacción mayor
+
+        Returns:
+            dict: {student_id: calificación final calculada}
+        """
+
+        averages = FinalGradeService.compute_weighted_averages(
+            subject_id, period_id, section_id=section_id, student_ids=student_ids
+        )
+
+        FinalGradeService.save_final_grades(subject_id, period_id, averages)
+
+        if commit:
+            db.session.commit()
+
+        return averages
+
+    @staticmethod
+    def save_final_grades(subject_id, period_id, values, comments=None):
+        """
+        Inserta o actualiza en bloque las calificaciones finales
+
+        Args:
+            subject_id: ID de la asignatura
+            period_id: ID del período
+            values: dict {student_id: valor}
+            comments: dict {student_id: comentario} (opcional); sin él se
+                conservan los comentarios existentes
+        """
+
+        if not values:
+            return
+
+        now = datetime.utcnow()
+        rows = [{
+            'student_id': student_id,
+            'subject_id': subject_id,
+            'period_id': period_id,
+            'value': value,
+            'updated_at': now
+        } for student_id, value in values.items()]
+
+        update_columns = ['value', 'updated_at']
+        if comments is not None:
+            for row in rows:
+                row['comments'] = comments.get(row['student_id'])
+            update_columns.append('comments')
+
+        bulk_upsert(
+            FinalGrade, rows,
+            index_elements=['student_id', 'subject_id', 'period_id'],
+            update_columns=update_columns
+        )
+
+        # El upsert no pasa por el ORM: las estadísticas y los reportes se marcan explícitamente
+        StatisticsService.mark_changed(period_id, subject_id)
+        ReportCacheService.mark_students(values.keys(), period_id)
@@ -0,0 +1,189 @@
+from app.models.academic import Student, TeacherAssignment
+from app.models.grades import StudentGrade
+from app.services.final_grade_service import FinalGradeService
+from app.services.report_cache_service import ReportCacheService
+from app.utils.database import bulk_upsert
+from app import db
+from datetime import datetime
+import math
+
+
+class GradeEntryService:
+    """Servicio para guardar planillas completas de calificaciones de una evaluación"""
+
+    @staticmethod
+    def resolve_teacher_id(grade_type, user=None):
+        """
+        Determina el profesor al que se atribuyen las calificaciones nuevas
+
+        Se resuelve una sola vez por planilla: el usuario actual si es profesor,
+        luego el profesor asignado a la asignatura y sección, y por último el
+        profesor de la evaluación.
+        """
+
+        if user is not None and user.is_authenticated and user.is_teacher() and user.teacher_id:
+            return user.teacher_id
+
+        assignment = TeacherAssignment.query.filter_by(
+            subject_id=grade_type.subject_id,
+            section_id=grade_type.section_id
+        ).first()
+
+        if assignment:
+            return assignment.teacher_id
+
+        return grade_type.teacher_id
+
+    @staticmethod
+    def parse_value(raw_value):
+        """Convierte el valor recibido a float; 'NP' cuenta como 0. Retorna None si está vacío"""
+
+        if raw_value is None:
+            return None
+
+        if isinstance(raw_value, str):
+            raw_value = raw_value.strip()
+            if not raw_value:
+                return None
+            if raw_value.upper() == 'NP':
+                return 0.0
+
+        value = float(raw_value)
+        if not math.isfinite(value):
+            raise ValueError('La calificación debe ser un número finito')
+        return value
+
+    @staticmethod
+    def save_grade_sheet(grade_type, entries, teacher_id=None, user=None):
+        """
+        Guarda la planilla de una evaluación en una sola transacción
+
+        Args:
+            grade_type: Evaluación (GradeType) a la que pertenecen las notas
+            entries: Lista de diccionarios {student_id, value, comment}
+            teacher_id: Profesor para las notas nuevas (opcional, se resuelve si falta)
+            user: Usuario que registra las notas (opcional)
+
+        Returns:
+            dict: Resultado con estadísticas y errores por fila. Las filas
+                inválidas se reportan en errors y las válidas se guardan;
+                success es False y database_error True solo si falla el guardado.
+        """
+
+        result = {
+            'success': True,
+            'created': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'final_grades_updated': 0,
+            'errors': [],
+            'database_error': False
+        }
+
+        # Validar y normalizar las filas recibidas
+        values = {}
+        comments = {}
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                result['errors'].append(f"Fila {index + 1}: datos inválidos")
+                continue
+
+            try:
+                student_id = int(entry.get('student_id'))
+                value = GradeEntryService.parse_value(entry.get('value'))
+            except (TypeError, ValueError):
+                result['errors'].append(f"Fila {index + 1}: datos inválidos")
+                continue
+
+            if value is None:
+                continue
+
+            if value < 0 or value > 100:
+                result['errors'].append(f"Fila {index + 1}: la calificación debe estar entre 0 y 100")
+                continue
+
+            values[student_id] = value
+            comments[student_id] = entry.get('comment')
+
+        if not values:
+            return result
+
+        # Estudiantes válidos y calificaciones existentes con una consulta IN cada uno
+        valid_ids = {
+            row[0] for row in db.session.query(Student.id).filter(Student.id.in_(list(values.keys())))
+        }
+
+        existing = {
+            row.student_id: row for row in db.session.query(
+                StudentGrade.student_id, StudentGrade.value, StudentGrade.comments
+            ).filter(
+                StudentGrade.grade_type_id == grade_type.id,
+                StudentGrade.student_id.in_(list(valid_ids))
+            )
+        } if valid_ids else {}
+
+        if teacher_id is None:
+            teacher_id = GradeEntryService.resolve_teacher_id(grade_type, user)
+
+        now = datetime.utcnow()
+        rows = []
+        for student_id, value in values.items():
+            if student_id not in valid_ids:
+                result['errors'].append(f"Estudiante {student_id} no encontrado")
+                continue
+
+            previous = existing.get(student_id)
+            comment = comments[student_id]
+            if comment is None:
+                comment = previous.comments if previous else ''
+
+            if previous and previous.value == value and (previous.comments or '') == (comment or ''):
+                result['unchanged'] += 1
+                continue
+
+            if previous:
+                result['updated'] += 1
+            else:
+                result['created'] += 1
+
+            rows.append({
+                'student_id': student_id,
+                'subject_id': grade_type.subject_id,
+                'grade_type_id': grade_type.id,
+                'period_id': grade_type.period_id,
+                'teacher_id': teacher_id,
+                'value': value,
+                'comments': comment,
+                'updated_at': now
+            })
+
+        if not rows:
+            return result
+
+        try:
+            bulk_upsert(
+                StudentGrade, rows,
+                index_elements=['student_id', 'grade_type_id'],
+                update_columns=['value', 'comments', 'updated_at']
+            )
+            ReportCacheService.mark_sections([grade_type.section_id], grade_type.period_id)
+
+            # Recalcular solo las calificaciones finales de los estudiantes afectados
+            finals = FinalGradeService.recalculate(
+                grade_type.subject_id, grade_type.period_id,
+                student_ids=[row['student_id'] for row in rows],
+                commit=False
+            )
+            result['final_grades_updated'] = len(finals)
+
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            result['success'] = False
+            result['database_error'] = True
+            result['created'] = 0
+            result['updated'] = 0
+            result['errors'].append(str(e))
+
+        return result
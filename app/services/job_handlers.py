@@ -0,0 +1,143 @@
+from app.models.academic import AcademicYear, Period, Section, TeacherAssignment
+from app.models.templates import ExcelTemplate
+from app.services.job_service import JobService
+from app.services.student_import_service import StudentImportService
+from app.services.batch_report_service import BatchReportService
+from app.services.streaming_export_service import StreamingExportService
+from app.services.final_grade_service import FinalGradeService
+from app.services.section_gradebook import SectionGradebook
+from app.services.template_service import TemplateService
+from app.utils.pdf import report_cards, render_report_cards_pdf, write_report_cards_zip
+from app import db
+import os
+
+# Manejadores de los trabajos en segundo plano. Cada uno recibe el JobContext
+# y los parámetros guardados en Job.params, y retorna un resumen serializable.
+
+
+@JobService.handler('import_students', timeout_config='IMPORT_TIMEOUT')
+def import_students(ctx, file_path, section_id):
+    """Importa estudiantes desde un archivo subido en /import"""
+
+    try:
+        return StudentImportService.import_students_file(file_path, section_id, progress=ctx.progress)
+    finally:
+        # El archivo subido es temporal
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+@JobService.handler('batch_template_report')
+def batch_template_report(ctx, template_id, period_ids, section_ids):
+    """Genera el ZIP de reportes con plantilla para varias secciones y períodos"""
+
+    template = db.session.get(ExcelTemplate, template_id)
+    if template is None:
+        raise ValueError('La plantilla no existe')
+
+    periods = Period.query.filter(Period.id.in_(period_ids)).order_by(Period.start_date, Period.id).all()
+    sections = Section.query.filter(Section.id.in_(section_ids)).all()
+    order = {section_id: position for position, section_id in enumerate(section_ids)}
+    sections.sort(key=lambda section: order[section.id])
+
+    download_name = f"Reportes_{template.name.replace(' ', '_')}.zip"
+
+    return BatchReportService.generate(
+        template, periods, sections, ctx.output_path(download_name),
+        progress=lambda done, total, filename, error: ctx.progress(done, total, filename)
+    )
+
+
+@JobService.handler('analyze_template')
+def analyze_template(ctx, template_id):
+    """Analiza las celdas, estilos y dimensiones del archivo de una plantilla subida"""
+
+    template = db.session.get(ExcelTemplate, template_id)
+    if template is None or not template.file_path:
+        raise ValueError('La plantilla no tiene archivo')
+
+    return TemplateService.analyze_template_structure(template.id, template.file_path, progress=ctx.progress)
+
+
+@JobService.handler('report_cards')
+def report_cards_batch(ctx, period_id, section_ids, format='zip'):
+    """Genera las boletas de varias secciones: un ZIP con un PDF por estudiante o un único PDF"""
+
+    period = db.session.get(Period, period_id)
+    if period is None:
+        raise ValueError('El período no existe')
+
+    sections = Section.query.filter(Section.id.in_(section_ids)).all()
+    order = {section_id: position for position, section_id in enumerate(section_ids)}
+    sections.sort(key=lambda section: order[section.id])
+
+    # Todas las matrices del período con tres consultas
+    gradebooks = SectionGradebook.load_many(sections, period)
+    cards = []
+    for section in sections:
+        cards.extend(report_cards(gradebooks[section.id]))
+
+    if not cards:
+        raise ValueError('Las secciones no tienen estudiantes activos')
+
+    download_name = f"Boletas_{period.name.replace(' ', '_')}"
+
+    if format == 'pdf':
+        ctx.progress(0, len(cards), 'Generando documento')
+        with open(ctx.output_path(f'{download_name}.pdf'), 'wb') as output:
+            output.write(render_report_cards_pdf(cards))
+        ctx.progress(len(cards), len(cards), 'Archivo generado')
+    else:
+        write_report_cards_zip(
+            cards, ctx.output_path(f'{download_name}.zip'),
+            progress=lambda done, total, filename: ctx.progress(done, total, filename)
+        )
+
+    return {'sections': len(sections), 'report_cards': len(cards)}
+
+
+@JobService.handler('school_excel_export')
+def school_excel_export(ctx, academic_year_id):
+    """Exporta todas las calificaciones finales de un año académico"""
+
+    academic_year = db.session.get(AcademicYear, academic_year_id)
+    if academic_year is None:
+        raise ValueError('El año académico no existe')
+
+    wb, total_rows = StreamingExportService.build_school_workbook(
+        academic_year,
+        progress=lambda rows: ctx.progress(rows, message=f'{rows} filas escritas')
+    )
+
+    download_name = f"Calificaciones_{academic_year.name.replace(' ', '_')}.xlsx"
+    wb.save(ctx.output_path(download_name))
+    ctx.progress(total_rows, total_rows, 'Archivo generado')
+
+    return {'rows': total_rows}
+
+
+@JobService.handler('recalculate_final_grades')
+def recalculate_final_grades(ctx, period_id, section_id=None):
+    """Recalcula las calificaciones finales de un período, por sección y asignatura"""
+
+    period = db.session.get(Period, period_id)
+    if period is None:
+        raise ValueError('El período no existe')
+
+    query = db.session.query(
+        TeacherAssignment.section_id, TeacherAssignment.subject_id
+    ).filter_by(academic_year_id=period.academic_year_id).distinct()
+
+    if section_id:
+        query = query.filter(TeacherAssignment.section_id == section_id)
+
+    pairs = query.all()
+    students = 0
+
+    # Un commit por sección y asignatura: lo ya recalculado se conserva si se cancela
+    for position, (pair_section_id, subject_id) in enumerate(pairs, 1):
+        averages = FinalGradeService.recalculate(subject_id, period.id, section_id=pair_section_id)
+        students += len(averages)
+        ctx.progress(position, len(pairs), f'{position} de {len(pairs)} asignaturas')
+
+    return {'assignments': len(pairs), 'final_grades': students}
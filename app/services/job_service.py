@@ -0,0 +1,340 @@
+from app.models.jobs import Job
+from app import db
+from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.utils import secure_filename
+from datetime import datetime, timedelta
+import threading
+import json
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """El usuario canceló el trabajo"""
+
+
+class JobTimeout(Exception):
+    """El trabajo superó su tiempo límite"""
+
+
+class JobContext:
+    """
+    Objeto que recibe cada manejador de trabajo para reportar progreso
+
+    Cada llamada a progress() o check() verifica la cancelación y el tiempo
+    límite, por lo que los manejadores deben llamarlos con frecuencia.
+    """
+
+    # Intervalo mínimo entre escrituras de progreso / lecturas de cancelación
+    PERSIST_INTERVAL = 1.0
+
+    def __init__(self, job_id, timeout):
+        self.job_id = job_id
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.result_path = None
+        self.result_name = None
+        self.current = 0
+        self.total = 0
+        self._last_persist = 0.0
+        self._last_cancel_check = time.monotonic()
+
+    def check(self):
+        """Lanza JobTimeout o JobCancelled si corresponde"""
+
+        now = time.monotonic()
+
+        if self.deadline is not None and now > self.deadline:
+            raise JobTimeout(f'Tiempo límite excedido ({self.timeout} s)')
+
+        if now - self._last_cancel_check >= self.PERSIST_INTERVAL:
+            self._last_cancel_check = now
+            if JobService.is_cancel_requested(self.job_id):
+                raise JobCancelled()
+
+    def progress(self, current, total=None, message=None):
+        """
+        Registra el avance del trabajo
+
+        Args:
+            current: Unidades completadas
+            total: Total de unidades (opcional si no cambia)
+            message: Texto descriptivo del paso actual
+        """
+
+        self.current = current
+        if total is not None:
+            self.total = total
+
+        now = time.monotonic()
+        if now - self._last_persist >= self.PERSIST_INTERVAL or (self.total and current >= self.total):
+            self._last_persist = now
+            values = {
+                'progress_current': current,
+                'progress_total': self.total,
+                'heartbeat_at': datetime.utcnow()
+            }
+            if message is not None:
+                values['message'] = str(message)[:255]
+            JobService.update(self.job_id, best_effort=True, **values)
+
+        self.check()
+
+    def output_path(self, download_name):
+        """
+        Ruta en EXPORTS_FOLDER para el archivo resultado del trabajo
+
+        Args:
+            download_name: Nombre con el que se descargará el archivo
+        """
+
+        exports_dir = JobService.exports_dir()
+        filename = secure_filename(f'job_{self.job_id}_{download_name}') or f'job_{self.job_id}'
+        self.result_path = os.path.join(exports_dir, filename)
+        self.result_name = download_name
+        return self.result_path
+
+
+class JobService:
+    """
+    Cola de trabajos en segundo plano dentro del proceso, sin broker externo
+
+    Los trabajos se guardan en la tabla jobs y se ejecutan en un pool de hilos
+    (JOB_WORKERS por proceso). El estado se consulta por /jobs/<id> y la
+    cancelación se solicita marcando cancel_requested, lo que funciona aunque
+    el trabajo corra en otro proceso de gunicorn.
+    """
+
+    # job_type -> (función, clave de configuración del tiempo límite)
+    _handlers = {}
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def handler(job_type, timeout_config='JOB_TIMEOUT'):
+        """
+        Registra la función que ejecuta un tipo de trabajo
+
+        La función recibe un JobContext y los parámetros del trabajo como
+        argumentos con nombre, y retorna un diccionario con el resumen.
+        """
+
+        def decorator(func):
+            JobService._handlers[job_type] = (func, timeout_config)
+            return func
+
+        return decorator
+
+    @staticmethod
+    def exports_dir():
+        exports_dir = current_app.config.get('EXPORTS_FOLDER') or os.path.join('uploads', 'exports')
+        os.makedirs(exports_dir, exist_ok=True)
+        return exports_dir
+
+    @staticmethod
+    def _get_executor():
+        with JobService._executor_lock:
+            if JobService._executor is None:
+                JobService._executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('JOB_WORKERS', 2),
+                    thread_name_prefix='job-worker'
+                )
+            return JobService._executor
+
+    @staticmethod
+    def submit(job_type, params=None, user_id=None):
+        """
+        Crea un trabajo y lo encola para su ejecución
+
+        El trabajo se inserta en una transacción propia, como en update(): la
+        sesión de quien lo llama no se confirma ni se descarta. Los datos que
+        el trabajo deba leer tienen que estar confirmados antes de llamarlo (en
+        SQLite, además, una escritura sin confirmar bloquea esta inserción).
+
+        Args:
+            job_type: Tipo registrado con JobService.handler
+            params: Diccionario serializable en JSON
+            user_id: Usuario que lo solicita
+
+        Returns:
+            Job: Fuera de la sesión; solo para leer sus atributos (id)
+        """
+
+        if job_type not in JobService._handlers:
+            raise ValueError(f'Tipo de trabajo desconocido: {job_type}')
+
+        try:
+            JobService.cleanup_expired()
+        except Exception:
+            logger.exception('Error limpiando trabajos expirados')
+
+        job = Job(job_type=job_type, status=Job.PENDING, created_by=user_id, created_at=datetime.utcnow())
+        job.set_params(params or {})
+
+        with db.engine.begin() as connection:
+            job.id = connection.execute(
+                Job.__table__.insert().values(
+                    job_type=job.job_type, status=job.status, params=job.params,
+                    created_by=job.created_by, created_at=job.created_at
+                )
+            ).inserted_primary_key[0]
+        job_id = job.id
+
+        app = current_app._get_current_object()
+
+        if current_app.config.get('JOBS_RUN_INLINE'):
+            JobService.run(job_id, app)
+        else:
+            JobService._get_executor().submit(JobService.run, job_id, app)
+
+        return job
+
+    @staticmethod
+    def update(job_id, best_effort=False, **values):
+        """
+        Actualiza un trabajo en una transacción propia, independiente de la
+        sesión que usa el manejador para sus datos
+        """
+
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(
+                    Job.__table__.update().where(Job.__table__.c.id == job_id).values(**values)
+                )
+        except SQLAlchemyError:
+            if not best_effort:
+                raise
+            logger.warning('No se pudo actualizar el progreso del trabajo %s', job_id)
+
+    @staticmethod
+    def is_cancel_requested(job_id):
+        try:
+            with db.engine.connect() as connection:
+                return bool(connection.execute(
+                    db.select(Job.__table__.c.cancel_requested).where(Job.__table__.c.id == job_id)
+                ).scalar())
+        except SQLAlchemyError:
+            return False
+
+    @staticmethod
+    def run(job_id, app):
+        """Ejecuta un trabajo; se llama desde un hilo del pool"""
+
+        with app.app_context():
+            try:
+                job = db.session.get(Job, job_id)
+                if job is None or job.status != Job.PENDING:
+                    return
+
+                now = datetime.utcnow()
+
+                if job.cancel_requested:
+                    JobService.update(job_id, status=Job.CANCELLED, finished_at=now)
+                    return
+
+                func, timeout_config = JobService._handlers[job.job_type]
+                params = job.get_params()
+                timeout = app.config.get(timeout_config) or app.config.get('JOB_TIMEOUT')
+
+                JobService.update(job_id, status=Job.RUNNING, started_at=now, heartbeat_at=now)
+                db.session.expire_all()
+
+                context = JobContext(job_id, timeout)
+                status = Job.COMPLETED
+                values = {}
+
+                try:
+                    result = func(context, **params) or {}
+                    db.session.commit()
+                    values['result'] = json.dumps(result, default=str)
+                    if context.result_path and os.path.exists(context.result_path):
+                        values['result_path'] = context.result_path
+                        values['result_name'] = context.result_name
+                    values['progress_current'] = context.total or context.current
+                    values['progress_total'] = context.total
+                except JobCancelled:
+                    db.session.rollback()
+                    status = Job.CANCELLED
+                    values['message'] = 'Cancelado por el usuario'
+                except JobTimeout as e:
+                    db.session.rollback()
+                    status = Job.FAILED
+                    values['error'] = str(e)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.exception('Error en el trabajo %s (%s)', job_id, job.job_type)
+                    status = Job.FAILED
+                    values['error'] = str(e)
+
+                if status != Job.COMPLETED and context.result_path and os.path.exists(context.result_path):
+                    os.remove(context.result_path)
+
+                JobService.update(job_id, status=status, finished_at=datetime.utcnow(), **values)
+
+            except Exception:
+                logger.exception('Error ejecutando el trabajo %s', job_id)
+                JobService.update(
+                    job_id, best_effort=True,
+                    status=Job.FAILED, error='Error interno al ejecutar el trabajo',
+                    finished_at=datetime.utcnow()
+                )
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def request_cancel(job):
+        """Solicita la cancelación; los trabajos pendientes se cancelan de inmediato"""
+
+        if job.is_finished:
+            return False
+
+        job.cancel_requested = True
+        if job.status == Job.PENDING:
+            job.status = Job.CANCELLED
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def cleanup_expired():
+        """
+        Elimina los archivos de resultado vencidos y marca como fallidos los
+        trabajos cuyo proceso dejó de responder
+        """
+
+        now = datetime.utcnow()
+        retention = timedelta(hours=current_app.config.get('JOB_RESULT_RETENTION_HOURS', 24))
+        stale_limit = now - timedelta(seconds=current_app.config.get('JOB_TIMEOUT', 1800) + 60)
+        table = Job.__table__
+
+        # Transacción propia: se llama desde submit() con la sesión de la solicitud abierta
+        with db.engine.begin() as connection:
+            expired = connection.execute(
+                db.select(table.c.id, table.c.result_path).where(
+                    table.c.result_path.isnot(None),
+                    table.c.finished_at < now - retention
+                )
+            ).all()
+
+            for _, result_path in expired:
+                if os.path.exists(result_path):
+                    os.remove(result_path)
+
+            if expired:
+                connection.execute(
+                    table.update().where(table.c.id.in_([job_id for job_id, _ in expired])).values(result_path=None)
+                )
+
+            # Un trabajo sin latido por más que el tiempo límite quedó huérfano
+            connection.execute(
+                table.update().where(
+                    table.c.status.in_([Job.PENDING, Job.RUNNING]),
+                    db.func.coalesce(table.c.heartbeat_at, table.c.created_at) < stale_limit
+                ).values(status=Job.FAILED, error='El trabajo fue interrumpido', finished_at=now)
+            )
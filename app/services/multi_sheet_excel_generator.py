@@ -2,6 +2,7 @@ from app.services.excel_generator import ExcelGenerator
 from openpyxl import Workbook
 from io import BytesIO
 import tempfile
+from app.utils.excel import register_report_styles, HEADER_STYLE, CELL_STYLE, GRADE_STYLE
 
 class MultiSheetExcelGenerator:
     
@@ -48,55 +49,28 @@ class MultiSheetExcelGenerator:
     def _add_grades_sheet(wb, students, subjects, grades_data):
         """Agrega una hoja con los datos de calificaciones"""
         
+        # Estilos con nombre registrados una sola vez en el libro
+        register_report_styles(wb)
+        
         # Crear nueva hoja
         ws = wb.create_sheet("Calificaciones")
         
         # Encabezados
         headers = ['ID', 'Apellidos', 'Nombres'] + [subject.name for subject in subjects]
         for col, header in enumerate(headers, 1):
-            ws.cell(row=1, column=col, value=header)
+            ws.cell(row=1, column=col, value=header).style = HEADER_STYLE
         
-        # Datos de estudiantes y calificaciones
+        # Datos de estudiantes y calificaciones, con su estilo en la misma pasada
         for row, student in enumerate(students, 2):
-            ws.cell(row=row, column=1, value=student.student_id)
-            ws.cell(row=row, column=2, value=student.last_name)
-            ws.cell(row=row, column=3, value=student.first_name)
+            ws.cell(row=row, column=1, value=student.student_id).style = CELL_STYLE
+            ws.cell(row=row, column=2, value=student.last_name).style = CELL_STYLE
+            ws.cell(row=row, column=3, value=student.first_name).style = CELL_STYLE
             
             # Calificaciones por materia
+            student_grades = grades_data.get(student.id, {})
             for col, subject in enumerate(subjects, 4):
-                grade = grades_data.get(student.id, {}).get(subject.id, '')
-                ws.cell(row=row, column=col, value=grade)
-        
-        # Aplicar estilos básicos
-        MultiSheetExcelGenerator._apply_basic_styles(ws, len(headers), len(students) + 1)
-    
-    @staticmethod
-    def _apply_basic_styles(ws, num_cols, num_rows):
-        """Aplica estilos básicos a una hoja"""
-        
-        from openpyxl.styles import Font, PatternFill, Border, Side
-        
-        # Estilo para encabezados
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Aplicar a la primera fila
-        for col in range(1, num_cols + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-        
-        # Bordes para toda la tabla
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        for row in range(1, num_rows + 1):
-            for col in range(1, num_cols + 1):
-                ws.cell(row=row, column=col).border = thin_border
+                grade = student_grades.get(subject.id, '')
+                ws.cell(row=row, column=col, value=grade).style = GRADE_STYLE
     
     @staticmethod
     def generate_to_file(wb):
@@ -0,0 +1,259 @@
+from app.models.academic import AcademicYear, Period, Grade, Section, Subject, subject_grade
+from app import db
+from flask import current_app, g, has_request_context
+from sqlalchemy import event, select
+from collections import namedtuple
+from types import MappingProxyType
+import threading
+import time
+
+
+# Filas inmutables que reciben las vistas y los `choices` de los formularios
+GradeRef = namedtuple('GradeRef', 'id name level sections')
+SectionRef = namedtuple('SectionRef', 'id name grade_id grade_name grade_level')
+SubjectRef = namedtuple('SubjectRef', 'id name code description grade_ids')
+YearRef = namedtuple('YearRef', 'id name start_date end_date is_active')
+PeriodRef = namedtuple('PeriodRef', 'id name start_date end_date academic_year_id')
+
+# Entidades cuyas escrituras invalidan la caché
+TRACKED = (AcademicYear, Period, Grade, Section, Subject)
+TRACKED_TABLES = frozenset(entity.__table__.name for entity in TRACKED) | {subject_grade.name}
+
+
+class ReferenceData:
+    """
+    Instantánea de los datos de referencia: grados, secciones, asignaturas,
+    años académicos y períodos
+
+    Todo son tuplas y namedtuples; la misma instancia se comparte entre
+    solicitudes y entre hilos, así que nunca se modifica.
+    """
+
+    def __init__(self, version, grades, sections, subjects, academic_years, periods):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.grades = grades
+        self.sections = sections
+        self.subjects = subjects
+        self.academic_years = academic_years
+        self.periods = periods
+        self.active_year = next((year for year in academic_years if year.is_active), None)
+
+        self._grades = MappingProxyType({grade.id: grade for grade in grades})
+        self._sections = MappingProxyType({section.id: section for section in sections})
+        self._subjects = MappingProxyType({subject.id: subject for subject in subjects})
+        self._years = MappingProxyType({year.id: year for year in academic_years})
+        by_year = {}
+        for period in periods:
+            by_year.setdefault(period.academic_year_id, []).append(period)
+        self._periods_by_year = MappingProxyType({key: tuple(value) for key, value in by_year.items()})
+
+    @classmethod
+    def load(cls, version):
+        rows = db.session.execute(
+            select(Grade.id, Grade.name, Grade.level, Section.id, Section.name)
+            .outerjoin(Section, Section.grade_id == Grade.id)
+            .order_by(Grade.level, Grade.name, Section.name, Section.id)
+        ).all()
+
+        grade_rows = {}
+        sections = []
+        for grade_id, grade_name, grade_level, section_id, section_name in rows:
+            grade = grade_rows.setdefault(grade_id, (grade_name, grade_level, []))
+            if section_id is not None:
+                section = SectionRef(section_id, section_name, grade_id, grade_name, grade_level)
+                grade[2].append(section)
+                sections.append(section)
+        grades = tuple(
+            GradeRef(grade_id, name, level, tuple(grade_sections))
+            for grade_id, (name, level, grade_sections) in grade_rows.items()
+        )
+
+        subject_grades = {}
+        for subject_id, grade_id in db.session.execute(select(subject_grade.c.subject_id, subject_grade.c.grade_id)):
+            subject_grades.setdefault(subject_id, []).append(grade_id)
+        subjects = tuple(
+            SubjectRef(subject_id, name, code, description, tuple(sorted(subject_grades.get(subject_id, ()))))
+            for subject_id, name, code, description in db.session.execute(
+                select(Subject.id, Subject.name, Subject.code, Subject.description).order_by(Subject.name, Subject.id)
+            )
+        )
+
+        academic_years = tuple(YearRef(*row) for row in db.session.execute(
+            select(AcademicYear.id, AcademicYear.name, AcademicYear.start_date, AcademicYear.end_date,
+                   AcademicYear.is_active).order_by(AcademicYear.start_date.desc(), AcademicYear.id.desc())
+        ))
+
+        periods = tuple(PeriodRef(*row) for row in db.session.execute(
+            select(Period.id, Period.name, Period.start_date, Period.end_date, Period.academic_year_id)
+            .order_by(Period.start_date, Period.id)
+        ))
+
+        return cls(version, grades, tuple(sections), subjects, academic_years, periods)
+
+    # ------------------------------------------------------------------
+    # Búsquedas
+    # ------------------------------------------------------------------
+
+    def grade(self, grade_id):
+        return self._grades.get(grade_id)
+
+    def section(self, section_id):
+        return self._sections.get(section_id)
+
+    def subject(self, subject_id):
+        return self._subjects.get(subject_id)
+
+    def academic_year(self, year_id):
+        return self._years.get(year_id)
+
+    def periods_of(self, year_id):
+        """Períodos de un año académico ordenados por fecha de inicio"""
+
+        return self._periods_by_year.get(year_id, ())
+
+    @property
+    def active_periods(self):
+        return self.periods_of(self.active_year.id) if self.active_year else ()
+
+    def sections_of(self, grade_id):
+        grade = self._grades.get(grade_id)
+        return grade.sections if grade else ()
+
+    def subjects_of(self, grade_id):
+        return tuple(subject for subject in self.subjects if grade_id in subject.grade_ids)
+
+    # ------------------------------------------------------------------
+    # Opciones de formularios
+    # ------------------------------------------------------------------
+
+    def section_choices(self):
+        """Opciones (id, "Grado 'Sección'") para los SelectField de sección"""
+
+        return [(section.id, f"{section.grade_name} '{section.name}'") for section in self.sections]
+
+    def year_choices(self):
+        return [(year.id, year.name) for year in self.academic_years]
+
+
+class ReferenceDataService:
+    """
+    Caché por proceso de los datos de referencia (ver ReferenceData)
+
+    La instantánea lleva el número de versión con el que se cargó. Cualquier
+    commit que inserte, modifique o elimine grados, secciones, asignaturas,
+    años o períodos incrementa la versión (eventos de sesión, incluidos los
+    UPDATE / DELETE en bloque), y la siguiente lectura recarga. Dentro de
+    una solicitud se usa siempre la misma instantánea (flask.g).
+
+    La invalidación solo llega al proceso que hizo la escritura; con varios
+    workers, REFERENCE_DATA_TTL acota cuánto tiempo puede servir cada uno
+    datos anteriores.
+    """
+
+    SESSION_KEY = 'reference_data_dirty'
+
+    _lock = threading.Lock()
+    _snapshots = {}  # Por motor de base de datos (una entrada por aplicación)
+    _version = 0
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def get():
+        """Instantánea vigente (la de la solicitud en curso si ya se pidió)"""
+
+        if has_request_context():
+            cached = g.get('reference_data')
+            if cached is not None and cached.version == ReferenceDataService._version:
+                return cached
+
+        ttl = current_app.config.get('REFERENCE_DATA_TTL', 60)
+
+        key = id(db.engine)
+
+        with ReferenceDataService._lock:
+            snapshot = ReferenceDataService._snapshots.get(key)
+            version = ReferenceDataService._version
+            if snapshot is not None and snapshot.version == version and time.monotonic() - snapshot.loaded_at < ttl:
+                ReferenceDataService.hits += 1
+            else:
+                snapshot = None
+
+        if snapshot is None:
+            snapshot = ReferenceData.load(version)
+            with ReferenceDataService._lock:
+                ReferenceDataService.misses += 1
+                # Una escritura durante la carga deja la instantánea sin guardar
+                if ReferenceDataService._version == version:
+                    ReferenceDataService._snapshots[key] = snapshot
+
+        if has_request_context():
+            g.reference_data = snapshot
+        return snapshot
+
+    @staticmethod
+    def version():
+        """Versión actual de los datos de referencia en este proceso"""
+
+        return ReferenceDataService._version
+
+    @staticmethod
+    def invalidate():
+        with ReferenceDataService._lock:
+            ReferenceDataService._version += 1
+            ReferenceDataService._snapshots.clear()
+
+    @staticmethod
+    def stats():
+        with ReferenceDataService._lock:
+            return {
+                'version': ReferenceDataService._version,
+                'size': len(ReferenceDataService._snapshots),
+                'hits': ReferenceDataService.hits,
+                'misses': ReferenceDataService.misses
+            }
+
+    @staticmethod
+    def mark_dirty(session=None):
+        """Marca la transacción actual como escritura de datos de referencia"""
+
+        session = session or db.session
+        session.info[ReferenceDataService.SESSION_KEY] = True
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, TRACKED):
+                session.info[ReferenceDataService.SESSION_KEY] = True
+                return
+
+    @staticmethod
+    def _do_orm_execute(orm_execute_state):
+        # Model.query.update(...) / .delete() no pasan por el flush
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and mapper.local_table.name in TRACKED_TABLES:
+                ReferenceDataService.mark_dirty(orm_execute_state.session)
+
+    @staticmethod
+    def _after_commit(session):
+        if session.info.pop(ReferenceDataService.SESSION_KEY, False):
+            ReferenceDataService.invalidate()
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop(ReferenceDataService.SESSION_KEY, None)
+
+    @staticmethod
+    def install(session):
+        """Registra los eventos de sesión que invalidan la caché"""
+
+        for name, handler in (
+            ('after_flush', ReferenceDataService._after_flush),
+            ('do_orm_execute', ReferenceDataService._do_orm_execute),
+            ('after_commit', ReferenceDataService._after_commit),
+            ('after_rollback', ReferenceDataService._after_rollback),
+        ):
+            if not event.contains(session, name, handler):
+                event.listen(session, name, handler)
@@ -0,0 +1,409 @@
+from app.models.academic import Period, Grade, Section, Subject, Student, TeacherAssignment, subject_grade
+from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.models.statistics import ReportVersion
+from app.utils.database import UPSERT_CHUNK_SIZE
+from app import db
+from flask import current_app
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+import threading
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger('app.reports')
+
+# Escrituras que cambian los datos de una sección en un período
+SECTION_ENTITIES = (StudentGrade, FinalGrade, GradeType, Student)
+
+# Escrituras que cambian nombres o asignaturas de todos los reportes (poco frecuentes)
+GLOBAL_ENTITIES = (Period, Grade, Section, Subject, TeacherAssignment)
+
+TRACKED_TABLES = frozenset(
+    entity.__table__.name for entity in SECTION_ENTITIES + GLOBAL_ENTITIES
+) | {subject_grade.name}
+
+
+class ReportCacheService:
+    """
+    Caché en disco de los reportes de sección (Excel, PDF, plantillas y datos
+    de la vista del reporte)
+
+    La clave de cada archivo combina el tipo de reporte, la sección, el
+    período, la plantilla (ID y huella) y la versión de datos de la sección
+    en el período (tabla report_versions). La versión se incrementa en la
+    misma transacción que escribe calificaciones, evaluaciones o estudiantes:
+
+    - Cambios por el ORM se detectan en before_flush / after_flush.
+    - Las escrituras en bloque (bulk_upsert, bulk_*_mappings) llaman a
+      mark_sections / mark_students explícitamente.
+    - UPDATE / DELETE en bloque sobre esas tablas, y cualquier cambio en
+      períodos, grados, secciones, asignaturas o asignaciones, incrementan
+      la versión de todas las secciones.
+
+    Como la versión vive en la base de datos, todos los procesos ven la
+    misma y comparten los archivos de REPORT_CACHE_FOLDER. Una descarga
+    repetida sin cambios cuesta una consulta y la lectura del archivo. Al
+    superar REPORT_CACHE_MAX_MB se eliminan los archivos usados hace más
+    tiempo (cada acierto actualiza la fecha de modificación del archivo).
+    """
+
+    SESSION_KEY = '_report_versions'
+    ALL = 'all'
+
+    _lock = threading.Lock()
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    # ------------------------------------------------------------------
+    # Versión de datos
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def data_version(section_id, period_id):
+        """Versión de datos de una sección en un período (0 si nunca cambió)"""
+
+        version = db.session.execute(
+            select(ReportVersion.version).where(
+                ReportVersion.section_id == section_id,
+                ReportVersion.period_id == period_id
+            )
+        ).scalar()
+        return version or 0
+
+    @staticmethod
+    def _pending(session):
+        return session.info.setdefault(ReportCacheService.SESSION_KEY, set())
+
+    @staticmethod
+    def mark_sections(section_ids, period_id=None, session=None):
+        """
+        Marca secciones para incrementar su versión antes del commit
+
+        Args:
+            section_ids: IDs de las secciones
+            period_id: Período afectado; None = todos los períodos
+        """
+
+        session = session or db.session
+        ReportCacheService._pending(session).update(
+            (section_id, period_id) for section_id in section_ids if section_id is not None
+        )
+
+    @staticmethod
+    def mark_students(student_ids, period_id=None, session=None):
+        """
+        Marca las secciones actuales de estos estudiantes
+
+        La sección se consulta al marcar: antes de mover estudiantes de
+        sección se marca la de origen, después la de destino.
+        """
+
+        session = session or db.session
+        student_ids = list(student_ids)
+        if not student_ids:
+            return
+
+        with session.no_autoflush:
+            section_ids = session.execute(
+                select(Student.section_id).where(Student.id.in_(student_ids)).distinct()
+            ).scalars().all()
+
+        ReportCacheService.mark_sections(section_ids, period_id, session)
+
+    @staticmethod
+    def mark_all(session=None):
+        session = session or db.session
+        ReportCacheService._pending(session).add(ReportCacheService.ALL)
+
+    @staticmethod
+    def _before_flush(session, flush_context, instances):
+        # Sección de origen de los estudiantes que se mueven o se eliminan: se
+        # consulta antes de que el flush la cambie
+        moved = [obj.id for obj in session.deleted if isinstance(obj, Student)]
+        moved.extend(
+            obj.id for obj in session.dirty
+            if isinstance(obj, Student) and obj.id is not None
+            and db.inspect(obj).attrs.section_id.history.has_changes()
+        )
+        if moved:
+            ReportCacheService.mark_students(moved, session=session)
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        students = {}
+
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+
+            if isinstance(obj, GLOBAL_ENTITIES):
+                ReportCacheService.mark_all(session)
+                return
+
+            if isinstance(obj, (StudentGrade, FinalGrade)):
+                students.setdefault(obj.period_id, set()).add(obj.student_id)
+
+            elif isinstance(obj, GradeType):
+                ReportCacheService.mark_sections([obj.section_id], obj.period_id, session)
+
+            elif isinstance(obj, Student) and obj not in session.deleted:
+                ReportCacheService.mark_sections([obj.section_id], session=session)
+
+        for period_id, student_ids in students.items():
+            ReportCacheService.mark_students(student_ids, period_id, session)
+
+    @staticmethod
+    def _do_orm_execute(orm_execute_state):
+        # Model.query.update(...) / .delete() no pasan por el flush
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and mapper.local_table.name in TRACKED_TABLES:
+                ReportCacheService.mark_all(orm_execute_state.session)
+
+    @staticmethod
+    def _before_commit(session):
+        if not session.info.get(ReportCacheService.SESSION_KEY) and not (session.new or session.dirty or session.deleted):
+            return
+
+        # El flush puede marcar más secciones (after_flush)
+        session.flush()
+
+        pending = session.info.pop(ReportCacheService.SESSION_KEY, None)
+        if pending:
+            ReportCacheService.bump(pending, session)
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop(ReportCacheService.SESSION_KEY, None)
+
+    @staticmethod
+    def install(session):
+        """Registra los eventos de sesión que mantienen report_versions"""
+
+        for name, handler in (
+            ('before_flush', ReportCacheService._before_flush),
+            ('after_flush', ReportCacheService._after_flush),
+            ('do_orm_execute', ReportCacheService._do_orm_execute),
+            ('before_commit', ReportCacheService._before_commit),
+            ('after_rollback', ReportCacheService._after_rollback),
+        ):
+            if not event.contains(session, name, handler):
+                event.listen(session, name, handler)
+
+    @staticmethod
+    def bump(pending, session=None):
+        """
+        Incrementa la versión de los pares (sección, período) marcados
+
+        Los pares con período None se extienden a todos los períodos y ALL a
+        todas las secciones, de modo que cada par afectado tenga su fila.
+
+        Returns:
+            int: Pares incrementados
+        """
+
+        session = session or db.session
+
+        with session.no_autoflush:
+            if ReportCacheService.ALL in pending:
+                section_ids = session.execute(select(Section.id)).scalars().all()
+                pending = {(section_id, None) for section_id in section_ids}
+
+            keys = {key for key in pending if key[1] is not None}
+            whole_sections = {section_id for section_id, period_id in pending if period_id is None}
+            if whole_sections:
+                period_ids = session.execute(select(Period.id)).scalars().all()
+                keys.update((section_id, period_id) for section_id in whole_sections for period_id in period_ids)
+
+        if not keys:
+            return 0
+
+        keys = sorted(keys)
+        now = datetime.utcnow()
+        table = ReportVersion.__table__
+        dialect = session.get_bind().dialect.name
+
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+                chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+                stmt = insert(table).values([
+                    {'section_id': section_id, 'period_id': period_id, 'version': 1, 'updated_at': now}
+                    for section_id, period_id in chunk
+                ])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['section_id', 'period_id'],
+                    set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at}
+                )
+                session.execute(stmt)
+            return len(keys)
+
+        # Motores sin ON CONFLICT: UPDATE de las filas existentes e INSERT del resto
+        key_columns = tuple_(table.c.section_id, table.c.period_id)
+        for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+            chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+            session.execute(
+                table.update().where(key_columns.in_(chunk)).values(version=table.c.version + 1, updated_at=now)
+            )
+            existing = set(session.execute(select(table.c.section_id, table.c.period_id).where(key_columns.in_(chunk))))
+            missing = [key for key in chunk if key not in existing]
+            if missing:
+                session.execute(table.insert(), [
+                    {'section_id': section_id, 'period_id': period_id, 'version': 1, 'updated_at': now}
+                    for section_id, period_id in missing
+                ])
+
+        return len(keys)
+
+    # ------------------------------------------------------------------
+    # Archivos en disco
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def folder():
+        folder = current_app.config.get('REPORT_CACHE_FOLDER') or os.path.join('uploads', 'exports', 'cache')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def key(kind, section, period, version, template=None, extra=()):
+        """
+        Clave de un reporte
+
+        La fecha de creación de la sección y del período evita reutilizar
+        archivos de una base de datos recreada con los mismos IDs.
+        """
+
+        parts = [kind, section.id, section.created_at, period.id, period.created_at, version]
+        if template is not None:
+            parts.extend(template)
+        parts.extend(extra)
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:40]
+
+    @staticmethod
+    def fetch(kind, section, period, extension, build, template=None, extra=()):
+        """
+        Ruta del reporte en caché, generándolo si hace falta
+
+        Args:
+            kind: Tipo de reporte ('section_excel', 'section_pdf', ...)
+            section: Sección
+            period: Período
+            extension: Extensión del archivo ('xlsx', 'pdf', 'json')
+            build: Función build(path) que escribe el reporte en path
+            template: (ID, huella) de la plantilla, si el reporte usa una
+            extra: Otros valores que cambian el contenido (p. ej. la fecha impresa)
+
+        Returns:
+            str: Ruta del archivo
+        """
+
+        version = ReportCacheService.data_version(section.id, period.id)
+        key = ReportCacheService.key(kind, section, period, version, template, extra)
+        folder = ReportCacheService.folder()
+        path = os.path.join(folder, f'{kind}_{key}.{extension}')
+
+        # REPORT_CACHE_MAX_MB = 0 desactiva la caché: siempre se genera y solo
+        # se conserva el último archivo, mientras se envía
+        if current_app.config.get('REPORT_CACHE_MAX_MB', 256) > 0:
+            try:
+                # La fecha de modificación es el último uso (orden LRU entre procesos)
+                os.utime(path)
+                with ReportCacheService._lock:
+                    ReportCacheService.hits += 1
+                return path
+            except FileNotFoundError:
+                pass
+
+        # Se escribe en un archivo temporal y se renombra: otro proceso nunca
+        # lee un reporte a medio escribir
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            build(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        with ReportCacheService._lock:
+            ReportCacheService.misses += 1
+
+        ReportCacheService.evict(keep=path)
+        return path
+
+    @staticmethod
+    def _files(folder):
+        files = []
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    @staticmethod
+    def evict(keep=None):
+        """
+        Elimina los archivos usados hace más tiempo hasta quedar bajo REPORT_CACHE_MAX_MB
+
+        Returns:
+            int: Archivos eliminados
+        """
+
+        max_bytes = current_app.config.get('REPORT_CACHE_MAX_MB', 256) * 1024 * 1024
+        files = ReportCacheService._files(ReportCacheService.folder())
+        total = sum(size for _, size, _ in files)
+        if total <= max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        with ReportCacheService._lock:
+            ReportCacheService.evictions += removed
+        if removed:
+            logger.info('Caché de reportes: %s archivos eliminados', removed)
+        return removed
+
+    @staticmethod
+    def clear():
+        """Elimina todos los reportes en caché"""
+
+        for _, _, path in ReportCacheService._files(ReportCacheService.folder()):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        with ReportCacheService._lock:
+            ReportCacheService.hits = 0
+            ReportCacheService.misses = 0
+            ReportCacheService.evictions = 0
+
+    @staticmethod
+    def stats():
+        files = ReportCacheService._files(ReportCacheService.folder())
+        with ReportCacheService._lock:
+            return {
+                'files': len(files),
+                'size_mb': round(sum(size for _, size, _ in files) / (1024 * 1024), 2),
+                'max_mb': current_app.config.get('REPORT_CACHE_MAX_MB', 256),
+                'hits': ReportCacheService.hits,
+                'misses': ReportCacheService.misses,
+                'evictions': ReportCacheService.evictions
+            }
@@ -0,0 +1,217 @@
+from app.models.academic import Student, Subject, TeacherAssignment
+from app.models.grades import FinalGrade
+from app import db
+from flask import current_app
+import numpy as np
+import warnings
+
+
+class SectionGradebook:
+    """
+    Matriz densa estudiante × asignatura con las calificaciones finales de una
+    sección en un período. Las celdas sin calificación valen NaN.
+
+    Todas las salidas de reportes de sección (HTML, Excel, PDF y plantillas)
+    se construyen a partir de esta estructura.
+    """
+
+    def __init__(self, section, period, students, subjects, matrix, passing_grade):
+        self.section = section
+        self.period = period
+        self.students = students
+        self.subjects = subjects
+        self.matrix = matrix
+        self.passing_grade = passing_grade
+
+        self.student_index = {student.id: i for i, student in enumerate(students)}
+        self.subject_index = {subject.id: j for j, subject in enumerate(subjects)}
+
+        graded = ~np.isnan(matrix)
+
+        # np.nanmean avisa cuando una fila o columna está vacía; el NaN resultante es lo esperado
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            self.row_averages = np.round(np.nanmean(matrix, axis=1), 2) if matrix.size else np.full(len(students), np.nan)
+            self.column_averages = np.round(np.nanmean(matrix, axis=0), 2) if matrix.size else np.full(len(subjects), np.nan)
+            self.section_average = round(float(np.nanmean(matrix)), 2) if graded.any() else None
+
+        # Aprobados/reprobados por asignatura (columnas)
+        self.column_passing = ((matrix >= passing_grade) & graded).sum(axis=0)
+        self.column_failing = ((matrix < passing_grade) & graded).sum(axis=0)
+
+        # Aprobados/reprobados por promedio del estudiante (filas)
+        has_average = ~np.isnan(self.row_averages)
+        self.students_passing = int(((self.row_averages >= passing_grade) & has_average).sum())
+        self.students_failing = int(((self.row_averages < passing_grade) & has_average).sum())
+        self.students_with_grades = int(has_average.sum())
+
+    @classmethod
+    def load(cls, section, period, passing_grade=None):
+        """
+        Carga la matriz de calificaciones finales de una sección y período
+
+        Args:
+            section: Sección
+            period: Período
+            passing_grade: Nota mínima aprobatoria (por defecto PASSING_GRADE de la configuración)
+
+        Returns:
+            SectionGradebook
+        """
+
+        return cls.load_many([section], period, passing_grade)[section.id]
+
+    @classmethod
+    def load_many(cls, sections, period, passing_grade=None):
+        """
+        Carga las matrices de varias secciones de un período con tres consultas en total
+
+        Args:
+            sections: Lista de secciones
+            period: Período
+            passing_grade: Nota mínima aprobatoria (por defecto PASSING_GRADE de la configuración)
+
+        Returns:
+            dict: {section_id: SectionGradebook}
+        """
+
+        if passing_grade is None:
+            passing_grade = current_app.config.get('PASSING_GRADE', 70)
+
+        section_ids = [section.id for section in sections]
+        if not section_ids:
+            return {}
+
+        students_by_section = {section_id: [] for section_id in section_ids}
+        for student in Student.query.filter(
+            Student.section_id.in_(section_ids),
+            Student.is_active == True
+        ).order_by(Student.last_name):
+            students_by_section[student.section_id].append(student)
+
+        # Asignaturas de cada sección a través de las asignaciones del año
+        subjects_by_section = {section_id: [] for section_id in section_ids}
+        subject_rows = db.session.query(TeacherAssignment.section_id, Subject).join(
+            Subject, TeacherAssignment.subject_id == Subject.id
+        ).filter(
+            TeacherAssignment.section_id.in_(section_ids),
+            TeacherAssignment.academic_year_id == period.academic_year_id
+        ).distinct().order_by(Subject.name)
+
+        for section_id, subject in subject_rows:
+            subjects_by_section[section_id].append(subject)
+
+        # Todas las calificaciones finales de las secciones en una sola consulta
+        grades_by_section = {section_id: [] for section_id in section_ids}
+        grade_rows = db.session.query(
+            Student.section_id, FinalGrade.student_id, FinalGrade.subject_id, FinalGrade.value
+        ).join(
+            Student, FinalGrade.student_id == Student.id
+        ).filter(
+            Student.section_id.in_(section_ids),
+            Student.is_active == True,
+            FinalGrade.period_id == period.id
+        )
+
+        for section_id, student_id, subject_id, value in grade_rows:
+            grades_by_section[section_id].append((student_id, subject_id, value))
+
+        gradebooks = {}
+        for section in sections:
+            students = students_by_section[section.id]
+            subjects = subjects_by_section[section.id]
+            matrix = cls._build_matrix(students, subjects, grades_by_section[section.id])
+            gradebooks[section.id] = cls(section, period, students, subjects, matrix, passing_grade)
+
+        return gradebooks
+
+    @staticmethod
+    def _build_matrix(students, subjects, rows):
+        """Matriz densa estudiante × asignatura a partir de tuplas (student_id, subject_id, valor)"""
+
+        matrix = np.full((len(students), len(subjects)), np.nan)
+
+        student_index = {student.id: i for i, student in enumerate(students)}
+        subject_index = {subject.id: j for j, subject in enumerate(subjects)}
+
+        # Descartar asignaturas que no pertenecen a la sección
+        rows = [row for row in rows if row[0] in student_index and row[1] in subject_index]
+
+        if rows:
+            # Pivot: dispersar (fila, columna, valor) sobre la matriz densa
+            row_idx = np.fromiter((student_index[r[0]] for r in rows), dtype=np.intp, count=len(rows))
+            col_idx = np.fromiter((subject_index[r[1]] for r in rows), dtype=np.intp, count=len(rows))
+            values = np.fromiter((r[2] for r in rows), dtype=float, count=len(rows))
+            matrix[row_idx, col_idx] = values
+
+        return matrix
+
+    @staticmethod
+    def _to_python(value):
+        """Convierte NaN en None y np.float64 en float"""
+        return None if np.isnan(value) else float(value)
+
+    def get(self, student_id, subject_id):
+        """Calificación final de un estudiante en una asignatura, o None"""
+        i = self.student_index.get(student_id)
+        j = self.subject_index.get(subject_id)
+        if i is None or j is None:
+            return None
+        return self._to_python(self.matrix[i, j])
+
+    def student_values(self, student_id):
+        """Lista de calificaciones del estudiante en el orden de self.subjects (None si falta)"""
+        i = self.student_index.get(student_id)
+        if i is None:
+            return [None] * len(self.subjects)
+        return [self._to_python(value) for value in self.matrix[i]]
+
+    def student_average(self, student_id):
+        """Promedio del estudiante sobre las asignaturas calificadas, o None"""
+        i = self.student_index.get(student_id)
+        if i is None:
+            return None
+        return self._to_python(self.row_averages[i])
+
+    def subject_average(self, subject_id):
+        """Promedio de la sección en una asignatura, o None"""
+        j = self.subject_index.get(subject_id)
+        if j is None:
+            return None
+        return self._to_python(self.column_averages[j])
+
+    def grades_data(self, include_missing=False):
+        """
+        Diccionario {student_id: {subject_id: valor}} compatible con las vistas existentes
+
+        Args:
+            include_missing: Incluir las celdas vacías con valor None
+        """
+        data = {}
+        for i, student in enumerate(self.students):
+            data[student.id] = {}
+            for j, subject in enumerate(self.subjects):
+                value = self.matrix[i, j]
+                if not np.isnan(value):
+                    data[student.id][subject.id] = float(value)
+                elif include_missing:
+                    data[student.id][subject.id] = None
+        return data
+
+    def rows(self):
+        """Itera (estudiante, calificaciones, promedio) en el orden de self.students"""
+        for i, student in enumerate(self.students):
+            yield (
+                student,
+                [self._to_python(value) for value in self.matrix[i]],
+                self._to_python(self.row_averages[i])
+            )
+
+    def subject_summary(self):
+        """Resumen por asignatura: promedio, aprobados y reprobados"""
+        return [{
+            'subject': subject,
+            'average': self._to_python(self.column_averages[j]),
+            'passing': int(self.column_passing[j]),
+            'failing': int(self.column_failing[j])
+        } for j, subject in enumerate(self.subjects)]
@@ -0,0 +1,380 @@
+from app.models.academic import Student, Teacher, Subject, Grade
+from app.models.grades import FinalGrade
+from app.models.statistics import GradeRollup
+from app.services.analytics_service import AnalyticsService
+from app.utils.database import bulk_upsert
+from app import db
+from flask import current_app
+from sqlalchemy import event, func, case, select, and_, tuple_
+from datetime import datetime
+import json
+
+
+class StatisticsService:
+    """
+    Estadísticas de calificaciones a partir de la tabla grade_rollups
+
+    Cada fila de grade_rollups resume las calificaciones finales de un período,
+    sección y asignatura (promedio, aprobados, reprobados, histograma). Cuando
+    cambian calificaciones finales, el par (período, asignatura) afectado se
+    marca en la sesión y se recalcula con una sola consulta agregada justo
+    antes del commit, dentro de la misma transacción:
+
+    - Cambios por el ORM (FinalGrade nuevas, modificadas o eliminadas, y
+      estudiantes que cambian de sección, se desactivan o se eliminan) se
+      detectan con los eventos before_flush / after_flush.
+    - Las escrituras en bloque (bulk_upsert, bulk_update_mappings) llaman a
+      mark_changed / mark_students_changed explícitamente.
+
+    Las lecturas del panel y de /admin/statistics solo consultan grade_rollups.
+    """
+
+    SESSION_KEY = '_statistics_pairs'
+
+    # ------------------------------------------------------------------
+    # Marcado de cambios
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _pending(session):
+        return session.info.setdefault(StatisticsService.SESSION_KEY, set())
+
+    @staticmethod
+    def mark_changed(period_id, subject_id, session=None):
+        """Marca un par (período, asignatura) para recalcular antes del commit"""
+
+        session = session or db.session
+        StatisticsService._pending(session).add((period_id, subject_id))
+        AnalyticsService.mark_dirty(session)
+
+    @staticmethod
+    def mark_students_changed(student_ids, session=None):
+        """
+        Marca los pares (período, asignatura) con calificaciones finales de
+        estos estudiantes; se usa cuando cambian de sección o de estado
+        """
+
+        session = session or db.session
+        student_ids = list(student_ids)
+        if not student_ids:
+            return
+
+        with session.no_autoflush:
+            pairs = session.execute(
+                select(FinalGrade.period_id, FinalGrade.subject_id).where(
+                    FinalGrade.student_id.in_(student_ids)
+                ).distinct()
+            ).all()
+
+        StatisticsService._pending(session).update((period_id, subject_id) for period_id, subject_id in pairs)
+        AnalyticsService.mark_dirty(session)
+
+    @staticmethod
+    def _before_flush(session, flush_context, instances):
+        # Estudiantes que cambian de sección o estado, o se eliminan: sus
+        # calificaciones se consultan antes de que el flush las borre
+        moved_students = set()
+
+        for obj in session.dirty:
+            if isinstance(obj, Student) and obj.id is not None:
+                state = db.inspect(obj)
+                if state.attrs.section_id.history.has_changes() or state.attrs.is_active.history.has_changes():
+                    moved_students.add(obj.id)
+
+        for obj in session.deleted:
+            if isinstance(obj, Student):
+                moved_students.add(obj.id)
+
+        if moved_students:
+            StatisticsService.mark_students_changed(moved_students, session)
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        # Después del flush las FinalGrade nuevas ya tienen sus claves foráneas
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, FinalGrade) and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+                StatisticsService.mark_changed(obj.period_id, obj.subject_id, session)
+
+    @staticmethod
+    def _before_commit(session):
+        pending = session.info.get(StatisticsService.SESSION_KEY)
+        if not pending and not (session.new or session.dirty or session.deleted):
+            return
+
+        # El flush puede marcar más pares (before_flush)
+        session.flush()
+
+        pending = session.info.pop(StatisticsService.SESSION_KEY, None)
+        if pending:
+            StatisticsService.refresh_pairs(pending, session)
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop(StatisticsService.SESSION_KEY, None)
+
+    @staticmethod
+    def install(session):
+        """Registra los eventos de sesión que mantienen grade_rollups"""
+
+        for name, handler in (
+            ('before_flush', StatisticsService._before_flush),
+            ('after_flush', StatisticsService._after_flush),
+            ('before_commit', StatisticsService._before_commit),
+            ('after_rollback', StatisticsService._after_rollback),
+        ):
+            if not event.contains(session, name, handler):
+                event.listen(session, name, handler)
+
+    # ------------------------------------------------------------------
+    # Cálculo
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _aggregate_columns(passing_grade):
+        """Columnas agregadas sobre FinalGrade.value: conteos, suma, extremos e histograma"""
+
+        value = FinalGrade.value
+        width = GradeRollup.BIN_WIDTH
+        last = GradeRollup.HISTOGRAM_BINS - 1
+
+        bins = []
+        for index in range(GradeRollup.HISTOGRAM_BINS):
+            if index == 0:
+                condition = value < width
+            elif index == last:
+                condition = value >= index * width
+            else:
+                condition = and_(value >= index * width, value < (index + 1) * width)
+            bins.append(func.sum(case((condition, 1), else_=0)))
+
+        return [
+            func.count(FinalGrade.id),
+            func.sum(value),
+            func.min(value),
+            func.max(value),
+            func.sum(case((value >= passing_grade, 1), else_=0)),
+        ] + bins
+
+    @staticmethod
+    def _rollup_row(period_id, section_id, subject_id, values, passing_grade, now):
+        count, total, minimum, maximum, passing = values[:5]
+        return {
+            'period_id': period_id,
+            'section_id': section_id,
+            'subject_id': subject_id,
+            'student_count': count,
+            'grade_sum': total or 0,
+            'min_value': minimum,
+            'max_value': maximum,
+            'passing_count': passing or 0,
+            'failing_count': count - (passing or 0),
+            'passing_grade': passing_grade,
+            'histogram': json.dumps([int(value or 0) for value in values[5:]]),
+            'updated_at': now
+        }
+
+    @staticmethod
+    def refresh_pairs(pairs, session=None):
+        """
+        Recalcula las filas de grade_rollups de los pares (período, asignatura)
+
+        Una consulta agregada agrupada por período, asignatura y sección
+        obtiene todos los resúmenes; las secciones que ya no tienen
+        calificaciones finales se eliminan.
+
+        Returns:
+            int: Filas de grade_rollups escritas
+        """
+
+        session = session or db.session
+        pairs = list(pairs)
+        if not pairs:
+            return 0
+
+        passing_grade = current_app.config.get('PASSING_GRADE', 70)
+        now = datetime.utcnow()
+
+        aggregates = session.execute(
+            select(
+                FinalGrade.period_id, FinalGrade.subject_id, Student.section_id,
+                *StatisticsService._aggregate_columns(passing_grade)
+            ).join(
+                Student, FinalGrade.student_id == Student.id
+            ).where(
+                Student.is_active == True,
+                tuple_(FinalGrade.period_id, FinalGrade.subject_id).in_(pairs)
+            ).group_by(
+                FinalGrade.period_id, FinalGrade.subject_id, Student.section_id
+            )
+        ).all()
+
+        rows = [
+            StatisticsService._rollup_row(period_id, section_id, subject_id, values, passing_grade, now)
+            for period_id, subject_id, section_id, *values in aggregates
+        ]
+
+        # Secciones que quedaron sin calificaciones en estos pares
+        keep = {(row['period_id'], row['subject_id'], row['section_id']) for row in rows}
+        stale = [
+            rollup_id
+            for rollup_id, period_id, subject_id, section_id in session.execute(
+                select(GradeRollup.id, GradeRollup.period_id, GradeRollup.subject_id, GradeRollup.section_id).where(
+                    tuple_(GradeRollup.period_id, GradeRollup.subject_id).in_(pairs)
+                )
+            )
+            if (period_id, subject_id, section_id) not in keep
+        ]
+        if stale:
+            session.execute(GradeRollup.__table__.delete().where(GradeRollup.id.in_(stale)))
+
+        bulk_upsert(
+            GradeRollup, rows,
+            index_elements=['period_id', 'section_id', 'subject_id'],
+            update_columns=[
+                'student_count', 'grade_sum', 'min_value', 'max_value', 'passing_count',
+                'failing_count', 'passing_grade', 'histogram', 'updated_at'
+            ]
+        )
+
+        return len(rows)
+
+    @staticmethod
+    def rebuild(period_id=None):
+        """
+        Reconstruye grade_rollups desde final_grades
+
+        Args:
+            period_id: Limitar a un período (opcional; por defecto todos)
+
+        Returns:
+            int: Filas de grade_rollups creadas
+        """
+
+        passing_grade = current_app.config.get('PASSING_GRADE', 70)
+        now = datetime.utcnow()
+
+        query = select(
+            FinalGrade.period_id, FinalGrade.subject_id, Student.section_id,
+            *StatisticsService._aggregate_columns(passing_grade)
+        ).join(
+            Student, FinalGrade.student_id == Student.id
+        ).where(
+            Student.is_active == True
+        ).group_by(
+            FinalGrade.period_id, FinalGrade.subject_id, Student.section_id
+        )
+
+        delete = GradeRollup.__table__.delete()
+        if period_id:
+            query = query.where(FinalGrade.period_id == period_id)
+            delete = delete.where(GradeRollup.period_id == period_id)
+
+        rows = [
+            StatisticsService._rollup_row(row_period_id, section_id, subject_id, values, passing_grade, now)
+            for row_period_id, subject_id, section_id, *values in db.session.execute(query)
+        ]
+
+        db.session.execute(delete)
+        if rows:
+            db.session.execute(GradeRollup.__table__.insert(), rows)
+
+        db.session.info.pop(StatisticsService.SESSION_KEY, None)
+        db.session.commit()
+
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Lecturas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def school_counts():
+        """Conteos del panel (estudiantes activos, profesores, asignaturas, grados) en una sola consulta"""
+
+        row = db.session.execute(select(
+            select(func.count(Student.id)).where(Student.is_active == True).scalar_subquery(),
+            select(func.count(Teacher.id)).scalar_subquery(),
+            select(func.count(Subject.id)).scalar_subquery(),
+            select(func.count(Grade.id)).scalar_subquery()
+        )).one()
+
+        return {
+            'students': row[0],
+            'teachers': row[1],
+            'subjects': row[2],
+            'grades': row[3]
+        }
+
+    @staticmethod
+    def _summaries(group_column, filters):
+        """Suma las filas de grade_rollups agrupadas por group_column"""
+
+        rows = db.session.query(
+            group_column,
+            GradeRollup.student_count,
+            GradeRollup.grade_sum,
+            GradeRollup.min_value,
+            GradeRollup.max_value,
+            GradeRollup.passing_count,
+            GradeRollup.failing_count,
+            GradeRollup.histogram
+        ).filter(*filters).all()
+
+        totals = {}
+        for key, count, total, minimum, maximum, passing, failing, histogram in rows:
+            item = totals.setdefault(key, {
+                'grade_count': 0,
+                'grade_sum': 0.0,
+                'min_grade': None,
+                'max_grade': None,
+                'passing_count': 0,
+                'failing_count': 0,
+                'histogram': [0] * GradeRollup.HISTOGRAM_BINS
+            })
+            item['grade_count'] += count
+            item['grade_sum'] += total
+            item['passing_count'] += passing
+            item['failing_count'] += failing
+            if minimum is not None and (item['min_grade'] is None or minimum < item['min_grade']):
+                item['min_grade'] = minimum
+            if maximum is not None and (item['max_grade'] is None or maximum > item['max_grade']):
+                item['max_grade'] = maximum
+            if histogram:
+                item['histogram'] = [a + b for a, b in zip(item['histogram'], json.loads(histogram))]
+
+        for item in totals.values():
+            count = item['grade_count']
+            item['avg_grade'] = round(item.pop('grade_sum') / count, 2) if count else 0
+            item['passing_rate'] = round(item['passing_count'] * 100 / count, 1) if count else 0
+
+        return totals
+
+    @staticmethod
+    def period_summaries(period_ids):
+        """
+        Resumen por período leído de grade_rollups
+
+        Returns:
+            dict: {period_id: {grade_count, avg_grade, min_grade, max_grade,
+                   passing_count, failing_count, passing_rate, histogram}}
+        """
+
+        period_ids = list(period_ids)
+        if not period_ids:
+            return {}
+
+        return StatisticsService._summaries(GradeRollup.period_id, [GradeRollup.period_id.in_(period_ids)])
+
+    @staticmethod
+    def subject_summaries(period_id):
+        """Resumen por asignatura de un período: {subject_id: {...}}"""
+
+        return StatisticsService._summaries(GradeRollup.subject_id, [GradeRollup.period_id == period_id])
+
+    @staticmethod
+    def histogram_labels():
+        width = GradeRollup.BIN_WIDTH
+        return [
+            f'{index * width}-{(index + 1) * width}'
+            for index in range(GradeRollup.HISTOGRAM_BINS)
+        ]
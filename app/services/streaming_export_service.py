@@ -0,0 +1,134 @@
+from app.models.academic import Period, Grade, Section, Subject, Student
+from app.models.grades import FinalGrade
+from app.utils.excel import (
+    new_streaming_workbook, create_streaming_sheet, styled_row,
+    CELL_STYLE, GRADE_STYLE
+)
+from app import db
+
+
+class StreamingExportService:
+    """
+    Exportaciones Excel de gran volumen en modo write-only
+
+    Las filas se leen con un cursor del servidor (yield_per) y se escriben a
+    medida que llegan, por lo que la memoria usada no crece con el número de
+    registros.
+    """
+
+    # Filas que se traen de la base de datos en cada lote del cursor
+    YIELD_PER = 1000
+
+    SCHOOL_HEADERS = ['Grado', 'Sección', 'ID', 'Apellidos', 'Nombres', 'Asignatura', 'Nota']
+    SCHOOL_COLUMN_WIDTHS = [18, 10, 15, 25, 25, 30, 10]
+
+    @staticmethod
+    def iter_school_rows(academic_year):
+        """
+        Itera todas las calificaciones finales de un año académico
+
+        Las filas vienen ordenadas por período, grado, sección, estudiante y
+        asignatura para poder escribir una hoja por período sin reordenar.
+
+        Yields:
+            tuple: (period_id, period_name, grade, section, student_id,
+                    last_name, first_name, subject, value)
+        """
+
+        query = db.session.query(
+            Period.id, Period.name,
+            Grade.name, Section.name,
+            Student.student_id, Student.last_name, Student.first_name,
+            Subject.name, FinalGrade.value
+        ).join(
+            Period, FinalGrade.period_id == Period.id
+        ).join(
+            Student, FinalGrade.student_id == Student.id
+        ).join(
+            Section, Student.section_id == Section.id
+        ).join(
+            Grade, Section.grade_id == Grade.id
+        ).join(
+            Subject, FinalGrade.subject_id == Subject.id
+        ).filter(
+            Period.academic_year_id == academic_year.id
+        ).order_by(
+            Period.start_date, Period.id,
+            Grade.name, Section.name,
+            Student.last_name, Student.first_name, Student.id,
+            Subject.name
+        ).yield_per(StreamingExportService.YIELD_PER)
+
+        for row in query:
+            yield tuple(row)
+
+    @staticmethod
+    def build_school_workbook(academic_year, progress=None):
+        """
+        Libro con todas las calificaciones finales del año, una hoja por período
+
+        Args:
+            academic_year: Año académico a exportar
+            progress: Función opcional progress(filas_escritas), llamada cada YIELD_PER filas
+
+        Returns:
+            tuple: (workbook, número de filas escritas)
+        """
+
+        wb = new_streaming_workbook()
+        ws = None
+        current_period_id = None
+        total_rows = 0
+
+        for period_id, period_name, *values in StreamingExportService.iter_school_rows(academic_year):
+            if period_id != current_period_id:
+                ws = create_streaming_sheet(
+                    wb, period_name,
+                    StreamingExportService.SCHOOL_HEADERS,
+                    StreamingExportService.SCHOOL_COLUMN_WIDTHS
+                )
+                current_period_id = period_id
+
+            # Solo la fila de encabezados lleva estilo; los datos se escriben como valores simples
+            ws.append(values)
+            total_rows += 1
+
+            if progress and total_rows % StreamingExportService.YIELD_PER == 0:
+                progress(total_rows)
+
+        # Un libro sin hojas no se puede guardar
+        if ws is None:
+            create_streaming_sheet(
+                wb, 'Sin datos',
+                StreamingExportService.SCHOOL_HEADERS,
+                StreamingExportService.SCHOOL_COLUMN_WIDTHS
+            )
+
+        return wb, total_rows
+
+    @staticmethod
+    def build_section_workbook(gradebook):
+        """
+        Libro con la matriz de calificaciones finales de una sección
+
+        Args:
+            gradebook: SectionGradebook ya cargado
+
+        Returns:
+            Workbook en modo write-only
+        """
+
+        wb = new_streaming_workbook()
+
+        section = gradebook.section
+        headers = ['ID', 'Apellidos', 'Nombres'] + [subject.name for subject in gradebook.subjects]
+        widths = [15, 25, 25] + [max(12, min(len(subject.name) + 2, 30)) for subject in gradebook.subjects]
+
+        ws = create_streaming_sheet(wb, f'{section.grade.name}{section.name}', headers, widths)
+
+        for student, values, _average in gradebook.rows():
+            row = styled_row(ws, [student.student_id, student.last_name, student.first_name], CELL_STYLE)
+            row.extend(styled_row(ws, values, GRADE_STYLE))
+            ws.append(row)
+
+        return wb
@@ -0,0 +1,315 @@
+from app.models.academic import Student, Section
+from app.services.statistics_service import StatisticsService
+from app.services.report_cache_service import ReportCacheService
+from app.services.student_search_service import StudentSearchService
+from app.utils.database import UPSERT_CHUNK_SIZE
+from app import db
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+import pandas as pd
+
+
+class StudentImportService:
+    """
+    Importación de estudiantes desde Excel, compartida por todas las rutas de carga
+
+    Las columnas se normalizan con operaciones vectorizadas de pandas, las
+    cédulas repetidas se detectan dentro del mismo DataFrame y los estudiantes
+    existentes se buscan con consultas IN por bloques. Las altas y
+    actualizaciones se escriben con bulk_insert_mappings / bulk_update_mappings
+    en bloques de IMPORT_BATCH_SIZE filas.
+    """
+
+    # Columnas de la hoja 'Estudiantes' de la plantilla de carga (/import)
+    UPLOAD_COLUMNS = {
+        'Cedula': 'student_id',
+        'Nombre': 'first_name',
+        'Apellido': 'last_name',
+        'Email': 'email',
+        'Telefono': 'phone'
+    }
+
+    # Columnas de la plantilla de admin.download_student_template
+    ADMIN_COLUMNS = {
+        'Cédula': 'student_id',
+        'Nombre': 'first_name',
+        'Apellido': 'last_name',
+        'Fecha de Nacimiento': 'birth_date',
+        'Género': 'gender',
+        'Dirección': 'address',
+        'Teléfono': 'phone',
+        'Email': 'email'
+    }
+
+    # Columnas con los nombres de los campos del modelo
+    MODEL_COLUMNS = {
+        'student_id': 'student_id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'date_of_birth': 'birth_date',
+        'gender': 'gender',
+        'address': 'address',
+        'phone': 'phone',
+        'email': 'email'
+    }
+
+    REQUIRED_FIELDS = ('student_id', 'first_name', 'last_name')
+
+    TEXT_FIELDS = ('student_id', 'first_name', 'last_name', 'address', 'phone', 'email')
+
+    @staticmethod
+    def clean_text(series):
+        """Texto sin espacios sobrantes; vacíos y NaN quedan como None"""
+
+        # Números leídos como float (p. ej. cédulas en una columna con celdas vacías): 12345678.0 -> 12345678
+        integral = series.map(lambda value: isinstance(value, float) and value.is_integer())
+        if integral.any():
+            series = series.astype(object).where(~integral, series[integral].astype('int64').astype(str))
+
+        text = series.astype(str).str.strip()
+        return text.where(series.notna() & (text != '') & (text.str.lower() != 'nan'), None)
+
+    @staticmethod
+    def _parse_dates(series):
+        """Fechas en formato dd/mm/aaaa o ya convertidas por pandas; inválidas quedan como NaT"""
+
+        is_text = series.map(lambda value: isinstance(value, str))
+        parsed = pd.to_datetime(series.where(~is_text), errors='coerce')
+
+        if is_text.any():
+            text = series[is_text].str.strip()
+            parsed[is_text] = pd.to_datetime(text, format='%d/%m/%Y', errors='coerce')
+
+        return parsed
+
+    @staticmethod
+    def normalize_frame(df, columns, required=REQUIRED_FIELDS):
+        """
+        Convierte la hoja leída en un DataFrame con los campos del modelo Student
+
+        Args:
+            df: DataFrame tal como lo lee pandas
+            columns: dict {columna del Excel: campo del modelo}
+            required: Campos obligatorios en cada fila
+
+        Returns:
+            tuple: (DataFrame con un campo por columna y 'row' con el número de
+                    fila en Excel, lista de errores 'Fila N: ...')
+
+        Raises:
+            ValueError: Si faltan columnas obligatorias en el archivo
+        """
+
+        missing_columns = [
+            column for column, field in columns.items()
+            if field in required and column not in df.columns
+        ]
+        if missing_columns:
+            raise ValueError(f'Columnas faltantes en el archivo: {", ".join(missing_columns)}')
+
+        # Con el índice que asigna read_excel, la fila en Excel es índice + 2 (encabezados en la 1)
+        frame = pd.DataFrame({'row': df.index + 2}, index=df.index)
+        invalid_dates = pd.Series(False, index=df.index)
+
+        for column, field in columns.items():
+            if column not in df.columns:
+                continue
+
+            series = df[column]
+
+            if field == 'gender':
+                frame[field] = StudentImportService.clean_text(series).str.upper().str[:1]
+            elif field == 'birth_date':
+                parsed = StudentImportService._parse_dates(series)
+                frame[field] = parsed.dt.date.astype(object).where(parsed.notna(), None)
+                invalid_dates = series.notna() & parsed.isna()
+            else:
+                frame[field] = StudentImportService.clean_text(series)
+
+        # Validaciones por fila: se conserva el primer error de cada una
+        error = pd.Series(None, index=frame.index, dtype=object)
+
+        def flag(mask, message):
+            nonlocal error
+            error = error.where(error.notna() | ~mask, message)
+
+        for field in required:
+            flag(frame[field].isna(), f'falta el valor de {field}')
+
+        for field in StudentImportService.TEXT_FIELDS:
+            if field in frame.columns:
+                limit = Student.__table__.c[field].type.length
+                flag(frame[field].str.len() > limit, f'{field} excede {limit} caracteres')
+
+        flag(invalid_dates, 'fecha de nacimiento inválida (use dd/mm/aaaa)')
+
+        # Cédulas repetidas en el mismo archivo: se conserva la primera aparición
+        flag(frame['student_id'].notna() & frame.duplicated('student_id'), 'cédula repetida en el archivo')
+
+        has_error = error.notna()
+        errors = [
+            f'Fila {row}: {message}'
+            for row, message in zip(frame.loc[has_error, 'row'], error[has_error])
+        ]
+
+        return frame[~has_error], errors
+
+    @staticmethod
+    def existing_students(student_ids):
+        """
+        Estudiantes existentes por cédula, con consultas IN por bloques
+
+        Returns:
+            dict: {cédula: id}
+        """
+
+        student_ids = list(student_ids)
+        found = {}
+
+        for start in range(0, len(student_ids), UPSERT_CHUNK_SIZE):
+            chunk = student_ids[start:start + UPSERT_CHUNK_SIZE]
+            found.update(
+                db.session.query(Student.student_id, Student.id).filter(Student.student_id.in_(chunk)).all()
+            )
+
+        return found
+
+    @staticmethod
+    def import_frame(df, columns, section_id, update_fields=None, is_active=True,
+                     required=REQUIRED_FIELDS, progress=None):
+        """
+        Crea o actualiza estudiantes a partir de un DataFrame
+
+        Args:
+            df: DataFrame leído del Excel
+            columns: dict {columna del Excel: campo del modelo}
+            section_id: Sección asignada a todos los estudiantes
+            update_fields: Campos que se actualizan si la cédula ya existe;
+                None para solo crear y reportar las cédulas existentes como error
+            is_active: Estado de los estudiantes creados o actualizados
+            required: Campos obligatorios en cada fila
+            progress: Función opcional progress(actual, total, mensaje)
+
+        Returns:
+            dict: {'students_created', 'students_updated', 'errors', 'student_ids'}
+                student_ids es {cédula: id} de todas las filas válidas
+        """
+
+        frame, errors = StudentImportService.normalize_frame(df, columns, required)
+
+        result = {
+            'students_created': 0,
+            'students_updated': 0,
+            'errors': errors,
+            'student_ids': {}
+        }
+
+        if frame.empty:
+            return result
+
+        existing = StudentImportService.existing_students(frame['student_id'].unique())
+        is_existing = frame['student_id'].isin(list(existing))
+
+        # Texto de búsqueda: bulk_insert_mappings / bulk_update_mappings no disparan los eventos del ORM
+        if 'first_name' in frame.columns and 'last_name' in frame.columns:
+            frame['search_text'] = StudentSearchService.search_text_series(
+                frame['first_name'], frame['last_name'], frame['student_id']
+            )
+
+        fields = [column for column in frame.columns if column != 'row']
+
+        # NaN / NaT -> None antes de pasar los valores a SQLAlchemy
+        frame = frame.astype(object).where(frame.notna(), None)
+        creates = frame[~is_existing]
+
+        if update_fields is None:
+            updates = frame.iloc[0:0]
+            result['errors'].extend(
+                f'Fila {row}: ya existe un estudiante con la cédula {student_id}'
+                for row, student_id in zip(frame.loc[is_existing, 'row'], frame.loc[is_existing, 'student_id'])
+            )
+        else:
+            updates = frame[is_existing]
+
+        create_rows = [
+            dict(values, section_id=section_id, is_active=is_active)
+            for values in creates[fields].to_dict('records')
+        ]
+
+        update_columns = ['student_id'] + [field for field in update_fields or [] if field in fields and field != 'student_id']
+        if 'first_name' in update_columns and 'last_name' in update_columns:
+            update_columns.append('search_text')
+        update_rows = [
+            dict(values, id=existing[values['student_id']], section_id=section_id, is_active=is_active)
+            for values in updates[update_columns].to_dict('records')
+        ]
+
+        batch_size = current_app.config.get('IMPORT_BATCH_SIZE', 100)
+        total = len(create_rows) + len(update_rows)
+        done = 0
+
+        def write(rows, row_numbers, operation, counter):
+            nonlocal done
+            for start in range(0, len(rows), batch_size):
+                chunk = rows[start:start + batch_size]
+                try:
+                    if counter == 'students_updated':
+                        # Reportes de las secciones de origen (antes de mover a los estudiantes)
+                        ReportCacheService.mark_students(row['id'] for row in chunk)
+                    operation(Student, chunk)
+                    ReportCacheService.mark_sections([section_id])
+                    if counter == 'students_updated':
+                        # Los estudiantes existentes pueden cambiar de sección o estado
+                        StatisticsService.mark_students_changed(row['id'] for row in chunk)
+                    db.session.commit()
+                    result[counter] += len(chunk)
+                except SQLAlchemyError as e:
+                    # El bloque completo se descarta; sus filas se reportan una por una
+                    db.session.rollback()
+                    message = str(getattr(e, 'orig', e))
+                    result['errors'].extend(
+                        f'Fila {row}: error al guardar ({message})'
+                        for row in row_numbers[start:start + batch_size]
+                    )
+                done += len(chunk)
+                if progress:
+                    progress(done, total, f'{done} de {total} estudiantes')
+
+        write(update_rows, updates['row'].tolist(), db.session.bulk_update_mappings, 'students_updated')
+        write(create_rows, creates['row'].tolist(), db.session.bulk_insert_mappings, 'students_created')
+
+        # bulk_insert_mappings no retorna los IDs de las altas
+        result['student_ids'] = StudentImportService.existing_students(frame['student_id'])
+
+        return result
+
+    @staticmethod
+    def import_students_file(file_path, section_id, progress=None):
+        """
+        Importa la hoja 'Estudiantes' de la plantilla de carga en una sección
+
+        Las cédulas existentes se actualizan (nombre, apellido, sección y estado).
+
+        Args:
+            file_path: Ruta del archivo Excel subido
+            section_id: ID de la sección destino
+            progress: Función opcional progress(actual, total, mensaje)
+
+        Returns:
+            dict: {'students_created', 'students_updated', 'errors'}
+        """
+
+        section = db.session.get(Section, section_id)
+        if section is None:
+            raise ValueError('La sección seleccionada no existe')
+
+        df = pd.read_excel(file_path, sheet_name='Estudiantes')
+
+        result = StudentImportService.import_frame(
+            df, StudentImportService.UPLOAD_COLUMNS, section.id,
+            update_fields=['first_name', 'last_name'],
+            progress=progress
+        )
+        del result['student_ids']
+
+        return result
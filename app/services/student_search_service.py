@@ -0,0 +1,281 @@
+from app.models.academic import Student, Section, Period
+from app.models.grades import GradeType
+from app import db
+from flask import current_app
+from sqlalchemy import DDL, event, text, tuple_
+from sqlalchemy.orm import contains_eager
+import unicodedata
+import base64
+import json
+import re
+
+
+# Marcas diacríticas que quedan separadas tras la normalización NFKD
+_COMBINING = r'[\u0300-\u036f]'
+_NON_DIGITS = r'\D'
+_SPACES = r'\s+'
+
+# Tabla FTS5 (SQLite) con tokenizador trigram sobre students.search_text:
+# MATCH '"abc"' equivale a LIKE '%abc%' pero usando el índice
+FTS_TABLE = 'students_search'
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"search_text, content='students', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON students BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON students BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON students BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END",
+]
+
+# Índice trigram (PostgreSQL) que atiende LIKE '%abc%' sobre search_text
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_students_search_text_trgm ON students USING gin (search_text gin_trgm_ops)",
+]
+
+# Los trigramas necesitan al menos 3 caracteres; los términos más cortos se
+# filtran con LIKE sobre las filas que ya coinciden con el resto
+MIN_INDEXED_LENGTH = 3
+
+
+class StudentSearchService:
+    """
+    Búsqueda de estudiantes por nombre o cédula para /admin/api/students/search
+
+    Cada estudiante guarda en students.search_text su apellido, nombre y los
+    dígitos de la cédula en minúsculas y sin acentos. La columna se mantiene
+    con eventos del ORM (before_insert / before_update) y, en las altas y
+    actualizaciones en bloque, con search_text_series.
+
+    El índice depende del motor:
+      - PostgreSQL: índice GIN pg_trgm sobre search_text
+      - SQLite: tabla FTS5 externa (students_search) con tokenizador trigram,
+        sincronizada por triggers
+      - Otros motores: LIKE sin índice
+
+    Los resultados se devuelven por páginas con paginación por clave
+    (apellido, nombre, id), sin OFFSET.
+    """
+
+    # ------------------------------------------------------------------
+    # Normalización
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def normalize(value):
+        """Minúsculas, sin acentos y con espacios simples"""
+
+        if not value:
+            return ''
+        value = re.sub(_COMBINING, '', unicodedata.normalize('NFKD', str(value)))
+        return re.sub(_SPACES, ' ', value.lower()).strip()
+
+    @staticmethod
+    def search_text(first_name, last_name, student_id):
+        """Valor de students.search_text para un estudiante"""
+
+        student_id = str(student_id or '')
+        digits = re.sub(_NON_DIGITS, '', student_id)
+        return StudentSearchService.normalize(f'{last_name or ""} {first_name or ""} {digits or student_id}')
+
+    @staticmethod
+    def search_text_series(first_names, last_names, student_ids):
+        """search_text vectorizado sobre columnas de un DataFrame (mismo resultado que search_text)"""
+
+        student_ids = student_ids.fillna('').astype(str)
+        digits = student_ids.str.replace(_NON_DIGITS, '', regex=True)
+        digits = digits.where(digits != '', student_ids)
+
+        combined = last_names.fillna('').astype(str) + ' ' + first_names.fillna('').astype(str) + ' ' + digits
+        return (
+            combined.str.normalize('NFKD')
+            .str.replace(_COMBINING, '', regex=True)
+            .str.lower()
+            .str.replace(_SPACES, ' ', regex=True)
+            .str.strip()
+        )
+
+    # ------------------------------------------------------------------
+    # Sincronización
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _set_search_text(mapper, connection, target):
+        target.search_text = StudentSearchService.search_text(
+            target.first_name, target.last_name, target.student_id
+        )
+
+    @staticmethod
+    def install():
+        """Registra los eventos del ORM y el DDL de índices para create_all"""
+
+        for name in ('before_insert', 'before_update'):
+            if not event.contains(Student, name, StudentSearchService._set_search_text):
+                event.listen(Student, name, StudentSearchService._set_search_text)
+
+        table = Student.__table__
+        if not table.info.get('search_ddl'):
+            for statement in SQLITE_DDL:
+                event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+            for statement in POSTGRESQL_DDL:
+                event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+            table.info['search_ddl'] = True
+
+    @staticmethod
+    def rebuild_index():
+        """Recalcula search_text de todos los estudiantes y reconstruye la tabla FTS5"""
+
+        rows = db.session.query(Student.id, Student.first_name, Student.last_name, Student.student_id).all()
+        db.session.bulk_update_mappings(Student, [
+            {'id': student_id, 'search_text': StudentSearchService.search_text(first_name, last_name, cedula)}
+            for student_id, first_name, last_name, cedula in rows
+        ])
+
+        if db.session.get_bind().dialect.name == 'sqlite':
+            db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+        db.session.commit()
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Paginación por clave
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def encode_cursor(student):
+        key = [student.last_name, student.first_name, student.id]
+        return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """(apellido, nombre, id) del último resultado de la página anterior; None si el cursor no es válido"""
+
+        if not cursor:
+            return None
+        try:
+            last_name, first_name, student_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return str(last_name), str(first_name), int(student_id)
+        except (ValueError, TypeError, UnicodeError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _like(token):
+        escaped = token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return Student.search_text.like(f'%{escaped}%', escape='\\')
+
+    @staticmethod
+    def _filter_terms(query, tokens):
+        """Cada término debe aparecer en search_text (AND entre términos)"""
+
+        dialect = db.session.get_bind().dialect.name
+        indexed = [token for token in tokens if len(token) >= MIN_INDEXED_LENGTH]
+
+        if dialect == 'sqlite' and indexed:
+            expression = ' AND '.join('"{}"'.format(token.replace('"', '""')) for token in indexed)
+            matches = text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression').bindparams(
+                expression=expression
+            )
+            query = query.filter(Student.id.in_(matches))
+            tokens = [token for token in tokens if len(token) < MIN_INDEXED_LENGTH]
+
+        for token in tokens:
+            query = query.filter(StudentSearchService._like(token))
+
+        return query
+
+    @staticmethod
+    def parse_term(search_term):
+        """
+        Detecta el tipo de búsqueda
+
+        Returns:
+            tuple: ('cedula' | 'name' | None, lista de términos normalizados)
+        """
+
+        search_term = (search_term or '').strip()
+        if not search_term:
+            return None, []
+
+        # Al menos 2 dígitos: búsqueda por cédula (con o sin V-/E-)
+        digits = re.sub(_NON_DIGITS, '', search_term)
+        if len(digits) >= 2:
+            return 'cedula', [digits]
+
+        return 'name', StudentSearchService.normalize(search_term).split()
+
+    @staticmethod
+    def filter_term(query, search_term):
+        """
+        Aplica a una consulta sobre Student el filtro por nombre o cédula
+
+        Returns:
+            tuple: (consulta filtrada, tipo de búsqueda o None)
+        """
+
+        search_type, tokens = StudentSearchService.parse_term(search_term)
+        if tokens:
+            query = StudentSearchService._filter_terms(query, tokens)
+        return query, search_type
+
+    @staticmethod
+    def search(search_term=None, section_id=None, grade_id=None, year_id=None, cursor=None, limit=None):
+        """
+        Una página de estudiantes activos que coinciden con los filtros
+
+        Args:
+            search_term: Nombre, apellido o cédula (detección automática)
+            section_id / grade_id / year_id: Filtros, del más al menos específico
+            cursor: Cursor devuelto en la página anterior
+            limit: Resultados por página (STUDENT_SEARCH_LIMIT por defecto,
+                hasta STUDENT_SEARCH_MAX_LIMIT)
+
+        Returns:
+            dict: {'students', 'search_type', 'has_more', 'next_cursor', 'limit'}
+                students trae la sección y el grado ya cargados
+        """
+
+        default_limit = current_app.config.get('STUDENT_SEARCH_LIMIT', 50)
+        max_limit = current_app.config.get('STUDENT_SEARCH_MAX_LIMIT', 200)
+        limit = max(1, min(limit or default_limit, max_limit))
+
+        query = Student.query.join(Student.section).join(Section.grade).options(
+            contains_eager(Student.section).contains_eager(Section.grade)
+        ).filter(Student.is_active == True)
+
+        if section_id:
+            query = query.filter(Student.section_id == section_id)
+        elif grade_id:
+            query = query.filter(Section.grade_id == grade_id)
+        elif year_id:
+            # Secciones que tienen evaluaciones en el año académico
+            sections_with_evaluations = db.session.query(GradeType.section_id).join(Period).filter(
+                Period.academic_year_id == year_id
+            ).distinct()
+            query = query.filter(Student.section_id.in_(sections_with_evaluations))
+
+        query, search_type = StudentSearchService.filter_term(query, search_term)
+
+        after = StudentSearchService.decode_cursor(cursor)
+        if after:
+            query = query.filter(tuple_(Student.last_name, Student.first_name, Student.id) > tuple_(*after))
+
+        students = query.order_by(Student.last_name, Student.first_name, Student.id).limit(limit + 1).all()
+
+        has_more = len(students) > limit
+        students = students[:limit]
+
+        return {
+            'students': students,
+            'search_type': search_type,
+            'has_more': has_more,
+            'next_cursor': StudentSearchService.encode_cursor(students[-1]) if has_more else None,
+            'limit': limit
+        }
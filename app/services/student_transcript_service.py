@@ -0,0 +1,179 @@
+from app.models.academic import Period, Subject, TeacherAssignment
+from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app import db
+
+
+class StudentTranscriptService:
+    """Carga las calificaciones de un estudiante en pocas consultas y arma la estructura en memoria"""
+
+    @staticmethod
+    def _section_subjects(student, academic_year_id):
+        """Asignaturas de la sección del estudiante según las asignaciones del año"""
+
+        return Subject.query.filter(
+            Subject.id.in_(
+                db.session.query(TeacherAssignment.subject_id).filter_by(
+                    section_id=student.section_id,
+                    academic_year_id=academic_year_id
+                )
+            )
+        ).order_by(Subject.name).all()
+
+    @staticmethod
+    def load_period_report(student, period):
+        """
+        Calificaciones de un estudiante en un período para reports.student_report
+
+        Args:
+            student: Estudiante
+            period: Período
+
+        Returns:
+            tuple: (subjects, grades_data, final_grades) donde
+                grades_data = {subject_id: {grade_type_id: {'name', 'value', 'weight'}}}
+                final_grades = {subject_id: valor}
+        """
+
+        subjects = StudentTranscriptService._section_subjects(student, period.academic_year_id)
+        subject_ids = [subject.id for subject in subjects]
+
+        grades_data = {subject_id: {} for subject_id in subject_ids}
+        final_grades = {}
+
+        if not subject_ids:
+            return subjects, grades_data, final_grades
+
+        # Evaluaciones y notas del estudiante en una sola consulta
+        rows = db.session.query(
+            StudentGrade.subject_id, StudentGrade.value,
+            GradeType.id, GradeType.name, GradeType.weight
+        ).join(
+            GradeType, StudentGrade.grade_type_id == GradeType.id
+        ).filter(
+            StudentGrade.student_id == student.id,
+            GradeType.period_id == period.id,
+            GradeType.subject_id.in_(subject_ids)
+        ).order_by(GradeType.name).all()
+
+        for subject_id, value, grade_type_id, name, weight in rows:
+            grades_data.setdefault(subject_id, {})[grade_type_id] = {
+                'name': name,
+                'value': value,
+                'weight': weight
+            }
+
+        # Calificaciones finales del período
+        final_rows = db.session.query(FinalGrade.subject_id, FinalGrade.value).filter(
+            FinalGrade.student_id == student.id,
+            FinalGrade.period_id == period.id,
+            FinalGrade.subject_id.in_(subject_ids)
+        ).all()
+
+        for subject_id, value in final_rows:
+            final_grades[subject_id] = value
+
+        return subjects, grades_data, final_grades
+
+    @staticmethod
+    def build_year_transcript(student, academic_year):
+        """
+        Boletín anual del estudiante para /admin/api/student/<id>/grades
+
+        Args:
+            student: Estudiante
+            academic_year: Año académico
+
+        Returns:
+            tuple: (periods, grades_data) donde grades_data tiene la forma
+                {subject_id: {'subject_name', 'subject_code', 'final_average',
+                              'periods': {period_id: {...}}}}
+        """
+
+        periods = academic_year.periods.order_by(Period.start_date).all()
+        period_ids = [period.id for period in periods]
+
+        if not period_ids:
+            return periods, {}
+
+        # 1) Todas las notas del estudiante en evaluaciones de su sección durante el año
+        grade_rows = db.session.query(
+            StudentGrade.value, StudentGrade.comments, StudentGrade.created_at,
+            GradeType.subject_id, GradeType.period_id, GradeType.name, GradeType.weight
+        ).join(
+            GradeType, StudentGrade.grade_type_id == GradeType.id
+        ).filter(
+            StudentGrade.student_id == student.id,
+            GradeType.section_id == student.section_id,
+            GradeType.period_id.in_(period_ids)
+        ).order_by(GradeType.id).all()
+
+        # 2) Todas las calificaciones finales del año
+        final_rows = db.session.query(
+            FinalGrade.subject_id, FinalGrade.period_id, FinalGrade.value
+        ).filter(
+            FinalGrade.student_id == student.id,
+            FinalGrade.period_id.in_(period_ids)
+        ).all()
+
+        evaluations = {}
+        for value, comments, created_at, subject_id, period_id, name, weight in grade_rows:
+            evaluations.setdefault((subject_id, period_id), []).append({
+                'evaluation_name': name,
+                'weight': weight,
+                'value': value,
+                'comments': comments or '',
+                'date_recorded': created_at.strftime('%d/%m/%Y') if created_at else ''
+            })
+
+        finals = {(subject_id, period_id): value for subject_id, period_id, value in final_rows}
+
+        subject_ids = {key[0] for key in evaluations} | {key[0] for key in finals}
+        if not subject_ids:
+            return periods, {}
+
+        # 3) Datos de las asignaturas involucradas
+        subjects = Subject.query.filter(Subject.id.in_(subject_ids)).order_by(Subject.name).all()
+
+        grades_data = {}
+        for subject in subjects:
+            subject_periods = {}
+            period_totals = []
+
+            for period in periods:
+                key = (subject.id, period.id)
+                period_evaluations = evaluations.get(key, [])
+                final_value = finals.get(key)
+
+                if not period_evaluations and final_value is None:
+                    continue
+
+                total_weight = sum(evaluation['weight'] for evaluation in period_evaluations)
+                total_weighted = sum(evaluation['value'] * evaluation['weight'] for evaluation in period_evaluations)
+
+                period_average = 0
+                if total_weight > 0:
+                    period_average = total_weighted / total_weight
+                elif final_value is not None:
+                    period_average = final_value
+
+                subject_periods[period.id] = {
+                    'period_name': period.name,
+                    'evaluations': period_evaluations,
+                    'period_average': round(period_average, 1),
+                    'final_grade': final_value
+                }
+
+                if period_average > 0:
+                    period_totals.append(period_average)
+
+            if not subject_periods:
+                continue
+
+            grades_data[subject.id] = {
+                'subject_name': subject.name,
+                'subject_code': subject.code,
+                'periods': subject_periods,
+                'final_average': round(sum(period_totals) / len(period_totals), 1) if period_totals else 0
+            }
+
+        return periods, grades_data
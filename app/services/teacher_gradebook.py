@@ -0,0 +1,293 @@
+from app.models.academic import Student
+from app.models.grades import GradeType, StudentGrade, FinalGrade
+from app.services.final_grade_service import FinalGradeService
+from app.services.grade_entry_service import GradeEntryService
+from app.services.report_cache_service import ReportCacheService
+from app.utils.database import bulk_upsert
+from app import db
+from sqlalchemy import and_
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+
+
+# Filas y columnas de la planilla (solo las columnas que muestran las vistas)
+StudentRow = namedtuple('StudentRow', 'id student_id first_name last_name')
+EvaluationColumn = namedtuple('EvaluationColumn', 'id name weight')
+
+
+class TeacherGradebook:
+    """
+    Planilla de una asignación (sección y asignatura) en un período: matriz
+    densa estudiante × evaluación más la calificación final de cada
+    estudiante. Las celdas sin calificación valen NaN.
+
+    Se carga con dos consultas (evaluaciones con sus notas, estudiantes con
+    su calificación final) y las vistas del profesor se construyen a partir
+    de ella. Al guardar, los valores enviados se comparan con la planilla y
+    solo se escriben, en bloque, las celdas que cambiaron.
+    """
+
+    def __init__(self, assignment, period_id, students, evaluations, values, comments, finals, final_comments):
+        self.assignment = assignment
+        self.period_id = period_id
+        self.students = students
+        self.evaluations = evaluations
+        self.values = values
+        self.comments = comments
+        self.finals = finals
+        self.final_comments = final_comments
+
+        self.student_index = {student.id: i for i, student in enumerate(students)}
+        self.evaluation_index = {evaluation.id: j for j, evaluation in enumerate(evaluations)}
+
+        # Calificación final propuesta: SUM(valor * peso) / SUM(peso) sobre las celdas con nota
+        weights = np.array([evaluation.weight for evaluation in evaluations], dtype=float)
+        graded = ~np.isnan(values)
+        weighted = np.where(graded, values, 0.0) @ weights
+        total_weight = graded.astype(float) @ weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.proposed = np.where(total_weight > 0, np.round(weighted / total_weight, 2), np.nan)
+
+    @classmethod
+    def load(cls, assignment, period_id):
+        """
+        Carga la planilla de una asignación y período
+
+        Args:
+            assignment: Asignación (TeacherAssignment) del profesor
+            period_id: ID del período
+
+        Returns:
+            TeacherGradebook
+        """
+
+        # Estudiantes activos de la sección con su calificación final (si existe)
+        student_rows = db.session.query(
+            Student.id, Student.student_id, Student.first_name, Student.last_name,
+            FinalGrade.value, FinalGrade.comments
+        ).outerjoin(
+            FinalGrade, and_(
+                FinalGrade.student_id == Student.id,
+                FinalGrade.subject_id == assignment.subject_id,
+                FinalGrade.period_id == period_id
+            )
+        ).filter(
+            Student.section_id == assignment.section_id,
+            Student.is_active == True
+        ).order_by(Student.last_name, Student.id).all()
+
+        students = [StudentRow(*row[:4]) for row in student_rows]
+        finals = np.array([np.nan if row[4] is None else row[4] for row in student_rows], dtype=float)
+        final_comments = [row[5] for row in student_rows]
+
+        # Evaluaciones de la sección, asignatura y período con todas sus notas
+        cell_rows = db.session.query(
+            GradeType.id, GradeType.name, GradeType.weight,
+            StudentGrade.student_id, StudentGrade.value, StudentGrade.comments
+        ).outerjoin(
+            StudentGrade, StudentGrade.grade_type_id == GradeType.id
+        ).filter(
+            GradeType.section_id == assignment.section_id,
+            GradeType.subject_id == assignment.subject_id,
+            GradeType.period_id == period_id
+        ).order_by(GradeType.name, GradeType.id)
+
+        evaluations = []
+        evaluation_index = {}
+        cells = []
+        for evaluation_id, name, weight, student_id, value, comment in cell_rows:
+            if evaluation_id not in evaluation_index:
+                evaluation_index[evaluation_id] = len(evaluations)
+                evaluations.append(EvaluationColumn(evaluation_id, name, weight))
+            if student_id is not None:
+                cells.append((student_id, evaluation_id, value, comment))
+
+        student_index = {student.id: i for i, student in enumerate(students)}
+        values = np.full((len(students), len(evaluations)), np.nan)
+        comments = {}
+        for student_id, evaluation_id, value, comment in cells:
+            i = student_index.get(student_id)
+            if i is None:
+                continue
+            values[i, evaluation_index[evaluation_id]] = value
+            if comment:
+                comments[(student_id, evaluation_id)] = comment
+
+        return cls(assignment, period_id, students, evaluations, values, comments, finals, final_comments)
+
+    @staticmethod
+    def _to_python(value):
+        """Convierte NaN en None y np.float64 en float"""
+        return None if np.isnan(value) else float(value)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def get(self, student_id, evaluation_id):
+        """Nota de un estudiante en una evaluación, o None"""
+        i = self.student_index.get(student_id)
+        j = self.evaluation_index.get(evaluation_id)
+        if i is None or j is None:
+            return None
+        return self._to_python(self.values[i, j])
+
+    def comment(self, student_id, evaluation_id):
+        return self.comments.get((student_id, evaluation_id))
+
+    def final(self, student_id):
+        """Calificación final guardada del estudiante, o None"""
+        i = self.student_index.get(student_id)
+        return None if i is None else self._to_python(self.finals[i])
+
+    def final_comment(self, student_id):
+        i = self.student_index.get(student_id)
+        return None if i is None else self.final_comments[i]
+
+    def proposed_final(self, student_id):
+        """Promedio ponderado de las notas del estudiante, o None si no tiene notas"""
+        i = self.student_index.get(student_id)
+        return None if i is None else self._to_python(self.proposed[i])
+
+    def student_values(self, student_id):
+        """Notas del estudiante en el orden de self.evaluations (None si falta)"""
+        i = self.student_index.get(student_id)
+        if i is None:
+            return [None] * len(self.evaluations)
+        return [self._to_python(value) for value in self.values[i]]
+
+    def rows(self):
+        """Itera (estudiante, notas, final, propuesta, comentario final) en el orden de self.students"""
+        for i, student in enumerate(self.students):
+            yield (
+                student,
+                [self._to_python(value) for value in self.values[i]],
+                self._to_python(self.finals[i]),
+                self._to_python(self.proposed[i]),
+                self.final_comments[i]
+            )
+
+    # ------------------------------------------------------------------
+    # Escritura por diferencias
+    # ------------------------------------------------------------------
+
+    def save_student_grades(self, student_id, submitted, comment, teacher_id=None):
+        """
+        Guarda las notas de un estudiante escribiendo solo las celdas que cambiaron
+
+        Args:
+            student_id: ID del estudiante
+            submitted: dict {evaluation_id: valor}; los valores None se ignoran
+            comment: Comentario que se aplica a las notas enviadas
+            teacher_id: Profesor de las notas nuevas (por defecto el de la asignación)
+
+        Returns:
+            dict: Resultado con celdas creadas, actualizadas y sin cambios
+        """
+
+        result = {'success': True, 'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+
+        now = datetime.utcnow()
+        rows = []
+        for evaluation_id, value in submitted.items():
+            if value is None or evaluation_id not in self.evaluation_index:
+                continue
+
+            previous = self.get(student_id, evaluation_id)
+            if previous == value and (self.comment(student_id, evaluation_id) or '') == (comment or ''):
+                result['unchanged'] += 1
+                continue
+
+            result['updated' if previous is not None else 'created'] += 1
+            rows.append({
+                'student_id': student_id,
+                'subject_id': self.assignment.subject_id,
+                'grade_type_id': evaluation_id,
+                'period_id': self.period_id,
+                'teacher_id': teacher_id or self.assignment.teacher_id,
+                'value': value,
+                'comments': comment,
+                'updated_at': now
+            })
+
+        if not rows:
+            return result
+
+        try:
+            bulk_upsert(
+                StudentGrade, rows,
+                index_elements=['student_id', 'grade_type_id'],
+                update_columns=['value', 'comments', 'updated_at']
+            )
+            ReportCacheService.mark_sections([self.assignment.section_id], self.period_id)
+            FinalGradeService.recalculate(
+                self.assignment.subject_id, self.period_id,
+                student_ids=[student_id],
+                commit=False
+            )
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            result.update(success=False, created=0, updated=0)
+            result['errors'].append(str(e))
+
+        return result
+
+    def save_finals(self, form):
+        """
+        Guarda las calificaciones finales enviadas (final_<id>, comments_<id>)
+
+        Solo se escriben, en un único upsert, los estudiantes cuya nota o
+        comentario difiere de la planilla. Las notas vacías se ignoran.
+
+        Returns:
+            dict: Resultado con calificaciones actualizadas, sin cambios y errores
+        """
+
+        result = {'success': True, 'updated': 0, 'unchanged': 0, 'errors': []}
+
+        values = {}
+        comments = {}
+        for i, student in enumerate(self.students):
+            try:
+                value = GradeEntryService.parse_value(form.get(f'final_{student.id}'))
+            except ValueError:
+                result['errors'].append(f'{student.last_name}, {student.first_name}: calificación inválida')
+                continue
+
+            if value is None:
+                continue
+
+            if value < 0 or value > 100:
+                result['errors'].append(f'{student.last_name}, {student.first_name}: la calificación debe estar entre 0 y 100')
+                continue
+
+            comment = form.get(f'comments_{student.id}')
+            if comment is None:
+                comment = self.final_comments[i]
+
+            if self._to_python(self.finals[i]) == value and (self.final_comments[i] or '') == (comment or ''):
+                result['unchanged'] += 1
+                continue
+
+            values[student.id] = value
+            comments[student.id] = comment
+
+        if not values:
+            return result
+
+        try:
+            FinalGradeService.save_final_grades(
+                self.assignment.subject_id, self.period_id, values, comments=comments
+            )
+            db.session.commit()
+            result['updated'] = len(values)
+
+        except Exception as e:
+            db.session.rollback()
+            result['success'] = False
+            result['errors'].append(str(e))
+
+        return result
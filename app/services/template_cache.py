@@ -0,0 +1,506 @@
+from app.models.templates import ExcelTemplate, TemplateCell, TemplateRange, TemplateStyle, TemplateCellStyle
+from app.utils.excel import clone_workbook
+from app import db
+from openpyxl import load_workbook
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils.cell import range_boundaries, column_index_from_string, get_column_letter
+from flask import current_app
+from sqlalchemy import event
+from collections import OrderedDict, namedtuple
+import threading
+import hashlib
+import logging
+import json
+import re
+import os
+
+logger = logging.getLogger('app.templates')
+
+# Tablas cuya escritura cambia la metadata de una plantilla
+METADATA_ENTITIES = (TemplateCell, TemplateRange, TemplateStyle, TemplateCellStyle)
+
+# Copias inmutables de la metadata de la plantilla (mismos atributos que los modelos)
+CellSpec = namedtuple('CellSpec', [
+    'id', 'cell_address', 'cell_type', 'data_type', 'content_type',
+    'default_value', 'style_config', 'extra_config'
+])
+
+RangeSpec = namedtuple('RangeSpec', [
+    'id', 'range_name', 'start_cell', 'end_cell', 'range_type', 'data_mapping'
+])
+
+StyleSpec = namedtuple('StyleSpec', [
+    'id', 'range_address', 'column_width', 'row_height', 'merge_cells', 'style_config'
+])
+
+# Estilo openpyxl ya construido; None en los atributos que no se modifican
+CellStyle = namedtuple('CellStyle', ['font', 'fill', 'alignment', 'border'])
+
+# Celda individual con coordenadas numéricas y su estilo compartido
+CellPlan = namedtuple('CellPlan', ['row', 'column', 'spec', 'style'])
+
+# Rango de estudiantes: columnas como (índice, tipo de dato); end_row None
+# significa tantas filas como estudiantes
+RangePlan = namedtuple('RangePlan', ['spec', 'start_row', 'end_row', 'columns'])
+
+_RANGE_CELL_RE = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _is_hex_color(value):
+    return isinstance(value, str) and len(value) == 6 and all(c in '0123456789ABCDEFabcdef' for c in value)
+
+
+def cell_coordinates(address):
+    """Dirección de una celda ('B7', '$B$7') como (fila, columna), o None si no es una celda"""
+
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(address)
+    except (TypeError, ValueError):
+        return None
+
+    if min_col is None or min_row is None or (min_col, min_row) != (max_col, max_row):
+        return None
+
+    return min_row, min_col
+
+
+def build_cell_style(style_config):
+    """
+    Objetos Font/PatternFill/Alignment/Border a partir del JSON de estilo de una celda
+
+    Se omiten la fuente con color inválido, el relleno blanco o inválido y
+    los bordes sin ningún lado. Retorna None si no queda nada que aplicar.
+    """
+
+    if isinstance(style_config, str):
+        style_config = json.loads(style_config)
+
+    if not style_config:
+        return None
+
+    font = fill = alignment = border = None
+
+    if 'font' in style_config:
+        font_config = style_config['font']
+        font_color = font_config.get('color', '000000')
+        if _is_hex_color(font_color):
+            font = Font(
+                name=font_config.get('name', 'Arial'),
+                size=font_config.get('size', 11),
+                bold=font_config.get('bold', False),
+                italic=font_config.get('italic', False),
+                color=font_color
+            )
+
+    if 'fill' in style_config:
+        fill_color = style_config['fill'].get('color', 'FFFFFF')
+        if _is_hex_color(fill_color) and fill_color.upper() != 'FFFFFF':
+            fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type='solid')
+
+    if 'alignment' in style_config:
+        align_config = style_config['alignment']
+        alignment_kwargs = {
+            'horizontal': align_config.get('horizontal', 'left'),
+            'vertical': align_config.get('vertical', 'top'),
+            'wrap_text': align_config.get('wrap_text', False)
+        }
+        for option in ('text_rotation', 'shrink_to_fit', 'indent'):
+            if option in align_config:
+                alignment_kwargs[option] = align_config[option]
+        alignment = Alignment(**alignment_kwargs)
+
+    if 'border' in style_config:
+        sides = {}
+        for side in ('left', 'right', 'top', 'bottom'):
+            side_config = style_config['border'].get(side)
+            if isinstance(side_config, dict) and side_config.get('style'):
+                sides[side] = Side(style=side_config['style'])
+        if sides:
+            border = Border(**sides)
+
+    if font is None and fill is None and alignment is None and border is None:
+        return None
+
+    return CellStyle(font, fill, alignment, border)
+
+
+def column_data_type(column_letter, mapping):
+    """Tipo de dato que va en una columna de un rango según su data_mapping"""
+
+    # Sistema simplificado: un solo tipo para todo el rango
+    if 'tipo' in mapping:
+        return mapping['tipo']
+
+    # Sistema anterior: tipo por letra de columna
+    if column_letter in mapping:
+        return mapping[column_letter]
+
+    # Rango de una sola columna: el primer valor
+    return next(iter(mapping.values())) if mapping else None
+
+
+def build_range_plan(range_spec):
+    """RangePlan de un rango de estudiantes, o None si su definición no es válida"""
+
+    try:
+        mapping = json.loads(range_spec.data_mapping)
+    except (TypeError, ValueError):
+        mapping = None
+
+    if not isinstance(mapping, dict):
+        logger.warning('Rango %s: data_mapping inválido', range_spec.range_name)
+        return None
+
+    start = _RANGE_CELL_RE.match((range_spec.start_cell or '').upper())
+    if not start:
+        logger.warning('Rango %s: celda inicial inválida %r', range_spec.range_name, range_spec.start_cell)
+        return None
+
+    start_col = column_index_from_string(start.group(1))
+    start_row = int(start.group(2))
+
+    end = _RANGE_CELL_RE.match((range_spec.end_cell or '').upper())
+    if end:
+        end_col = column_index_from_string(end.group(1))
+        end_row = int(end.group(2))
+    else:
+        # Rango abierto: solo la columna inicial, tantas filas como estudiantes
+        end_col = start_col
+        end_row = None
+
+    columns = []
+    for column in range(start_col, end_col + 1):
+        data_type = column_data_type(get_column_letter(column), mapping)
+        if data_type:
+            columns.append((column, data_type))
+
+    return RangePlan(range_spec, start_row, end_row, tuple(columns))
+
+
+class CompiledTemplate:
+    """
+    Plantilla ya procesada: libro openpyxl cargado una sola vez y metadata de
+    celdas, rangos y estilos. No se modifica; cada reporte trabaja sobre una
+    copia obtenida con new_workbook().
+
+    Las celdas y rangos se compilan la primera vez que se usan a coordenadas
+    numéricas y estilos openpyxl compartidos (cell_plans, range_plans), para
+    que el llenado no vuelva a parsear direcciones ni JSON en cada reporte.
+    """
+
+    __slots__ = (
+        'template_id', 'file_hash', '_workbook', 'cells', 'ranges', 'styles',
+        '_fingerprint', '_cell_plans', '_range_plans'
+    )
+
+    def __init__(self, template_id, file_hash, workbook, cells, ranges, styles):
+        self.template_id = template_id
+        self.file_hash = file_hash
+        self._workbook = workbook
+        self.cells = cells
+        self.ranges = ranges
+        self.styles = styles
+        self._fingerprint = None
+        self._cell_plans = None
+        self._range_plans = None
+
+    @property
+    def fingerprint(self):
+        """Hash del archivo y de la metadata: cambia con cualquier edición de la plantilla"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256(repr((self.file_hash, self.cells, self.ranges, self.styles)).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def cell_plans(self):
+        """Celdas individuales con coordenadas numéricas y estilos internados"""
+        if self._cell_plans is None:
+            self._cell_plans = self._compile_cells()
+        return self._cell_plans
+
+    @property
+    def range_plans(self):
+        """Rangos de estudiantes válidos, ya parseados"""
+        if self._range_plans is None:
+            self._range_plans = tuple(
+                plan for plan in (
+                    build_range_plan(range_spec)
+                    for range_spec in self.ranges if range_spec.range_type == 'students'
+                ) if plan is not None
+            )
+        return self._range_plans
+
+    def _compile_cells(self):
+        # Un solo juego de objetos de estilo por configuración distinta
+        styles = {}
+        plans = []
+
+        for cell in self.cells:
+            coordinates = cell_coordinates(cell.cell_address)
+            if coordinates is None:
+                logger.warning('Plantilla %s: dirección de celda inválida %r', self.template_id, cell.cell_address)
+                continue
+
+            style = None
+            if cell.style_config:
+                key = cell.style_config if isinstance(cell.style_config, str) else json.dumps(cell.style_config, sort_keys=True)
+                if key not in styles:
+                    try:
+                        styles[key] = build_cell_style(cell.style_config)
+                    except Exception:
+                        logger.warning('Plantilla %s: estilo inválido en %s', self.template_id, cell.cell_address, exc_info=True)
+                        styles[key] = None
+                style = styles[key]
+
+            plans.append(CellPlan(coordinates[0], coordinates[1], cell, style))
+
+        return tuple(plans)
+
+    @property
+    def has_workbook(self):
+        return self._workbook is not None
+
+    def new_workbook(self):
+        """Copia independiente del libro de la plantilla"""
+        if self._workbook is None:
+            return None
+        return clone_workbook(self._workbook)
+
+    def cells_by_content_type(self, content_type):
+        return [cell for cell in self.cells if cell.content_type == content_type]
+
+
+class TemplateCache:
+    """
+    Caché LRU de plantillas compiladas, por ID, versión y hash del archivo
+
+    Un cambio en el archivo genera un hash distinto y se recompila solo. Los
+    cambios de la plantilla o de su metadata (celdas, rangos, estilos)
+    incrementan ExcelTemplate.version en la misma transacción que los guarda:
+
+    - Cambios por el ORM se detectan en after_flush.
+    - Las escrituras en bloque (Query.delete(), inserciones con Core) llaman
+      a TemplateCache.mark() explícitamente.
+
+    Como la versión vive en la base de datos, los demás procesos dejan de
+    usar su copia en la siguiente solicitud. TemplateCache.invalidate() solo
+    libera antes la memoria del proceso que hizo el cambio.
+    """
+
+    SESSION_KEY = '_template_versions'
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    # Contador de invalidaciones por plantilla; evita guardar una compilación
+    # iniciada antes de una invalidación concurrente
+    _generations = {}
+
+    # Hash por archivo, válido mientras no cambien su tamaño ni fecha de modificación
+    _file_hashes = {}
+
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def _max_size():
+        try:
+            return current_app.config.get('TEMPLATE_CACHE_SIZE', 16)
+        except RuntimeError:
+            return 16
+
+    @staticmethod
+    def file_hash(file_path):
+        """Hash SHA-256 del contenido del archivo, o None si no existe"""
+
+        if not file_path or not os.path.exists(file_path):
+            return None
+
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        cached = TemplateCache._file_hashes.get(file_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b''):
+                digest.update(chunk)
+
+        file_hash = digest.hexdigest()
+        TemplateCache._file_hashes[file_path] = (signature, file_hash)
+        return file_hash
+
+    @staticmethod
+    def compile(template, file_hash=None):
+        """Carga el archivo y la metadata de una plantilla en un CompiledTemplate"""
+
+        if file_hash is None:
+            file_hash = TemplateCache.file_hash(template.file_path)
+
+        workbook = load_workbook(template.file_path) if file_hash else None
+
+        cells = tuple(
+            CellSpec(
+                cell.id, cell.cell_address, cell.cell_type, cell.data_type, cell.content_type,
+                cell.default_value, cell.style_config, cell.extra_config
+            )
+            for cell in TemplateCell.query.filter_by(template_id=template.id).order_by(TemplateCell.id)
+        )
+
+        ranges = tuple(
+            RangeSpec(
+                range_obj.id, range_obj.range_name, range_obj.start_cell, range_obj.end_cell,
+                range_obj.range_type, range_obj.data_mapping
+            )
+            for range_obj in TemplateRange.query.filter_by(template_id=template.id).order_by(TemplateRange.id)
+        )
+
+        styles = tuple(
+            StyleSpec(
+                style.id, style.range_address, style.column_width, style.row_height,
+                style.merge_cells, style.style_config
+            )
+            for style in TemplateStyle.query.filter_by(template_id=template.id).order_by(TemplateStyle.id)
+        )
+
+        return CompiledTemplate(template.id, file_hash, workbook, cells, ranges, styles)
+
+    @staticmethod
+    def get(template):
+        """
+        Plantilla compilada desde la caché, compilándola si hace falta
+
+        Args:
+            template: ExcelTemplate
+
+        Returns:
+            CompiledTemplate
+        """
+
+        file_hash = TemplateCache.file_hash(template.file_path)
+        key = (template.id, template.version or 0, file_hash)
+
+        with TemplateCache._lock:
+            compiled = TemplateCache._entries.get(key)
+            if compiled is not None:
+                TemplateCache._entries.move_to_end(key)
+                TemplateCache.hits += 1
+                return compiled
+
+            generation = TemplateCache._generations.get(template.id, 0)
+
+        compiled = TemplateCache.compile(template, file_hash)
+
+        with TemplateCache._lock:
+            TemplateCache.misses += 1
+
+            if TemplateCache._generations.get(template.id, 0) != generation:
+                return compiled
+
+            # Descartar versiones anteriores de la misma plantilla
+            for stale_key in [k for k in TemplateCache._entries if k[0] == template.id]:
+                del TemplateCache._entries[stale_key]
+
+            TemplateCache._entries[key] = compiled
+
+            max_size = TemplateCache._max_size()
+            while len(TemplateCache._entries) > max_size:
+                TemplateCache._entries.popitem(last=False)
+
+        return compiled
+
+    @staticmethod
+    def invalidate(template_id):
+        """Elimina de la caché todas las versiones de una plantilla"""
+
+        with TemplateCache._lock:
+            TemplateCache._generations[template_id] = TemplateCache._generations.get(template_id, 0) + 1
+            for key in [k for k in TemplateCache._entries if k[0] == template_id]:
+                del TemplateCache._entries[key]
+
+    # ------------------------------------------------------------------
+    # Versión de la plantilla
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _pending(session):
+        return session.info.setdefault(TemplateCache.SESSION_KEY, set())
+
+    @staticmethod
+    def mark(template_ids, session=None):
+        """Marca plantillas para incrementar su versión antes del commit"""
+
+        session = session or db.session
+        TemplateCache._pending(session).update(
+            template_id for template_id in template_ids if template_id is not None
+        )
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        template_ids = set()
+
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+
+            if isinstance(obj, ExcelTemplate):
+                # Una plantilla nueva no tiene copias en caché
+                if obj not in session.new:
+                    template_ids.add(obj.id)
+            elif isinstance(obj, METADATA_ENTITIES):
+                template_ids.add(obj.template_id)
+
+        if template_ids:
+            TemplateCache.mark(template_ids, session)
+
+    @staticmethod
+    def _before_commit(session):
+        if not session.info.get(TemplateCache.SESSION_KEY) and not (session.new or session.dirty or session.deleted):
+            return
+
+        # El flush puede marcar más plantillas (after_flush)
+        session.flush()
+
+        pending = session.info.pop(TemplateCache.SESSION_KEY, None)
+        if pending:
+            table = ExcelTemplate.__table__
+            session.execute(
+                table.update().where(table.c.id.in_(sorted(pending))).values(version=table.c.version + 1)
+            )
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop(TemplateCache.SESSION_KEY, None)
+
+    @staticmethod
+    def install(session):
+        """Registra los eventos de sesión que mantienen ExcelTemplate.version"""
+
+        for name, handler in (
+            ('after_flush', TemplateCache._after_flush),
+            ('before_commit', TemplateCache._before_commit),
+            ('after_rollback', TemplateCache._after_rollback),
+        ):
+            if not event.contains(session, name, handler):
+                event.listen(session, name, handler)
+
+    @staticmethod
+    def clear():
+        with TemplateCache._lock:
+            TemplateCache._entries.clear()
+            TemplateCache._file_hashes.clear()
+            TemplateCache.hits = 0
+            TemplateCache.misses = 0
+
+    @staticmethod
+    def stats():
+        with TemplateCache._lock:
+            return {
+                'size': len(TemplateCache._entries),
+                'max_size': TemplateCache._max_size(),
+                'hits': TemplateCache.hits,
+                'misses': TemplateCache.misses
+            }
@@ -18,6 +18,11 @@ class TemplateMapper:
         """Obtiene la nota del estudiante para el período actual"""
         from app.models.grades import FinalGrade
         
+        gradebook = context.get('gradebook')
+        if gradebook is not None:
+            values = [value for value in gradebook.student_values(student.id) if value is not None]
+            return values[0] if values else 0
+        
         grade = FinalGrade.query.filter_by(
             student_id=student.id,
             period_id=context['period_id']
@@ -30,6 +35,11 @@ class TemplateMapper:
         """Obtiene el promedio del estudiante"""
         from app.models.grades import FinalGrade
         
+        gradebook = context.get('gradebook')
+        if gradebook is not None:
+            average = gradebook.student_average(student.id)
+            return average if average is not None else 0
+        
         grades = FinalGrade.query.filter_by(
             student_id=student.id,
             period_id=context['period_id']
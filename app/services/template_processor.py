@@ -1,31 +1,89 @@
-from openpyxl import load_workbook, Workbook
+from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border
-from app.models.templates import ExcelTemplate, TemplateCell, TemplateRange, TemplateStyle, TemplateRange
+from app.models.templates import ExcelTemplate, TemplateRange
 from app.models.academic import Student, Section, Subject, Period, TeacherAssignment
 from app.models.grades import FinalGrade, StudentGrade
 from app.services.template_service import TemplateService
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from app.services.template_cache import TemplateCache
 from app import db
 from io import BytesIO
-import json
+import logging
 import re
 import os
 from datetime import datetime
 
+logger = logging.getLogger('app.templates')
+
+
+def _name_or_placeholder(value):
+    return value or 'didnt work bro'
+
+
+# Valor de cada tipo de dato de un rango de estudiantes: accessor(student, index)
+STUDENT_VALUE_ACCESSORS = {
+    'cedula': lambda student, index: student.student_id or '',
+    'nombre_completo': lambda student, index: f"{_name_or_placeholder(student.first_name)} {_name_or_placeholder(student.last_name)}".strip(),
+    'nombres': lambda student, index: _name_or_placeholder(student.first_name),
+    'apellidos': lambda student, index: _name_or_placeholder(student.last_name),
+    'numero_correlativo': lambda student, index: index + 1,
+    'numero': lambda student, index: index + 1
+}
+
+
 class TemplateProcessor:
     """Procesador de plantillas Excel con inyección de datos"""
     
-    def __init__(self, template):
+    def __init__(self, template, compiled=None):
         self.template = template
         self.workbook = None
         self.worksheet = None
+        # Permite recibir una plantilla ya compilada (p. ej. en procesos de generación por lotes)
+        self._compiled = compiled
+    
+    @staticmethod
+    def build_section_context(template, gradebook):
+        """
+        Contexto de datos de un reporte de sección a partir de su SectionGradebook
+        
+        Args:
+            template: Plantilla
+            gradebook: SectionGradebook de la sección y período
+        """
+        
+        section = gradebook.section
+        period = gradebook.period
+        now = datetime.now()
+        
+        return {
+            'template': template,
+            'section': section,
+            'grade': section.grade,
+            'period': period,
+            'academic_year': period.academic_year,
+            'students': gradebook.students,
+            'subjects': gradebook.subjects,
+            'grades_data': gradebook.grades_data(include_missing=True),
+            'current_date': now.strftime('%d/%m/%Y'),
+            'current_datetime': now,
+            'total_students': len(gradebook.students),
+            'total_subjects': len(gradebook.subjects),
+            'gradebook': gradebook
+        }
+    
+    @property
+    def compiled(self):
+        """Plantilla compilada (libro y metadata) obtenida de la caché"""
+        if self._compiled is None:
+            self._compiled = TemplateCache.get(self.template)
+        return self._compiled
         
     def load_template(self):
         """Cargar la plantilla Excel"""
         if not self.template.file_path or not os.path.exists(self.template.file_path):
             raise Exception(f"Archivo de plantilla no encontrado: {self.template.file_path}")
         
-        self.workbook = load_workbook(self.template.file_path)
+        # Copia del libro ya cargado en lugar de volver a leer el .xlsx
+        self.workbook = self.compiled.new_workbook()
         self.worksheet = self.workbook.active
         
     def generate_section_report(self, section, period):
@@ -83,8 +141,8 @@ class TemplateProcessor:
             """
             try:
                 # Cargar o crear workbook
-                if self.template.file_path and os.path.exists(self.template.file_path):
-                    self.workbook = load_workbook(self.template.file_path)
+                if self.compiled.has_workbook:
+                    self.workbook = self.compiled.new_workbook()
                     self.worksheet = self.workbook.active
                 else:
                     self.workbook = Workbook()
@@ -102,9 +160,7 @@ class TemplateProcessor:
                 return self.workbook
                 
             except Exception as e:
-                print(f"Error procesando plantilla: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception('Error procesando plantilla %s', self.template.id)
                 raise Exception(f"Error procesando plantilla: {str(e)}")
     
     def _process_student_table(self, context):
@@ -118,10 +174,7 @@ class TemplateProcessor:
                 return
             
             # Buscar celdas marcadas como tabla de estudiantes
-            table_cells = TemplateCell.query.filter_by(
-                template_id=self.template.id,
-                content_type='student_table'
-            ).all()
+            table_cells = self.compiled.cells_by_content_type('student_table')
             
             if not table_cells:
                 return
@@ -163,8 +216,8 @@ class TemplateProcessor:
                         value=grade if grade is not None else ""
                     )
                     
-        except Exception as e:
-            print(f"Error procesando tabla de estudiantes: {e}")
+        except Exception:
+            logger.exception('Error procesando tabla de estudiantes')
     
     def _process_subject_headers(self, context):
         """Procesar headers de asignaturas dinámicamente"""
@@ -172,32 +225,27 @@ class TemplateProcessor:
             subjects = context.get('subjects', [])
             
             # Buscar celdas marcadas como headers de asignaturas
-            header_cells = TemplateCell.query.filter_by(
-                template_id=self.template.id,
-                content_type='subject_header'
-            ).all()
+            header_cells = self.compiled.cells_by_content_type('subject_header')
             
             for i, subject in enumerate(subjects):
                 if i < len(header_cells):
                     cell = header_cells[i]
                     self.worksheet[cell.cell_address] = subject.name
                     
-        except Exception as e:
-            print(f"Error procesando headers de asignaturas: {e}")
+        except Exception:
+            logger.exception('Error procesando headers de asignaturas')
     
     def _apply_template_styles(self):
         """Aplicar estilos globales de la plantilla"""
         try:
             # Aplicar estilos de rangos
-            template_styles = TemplateStyle.query.filter_by(
-                template_id=self.template.id
-            ).all()
+            template_styles = self.compiled.styles
             
             for style in template_styles:
                 self._apply_range_style(style)
                 
-        except Exception as e:
-            print(f"Error aplicando estilos de plantilla: {e}")
+        except Exception:
+            logger.exception('Error aplicando estilos de plantilla')
     
     def _apply_range_style(self, template_style):
         """Aplicar estilo a un rango de celdas"""
@@ -213,8 +261,8 @@ class TemplateProcessor:
             if template_style.row_height and template_style.range_address.isdigit():
                 self.worksheet.row_dimensions[int(template_style.range_address)].height = template_style.row_height
                 
-        except Exception as e:
-            print(f"Error aplicando estilo de rango: {e}")
+        except Exception:
+            logger.exception('Error aplicando estilo de rango %s', template_style.range_address)
     
     
     def _column_letter_to_number(self, column_letter):
@@ -224,132 +272,17 @@ class TemplateProcessor:
             result = result * 26 + (ord(char.upper()) - ord('A') + 1)
         return result
 
-    def _apply_cell_style(self, cell, style_config_json):
-        """Aplicar estilo a una celda"""
-        
-        print(f"🎨 DEBUG: Aplicando estilo a celda {cell.coordinate}")
-        print(f"   📄 Estilo JSON recibido: {style_config_json}")
-        
-        try:
-            # DESERIALIZAR EL JSON PRIMERO
-            if isinstance(style_config_json, str):
-                style_config = json.loads(style_config_json)
-            else:
-                style_config = style_config_json
-            
-            print(f"   📋 Estilo deserializado: {style_config}")
-            
-            # Fuente
-            if 'font' in style_config:
-                font_config = style_config['font']
-                font_color = font_config.get('color', '000000')
-                
-                print(f"   📝 Aplicando font - color: {font_color}")
-                
-                # Asegurar formato correcto de color
-                if len(font_color) == 6 and all(c in '0123456789ABCDEFabcdef' for c in font_color):
-                    cell.font = Font(
-                        name=font_config.get('name', 'Arial'),
-                        size=font_config.get('size', 11),
-                        bold=font_config.get('bold', False),
-                        italic=font_config.get('italic', False),
-                        color=font_color
-                    )
-                    print(f"   ✅ Font aplicada correctamente")
-                else:
-                    print(f"   ❌ Color de font inválido: {font_color}")
-            
-            # Relleno - Solo aplicar si existe y no es blanco
-            if 'fill' in style_config:
-                fill_config = style_config['fill']
-                fill_color = fill_config.get('color', 'FFFFFF')
-                
-                print(f"   🎨 Evaluando fill - color: {fill_color}")
-                
-                # Validar color y aplicar solo si no es blanco
-                if (len(fill_color) == 6 and 
-                    all(c in '0123456789ABCDEFabcdef' for c in fill_color) and 
-                    fill_color.upper() != 'FFFFFF'):
-                    
-                    cell.fill = PatternFill(
-                        start_color=fill_color,
-                        end_color=fill_color,
-                        fill_type='solid'
-                    )
-                    print(f"   ✅ Fill aplicado: {fill_color}")
-                else:
-                    print(f"   ⚪ Fill ignorado (blanco o inválido): {fill_color}")
-            
-            # ALINEACIÓN - INCLUYENDO ORIENTACIÓN DE TEXTO
-            if 'alignment' in style_config:
-                align_config = style_config['alignment']
-                
-                alignment_kwargs = {
-                    'horizontal': align_config.get('horizontal', 'left'),
-                    'vertical': align_config.get('vertical', 'top'),
-                    'wrap_text': align_config.get('wrap_text', False)
-                }
-                
-                # 🔄 APLICAR ROTACIÓN DE TEXTO
-                if 'text_rotation' in align_config:
-                    alignment_kwargs['text_rotation'] = align_config['text_rotation']
-                    print(f"   🔄 Aplicando rotación {align_config['text_rotation']}° a {cell.coordinate}")
-                
-                # Aplicar shrink_to_fit si existe
-                if 'shrink_to_fit' in align_config:
-                    alignment_kwargs['shrink_to_fit'] = align_config['shrink_to_fit']
-                
-                # Aplicar indent si existe
-                if 'indent' in align_config:
-                    alignment_kwargs['indent'] = align_config['indent']
-                
-                cell.alignment = Alignment(**alignment_kwargs)
-                print(f"   📐 Alignment aplicado: {alignment_kwargs}")
-            
-            # Bordes - CORREGIDO
-            if 'border' in style_config:
-                border_config = style_config['border']
-                
-                # Extraer solo el estilo de cada lado (no todo el diccionario)
-                left_side = None
-                if 'left' in border_config and isinstance(border_config['left'], dict):
-                    left_style = border_config['left'].get('style')
-                    if left_style:
-                        left_side = Side(style=left_style)
-                
-                right_side = None
-                if 'right' in border_config and isinstance(border_config['right'], dict):
-                    right_style = border_config['right'].get('style')
-                    if right_style:
-                        right_side = Side(style=right_style)
-                
-                top_side = None
-                if 'top' in border_config and isinstance(border_config['top'], dict):
-                    top_style = border_config['top'].get('style')
-                    if top_style:
-                        top_side = Side(style=top_style)
-                
-                bottom_side = None
-                if 'bottom' in border_config and isinstance(border_config['bottom'], dict):
-                    bottom_style = border_config['bottom'].get('style')
-                    if bottom_style:
-                        bottom_side = Side(style=bottom_style)
-                
-                # Solo aplicar si hay al menos un borde
-                if any([left_side, right_side, top_side, bottom_side]):
-                    cell.border = Border(
-                        left=left_side,
-                        right=right_side,
-                        top=top_side,
-                        bottom=bottom_side
-                    )
-                    
-        except Exception as e:
-            print(f"Error aplicando estilo a celda {cell.coordinate}: {e}")
-            import traceback
-            traceback.print_exc()
-            # No aplicar ningún estilo si hay error
-            pass
+    def _apply_style(self, cell, style):
+        """Aplicar un CellStyle ya construido (objetos compartidos por la plantilla)"""
+        
+        if style.font is not None:
+            cell.font = style.font
+        if style.fill is not None:
+            cell.fill = style.fill
+        if style.alignment is not None:
+            cell.alignment = style.alignment
+        if style.border is not None:
+            cell.border = style.border
 
 
     def generate_preview(self):
@@ -376,9 +309,7 @@ class TemplateProcessor:
         # Procesar solo celdas individuales para la vista previa
         preview_data = {}
         
-        individual_cells = TemplateCell.query.filter_by(
-            template_id=self.template.id
-        ).all()
+        individual_cells = self.compiled.cells
         
         for cell in individual_cells:
             try:
@@ -453,196 +384,70 @@ class TemplateProcessor:
     def _process_individual_cells(self, context):
         """Procesar celdas individuales"""
         
-        individual_cells = TemplateCell.query.filter_by(
-            template_id=self.template.id
-        ).all()
-    
+        worksheet = self.worksheet
         
-        for cell in individual_cells:
-            
+        for plan in self.compiled.cell_plans:
             try:
-                value = self._get_cell_value(cell, context)
+                value = self._get_cell_value(plan.spec, context)
                 
                 if value is not None and value != '':
-                    self.worksheet[cell.cell_address] = value
+                    cell = worksheet.cell(row=plan.row, column=plan.column, value=value)
                     
                     # Aplicar estilo si existe
-                    if cell.style_config:
-                        self._apply_cell_style(
-                            self.worksheet[cell.cell_address], 
-                            cell.style_config
-                        )
+                    if plan.style is not None:
+                        self._apply_style(cell, plan.style)
                     
-            except Exception as e:
-                print(f"  - ✗ Error procesando celda: {e}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                logger.exception('Error procesando celda %s', plan.spec.cell_address)
                 continue
     
     def _process_ranges(self, context):
-        """Procesar rangos iterativos"""
-        
-        ranges = TemplateRange.query.filter_by(
-            template_id=self.template.id
-        ).all()
+        """Procesar rangos iterativos (solo los de estudiantes tienen datos)"""
         
-        print(f"=== DEBUG _process_ranges ===")
-        print(f"Template ID: {self.template.id}")
-        print(f"Rangos encontrados: {len(ranges)}")
+        range_plans = self.compiled.range_plans
+        logger.debug('Plantilla %s: %d rangos de estudiantes', self.template.id, len(range_plans))
         
-        for range_obj in ranges:
-            print(f"Procesando rango: {range_obj.range_name}")
-            print(f"  - Tipo: {range_obj.range_type}")
-            print(f"  - Start: {range_obj.start_cell}")
-            print(f"  - Mapping: {range_obj.data_mapping}")
-            
+        for plan in range_plans:
             try:
-                self._process_single_range(range_obj, context)
-                print(f"  - ✓ Rango procesado exitosamente")
-            except Exception as e:
-                print(f"  - ✗ Error procesando rango: {e}")
-                import traceback
-                traceback.print_exc()
+                self._process_students_range(plan, context)
+            except Exception:
+                logger.exception('Error procesando rango %s', plan.spec.range_name)
                 continue
-        
-        print(f"=== FIN DEBUG _process_ranges ===")
 
-    def _process_students_range(self, range_obj, context):
-        """Procesar rango de estudiantes"""
-        
-        import json
-        import re
-        from openpyxl.utils import column_index_from_string, get_column_letter
+    def _process_students_range(self, plan, context):
+        """Llenar un rango de estudiantes a partir de su RangePlan"""
         
-        # Obtener estudiantes del contexto
         students = context.get('students', [])
-        print(f"    Estudiantes disponibles: {len(students)}")
-        
         if not students:
-            print("    No hay estudiantes para procesar")
-            return
-        
-        # Parsear mapping
-        try:
-            mapping = json.loads(range_obj.data_mapping)
-            print(f"    Mapping: {mapping}")
-        except Exception as e:
-            print(f"    Error parseando mapping: {e}")
             return
         
-        # Procesar rango
-        start_cell = range_obj.start_cell
-        end_cell = range_obj.end_cell
-        
-        if not start_cell:
-            print("    No hay celda inicial")
-            return
+        # Columna -> función de valor, resuelto una vez por rango
+        columns = []
+        for column, data_type in plan.columns:
+            accessor = STUDENT_VALUE_ACCESSORS.get(data_type)
+            if accessor is None:
+                logger.debug('Rango %s: tipo de dato no reconocido %r', plan.spec.range_name, data_type)
+                continue
+            columns.append((column, accessor))
         
-        # Extraer coordenadas del rango
-        start_match = re.match(r'([A-Z]+)(\d+)', start_cell.upper())  # ← Agregar .upper()
-        if not start_match:
-            print(f"    Formato de celda inicial inválido: {start_cell}")
+        if not columns:
             return
         
-        start_col = start_match.group(1)
-        start_row = int(start_match.group(2))
+        end_row = plan.end_row if plan.end_row is not None else plan.start_row + len(students) - 1
+        logger.debug('Rango %s: %d estudiantes, filas %d a %d', plan.spec.range_name, len(students), plan.start_row, end_row)
         
-        # Si hay celda final, calcular rango completo
-        if end_cell:
-            end_match = re.match(r'([A-Z]+)(\d+)', end_cell.upper())  # ← Agregar .upper()
-            if end_match:
-                end_col = end_match.group(1)
-                end_row = int(end_match.group(2))
-                print(f"    Rango completo: {start_cell} hasta {end_cell}")
-            else:
-                end_col = start_col
-                end_row = start_row + len(students) - 1
-                print(f"    Rango calculado: {start_cell} hasta {end_col}{end_row}")
-        else:
-            # Rango abierto: solo columna inicial, tantas filas como estudiantes
-            end_col = start_col
-            end_row = start_row + len(students) - 1
-            print(f"    Rango abierto: {start_cell} hasta {end_col}{end_row}")
-        
-        # Determinar columnas a procesar
-        start_col_idx = column_index_from_string(start_col)
-        end_col_idx = column_index_from_string(end_col)
-        
-        print(f"    Columnas a procesar: {start_col} ({start_col_idx}) hasta {end_col} ({end_col_idx})")
-        
-        # Procesar cada estudiante
-        for i, student in enumerate(students):
-            current_row = start_row + i
+        cell = self.worksheet.cell
+        for index, student in enumerate(students):
+            row = plan.start_row + index
             
             # Si excede el rango de filas, parar
-            if current_row > end_row:
-                print(f"    Límite de filas alcanzado en fila {current_row}")
+            if row > end_row:
                 break
             
-            # ← CAMBIAR ESTA LÍNEA:
-            print(f"      Estudiante {i+1}: {student.first_name} {student.last_name} -> Fila {current_row}")
-            
-            # Procesar cada columna del rango
-            for col_idx in range(start_col_idx, end_col_idx + 1):
-                col_letter = get_column_letter(col_idx)
-                cell_address = f"{col_letter}{current_row}"
-                
-                # Determinar qué dato va en esta columna
-                data_type = self._get_data_type_for_column(col_letter, mapping, start_col)
-                
-                if data_type:
-                    value = self._get_student_data_value(student, data_type, i)
-                    print(f"        {cell_address} = '{value}' (tipo: {data_type})")
-                    
-                    if value is not None and value != '':
-                        self.worksheet[cell_address] = value
-                else:
-                    print(f"        {cell_address} = (sin mapeo)")
-
-    def _get_data_type_for_column(self, col_letter, mapping, start_col):
-        """Determinar qué tipo de dato va en una columna específica"""
-        
-        # Nuevo sistema simplificado
-        if 'tipo' in mapping:
-            return mapping['tipo']
-        
-        # Fallback para sistema anterior
-        if col_letter in mapping:
-            return mapping[col_letter]
-        
-        # Si es rango de una sola columna, usar el primer valor
-        return list(mapping.values())[0] if mapping else None
-
-    def _get_student_data_value(self, student, data_type, index=0):
-        """Obtener valor de dato del estudiante"""
-        
-        # ← CAMBIAR TODAS ESTAS LÍNEAS:
-        if data_type == 'cedula':
-            return student.student_id or ''
-        elif data_type == 'nombre_completo':
-            first_name = student.first_name or 'didnt work bro'
-            last_name = student.last_name or 'didnt work bro'
-            return f"{first_name} {last_name}".strip()
-        elif data_type == 'nombres':
-            return student.first_name or 'didnt work bro'
-        elif data_type == 'apellidos':
-            return student.last_name or 'didnt work bro'
-        elif data_type == 'numero_correlativo' or data_type == 'numero':
-            return index + 1
-        else:
-            print(f"        Tipo de dato no reconocido: {data_type}")
-            return ''
-    
-    def _process_single_range(self, range_obj, context):
-        """Procesar un rango específico"""
-        
-        print(f"  _process_single_range: {range_obj.range_name}")
-        print(f"    Tipo: {range_obj.range_type}")
-        print(f"    Start cell: {range_obj.start_cell}")
-        print(f"    Data mapping: {range_obj.data_mapping}")
-        
-        if range_obj.range_type == 'students':
-            self._process_students_range(range_obj, context)
+            for column, accessor in columns:
+                value = accessor(student, index)
+                if value is not None and value != '':
+                    cell(row=row, column=column, value=value)
     
     def _get_students_data(self, context, column_mapping):
         """Obtener datos de estudiantes"""
@@ -840,6 +645,10 @@ class TemplateProcessor:
     def _calculate_section_average(self, context):
         """Calcular promedio general de la sección"""
         
+        gradebook = context.get('gradebook')
+        if gradebook is not None:
+            return gradebook.section_average or 0
+        
         students = context.get('students', [])
         subjects = context.get('subjects', [])
         period = context.get('period')
@@ -860,7 +669,17 @@ class TemplateProcessor:
         return round(total_grades / grade_count, 2) if grade_count > 0 else 0
     
     def _count_passing_students(self, context):
-        """Contar estudiantes aprobados"""
+        """
+        Contar estudiantes aprobados
+
+        Con el SectionGradebook del contexto: promedio >= PASSING_GRADE sobre
+        las asignaturas calificadas. Una nota 0 (NP) cuenta en el promedio; una
+        asignatura sin nota no.
+        """
+        
+        gradebook = context.get('gradebook')
+        if gradebook is not None:
+            return gradebook.students_passing
         
         students = context.get('students', [])
         subjects = context.get('subjects', [])
@@ -918,12 +737,12 @@ class TemplateProcessor:
         """Procesa template con extensión automática de rangos"""
         
         try:
-            print(f"🔄 Procesando template {template_id} con auto-extensión")
+            logger.info('Procesando plantilla %s con auto-extensión', template_id)
             
             # 1. Detectar rangos si no existen
             existing_ranges = TemplateRange.query.filter_by(template_id=template_id).count()
             if existing_ranges == 0:
-                print("🔍 Detectando rangos automáticamente...")
+                logger.info('Detectando rangos automáticamente')
                 TemplateService.detect_data_ranges_from_template(template_id)
             
             # 2. Extender rangos según los datos
@@ -933,5 +752,5 @@ class TemplateProcessor:
             return self.process_template(template_id, data)
             
         except Exception as e:
-            print(f"❌ Error en process_template_with_auto_extension: {e}")
+            logger.exception('Error en process_template_with_auto_extension')
             raise e
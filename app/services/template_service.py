@@ -1,82 +1,117 @@
-from openpyxl import load_workbook
-from app.models.templates import ExcelTemplate, TemplateCell, TemplateStyle, TemplateRange
+from app.models.templates import ExcelTemplate, TemplateCell, TemplateCellStyle, TemplateStyle, TemplateRange
 from app.services.template_mapper import TemplateMapper
+from app.services.template_cache import TemplateCache
+from app.utils.database import UPSERT_CHUNK_SIZE
+from app.utils.excel import load_active_sheet, populated_cells
 from app import db
+import hashlib
+import logging
 import json
 import os
 import re
 
+logger = logging.getLogger('app.templates')
+
 class TemplateService:
     
     @staticmethod
-    def analyze_template_structure(template_id, file_path):
-        """Analiza la estructura de un archivo Excel y crea celdas automáticamente"""
+    def analyze_template_structure(template_id, file_path, progress=None):
+        """
+        Analiza la estructura de un archivo Excel y crea celdas automáticamente
+        
+        Solo se cargan la hoja activa y sus celdas con valor. Cada
+        formato distinto se extrae una vez y se guarda en template_cell_styles,
+        referenciado por las celdas; celdas y dimensiones se insertan en bloque.
+        
+        Args:
+            template_id: ID de la plantilla
+            file_path: Ruta del .xlsx
+            progress: Función opcional progress(done, total, message)
+        
+        Returns:
+            dict: Celdas, estilos compartidos y dimensiones guardados
+        """
         
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
         
         try:
-            # Cargar workbook
-            wb = load_workbook(file_path)
-            ws = wb.active
+            # Solo se carga la hoja activa
+            ws = load_active_sheet(file_path)
             
-            # Limpiar celdas existentes
+            # Limpiar celdas existentes (escrituras en bloque: la versión se marca aquí)
+            TemplateCache.mark([template_id])
             TemplateCell.query.filter_by(template_id=template_id).delete()
+            TemplateCellStyle.query.filter_by(template_id=template_id).delete()
             TemplateStyle.query.filter_by(template_id=template_id).delete()
             
-            # print(f"🔍 Analizando estructura del template {template_id}")
+            cells = populated_cells(ws)
+            total = len(cells)
+            if progress:
+                progress(0, total, 'Analizando celdas')
             
-            # Analizar celdas con contenido
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value is not None:
-                        # 🔢 DETERMINAR TIPO DE DATO Y FORMATO
-                        cell_data_type = TemplateService._determine_cell_data_type(cell)
-                        formatted_value = TemplateService._format_cell_value(cell)
-                        
-                        # print(f"Celda: {cell.coordinate}, Valor: {cell.value}, Tipo: {cell_data_type}, Formateado: {formatted_value}")
-                        
-                        # Crear celda de plantilla
-                        template_cell = TemplateCell(
-                            template_id=template_id,
-                            cell_address=cell.coordinate,
-                            cell_type='static',  # Por defecto estático
-                            default_value=formatted_value,  # Usar valor formateado
-                            data_type=cell_data_type,  # 🔢 NUEVO: Guardar tipo de dato
-                            style_config=TemplateService._extract_cell_style(cell)
-                        )
-                        db.session.add(template_cell)
-            
-            # Analizar estilos de columnas
-            for col_letter, col_dimension in ws.column_dimensions.items():
-                if col_dimension.width:
-                    try:
-                        template_style = TemplateStyle(
-                            template_id=template_id,
-                            range_address=f"{col_letter}:{col_letter}",
-                            column_width=col_dimension.width
-                        )
-                        db.session.add(template_style)
-                    except Exception as e:
-                        print(f"Error procesando columna {col_letter}: {e}")
-                        continue
-            
-            # Analizar estilos de filas
-            for row_num, row_dimension in ws.row_dimensions.items():
-                if row_dimension.height:
-                    try:
-                        template_style = TemplateStyle(
-                            template_id=template_id,
-                            range_address=f"{row_num}:{row_num}",
-                            row_height=row_dimension.height
-                        )
-                        db.session.add(template_style)
-                    except Exception as e:
-                        print(f"Error procesando fila {row_num}: {e}")
-                        continue
+            # Estilo extraído una vez por formato del libro: las celdas con el
+            # mismo formato comparten el mismo JSON y la misma fila de estilo
+            extracted = {}
+            style_hashes = {}
+            cell_rows = []
+            
+            for cell in cells:
+                style_id = cell.style_id
+                if style_id not in extracted:
+                    style_config = TemplateService._extract_cell_style(cell)
+                    style_hash = hashlib.sha256(style_config.encode('utf-8')).hexdigest() if style_config else None
+                    if style_hash:
+                        style_hashes[style_hash] = style_config
+                    extracted[style_id] = style_hash
+                
+                cell_rows.append({
+                    'template_id': template_id,
+                    'cell_address': cell.coordinate,
+                    'cell_type': 'static',  # Por defecto estático
+                    'default_value': TemplateService._format_cell_value(cell),  # Usar valor formateado
+                    'data_type': TemplateService._determine_cell_data_type(cell),
+                    'style_hash': extracted[style_id]
+                })
+            
+            if style_hashes:
+                db.session.execute(TemplateCellStyle.__table__.insert(), [
+                    {'template_id': template_id, 'style_hash': style_hash, 'style_config': style_config}
+                    for style_hash, style_config in style_hashes.items()
+                ])
+            
+            style_ids = dict(
+                db.session.query(TemplateCellStyle.style_hash, TemplateCellStyle.id).filter_by(template_id=template_id)
+            )
+            for row in cell_rows:
+                row['cell_style_id'] = style_ids.get(row.pop('style_hash'))
+            
+            for start in range(0, total, UPSERT_CHUNK_SIZE):
+                db.session.execute(TemplateCell.__table__.insert(), cell_rows[start:start + UPSERT_CHUNK_SIZE])
+                if progress:
+                    progress(min(start + UPSERT_CHUNK_SIZE, total), total, 'Guardando celdas')
+            
+            # Anchos de columna y altos de fila
+            dimension_rows = [
+                {'template_id': template_id, 'range_address': f"{col_letter}:{col_letter}", 'column_width': col_dimension.width, 'row_height': None}
+                for col_letter, col_dimension in ws.column_dimensions.items() if col_dimension.width
+            ]
+            dimension_rows.extend(
+                {'template_id': template_id, 'range_address': f"{row_num}:{row_num}", 'column_width': None, 'row_height': row_dimension.height}
+                for row_num, row_dimension in ws.row_dimensions.items() if row_dimension.height
+            )
+            if dimension_rows:
+                db.session.execute(TemplateStyle.__table__.insert(), dimension_rows)
             
             db.session.commit()
-            print(f"Plantilla {template_id} analizada exitosamente")
+            TemplateCache.invalidate(template_id)
+            logger.info('Plantilla %s analizada: %d celdas, %d estilos distintos', template_id, total, len(style_hashes))
+            
+            return {
+                'cells': total,
+                'cell_styles': len(style_hashes),
+                'dimensions': len(dimension_rows)
+            }
             
         except Exception as e:
             db.session.rollback()
@@ -195,7 +230,7 @@ class TemplateService:
                         # print(f"   📝 Color procesado de fuente: {font_color}")
                             
                 except Exception as font_error:
-                    print(f"   ❌ Error procesando color de fuente: {font_error}")
+                    logger.debug('Color de fuente inválido en %s: %s', cell.coordinate, font_error)
                     font_color = '000000'
                 
                 style_config['font'] = {
@@ -234,11 +269,9 @@ class TemplateService:
                             'color': fill_color
                         }
                         # print(f"   ✅ Fill guardado: {fill_color}")
-                    else:
-                        print(f"   ⚪ Fill blanco ignorado")
                         
                 except Exception as fill_error:
-                    print(f"   ❌ Error procesando fill: {fill_error}")
+                    logger.debug('Relleno inválido en %s: %s', cell.coordinate, fill_error)
             
             # BORDES - CAPTURAR EL ESTILO ORIGINAL EXACTO
             if cell.border:
@@ -311,7 +344,7 @@ class TemplateService:
                         # print(f"   🔲 Border extraído: {border_config}")
                         
                 except Exception as border_error:
-                    print(f"   ❌ Error procesando bordes: {border_error}")
+                    logger.debug('Bordes inválidos en %s: %s', cell.coordinate, border_error)
             
             # Alineación
             if cell.alignment:
@@ -343,9 +376,7 @@ class TemplateService:
             return result
             
         except Exception as e:
-            print(f"❌ ERROR GENERAL extrayendo estilo de {cell.coordinate}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.warning('Error extrayendo estilo de %s', cell.coordinate, exc_info=True)
             return None
 
     # Agregar estos métodos al final de la clase TemplateService
@@ -540,6 +571,7 @@ class TemplateService:
                     db.session.add(new_range)
             
             db.session.commit()
+            TemplateCache.invalidate(template_id)
             # print(f"✅ Rangos detectados y guardados para template {template_id}")
             return student_ranges
             
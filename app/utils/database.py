@@ -0,0 +1,304 @@
+from app import db
+from sqlalchemy import tuple_, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, NullPool
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import deque
+import threading
+import logging
+import math
+import time
+
+logger = logging.getLogger('app.db')
+
+# Filas por sentencia INSERT; mantiene el número de parámetros por debajo
+# del límite de SQLite y evita sentencias gigantes en PostgreSQL
+UPSERT_CHUNK_SIZE = 500
+
+
+def bulk_upsert(model, rows, index_elements, update_columns):
+    """
+    Inserta o actualiza filas en bloque usando INSERT ... ON CONFLICT
+
+    Args:
+        model: Modelo SQLAlchemy destino
+        rows: Lista de diccionarios {columna: valor}
+        index_elements: Columnas de la restricción única que define el conflicto
+        update_columns: Columnas a sobrescribir cuando la fila ya existe
+
+    Returns:
+        int: Número de filas enviadas
+    """
+
+    if not rows:
+        return 0
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        insert = postgresql.insert
+    elif dialect == 'sqlite':
+        insert = sqlite.insert
+    else:
+        _bulk_upsert_fallback(model, rows, index_elements, update_columns)
+        return len(rows)
+
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+        stmt = insert(model.__table__).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+        db.session.execute(stmt)
+
+    return len(rows)
+
+
+def _bulk_upsert_fallback(model, rows, index_elements, update_columns):
+    """Upsert para motores sin ON CONFLICT: una consulta IN y mapeos en bloque"""
+
+    key_columns = [getattr(model, column) for column in index_elements]
+    keys = [tuple(row[column] for column in index_elements) for row in rows]
+
+    existing = {}
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        chunk = keys[start:start + UPSERT_CHUNK_SIZE]
+        for record in db.session.query(model.id, *key_columns).filter(tuple_(*key_columns).in_(chunk)):
+            existing[tuple(record[1:])] = record[0]
+
+    updates = []
+    inserts = []
+    for key, row in zip(keys, rows):
+        if key in existing:
+            update = {column: row[column] for column in update_columns}
+            update['id'] = existing[key]
+            updates.append(update)
+        else:
+            inserts.append(row)
+
+    if updates:
+        db.session.bulk_update_mappings(model, updates)
+    if inserts:
+        db.session.bulk_insert_mappings(model, inserts)
+
+
+# ----------------------------------------------------------------------
+# Configuración del motor y del pool de conexiones
+# ----------------------------------------------------------------------
+
+# Esperas conservadas para calcular percentiles
+WAIT_SAMPLES = 1000
+
+
+class PoolMetrics:
+    """
+    Esperas al obtener conexiones del pool y ocupación máxima
+
+    Cada checkout registra cuánto tardó en obtener la conexión (espera por
+    una libre más, si hizo falta, la apertura de una nueva, que también se
+    cuenta aparte). La saturación es conexiones en uso / capacidad del pool
+    (pool_size + max_overflow).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.reset()
+
+    def reset(self):
+        # Las conexiones en uso siguen en uso: solo se reinician los acumulados
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.waits = deque(maxlen=WAIT_SAMPLES)
+            self.connects = 0
+            self.connect_total = 0.0
+            self.peak_in_use = self.in_use
+
+    def checked_out(self, wait):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.waits.append(wait)
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def timed_out(self, wait):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_max = max(self.wait_max, wait)
+
+    def connected(self, elapsed):
+        with self._lock:
+            self.connects += 1
+            self.connect_total += elapsed
+
+    def snapshot(self, capacity=None):
+        """Métricas actuales; capacity None para pools sin límite (NullPool)"""
+
+        with self._lock:
+            waits = sorted(self.waits)
+            checkouts = self.checkouts
+            return {
+                'checkouts': checkouts,
+                'timeouts': self.timeouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'capacity': capacity,
+                'saturation': round(self.in_use / capacity, 3) if capacity else None,
+                'peak_saturation': round(self.peak_in_use / capacity, 3) if capacity else None,
+                'avg_wait_ms': round(self.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                'p95_wait_ms': round(waits[math.ceil(len(waits) * 0.95) - 1] * 1000, 3) if waits else 0.0,
+                'max_wait_ms': round(self.wait_max * 1000, 3),
+                'connects': self.connects,
+                'avg_connect_ms': round(self.connect_total / self.connects * 1000, 3) if self.connects else 0.0
+            }
+
+
+class _MeteredPool:
+    """Mezcla para pools de SQLAlchemy que registra sus checkouts en PoolMetrics"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            wait = time.perf_counter() - started
+            self.metrics.timed_out(wait)
+            logger.warning('Pool de conexiones agotado tras %.0f ms (%s)', wait * 1000, self.status())
+            raise
+        self.metrics.checked_out(time.perf_counter() - started)
+        return record
+
+    def _do_return_conn(self, record):
+        self.metrics.checked_in()
+        super()._do_return_conn(record)
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        record = super()._create_connection()
+        self.metrics.connected(time.perf_counter() - started)
+        return record
+
+    def recreate(self):
+        # engine.dispose() reemplaza el pool; las métricas continúan
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    def capacity(self):
+        return self.size() + max(self._max_overflow, 0)
+
+
+class MeteredNullPool(_MeteredPool, NullPool):
+    def capacity(self):
+        return None
+
+
+def pool_limits(config):
+    """
+    (pool_size, max_overflow) por proceso
+
+    DB_POOL_SIZE = 0 usa un tamaño automático: un hilo web por conexión más
+    los hilos de trabajos en segundo plano (WEB_THREADS + JOB_WORKERS). Con
+    DB_MAX_CONNECTIONS el total de conexiones de todos los procesos
+    (WEB_CONCURRENCY) no supera ese límite.
+    """
+
+    pool_size = config.get('DB_POOL_SIZE') or config.get('WEB_THREADS', 1) + config.get('JOB_WORKERS', 2)
+    max_overflow = config.get('DB_MAX_OVERFLOW', 2)
+
+    budget = config.get('DB_MAX_CONNECTIONS')
+    if budget:
+        per_process = max(1, budget // max(1, config.get('WEB_CONCURRENCY', 1)))
+        pool_size = min(pool_size, per_process)
+        max_overflow = min(max_overflow, per_process - pool_size)
+
+    return pool_size, max_overflow
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS a partir de la configuración (ver DB_* en config.py)
+
+    SQLite conserva las opciones por defecto. En PostgreSQL el pool se
+    dimensiona con pool_limits, comprueba la conexión antes de usarla
+    (pre-ping), la renueva cada DB_POOL_RECYCLE segundos y fija
+    statement_timeout al conectar.
+
+    Con DB_PGBOUNCER (pooler en modo transacción, p. ej. PgBouncer o el
+    puerto 6543 de Supabase) el pool lo gestiona el pooler: se usa NullPool
+    y se desactivan las sentencias preparadas, que no sobreviven a un cambio
+    de conexión del servidor. Tampoco se envía statement_timeout como
+    parámetro de inicio (el pooler lo rechaza); debe definirse en el rol
+    (ALTER ROLE ... SET statement_timeout).
+    """
+
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    connect_args = {}
+    if config.get('DB_CONNECT_TIMEOUT'):
+        connect_args['connect_timeout'] = config['DB_CONNECT_TIMEOUT']
+
+    if config.get('DB_PGBOUNCER'):
+        # psycopg 3 prepara las sentencias repetidas; psycopg2 nunca lo hace
+        if url.get_driver_name() == 'psycopg':
+            connect_args['prepare_threshold'] = None
+        return {
+            'poolclass': MeteredNullPool,
+            'connect_args': connect_args
+        }
+
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        connect_args['options'] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+
+    pool_size, max_overflow = pool_limits(config)
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+        'connect_args': connect_args
+    }
+
+
+def pool_status():
+    """Estado y métricas del pool de cada motor de la aplicación"""
+
+    status = []
+    for name, engine in db.engines.items():
+        pool = engine.pool
+        metrics = getattr(pool, 'metrics', None)
+        status.append({
+            'bind': name or 'default',
+            'url': engine.url.render_as_string(hide_password=True),
+            'pool': type(pool).__name__,
+            'status': pool.status(),
+            'metrics': metrics.snapshot(pool.capacity()) if metrics else None
+        })
+    return status
+
+
+def reset_pool_metrics():
+    for engine in db.engines.values():
+        metrics = getattr(engine.pool, 'metrics', None)
+        if metrics is not None:
+            metrics.reset()
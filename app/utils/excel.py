@@ -0,0 +1,358 @@
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell, MergedCell
+from openpyxl.drawing.image import Image
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.styles import NamedStyle, Font, PatternFill, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+from flask import Response, stream_with_context
+from copy import copy, deepcopy
+from io import BytesIO
+from urllib.parse import quote
+import tempfile
+import unicodedata
+import os
+
+try:
+    from openpyxl.worksheet._reader import WorksheetReader
+except ImportError:  # Lector interno de openpyxl no disponible: carga completa
+    WorksheetReader = None
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Tamaño de cada bloque enviado al cliente
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Nombres de los estilos con nombre compartidos por todas las hojas
+HEADER_STYLE = 'report_header'
+CELL_STYLE = 'report_cell'
+GRADE_STYLE = 'report_grade'
+
+# Excel no permite más de 31 caracteres ni estos caracteres en el nombre de una hoja
+_INVALID_SHEET_CHARS = '[]:*?/\\'
+
+
+def register_report_styles(wb):
+    """
+    Registra una sola vez por libro los estilos con nombre de los reportes
+
+    Las celdas referencian el estilo por nombre en lugar de crear objetos
+    Font/Border/PatternFill propios.
+    """
+
+    existing = set(wb.named_styles)
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    if HEADER_STYLE not in existing:
+        wb.add_named_style(NamedStyle(
+            name=HEADER_STYLE,
+            font=Font(bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color='366092', end_color='366092', fill_type='solid'),
+            border=border,
+            alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)
+        ))
+
+    if CELL_STYLE not in existing:
+        wb.add_named_style(NamedStyle(name=CELL_STYLE, border=border))
+
+    if GRADE_STYLE not in existing:
+        wb.add_named_style(NamedStyle(
+            name=GRADE_STYLE,
+            border=border,
+            number_format='0.00',
+            alignment=Alignment(horizontal='center')
+        ))
+
+
+def new_streaming_workbook():
+    """Crea un libro en modo write-only con los estilos de reporte registrados"""
+
+    wb = Workbook(write_only=True)
+    register_report_styles(wb)
+    return wb
+
+
+def safe_sheet_title(title):
+    """Normaliza un texto para usarlo como nombre de hoja"""
+
+    for char in _INVALID_SHEET_CHARS:
+        title = title.replace(char, '-')
+    return title[:31] or 'Hoja'
+
+
+def styled_row(ws, values, style):
+    """Construye una fila de WriteOnlyCell que comparten un estilo con nombre"""
+
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+def create_streaming_sheet(wb, title, headers, column_widths=None):
+    """
+    Crea una hoja write-only con su fila de encabezados
+
+    Args:
+        wb: Libro en modo write-only
+        title: Nombre de la hoja
+        headers: Lista de encabezados
+        column_widths: Lista opcional de anchos por columna
+
+    Returns:
+        WriteOnlyWorksheet
+    """
+
+    ws = wb.create_sheet(title=safe_sheet_title(title))
+
+    # Los anchos deben definirse antes de escribir la primera fila
+    for index, width in enumerate(column_widths or [], 1):
+        if width:
+            ws.column_dimensions[get_column_letter(index)].width = width
+
+    ws.freeze_panes = 'A2'
+    ws.append(styled_row(ws, headers, HEADER_STYLE))
+    return ws
+
+
+def stream_workbook(wb, download_name):
+    """
+    Guarda el libro en un archivo temporal y lo envía en bloques
+
+    El archivo se elimina cuando termina la descarga, de modo que el consumo
+    de memoria no depende del tamaño del reporte.
+    """
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_file:
+        temp_path = temp_file.name
+
+    try:
+        wb.save(temp_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    return stream_file(temp_path, download_name, XLSX_MIMETYPE, delete_after=True)
+
+
+def stream_file(path, download_name, mimetype, delete_after=False):
+    """Respuesta que envía un archivo en bloques de STREAM_CHUNK_SIZE"""
+
+    def generate():
+        try:
+            with open(path, 'rb') as file:
+                while True:
+                    chunk = file.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            if delete_after and os.path.exists(path):
+                os.remove(path)
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    set_attachment(response, download_name)
+    response.headers['Content-Length'] = str(os.path.getsize(path))
+    return response
+
+
+def set_attachment(response, download_name):
+    """
+    Define Content-Disposition como lo hace send_file
+
+    Los nombres con caracteres no ASCII (Período, Año) llevan una versión
+    ASCII en filename y el nombre completo en filename* (RFC 5987); las
+    comillas del nombre se escapan.
+    """
+
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name)
+        simple = simple.encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        names = {'filename': simple, 'filename*': f"UTF-8''{quoted}"}
+    else:
+        names = {'filename': download_name}
+
+    response.headers.set('Content-Disposition', 'attachment', **names)
+
+
+def load_active_sheet(path):
+    """
+    Hoja activa de un .xlsx como Worksheet normal, sin procesar las demás hojas
+
+    load_workbook() completo lee todas las hojas (y da formato a cada celda
+    combinada) aunque solo se use una. Aquí el libro se abre en modo solo
+    lectura para obtener estilos y textos compartidos, y solo la hoja activa
+    se carga con el mismo lector de openpyxl: celdas, celdas combinadas y
+    dimensiones quedan igual que con una carga completa.
+
+    Ese lector es interno de openpyxl (requirements.txt fija la versión); si
+    no está disponible se usa load_workbook() completo.
+    """
+
+    if WorksheetReader is None:
+        return load_workbook(path).active
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        read_only_ws = wb.active
+        ws = Worksheet(wb, title=read_only_ws.title)
+
+        try:
+            source = read_only_ws._get_source()
+        except AttributeError:
+            return load_workbook(path).active
+
+        try:
+            reader = WorksheetReader(ws, source, read_only_ws._shared_strings, wb.data_only, False)
+            reader.bind_cells()
+            reader.bind_merged_cells()
+            reader.bind_col_dimensions()
+            reader.bind_row_dimensions()
+        finally:
+            source.close()
+
+        return ws
+    finally:
+        wb.close()
+
+
+def populated_cells(ws):
+    """
+    Celdas con valor de una hoja, ordenadas por fila y columna
+
+    Recorre solo las celdas guardadas en el libro: ws.iter_rows() crea una
+    celda por cada coordenada del rectángulo usado, aunque esté vacía.
+    """
+
+    return [cell for _, cell in sorted(ws._cells.items()) if cell.value is not None]
+
+
+def _clone_image(image):
+    """
+    Copia de una imagen con su propio flujo de datos
+
+    Al guardar, openpyxl cierra el flujo de la imagen: una imagen compartida
+    con el libro en caché solo podría guardarse una vez.
+    """
+
+    ref = image.ref
+    if hasattr(ref, 'getvalue'):
+        data = ref.getvalue()
+    elif isinstance(ref, (str, os.PathLike)):
+        with open(ref, 'rb') as file:
+            data = file.read()
+    else:
+        # Imagen PIL
+        buffer = BytesIO()
+        ref.save(buffer, format=image.format or 'png')
+        data = buffer.getvalue()
+
+    clone = Image(BytesIO(data))
+    clone.width = image.width
+    clone.height = image.height
+    clone.format = image.format
+    clone.anchor = deepcopy(image.anchor)
+    return clone
+
+
+def _copy_cell_style(source_cell, target_cell):
+    """Copia el formato de una celda a otra de otro libro con los atributos públicos de openpyxl"""
+
+    target_cell.style = source_cell.style
+    target_cell.font = copy(source_cell.font)
+    target_cell.border = copy(source_cell.border)
+    target_cell.fill = copy(source_cell.fill)
+    target_cell.number_format = source_cell.number_format
+    target_cell.protection = copy(source_cell.protection)
+    target_cell.alignment = copy(source_cell.alignment)
+    target_cell.quotePrefix = source_cell.quotePrefix
+    target_cell.pivotButton = source_cell.pivotButton
+
+
+def clone_workbook(source):
+    """
+    Crea una copia independiente de un libro ya cargado sin volver a leer el .xlsx
+
+    Se copian valores, estilos, dimensiones, celdas combinadas, configuración
+    de página, vistas, validaciones, formato condicional e imágenes. Las
+    celdas combinadas se vuelven a combinar en la hoja nueva, de modo que la
+    copia tiene sus propias MergedCell y rangos. El libro original no se modifica.
+    """
+
+    target = Workbook()
+    target.remove(target.active)
+
+    for named_style in source._named_styles:
+        if named_style.name not in target.named_styles:
+            target.add_named_style(copy(named_style))
+
+    target._colors = source._colors
+    target._differential_styles = copy(source._differential_styles)
+    target._table_styles = source._table_styles
+    target.loaded_theme = source.loaded_theme
+    target.epoch = source.epoch
+    target.defined_names = copy(source.defined_names)
+
+    for source_ws in source.worksheets:
+        target_ws = target.create_sheet(source_ws.title)
+
+        # Las celdas cubiertas por una combinación se crean al combinar
+        source_cells = list(source_ws._cells.values())
+        merged = []
+
+        for source_cell in source_cells:
+            if isinstance(source_cell, MergedCell):
+                merged.append(source_cell)
+                continue
+
+            target_cell = target_ws.cell(row=source_cell.row, column=source_cell.column)
+            target_cell.value = source_cell.value
+            target_cell.data_type = source_cell.data_type
+
+            if source_cell.has_style:
+                _copy_cell_style(source_cell, target_cell)
+            if source_cell.hyperlink:
+                target_cell.hyperlink = copy(source_cell.hyperlink)
+            if source_cell.comment:
+                target_cell.comment = copy(source_cell.comment)
+
+        for merged_range in source_ws.merged_cells.ranges:
+            target_ws.merge_cells(merged_range.coord)
+
+        for source_cell in merged:
+            if source_cell.has_style:
+                _copy_cell_style(source_cell, target_ws.cell(row=source_cell.row, column=source_cell.column))
+
+        for attr in ('row_dimensions', 'column_dimensions'):
+            source_dimensions = getattr(source_ws, attr)
+            target_dimensions = getattr(target_ws, attr)
+            for key, dimension in source_dimensions.items():
+                target_dimensions[key] = copy(dimension)
+                target_dimensions[key].worksheet = target_ws
+
+        target_ws.sheet_format = copy(source_ws.sheet_format)
+        target_ws.sheet_properties = copy(source_ws.sheet_properties)
+        target_ws.page_margins = copy(source_ws.page_margins)
+        target_ws.page_setup = copy(source_ws.page_setup)
+        target_ws.print_options = copy(source_ws.print_options)
+        target_ws.HeaderFooter = copy(source_ws.HeaderFooter)
+        target_ws.views = copy(source_ws.views)
+        target_ws.protection = copy(source_ws.protection)
+        target_ws.auto_filter = copy(source_ws.auto_filter)
+        target_ws.data_validations = deepcopy(source_ws.data_validations)
+        target_ws.conditional_formatting = deepcopy(source_ws.conditional_formatting)
+        target_ws.print_title_rows = source_ws.print_title_rows
+        target_ws.print_title_cols = source_ws.print_title_cols
+        target_ws.print_area = source_ws.print_area
+
+        for image in source_ws._images:
+            target_ws.add_image(_clone_image(image))
+
+    target.active = source.worksheets.index(source.active) if source.worksheets else 0
+
+    return target
@@ -0,0 +1,186 @@
+from app import db
+from sqlalchemy import and_, or_, func
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.engine import Row
+from datetime import date, datetime
+import base64
+import json
+
+# Filas por página de los listados de administración
+DEFAULT_PER_PAGE = 20
+
+# Prefijos del cursor: página siguiente / página anterior
+_NEXT = 'n'
+_PREV = 'p'
+
+
+class KeysetPage:
+    """
+    Página de un listado paginado por clave
+
+    items son las filas de la página (proyecciones Row o entidades); los
+    cursores son opacos y se pasan tal cual en ?cursor= para pedir la página
+    siguiente o la anterior.
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _order_spec(order_by):
+    """[(columna, descendente)] a partir de columnas o de columna.desc() / columna.asc()"""
+
+    spec = []
+    for item in order_by:
+        if isinstance(item, UnaryExpression) and item.modifier in (operators.desc_op, operators.asc_op):
+            spec.append((item.element, item.modifier is operators.desc_op))
+        else:
+            spec.append((item, False))
+    return spec
+
+
+def _key_value(item, column):
+    if isinstance(item, Row):
+        return item._mapping[column]
+    return getattr(item, column.key)
+
+
+def _encode(direction, values):
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    payload = base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+    return f'{direction}{payload}'
+
+
+def _decode(cursor, spec):
+    """(dirección, valores) del cursor; None si no es válido para este orden"""
+
+    if not cursor or cursor[0] not in (_NEXT, _PREV):
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor[1:].encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(spec):
+        return None
+
+    decoded = []
+    for value, (column, _) in zip(values, spec):
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        try:
+            if value is not None and python_type in (date, datetime):
+                value = python_type.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+        decoded.append(value)
+
+    return cursor[0], decoded
+
+
+def _seek(spec, values, forward):
+    """
+    Filas estrictamente posteriores (forward) o anteriores a la clave dada
+
+    Se expande como (a > x) OR (a = x AND b > y) OR ... para admitir columnas
+    con distinto sentido de orden.
+    """
+
+    conditions = []
+    for index, (column, descending) in enumerate(spec):
+        value = values[index]
+        after = column < value if descending == forward else column > value
+        equal = [spec[position][0] == values[position] for position in range(index)]
+        conditions.append(and_(*equal, after) if equal else after)
+    return or_(*conditions)
+
+
+def keyset_paginate(query, order_by, cursor=None, per_page=DEFAULT_PER_PAGE, with_total=False):
+    """
+    Pagina una consulta por clave (seek) en lugar de OFFSET
+
+    Args:
+        query: Consulta sin ORDER BY (proyección de columnas o entidades)
+        order_by: Columnas del orden; la última debe ser única (normalmente el id).
+            Las columnas deben estar en la proyección y no ser nulas
+        cursor: Cursor recibido en ?cursor=; None para la primera página
+        per_page: Filas por página
+        with_total: Contar también el total de filas (una consulta COUNT adicional)
+
+    Returns:
+        KeysetPage
+    """
+
+    spec = _order_spec(order_by)
+    decoded = _decode(cursor, spec)
+    direction, values = decoded if decoded else (_NEXT, None)
+    forward = direction == _NEXT
+
+    total = query.order_by(None).count() if with_total else None
+
+    page_query = query
+    if values is not None:
+        page_query = page_query.filter(_seek(spec, values, forward))
+
+    # Hacia atrás se recorre en orden inverso y luego se invierte la página
+    ordering = [
+        column.desc() if descending == forward else column.asc()
+        for column, descending in spec
+    ]
+    rows = page_query.order_by(*ordering).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    def key(row):
+        return [_key_value(row, column) for column, _ in spec]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if (forward and more) or (not forward and values is not None):
+            next_cursor = _encode(_NEXT, key(rows[-1]))
+        if (not forward and more) or (forward and values is not None):
+            prev_cursor = _encode(_PREV, key(rows[0]))
+
+    return KeysetPage(rows, per_page, next_cursor, prev_cursor, total)
+
+
+def grouped_counts(column, *criteria, join=None):
+    """
+    {valor de column: filas} con un solo GROUP BY
+
+    Args:
+        column: Columna por la que se agrupa (p. ej. TeacherAssignment.subject_id)
+        criteria: Filtros adicionales
+        join: Entidad o tabla a unir antes de filtrar
+    """
+
+    query = db.session.query(column, func.count())
+    if join is not None:
+        query = query.join(join)
+    if criteria:
+        query = query.filter(*criteria)
+    return dict(query.group_by(column).all())
+
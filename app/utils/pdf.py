@@ -0,0 +1,291 @@
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+from flask import current_app, Response, stream_with_context
+from app.utils.excel import set_attachment
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import namedtuple
+from xml.sax.saxutils import escape
+from io import BytesIO
+import multiprocessing
+import zipfile
+import math
+import os
+
+PDF_MIMETYPE = 'application/pdf'
+ZIP_MIMETYPE = 'application/zip'
+
+# Una boleta tarda unos milisegundos y arrancar el pool (spawn) cerca de dos
+# segundos: por debajo de este número de boletas se generan en el proceso actual
+POOL_THRESHOLD = 400
+
+# Lotes por proceso: varios por worker para repartir bien la carga
+CHUNKS_PER_WORKER = 4
+
+# Estilos y tablas compartidos: se construyen una vez por proceso al importar
+# el módulo y cada documento solo los referencia
+_SAMPLE_STYLES = getSampleStyleSheet()
+TITLE_STYLE = _SAMPLE_STYLES['Heading1']
+SUBTITLE_STYLE = _SAMPLE_STYLES['Heading2']
+NORMAL_STYLE = _SAMPLE_STYLES['Normal']
+
+GRADE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+# Columnas fijas de la boleta: el ancho no se mide en cada documento
+REPORT_CARD_COL_WIDTHS = (4.5 * inch, 1.5 * inch)
+
+# Datos planos de una boleta (serializables para el pool de procesos)
+ReportCard = namedtuple('ReportCard', 'student_id first_name last_name grade_name section_name period_name subjects values')
+
+
+def _paragraph(text, style):
+    return Paragraph(escape(str(text)), style)
+
+
+def _format_grade(value):
+    return str(value) if value is not None else ''
+
+
+# ----------------------------------------------------------------------
+# Reporte de sección
+# ----------------------------------------------------------------------
+
+def render_section_pdf(gradebook):
+    """
+    PDF con la matriz de calificaciones finales de una sección
+
+    Args:
+        gradebook: SectionGradebook de la sección y período
+
+    Returns:
+        bytes
+    """
+
+    section = gradebook.section
+    elements = [
+        _paragraph('Reporte de Calificaciones', TITLE_STYLE),
+        _paragraph(f'Grado: {section.grade.name} Sección: {section.name}', SUBTITLE_STYLE),
+        _paragraph(f'Período: {gradebook.period.name}', SUBTITLE_STYLE)
+    ]
+
+    data = [['ID', 'Apellidos', 'Nombres'] + [subject.name for subject in gradebook.subjects]]
+    for student, values, average in gradebook.rows():
+        data.append([student.student_id, student.last_name, student.first_name] + [_format_grade(value) for value in values])
+
+    table = Table(data)
+    table.setStyle(GRADE_TABLE_STYLE)
+    elements.append(table)
+
+    output = BytesIO()
+    SimpleDocTemplate(output, pagesize=letter).build(elements)
+    return output.getvalue()
+
+
+# ----------------------------------------------------------------------
+# Boletas de estudiantes
+# ----------------------------------------------------------------------
+
+def report_card(student, section, period, subjects, values):
+    """
+    Boleta de un estudiante a partir de sus calificaciones finales
+
+    Args:
+        student: Estudiante (student_id, first_name, last_name)
+        section: Sección (name, grade.name)
+        period: Período
+        subjects: Asignaturas en el orden de values
+        values: Calificación final por asignatura (None si falta)
+    """
+
+    return ReportCard(
+        student.student_id, student.first_name, student.last_name,
+        section.grade.name, section.name, period.name,
+        tuple(subject.name for subject in subjects), tuple(values)
+    )
+
+
+def report_cards(gradebook):
+    """Boletas de todos los estudiantes de un SectionGradebook, sin consultas adicionales"""
+
+    return [
+        report_card(student, gradebook.section, gradebook.period, gradebook.subjects, values)
+        for student, values, average in gradebook.rows()
+    ]
+
+
+def report_card_filename(card):
+    def clean(text):
+        return str(text).replace('/', '-').replace('\\', '-')
+
+    return f'{clean(card.grade_name)}{clean(card.section_name)}/Boleta_{clean(card.last_name)}_{clean(card.first_name)}_{clean(card.student_id)}.pdf'
+
+
+def _report_card_flowables(card):
+    elements = [
+        _paragraph('Boleta de Calificaciones', TITLE_STYLE),
+        _paragraph(f'Estudiante: {card.first_name} {card.last_name}', SUBTITLE_STYLE),
+        _paragraph(f'C.I: {card.student_id}', NORMAL_STYLE),
+        _paragraph(f'Grado: {card.grade_name} Sección: {card.section_name}', NORMAL_STYLE),
+        _paragraph(f'Período: {card.period_name}', NORMAL_STYLE),
+        Spacer(1, NORMAL_STYLE.leading)
+    ]
+
+    data = [['Asignatura', 'Calificación']]
+    data.extend([name, _format_grade(value)] for name, value in zip(card.subjects, card.values))
+
+    graded = [value for value in card.values if value is not None]
+    if graded:
+        data.append(['Promedio', f'{sum(graded) / len(graded):.2f}'])
+
+    table = Table(data, colWidths=REPORT_CARD_COL_WIDTHS)
+    table.setStyle(GRADE_TABLE_STYLE)
+    elements.append(table)
+    return elements
+
+
+def render_report_card(card):
+    """PDF de una boleta; retorna bytes"""
+
+    output = BytesIO()
+    SimpleDocTemplate(output, pagesize=letter).build(_report_card_flowables(card))
+    return output.getvalue()
+
+
+def render_report_cards_pdf(cards):
+    """
+    Un solo PDF con una boleta por página
+
+    ReportLab compone el documento de forma secuencial, así que se genera en
+    el proceso actual; el pool solo se usa para archivos separados.
+    """
+
+    elements = []
+    for index, card in enumerate(cards):
+        if index:
+            elements.append(PageBreak())
+        elements.extend(_report_card_flowables(card))
+
+    output = BytesIO()
+    SimpleDocTemplate(output, pagesize=letter).build(elements)
+    return output.getvalue()
+
+
+def _render_chunk(cards):
+    """Genera un lote de boletas en un proceso del pool"""
+
+    return [(report_card_filename(card), render_report_card(card)) for card in cards]
+
+
+def _max_workers(max_workers, total):
+    if max_workers is None:
+        max_workers = current_app.config.get('REPORT_BATCH_WORKERS') or min(4, os.cpu_count() or 1)
+    if total < POOL_THRESHOLD:
+        return 1
+    return max(1, min(int(max_workers), total))
+
+
+def iter_report_cards(cards, max_workers=None):
+    """
+    Genera las boletas como (nombre de archivo, bytes del PDF) a medida que terminan
+
+    Con POOL_THRESHOLD boletas o más se reparten por lotes en un pool de
+    procesos (REPORT_BATCH_WORKERS); el orden de salida es el de finalización.
+    """
+
+    cards = list(cards)
+    workers = _max_workers(max_workers, len(cards))
+
+    if workers == 1:
+        for card in cards:
+            yield report_card_filename(card), render_report_card(card)
+        return
+
+    size = math.ceil(len(cards) / (workers * CHUNKS_PER_WORKER))
+    chunks = [cards[start:start + size] for start in range(0, len(cards), size)]
+
+    # Procesos nuevos (spawn): no heredan conexiones abiertas de la base de datos
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    with executor:
+        futures = [executor.submit(_render_chunk, chunk) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        except BaseException:
+            # Cancelación o cliente desconectado: no esperar el resto de lotes
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def write_report_cards_zip(cards, output, max_workers=None, progress=None):
+    """
+    Escribe un ZIP con una boleta PDF por estudiante
+
+    Args:
+        cards: Lista de ReportCard
+        output: Ruta o archivo de salida
+        max_workers: Procesos del pool (por defecto REPORT_BATCH_WORKERS)
+        progress: Función opcional progress(done, total, filename)
+
+    Returns:
+        int: Boletas generadas
+    """
+
+    cards = list(cards)
+    done = 0
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in iter_report_cards(cards, max_workers):
+            archive.writestr(filename, content)
+            done += 1
+            if progress:
+                progress(done, len(cards), filename)
+    return done
+
+
+class _StreamBuffer:
+    """Destino de zipfile sin seek: acumula lo escrito hasta que se envía"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_report_cards_zip(cards, filename, max_workers=None):
+    """
+    Respuesta que envía el ZIP de boletas a medida que se genera cada una
+
+    El cliente empieza a recibir datos con la primera boleta en lugar de
+    esperar al lote completo.
+    """
+
+    def generate():
+        buffer = _StreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in iter_report_cards(cards, max_workers):
+                archive.writestr(name, content)
+                yield buffer.drain()
+        yield buffer.drain()
+
+    response = Response(stream_with_context(generate()), mimetype=ZIP_MIMETYPE)
+    set_attachment(response, filename)
+    return response
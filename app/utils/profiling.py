@@ -0,0 +1,252 @@
+from flask import g, request, has_app_context, before_render_template, template_rendered
+from sqlalchemy import event
+from collections import deque
+from datetime import datetime
+import traceback
+import threading
+import logging
+import json
+import time
+import os
+
+logger = logging.getLogger('app.perf')
+
+# Últimas solicitudes medidas (compartido por todos los hilos del proceso)
+_buffer = deque(maxlen=200)
+_buffer_lock = threading.Lock()
+
+# Carpeta del paquete: sirve para ubicar en la pila la línea de la aplicación que emitió la consulta
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RequestStats:
+    """Medición de una solicitud: consultas, tiempo en la base de datos y en plantillas"""
+
+    __slots__ = (
+        'started', 'endpoint', 'method', 'path', 'status',
+        'query_count', 'db_time', 'template_time', 'shapes', 'template_started'
+    )
+
+    def __init__(self, endpoint, method, path):
+        self.started = time.perf_counter()
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.status = None
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        # sentencia -> [veces, tiempo total, lugar de la aplicación que la emitió]
+        self.shapes = {}
+        self.template_started = []
+
+
+def _current_stats():
+    if not has_app_context():
+        return None
+    return g.get('_perf_stats')
+
+
+def _caller_location():
+    """Primera línea de código de la aplicación en la pila (fuera de este módulo)"""
+
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_APP_ROOT) and not filename.endswith('profiling.py'):
+            return f'{os.path.relpath(filename, os.path.dirname(_APP_ROOT))}:{frame.lineno} ({frame.name})'
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('_perf_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    if stats is None:
+        return
+
+    started = conn.info.get('_perf_started')
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+
+    stats.query_count += 1
+    stats.db_time += elapsed
+
+    # Las sentencias ya vienen parametrizadas: el texto identifica la forma de la consulta
+    shape = stats.shapes.get(statement)
+    if shape is None:
+        stats.shapes[statement] = [1, elapsed, None]
+        return
+
+    shape[0] += 1
+    shape[1] += elapsed
+
+    # La pila solo se inspecciona una vez por forma, al alcanzar el umbral de N+1
+    if shape[0] == g.get('_perf_threshold') and shape[2] is None:
+        shape[2] = _caller_location()
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None:
+        stats.template_started.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None and stats.template_started:
+        stats.template_time += time.perf_counter() - stats.template_started.pop()
+
+
+def _build_record(stats, threshold):
+    total_ms = (time.perf_counter() - stats.started) * 1000
+
+    repeated = sorted(
+        (
+            {
+                'statement': ' '.join(statement.split())[:300],
+                'count': count,
+                'db_ms': round(elapsed * 1000, 2),
+                'location': location
+            }
+            for statement, (count, elapsed, location) in stats.shapes.items()
+            if count >= threshold
+        ),
+        key=lambda item: item['count'],
+        reverse=True
+    )
+
+    return {
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'endpoint': stats.endpoint,
+        'method': stats.method,
+        'path': stats.path,
+        'status': stats.status,
+        'total_ms': round(total_ms, 2),
+        'query_count': stats.query_count,
+        'db_ms': round(stats.db_time * 1000, 2),
+        'template_ms': round(stats.template_time * 1000, 2),
+        'n_plus_one': repeated
+    }
+
+
+def init_profiling(app, db):
+    """
+    Activa la medición de solicitudes si PERF_PROFILING está habilitado
+
+    Sin PERF_PROFILING no se registra ningún evento ni hook, por lo que la
+    medición no tiene costo alguno.
+    """
+
+    if not app.config.get('PERF_PROFILING'):
+        return
+
+    threshold = app.config.get('PERF_N_PLUS_ONE_THRESHOLD', 5)
+    slow_ms = app.config.get('PERF_SLOW_REQUEST_MS', 500)
+
+    global _buffer
+    _buffer = deque(_buffer, maxlen=app.config.get('PERF_BUFFER_SIZE', 200))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_profiling():
+        if request.endpoint == 'static':
+            return
+        g._perf_stats = RequestStats(request.endpoint, request.method, request.path)
+        g._perf_threshold = threshold
+
+    @app.after_request
+    def record_status(response):
+        stats = g.get('_perf_stats')
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_profiling(exc):
+        stats = g.pop('_perf_stats', None)
+        if stats is None:
+            return
+
+        if exc is not None and stats.status is None:
+            stats.status = 500
+
+        record = _build_record(stats, threshold)
+
+        with _buffer_lock:
+            _buffer.append(record)
+
+        # Una línea JSON por solicitud; advertencia si es lenta o tiene N+1
+        level = logging.WARNING if record['n_plus_one'] or record['total_ms'] >= slow_ms else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
+
+
+def recent_requests():
+    """Solicitudes medidas, de la más reciente a la más antigua"""
+
+    with _buffer_lock:
+        return list(reversed(_buffer))
+
+
+def clear_requests():
+    with _buffer_lock:
+        _buffer.clear()
+
+
+def summarize_by_endpoint(records):
+    """
+    Agrupa las solicitudes por ruta
+
+    Returns:
+        list: dicts con endpoint, requests, avg/max de consultas y tiempos,
+              y el número de solicitudes con N+1, ordenados por consultas promedio
+    """
+
+    summary = {}
+
+    for record in records:
+        item = summary.setdefault(record['endpoint'], {
+            'endpoint': record['endpoint'],
+            'requests': 0,
+            'queries': 0,
+            'max_queries': 0,
+            'db_ms': 0.0,
+            'total_ms': 0.0,
+            'max_total_ms': 0.0,
+            'template_ms': 0.0,
+            'n_plus_one': 0
+        })
+        item['requests'] += 1
+        item['queries'] += record['query_count']
+        item['max_queries'] = max(item['max_queries'], record['query_count'])
+        item['db_ms'] += record['db_ms']
+        item['total_ms'] += record['total_ms']
+        item['max_total_ms'] = max(item['max_total_ms'], record['total_ms'])
+        item['template_ms'] += record['template_ms']
+        if record['n_plus_one']:
+            item['n_plus_one'] += 1
+
+    rows = []
+    for item in summary.values():
+        count = item['requests']
+        rows.append({
+            'endpoint': item['endpoint'],
+            'requests': count,
+            'avg_queries': round(item['queries'] / count, 1),
+            'max_queries': item['max_queries'],
+            'avg_db_ms': round(item['db_ms'] / count, 2),
+            'avg_template_ms': round(item['template_ms'] / count, 2),
+            'avg_total_ms': round(item['total_ms'] / count, 2),
+            'max_total_ms': round(item['max_total_ms'], 2),
+            'n_plus_one': item['n_plus_one']
+        })
+
+    return sorted(rows, key=lambda row: row['avg_queries'], reverse=True)
@@ -0,0 +1,11 @@
+"""
+Benchmarks de rendimiento del gestor de calificaciones
+
+- generator: genera un colegio sintético de tamaño configurable
+- suite: mide las rutas críticas con el cliente de pruebas de Flask y guarda
+  los resultados en JSON (benchmarks/results/)
+
+Uso:
+    python -m benchmarks.generator --database-url sqlite:////tmp/bench.db --students 40
+    python -m benchmarks.suite --database-url sqlite:////tmp/bench.db --skip-generate
+"""
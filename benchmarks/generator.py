@@ -0,0 +1,474 @@
+"""
+Generador de un colegio sintético para benchmarks
+
+Crea N grados × M secciones × K estudiantes, S asignaturas, P períodos y
+E evaluaciones por asignatura, sección y período, con sus calificaciones y
+calificaciones finales. Los registros se insertan con INSERT masivos de
+SQLAlchemy Core (executemany), por lo que funciona igual en SQLite y en
+PostgreSQL.
+
+La base de datos destino debe estar vacía: se usa DATABASE_URL o --database-url.
+
+Uso:
+    python -m benchmarks.generator --database-url sqlite:////tmp/bench.db \\
+        --grades 6 --sections 4 --students 35 --subjects 8 --periods 3 --evaluations 4
+"""
+
+from datetime import date, timedelta
+from random import Random
+import argparse
+import time
+import os
+
+# Filas por sentencia INSERT
+INSERT_CHUNK_SIZE = 5000
+
+DEFAULTS = {
+    'grades': 6,
+    'sections': 4,
+    'students': 35,
+    'subjects': 8,
+    'periods': 3,
+    'evaluations': 4,
+    'seed': 42
+}
+
+FIRST_NAMES = [
+    'Juan', 'María', 'Carlos', 'Ana', 'Pedro', 'Laura', 'Diego', 'Sofía', 'Luis', 'Elena',
+    'José', 'Carmen', 'Miguel', 'Lucía', 'Andrés', 'Valentina', 'Jorge', 'Isabel', 'Rafael', 'Daniela'
+]
+
+LAST_NAMES = [
+    'García', 'López', 'Rodríguez', 'Martínez', 'Sánchez', 'Díaz', 'Pérez', 'Torres', 'Morales', 'Flores',
+    'Ramírez', 'Romero', 'Herrera', 'Medina', 'Castro', 'Vargas', 'Rojas', 'Mendoza', 'Silva', 'Guzmán'
+]
+
+SUBJECT_NAMES = [
+    'Matemáticas', 'Castellano', 'Inglés', 'Biología', 'Física', 'Química', 'Historia', 'Geografía',
+    'Educación Física', 'Arte', 'Música', 'Informática', 'Filosofía', 'Literatura', 'Economía', 'Dibujo Técnico'
+]
+
+GRADE_TYPE_NAMES = ['Examen', 'Taller', 'Exposición', 'Proyecto', 'Quiz', 'Tarea', 'Laboratorio', 'Participación']
+
+# Contraseña de los usuarios generados (admin y profesores)
+BENCHMARK_PASSWORD = 'benchmark123'
+
+
+def _insert(table, rows):
+    """INSERT masivo por bloques de INSERT_CHUNK_SIZE filas"""
+
+    from app import db
+
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def _create_template_file(path, subjects):
+    """Libro de plantilla con encabezados; los datos empiezan en la fila 6"""
+
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Reporte'
+    ws['A1'] = 'Reporte de Calificaciones'
+    ws['A1'].font = Font(bold=True, size=14)
+    ws['A3'] = 'Sección:'
+    ws['A4'] = 'Período:'
+
+    headers = ['N°', 'Cédula', 'Estudiante', 'Sección', 'Nota'] + [subject for subject in subjects]
+    for index, header in enumerate(headers, start=1):
+        cell = ws.cell(row=5, column=index, value=header)
+        cell.font = Font(bold=True)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    wb.save(path)
+
+
+def generate(grades=DEFAULTS['grades'], sections=DEFAULTS['sections'], students=DEFAULTS['students'],
+             subjects=DEFAULTS['subjects'], periods=DEFAULTS['periods'], evaluations=DEFAULTS['evaluations'],
+             seed=DEFAULTS['seed'], template_path=None, log=print):
+    """
+    Genera el colegio sintético en la base de datos de la aplicación activa
+
+    Debe llamarse dentro de un contexto de aplicación.
+
+    Args:
+        grades: Número de grados (N)
+        sections: Secciones por grado (M)
+        students: Estudiantes por sección (K)
+        subjects: Asignaturas, todas asignadas a todas las secciones (S)
+        periods: Períodos del año académico activo (P)
+        evaluations: Evaluaciones por asignatura, sección y período (E)
+        seed: Semilla para que el conjunto de datos sea reproducible
+        template_path: Ruta del Excel de la plantilla de benchmark (opcional)
+        log: Función para reportar el avance
+
+    Returns:
+        dict: Conteos por tabla e IDs de referencia (admin_user_id,
+              teacher_user_id, academic_year_id, template_id)
+    """
+
+    from app import db
+    from app.models.users import User
+    from app.models.academic import (
+        AcademicYear, Period, Grade, Section, Subject, Student, Teacher,
+        TeacherAssignment, subject_grade
+    )
+    from app.models.grades import GradeType, StudentGrade, FinalGrade
+    from app.models.templates import ExcelTemplate, TemplateCell, TemplateRange
+    from app.services.student_search_service import StudentSearchService
+    from app.services.statistics_service import StatisticsService
+
+    if db.session.query(Student.id).first() is not None:
+        raise RuntimeError('La base de datos ya tiene estudiantes; use una base de datos vacía')
+
+    rng = Random(seed)
+    started = time.perf_counter()
+    now = date.today()
+
+    # Año académico y períodos
+    year = AcademicYear(
+        name=f'Benchmark {now.year}',
+        start_date=date(now.year, 1, 1),
+        end_date=date(now.year, 12, 31),
+        is_active=True
+    )
+    db.session.add(year)
+    db.session.flush()
+
+    period_length = 365 // periods
+    _insert(Period.__table__, [
+        {
+            'name': f'Lapso {index + 1}',
+            'start_date': year.start_date + timedelta(days=index * period_length),
+            'end_date': year.start_date + timedelta(days=(index + 1) * period_length - 1),
+            'academic_year_id': year.id
+        }
+        for index in range(periods)
+    ])
+
+    # Grados, secciones y asignaturas
+    _insert(Grade.__table__, [
+        {'name': f'{index + 1}° Año', 'level': 'Secundaria'}
+        for index in range(grades)
+    ])
+    grade_ids = [row[0] for row in db.session.query(Grade.id).order_by(Grade.id)]
+
+    _insert(Section.__table__, [
+        {'name': chr(ord('A') + index % 26) + ('' if index < 26 else str(index // 26)),
+         'grade_id': grade_id, 'capacity': students}
+        for grade_id in grade_ids
+        for index in range(sections)
+    ])
+
+    _insert(Subject.__table__, [
+        {
+            'name': SUBJECT_NAMES[index % len(SUBJECT_NAMES)] + ('' if index < len(SUBJECT_NAMES) else f' {index // len(SUBJECT_NAMES) + 1}'),
+            'code': f'BEN{index + 1:03d}'
+        }
+        for index in range(subjects)
+    ])
+
+    period_ids = [row[0] for row in db.session.query(Period.id).filter_by(academic_year_id=year.id).order_by(Period.id)]
+    section_ids = [row[0] for row in db.session.query(Section.id).order_by(Section.id)]
+    subject_rows = db.session.query(Subject.id, Subject.name).order_by(Subject.id).all()
+    subject_ids = [subject_id for subject_id, _ in subject_rows]
+
+    _insert(subject_grade, [
+        {'subject_id': subject_id, 'grade_id': grade_id}
+        for grade_id in grade_ids
+        for subject_id in subject_ids
+    ])
+
+    # Usuarios: un administrador y un profesor por asignatura
+    admin_user = User(
+        identification_number='B0000000',
+        email='admin@benchmark.local',
+        username='benchmark_admin',
+        first_name='Admin',
+        last_name='Benchmark',
+        role='admin',
+        is_active=True,
+        is_registered=True
+    )
+    admin_user.set_password(BENCHMARK_PASSWORD)
+    db.session.add(admin_user)
+
+    # El hash de la contraseña se calcula una vez y se reutiliza para todos los profesores
+    password_hash = admin_user.password_hash
+
+    _insert(User.__table__, [
+        {
+            'identification_number': f'B{index + 1:07d}',
+            'email': f'profesor{index + 1}@benchmark.local',
+            'username': f'profesor{index + 1}',
+            'password_hash': password_hash,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'role': 'teacher',
+            'is_active': True,
+            'is_registered': True
+        }
+        for index in range(subjects)
+    ])
+    db.session.flush()
+
+    teacher_users = db.session.query(User.id, User.identification_number, User.first_name, User.last_name).filter(
+        User.role == 'teacher', User.email.like('%@benchmark.local')
+    ).order_by(User.id).all()
+
+    _insert(Teacher.__table__, [
+        {
+            'user_id': user_id,
+            'first_name': first_name,
+            'last_name': last_name,
+            'employee_id': identification,
+            'identification_number': identification,
+            'is_registered': True,
+            'is_active': True,
+            'hire_date': date(2020, 1, 1)
+        }
+        for user_id, identification, first_name, last_name in teacher_users
+    ])
+    teacher_ids = [row[0] for row in db.session.query(Teacher.id).filter(
+        Teacher.user_id.in_([user_id for user_id, _, _, _ in teacher_users])
+    ).order_by(Teacher.id)]
+
+    # Cada asignatura la dicta el mismo profesor en todas las secciones
+    subject_teacher = dict(zip(subject_ids, teacher_ids))
+
+    _insert(TeacherAssignment.__table__, [
+        {
+            'teacher_id': subject_teacher[subject_id],
+            'subject_id': subject_id,
+            'section_id': section_id,
+            'academic_year_id': year.id
+        }
+        for section_id in section_ids
+        for subject_id in subject_ids
+    ])
+    log(f'  Estructura: {len(grade_ids)} grados, {len(section_ids)} secciones, {len(subject_ids)} asignaturas')
+
+    # Estudiantes
+    birth_year = now.year - 15
+    student_rows = []
+    for section_id in section_ids:
+        for _ in range(students):
+            number = len(student_rows) + 1
+            first_name = rng.choice(FIRST_NAMES)
+            last_name = f'{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}'
+            student_id = f'V{30000000 + number}'
+            student_rows.append({
+                'first_name': first_name,
+                'last_name': last_name,
+                'student_id': student_id,
+                'search_text': StudentSearchService.search_text(first_name, last_name, student_id),
+                'birth_date': date(birth_year, rng.randint(1, 12), rng.randint(1, 28)),
+                'gender': rng.choice(['M', 'F']),
+                'address': f'Calle {rng.randint(1, 100)} #{rng.randint(1, 999)}',
+                'phone': f'0414-{rng.randint(1000000, 9999999)}',
+                'email': f'estudiante{number}@benchmark.local',
+                'section_id': section_id,
+                'is_active': True
+            })
+    _insert(Student.__table__, student_rows)
+
+    students_by_section = {}
+    for student_id, section_id in db.session.query(Student.id, Student.section_id).order_by(Student.id):
+        students_by_section.setdefault(section_id, []).append(student_id)
+    log(f'  Estudiantes: {len(student_rows)}')
+
+    # Evaluaciones: pesos distintos para que el promedio ponderado no sea trivial
+    weights = [round(rng.uniform(0.1, 0.4), 2) for _ in range(evaluations)]
+    _insert(GradeType.__table__, [
+        {
+            'name': f'{GRADE_TYPE_NAMES[index % len(GRADE_TYPE_NAMES)]} {index + 1}',
+            'weight': weights[index],
+            'subject_id': subject_id,
+            'period_id': period_id,
+            'teacher_id': subject_teacher[subject_id],
+            'section_id': section_id
+        }
+        for period_id in period_ids
+        for section_id in section_ids
+        for subject_id in subject_ids
+        for index in range(evaluations)
+    ])
+
+    grade_types = {}
+    for grade_type_id, subject_id, period_id, section_id, weight in db.session.query(
+        GradeType.id, GradeType.subject_id, GradeType.period_id, GradeType.section_id, GradeType.weight
+    ).order_by(GradeType.id):
+        grade_types.setdefault((section_id, subject_id, period_id), []).append((grade_type_id, weight))
+
+    # Calificaciones y calificaciones finales (promedio ponderado), por bloques
+    grade_count = 0
+    final_count = 0
+    pending_grades = []
+    pending_finals = []
+
+    for (section_id, subject_id, period_id), types in grade_types.items():
+        teacher_id = subject_teacher[subject_id]
+        total_weight = sum(weight for _, weight in types)
+
+        for student_id in students_by_section.get(section_id, []):
+            # Cada estudiante tiene un nivel base y variación por evaluación
+            base = rng.uniform(50, 95)
+            weighted = 0.0
+
+            for grade_type_id, weight in types:
+                value = round(min(100, max(0, base + rng.uniform(-15, 15))), 2)
+                weighted += value * weight
+                pending_grades.append({
+                    'student_id': student_id,
+                    'subject_id': subject_id,
+                    'grade_type_id': grade_type_id,
+                    'period_id': period_id,
+                    'teacher_id': teacher_id,
+                    'value': value
+                })
+
+            pending_finals.append({
+                'student_id': student_id,
+                'subject_id': subject_id,
+                'period_id': period_id,
+                'value': round(weighted / total_weight, 2)
+            })
+
+        if len(pending_grades) >= INSERT_CHUNK_SIZE:
+            _insert(StudentGrade.__table__, pending_grades)
+            _insert(FinalGrade.__table__, pending_finals)
+            grade_count += len(pending_grades)
+            final_count += len(pending_finals)
+            pending_grades = []
+            pending_finals = []
+
+    _insert(StudentGrade.__table__, pending_grades)
+    _insert(FinalGrade.__table__, pending_finals)
+    grade_count += len(pending_grades)
+    final_count += len(pending_finals)
+    log(f'  Calificaciones: {grade_count} ({final_count} finales)')
+
+    # Las inserciones por bloques no pasan por los eventos que mantienen grade_rollups
+    rollup_count = StatisticsService.rebuild()
+    log(f'  Resúmenes de estadísticas: {rollup_count}')
+
+    # Plantilla Excel con celdas de datos (export_with_template) y rango de estudiantes (TemplateProcessor)
+    if template_path is None:
+        template_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     'uploads', 'templates', 'benchmark_template.xlsx')
+    _create_template_file(template_path, [name for _, name in subject_rows])
+
+    template = ExcelTemplate(
+        name='Benchmark',
+        description='Plantilla generada para benchmarks',
+        template_type='section_report',
+        file_path=template_path,
+        created_by=admin_user.id,
+        is_active=True
+    )
+    db.session.add(template)
+    db.session.flush()
+
+    for address, data_type in [('A6', 'cedula'), ('B6', 'nombre_completo'), ('C6', 'seccion'), ('D6', 'nota')]:
+        db.session.add(TemplateCell(
+            template_id=template.id,
+            cell_address=address,
+            cell_type='data',
+            data_type=data_type
+        ))
+
+    for start_cell, data_type in [('A6', 'numero'), ('B6', 'cedula'), ('C6', 'nombre_completo')]:
+        db.session.add(TemplateRange(
+            template_id=template.id,
+            range_name=f'estudiantes_{data_type}',
+            start_cell=start_cell,
+            range_type='students',
+            data_mapping=f'{{"tipo": "{data_type}"}}'
+        ))
+
+    db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    log(f'  Datos generados en {elapsed:.1f} s')
+
+    return {
+        'academic_year_id': year.id,
+        'admin_user_id': admin_user.id,
+        'teacher_user_id': teacher_users[0][0] if teacher_users else None,
+        'template_id': template.id,
+        'counts': {
+            'grades': len(grade_ids),
+            'sections': len(section_ids),
+            'subjects': len(subject_ids),
+            'periods': len(period_ids),
+            'students': len(student_rows),
+            'grade_types': sum(len(types) for types in grade_types.values()),
+            'student_grades': grade_count,
+            'final_grades': final_count
+        },
+        'seconds': round(elapsed, 2)
+    }
+
+
+def add_arguments(parser):
+    """Opciones de tamaño del conjunto de datos, compartidas con la suite"""
+
+    parser.add_argument('--database-url', help='URL de la base de datos (por defecto DATABASE_URL)')
+    parser.add_argument('--grades', type=int, default=DEFAULTS['grades'], help='Grados (N)')
+    parser.add_argument('--sections', type=int, default=DEFAULTS['sections'], help='Secciones por grado (M)')
+    parser.add_argument('--students', type=int, default=DEFAULTS['students'], help='Estudiantes por sección (K)')
+    parser.add_argument('--subjects', type=int, default=DEFAULTS['subjects'], help='Asignaturas (S)')
+    parser.add_argument('--periods', type=int, default=DEFAULTS['periods'], help='Períodos (P)')
+    parser.add_argument('--evaluations', type=int, default=DEFAULTS['evaluations'], help='Evaluaciones por asignatura y período (E)')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'], help='Semilla aleatoria')
+
+
+def dataset_options(args):
+    return {key: getattr(args, key) for key in DEFAULTS}
+
+
+def create_benchmark_app(database_url=None):
+    """
+    Crea la aplicación apuntando a la base de datos de benchmark
+
+    La configuración se lee de las variables de entorno al importar config.py,
+    por eso DATABASE_URL se define antes de importar la aplicación.
+    """
+
+    if database_url:
+        os.environ['DATABASE_URL'] = database_url
+
+    from app import create_app, db
+
+    app = create_app()
+
+    # Las exportaciones se generan dentro de la misma solicitud para poder medirlas
+    app.config['JOBS_RUN_INLINE'] = True
+    with app.app_context():
+        db.create_all()
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera un colegio sintético para benchmarks')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(args.database_url)
+
+    with app.app_context():
+        print(f"Generando datos en {app.config['SQLALCHEMY_DATABASE_URI']}")
+        summary = generate(**dataset_options(args))
+
+    for table, count in summary['counts'].items():
+        print(f'  {table}: {count}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,465 @@
+"""
+Prueba de carga HTTP contra la aplicación servida por gunicorn
+
+Un cliente asyncio propio (HTTP/1.1 con keep-alive, sin dependencias) simula
+N usuarios concurrentes que inician sesión como administrador y repiten una
+mezcla ponderada de registro de calificaciones, reportes, búsquedas y
+exportaciones. Por cada configuración se mide el throughput y la latencia
+p50 / p95 / p99 por escenario.
+
+Con --serve se genera (o reutiliza) un colegio sintético y se levanta gunicorn
+con cada perfil indicado (clase:procesosxhilos), uno tras otro:
+
+    python -m benchmarks.load --serve gthread:2x4 sync:4x1 --users 16 --duration 30
+
+Con --url se ataca un servidor ya en marcha; --database-url debe apuntar a la
+misma base de datos para obtener los IDs de los escenarios:
+
+    python -m benchmarks.load --url http://127.0.0.1:8000 \\
+        --database-url postgresql+psycopg://... --skip-generate
+
+SQLite admite una sola escritura a la vez: para comparar configuraciones con
+escrituras concurrentes conviene PostgreSQL.
+"""
+
+from datetime import datetime
+from urllib.parse import urlsplit, urlencode
+from http.cookies import SimpleCookie
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import random
+import socket
+import shutil
+import math
+import time
+import json
+import sys
+import os
+import re
+
+from benchmarks.generator import add_arguments, dataset_options, create_benchmark_app, generate, BENCHMARK_PASSWORD
+from benchmarks.suite import RESULTS_DIR, load_fixtures, _git_commit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Peso de cada escenario en la mezcla de tráfico
+DEFAULT_MIX = {
+    'grade_entry': 4,
+    'section_report': 3,
+    'student_report': 3,
+    'search_students': 3,
+    'export_excel': 1,
+    'export_pdf': 1
+}
+
+# Segundos máximos esperando a que gunicorn acepte solicitudes
+SERVER_START_TIMEOUT = 60
+
+_CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+class HttpClient:
+    """
+    Conexión HTTP/1.1 persistente con cookies, suficiente para la aplicación
+
+    Admite respuestas con Content-Length, chunked o cerradas por el servidor
+    (los workers sync de gunicorn no mantienen la conexión abierta).
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.headers = {}
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.reader = self.writer = None
+
+    async def request(self, method, path, form=None):
+        """(estado, cuerpo); reintenta una vez si el servidor cerró la conexión"""
+
+        for attempt in (0, 1):
+            if self.writer is None:
+                await self._connect()
+            try:
+                return await self._send(method, path, form)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _send(self, method, path, form):
+        body = urlencode(form).encode('utf-8') if form is not None else b''
+        headers = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+            f'Content-Length: {len(body)}'
+        ]
+        if form is not None:
+            headers.append('Content-Type: application/x-www-form-urlencoded')
+        if self.cookies:
+            headers.append('Cookie: ' + '; '.join(f'{key}={value}' for key, value in self.cookies.items()))
+
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        response_headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                key = key.strip().lower()
+                if key == 'set-cookie':
+                    cookie = SimpleCookie()
+                    cookie.load(value.strip())
+                    for name, morsel in cookie.items():
+                        self.cookies[name] = morsel.value
+                else:
+                    response_headers[key] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b'\r\n')
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            content = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            await self.close()
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+
+        self.headers = response_headers
+        return status, content
+
+
+def build_scenarios(fx):
+    """{nombre: función(run) -> (método, ruta, formulario)}"""
+
+    section, period = fx['section_id'], fx['period_id']
+
+    def grade_entry(run):
+        form = {'evaluation_id': str(fx['grade_type_id'])}
+        for index, student_id in enumerate(fx['section_students']):
+            form[f'grade_{student_id}'] = str(60 + (index + run) % 40)
+            form[f'comment_{student_id}'] = ''
+        return 'POST', '/admin/save-grades', form
+
+    scenarios = {
+        'section_report': lambda run: ('GET', f'/reports/section/{section}/period/{period}', None),
+        'student_report': lambda run: ('GET', f"/reports/student/{fx['student_id']}/period/{period}", None),
+        'search_students': lambda run: ('GET', '/admin/api/students/search?' + urlencode({'search_term': fx['student_last_name']}), None),
+        'export_excel': lambda run: ('GET', f'/reports/export/excel/section/{section}/period/{period}', None),
+        'export_pdf': lambda run: ('GET', f'/reports/export/pdf/section/{section}/period/{period}', None),
+    }
+    if fx['grade_type_id']:
+        scenarios['grade_entry'] = grade_entry
+
+    return scenarios
+
+
+async def login(client, identification, password):
+    status, content = await client.request('GET', '/auth/login')
+    match = _CSRF_PATTERN.search(content.decode('utf-8', 'replace'))
+    form = {'identification_number': identification, 'password': password}
+    if match:
+        form['csrf_token'] = match.group(1)
+    status, _ = await client.request('POST', '/auth/login', form)
+    # Las credenciales incorrectas también redirigen, pero de vuelta al login
+    if status != 302 or '/auth/login' in client.headers.get('location', ''):
+        raise RuntimeError(f'No se pudo iniciar sesión (estado {status})')
+
+
+async def virtual_user(host, port, scenarios, weights, deadline, measure_from, samples, seed):
+    """Repite escenarios al azar según la mezcla hasta deadline; mide desde measure_from"""
+
+    rng = random.Random(seed)
+    names = list(weights)
+    client = HttpClient(host, port)
+    run = seed * 1000
+    try:
+        await login(client, 'B0000000', BENCHMARK_PASSWORD)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights=[weights[item] for item in names])[0]
+            method, path, form = scenarios[name](run)
+            run += 1
+
+            started = time.monotonic()
+            try:
+                status, _ = await client.request(method, path, form)
+                error = None if status < 400 else f'HTTP {status}'
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                await client.close()
+                error = type(e).__name__
+            finished = time.monotonic()
+
+            if started >= measure_from:
+                samples.append((name, finished - started, error))
+    finally:
+        await client.close()
+
+
+def _percentile(values, percent):
+    """Percentil por rango más cercano sobre valores ordenados"""
+
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+
+
+def summarize(samples, seconds):
+    def describe(latencies, errors):
+        latencies = sorted(latencies)
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': round(len(latencies) / seconds, 2),
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+        }
+
+    by_scenario = {}
+    for name, latency, error in samples:
+        item = by_scenario.setdefault(name, ([], []))
+        item[0].append(latency)
+        if error:
+            item[1].append(error)
+
+    return {
+        'total': describe([latency for _, latency, _ in samples], sum(1 for *_, error in samples if error)),
+        'scenarios': {
+            name: dict(describe(latencies, len(errors)), error_kinds=sorted(set(errors)))
+            for name, (latencies, errors) in sorted(by_scenario.items())
+        }
+    }
+
+
+async def run_load(base_url, scenarios, weights, users, duration, warmup):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+
+    samples = []
+    measure_from = time.monotonic() + warmup
+    deadline = measure_from + duration
+    await asyncio.gather(*(
+        virtual_user(host, port, scenarios, weights, deadline, measure_from, samples, seed)
+        for seed in range(users)
+    ))
+
+    # Métricas del pool de uno de los workers (cada proceso tiene el suyo)
+    pool = None
+    client = HttpClient(host, port)
+    try:
+        await login(client, 'B0000000', BENCHMARK_PASSWORD)
+        status, content = await client.request('GET', '/admin/perf/pool')
+        if status == 200:
+            pool = json.loads(content).get('pools')
+    except (OSError, RuntimeError, ValueError):
+        pass
+    finally:
+        await client.close()
+
+    result = summarize(samples, duration)
+    result['pool'] = pool
+    return result
+
+
+def parse_profile(text):
+    """'gthread:2x4' -> ('gthread', 2, 4); 'sync:4' -> ('sync', 4, 1)"""
+
+    worker_class, _, counts = text.partition(':')
+    workers, _, threads = counts.partition('x')
+    return worker_class, int(workers or 2), int(threads or 1)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(process, port):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn terminó antes de aceptar solicitudes')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn no respondió a tiempo')
+
+
+def start_server(profile, database_url, log_path, inline_jobs):
+    """Levanta gunicorn con gunicorn.conf.py y el perfil dado; devuelve (proceso, URL)"""
+
+    worker_class, workers, threads = profile
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        GUNICORN_WORKER_CLASS=worker_class,
+        WEB_CONCURRENCY=str(workers),
+        WEB_THREADS=str(threads),
+        JOBS_RUN_INLINE='true' if inline_jobs else 'false',
+        DEMO_MODE='false'
+    )
+    log = open(log_path, 'ab')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'run:app'],
+        cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    log.close()
+    try:
+        _wait_for_server(process, port)
+    except RuntimeError as e:
+        stop_server(process)
+        with open(log_path, encoding='utf-8', errors='replace') as f:
+            tail = ''.join(f.readlines()[-20:])
+        raise RuntimeError(f'{e}\n{tail}') from None
+    return process, f'http://127.0.0.1:{port}'
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def parse_mix(text):
+    """'grade_entry=4,export_pdf=1' -> {escenario: peso}"""
+
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def print_results(results):
+    for run in results['runs']:
+        total = run['result']['total']
+        print(f"\n{run['profile']}: {total['throughput_rps']} sol/s, "
+              f"p50 {total['p50_ms']} ms, p99 {total['p99_ms']} ms, {total['errors']} errores")
+        print(f"  {'Escenario':<18} {'Sol.':>6} {'Err.':>5} {'sol/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, item in run['result']['scenarios'].items():
+            print(f"  {name:<18} {item['requests']:>6} {item['errors']:>5} {item['throughput_rps']:>8} "
+                  f"{item['p50_ms']:>9} {item['p95_ms']:>9} {item['p99_ms']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga con tráfico mixto contra gunicorn')
+    add_arguments(parser)
+    parser.add_argument('--skip-generate', action='store_true', help='Usar los datos ya generados en la base de datos')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Servidor ya en marcha (http://host:puerto)')
+    target.add_argument('--serve', nargs='+', metavar='PERFIL',
+                        help='Perfiles de gunicorn a comparar: clase:procesosxhilos (p. ej. gthread:2x4 sync:4)')
+    parser.add_argument('--users', type=int, default=16, help='Usuarios concurrentes')
+    parser.add_argument('--duration', type=float, default=30, help='Segundos medidos por perfil')
+    parser.add_argument('--warmup', type=float, default=5, help='Segundos de calentamiento sin medir')
+    parser.add_argument('--mix', help='Pesos de los escenarios, p. ej. grade_entry=4,export_pdf=1')
+    parser.add_argument('--queued-exports', action='store_true',
+                        help='Encolar las exportaciones como trabajos en lugar de generarlas en la solicitud')
+    parser.add_argument('--output', help='Archivo JSON de resultados (por defecto benchmarks/results/)')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='load_')
+    database_url = args.database_url or os.environ.get('DATABASE_URL')
+    template_path = None
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(work_dir, 'benchmark.db')
+        template_path = os.path.join(work_dir, 'benchmark_template.xlsx')
+
+    app = create_benchmark_app(database_url)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'database': database_url.split(':', 1)[0],
+        'users': args.users,
+        'duration': args.duration,
+        'runs': []
+    }
+
+    try:
+        if not args.skip_generate:
+            with app.app_context():
+                print(f'Generando datos en {database_url}')
+                generate(template_path=template_path, **dataset_options(args))
+            results['dataset'] = dataset_options(args)
+
+        scenarios = build_scenarios(load_fixtures(app))
+        weights = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+        weights = {name: weight for name, weight in weights.items() if name in scenarios and weight > 0}
+        results['mix'] = weights
+
+        if args.url:
+            print(f'Carga contra {args.url}: {args.users} usuarios, {args.duration} s')
+            result = asyncio.run(run_load(args.url, scenarios, weights, args.users, args.duration, args.warmup))
+            results['runs'].append({'profile': args.url, 'result': result})
+        else:
+            log_path = os.path.join(work_dir, 'gunicorn.log')
+            for text in args.serve:
+                profile = parse_profile(text)
+                print(f'Perfil {text}: {args.users} usuarios, {args.duration} s')
+                process, url = start_server(profile, database_url, log_path, not args.queued_exports)
+                try:
+                    result = asyncio.run(run_load(url, scenarios, weights, args.users, args.duration, args.warmup))
+                finally:
+                    stop_server(process)
+                results['runs'].append({
+                    'profile': text,
+                    'worker_class': profile[0],
+                    'workers': profile[1],
+                    'threads': profile[2],
+                    'result': result
+                })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"load-{stamp}-{results['git_commit'] or 'local'}.json")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print_results(results)
+    print(f'\nResultados guardados en {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,373 @@
+"""
+Suite de benchmarks de las rutas críticas
+
+Genera (o reutiliza) un colegio sintético, ejecuta cada caso con el cliente
+de pruebas de Flask y mide el tiempo total y el número de consultas SQL por
+solicitud. Los resultados se guardan en benchmarks/results/ como JSON, con el
+commit actual, para comparar ejecuciones entre commits:
+
+    python -m benchmarks.suite --database-url sqlite:////tmp/bench.db
+    python -m benchmarks.suite --database-url sqlite:////tmp/bench.db --skip-generate \\
+        --compare benchmarks/results/<resultado anterior>.json
+
+Las exportaciones que normalmente se encolan como trabajos en segundo plano
+se ejecutan dentro de la misma solicitud (JOBS_RUN_INLINE) para medir la
+generación completa.
+"""
+
+from datetime import datetime
+from statistics import mean, median
+import subprocess
+import platform
+import argparse
+import tempfile
+import shutil
+import time
+import json
+import os
+
+from benchmarks.generator import add_arguments, dataset_options, create_benchmark_app, generate
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Variación del tiempo mediano que se reporta como regresión al comparar
+REGRESSION_THRESHOLD = 0.20
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas por el engine mientras está activo"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(RESULTS_DIR), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_fixtures(app):
+    """
+    IDs de referencia para los casos: la primera sección con estudiantes, el
+    primer período del año activo, un estudiante, una evaluación y la plantilla
+    """
+
+    from app import db
+    from app.models.users import User
+    from app.models.academic import AcademicYear, Period, Student, TeacherAssignment
+    from app.models.grades import GradeType
+    from app.models.templates import ExcelTemplate
+
+    with app.app_context():
+        year = AcademicYear.query.filter_by(is_active=True).first()
+        if year is None:
+            raise RuntimeError('No hay un año académico activo; ejecute el generador primero')
+
+        period = Period.query.filter_by(academic_year_id=year.id).order_by(Period.id).first()
+        student = Student.query.filter_by(is_active=True).order_by(Student.id).first()
+        admin = User.query.filter_by(role='admin').order_by(User.id).first()
+
+        grade_type = GradeType.query.filter_by(
+            section_id=student.section_id, period_id=period.id
+        ).order_by(GradeType.id).first()
+
+        section_students = [
+            row[0] for row in db.session.query(Student.id).filter_by(
+                section_id=student.section_id, is_active=True
+            ).order_by(Student.id)
+        ]
+
+        template = ExcelTemplate.query.filter_by(is_active=True).order_by(ExcelTemplate.id).first()
+
+        assignment = TeacherAssignment.query.filter_by(
+            section_id=student.section_id, subject_id=grade_type.subject_id, academic_year_id=year.id
+        ).first() if grade_type else None
+
+        return {
+            'admin_user_id': admin.id,
+            'period_id': period.id,
+            'section_id': student.section_id,
+            'student_id': student.id,
+            'student_cedula': student.student_id,
+            'student_last_name': student.last_name.split()[0],
+            'grade_type_id': grade_type.id if grade_type else None,
+            'section_students': section_students,
+            'template_id': template.id if template else None,
+            'assignment_id': assignment.id if assignment else None
+        }
+
+
+def build_cases(fx):
+    """
+    Casos de la suite: (nombre, método, URL, función que arma el formulario)
+
+    El formulario de save_grades cambia en cada ejecución para que siempre
+    haya notas que actualizar.
+    """
+
+    section, period = fx['section_id'], fx['period_id']
+
+    def grade_form(run):
+        form = {'evaluation_id': str(fx['grade_type_id'])}
+        for index, student_id in enumerate(fx['section_students']):
+            form[f'grade_{student_id}'] = str(60 + (index + run) % 40)
+            form[f'comment_{student_id}'] = ''
+        return form
+
+    cases = [
+        ('section_report', 'GET', f'/reports/section/{section}/period/{period}', None),
+        ('student_report', 'GET', f"/reports/student/{fx['student_id']}/period/{period}", None),
+        ('export_section_excel', 'GET', f'/reports/export/excel/section/{section}/period/{period}', None),
+        ('export_section_pdf', 'GET', f'/reports/export/pdf/section/{section}/period/{period}', None),
+        ('export_student_pdf', 'GET', f"/reports/export/pdf/student/{fx['student_id']}/period/{period}", None),
+        ('section_report_cards_pdf', 'GET', f'/reports/export/pdf/section/{section}/period/{period}/report-cards', None),
+        ('section_report_cards_zip', 'GET', f'/reports/export/pdf/section/{section}/period/{period}/report-cards?format=zip', None),
+        ('search_students_name', 'GET', f"/admin/api/students/search?search_term={fx['student_last_name']}", None),
+        ('search_students_cedula', 'GET', f"/admin/api/students/search?search_term={fx['student_cedula'][-4:]}", None),
+        ('search_students_section', 'GET', f'/admin/api/students/search?section_id={section}', None),
+        ('admin_statistics', 'GET', '/admin/statistics', None),
+        ('grade_analytics', 'GET', f'/reports/api/analytics?period_id={period}', None),
+        ('admin_students', 'GET', '/admin/students', None),
+        ('admin_assignments', 'GET', '/admin/assignments', None),
+        ('admin_evaluations', 'GET', '/admin/evaluations', None),
+    ]
+
+    if fx['grade_type_id']:
+        cases.append(('save_grades', 'POST', '/admin/save-grades', grade_form))
+
+    if fx['assignment_id']:
+        assignment = fx['assignment_id']
+        cases.append(('teacher_view_grades', 'GET', f'/teacher/assignments/{assignment}/grades/{period}', None))
+        cases.append(('teacher_final_grades', 'GET', f'/teacher/assignments/{assignment}/period/{period}/final-grades', None))
+
+    if fx['template_id']:
+        template = fx['template_id']
+        cases.append(('export_with_template', 'GET',
+                      f'/reports/export/template/{template}/section/{section}/period/{period}', None))
+        cases.append(('generate_with_template', 'GET',
+                      f'/reports/generate-with-template/{template}?section_id={section}&period_id={period}', None))
+
+    return cases
+
+
+def run_case(app, client, name, method, url, form_builder, repeat, warmup):
+    """Ejecuta un caso warmup + repeat veces y resume tiempos y consultas"""
+
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+
+    timings = []
+    queries = []
+    status = None
+    size = 0
+    error = None
+
+    for run in range(warmup + repeat):
+        data = form_builder(run) if form_builder else None
+
+        with QueryCounter(engine) as counter:
+            started = time.perf_counter()
+            try:
+                response = client.open(url, method=method, data=data)
+                status = response.status_code
+                size = len(response.get_data())
+            except Exception as e:
+                status = None
+                error = f'{type(e).__name__}: {e}'
+            elapsed = (time.perf_counter() - started) * 1000
+
+        if error:
+            break
+
+        if run >= warmup:
+            timings.append(elapsed)
+            queries.append(counter.count)
+
+    result = {
+        'name': name,
+        'method': method,
+        'url': url,
+        'status': status,
+        'runs': len(timings),
+        'response_bytes': size,
+        'error': error
+    }
+
+    if timings:
+        result['queries'] = max(queries)
+        result['wall_ms'] = {
+            'min': round(min(timings), 2),
+            'median': round(median(timings), 2),
+            'mean': round(mean(timings), 2),
+            'max': round(max(timings), 2)
+        }
+
+    return result
+
+
+def compare(current, previous):
+    """
+    Diferencias de consultas y tiempo mediano respecto a un resultado anterior
+
+    Returns:
+        list: dicts {name, queries, previous_queries, median_ms,
+              previous_median_ms, regression}
+    """
+
+    previous_cases = {case['name']: case for case in previous.get('cases', [])}
+    rows = []
+
+    for case in current['cases']:
+        before = previous_cases.get(case['name'])
+        if not before or 'wall_ms' not in case or 'wall_ms' not in before:
+            continue
+
+        median_ms = case['wall_ms']['median']
+        previous_ms = before['wall_ms']['median']
+
+        rows.append({
+            'name': case['name'],
+            'queries': case['queries'],
+            'previous_queries': before['queries'],
+            'median_ms': median_ms,
+            'previous_median_ms': previous_ms,
+            'regression': (
+                case['queries'] > before['queries']
+                or (previous_ms > 0 and median_ms > previous_ms * (1 + REGRESSION_THRESHOLD))
+            )
+        })
+
+    return rows
+
+
+def print_results(results, comparison=None):
+    print(f"\n{'Caso':<28} {'Estado':>6} {'Consultas':>10} {'Mediana ms':>11} {'Mín ms':>9} {'Máx ms':>9}")
+    print('-' * 78)
+    for case in results['cases']:
+        if 'wall_ms' not in case:
+            print(f"{case['name']:<28} {'ERROR':>6}  {case['error']}")
+            continue
+        wall = case['wall_ms']
+        print(f"{case['name']:<28} {case['status']:>6} {case['queries']:>10} "
+              f"{wall['median']:>11.2f} {wall['min']:>9.2f} {wall['max']:>9.2f}")
+
+    if comparison:
+        print(f"\n{'Caso':<28} {'Consultas':>16} {'Mediana ms':>22}")
+        print('-' * 78)
+        for row in comparison:
+            flag = '  <- regresión' if row['regression'] else ''
+            print(f"{row['name']:<28} {row['previous_queries']:>7} -> {row['queries']:<6} "
+                  f"{row['previous_median_ms']:>10.2f} -> {row['median_ms']:<9.2f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mide las rutas críticas sobre un colegio sintético')
+    add_arguments(parser)
+    parser.add_argument('--skip-generate', action='store_true', help='Usar los datos ya generados en la base de datos')
+    parser.add_argument('--repeat', type=int, default=5, help='Ejecuciones medidas por caso')
+    parser.add_argument('--warmup', type=int, default=1, help='Ejecuciones de calentamiento por caso')
+    parser.add_argument('--only', nargs='+', help='Ejecutar solo estos casos')
+    parser.add_argument('--output', help='Archivo JSON de resultados (por defecto benchmarks/results/)')
+    parser.add_argument('--compare', help='Resultado JSON anterior para comparar')
+    parser.add_argument('--no-report-cache', action='store_true',
+                        help='Generar los reportes en cada ejecución (mide la generación, no la caché en disco)')
+    args = parser.parse_args(argv)
+
+    # Sin --database-url ni DATABASE_URL se usa una base SQLite temporal
+    work_dir = tempfile.mkdtemp(prefix='benchmark_')
+    database_url = args.database_url or os.environ.get('DATABASE_URL')
+    template_path = None
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(work_dir, 'benchmark.db')
+        # Con la base temporal, la plantilla también se descarta al terminar
+        template_path = os.path.join(work_dir, 'benchmark_template.xlsx')
+
+    app = create_benchmark_app(database_url)
+    app.config['EXPORTS_FOLDER'] = os.path.join(work_dir, 'exports')
+    app.config['REPORT_CACHE_FOLDER'] = os.path.join(work_dir, 'exports', 'cache')
+    if args.no_report_cache:
+        app.config['REPORT_CACHE_MAX_MB'] = 0
+
+    try:
+        dataset = None
+        if not args.skip_generate:
+            with app.app_context():
+                print(f'Generando datos en {database_url}')
+                dataset = generate(template_path=template_path, **dataset_options(args))
+
+        fx = load_fixtures(app)
+        cases = build_cases(fx)
+        if args.only:
+            cases = [case for case in cases if case[0] in args.only]
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(fx['admin_user_id'])
+
+        results = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'database': database_url.split(':', 1)[0],
+            'python': platform.python_version(),
+            'dataset': dataset_options(args) if dataset else None,
+            'counts': dataset['counts'] if dataset else None,
+            'generation_seconds': dataset['seconds'] if dataset else None,
+            'repeat': args.repeat,
+            'cases': []
+        }
+
+        for name, method, url, form_builder in cases:
+            print(f'  {name}...')
+            results['cases'].append(
+                run_case(app, client, name, method, url, form_builder, args.repeat, args.warmup)
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    comparison = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            comparison = compare(results, json.load(f))
+        results['comparison'] = {'against': os.path.basename(args.compare), 'cases': comparison}
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['git_commit'] or 'local'}.json")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print_results(results, comparison)
+    print(f'\nResultados guardados en {output}')
+
+    # Código de salida distinto de cero si hubo regresiones (útil en CI)
+    return 1 if comparison and any(row['regression'] for row in comparison) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -10,6 +10,19 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'instance', 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de conexiones a PostgreSQL (SQLALCHEMY_ENGINE_OPTIONS se deriva en app/utils/database.py)
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 1)  # Procesos de gunicorn
+    WEB_THREADS = int(os.environ.get('WEB_THREADS') or 1)  # Hilos por proceso
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 0)  # 0 = automático (WEB_THREADS + JOB_WORKERS)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 2)  # Conexiones extra en picos
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS') or 0)  # Límite total entre procesos; 0 = sin límite
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # Segundos esperando una conexión libre
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 300)  # Segundos antes de renovar una conexión
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', '1', 'yes']
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT') or 10)  # Segundos para abrir una conexión
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)  # 0 = sin límite
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() in ['true', '1', 'yes']  # Pooler en modo transacción
+    
     # Configuración de correo (si se implementa más adelante)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
@@ -24,5 +37,46 @@ class Config:
     UPLOAD_FOLDER = os.path.join(basedir, 'app/static/uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
     
+    # Calificaciones
+    PASSING_GRADE = float(os.environ.get('PASSING_GRADE') or 70)  # Nota mínima aprobatoria
+    
+    # Caché de datos de referencia (grados, secciones, asignaturas, años y períodos)
+    REFERENCE_DATA_TTL = int(os.environ.get('REFERENCE_DATA_TTL') or 60)  # Segundos; acota datos viejos entre workers
+    
+    # Caché del usuario autenticado y sus asignaciones (current_user)
+    AUTH_CONTEXT_TTL = int(os.environ.get('AUTH_CONTEXT_TTL') or 30)  # Segundos; acota permisos viejos entre workers
+    
+    # Búsqueda de estudiantes (/admin/api/students/search)
+    STUDENT_SEARCH_LIMIT = int(os.environ.get('STUDENT_SEARCH_LIMIT') or 50)  # Resultados por página
+    STUDENT_SEARCH_MAX_LIMIT = int(os.environ.get('STUDENT_SEARCH_MAX_LIMIT') or 200)  # Máximo aceptado en ?limit=
+    
+    # Analítica de calificaciones (/reports/analytics)
+    ANALYTICS_SNAPSHOT_TTL = int(os.environ.get('ANALYTICS_SNAPSHOT_TTL') or 300)  # Segundos antes de recargar la instantánea
+    ANALYTICS_AT_RISK_FAILED = int(os.environ.get('ANALYTICS_AT_RISK_FAILED') or 2)  # Asignaturas reprobadas para marcar riesgo
+    ANALYTICS_AT_RISK_DROP = float(os.environ.get('ANALYTICS_AT_RISK_DROP') or 10)  # Caída de promedio entre períodos
+    
+    # Plantillas Excel
+    TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE') or 16)  # Plantillas compiladas en memoria
+    REPORT_BATCH_WORKERS = int(os.environ.get('REPORT_BATCH_WORKERS') or 0)  # 0 = automático (hasta 4 procesos)
+    
+    # Trabajos en segundo plano
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)  # Hilos por proceso
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT') or 1800)  # Segundos por trabajo
+    IMPORT_TIMEOUT = int(os.environ.get('IMPORT_TIMEOUT') or 300)  # Segundos por importación
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 100)  # Filas por commit en importaciones
+    JOB_RESULT_RETENTION_HOURS = int(os.environ.get('JOB_RESULT_RETENTION_HOURS') or 24)
+    JOBS_RUN_INLINE = os.environ.get('JOBS_RUN_INLINE', 'false').lower() in ['true', '1', 'yes']
+    EXPORTS_FOLDER = os.path.join(basedir, 'uploads', 'exports')
+    
+    # Caché en disco de reportes de sección (clave con la versión de datos de la sección)
+    REPORT_CACHE_FOLDER = os.path.join(EXPORTS_FOLDER, 'cache')
+    REPORT_CACHE_MAX_MB = int(os.environ.get('REPORT_CACHE_MAX_MB') or 256)  # Tamaño máximo antes de eliminar los menos usados (0 = sin caché)
+    
+    # Medición de consultas y tiempos por solicitud (/admin/perf)
+    PERF_PROFILING = os.environ.get('PERF_PROFILING', 'false').lower() in ['true', '1', 'yes']
+    PERF_BUFFER_SIZE = int(os.environ.get('PERF_BUFFER_SIZE') or 200)  # Solicitudes conservadas en memoria
+    PERF_N_PLUS_ONE_THRESHOLD = int(os.environ.get('PERF_N_PLUS_ONE_THRESHOLD') or 5)  # Repeticiones de una misma consulta
+    PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS') or 500)
+    
     # DEMO MODE - Permite acceso público sin login
     DEMO_MODE = os.environ.get('DEMO_MODE', 'false').lower() in ['true', '1', 'yes']
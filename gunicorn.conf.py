@@ -0,0 +1,117 @@
+"""
+Perfil de producción de gunicorn (gunicorn -c gunicorn.conf.py run:app)
+
+Por defecto usa workers gthread: las exportaciones Excel / PDF ocupan un hilo
+y no el proceso entero, y varios procesos reparten el trabajo de CPU. Con
+GUNICORN_WORKER_CLASS=gevent (requiere gevent instalado) cada proceso atiende
+muchas conexiones concurrentes; conviene solo si el tráfico espera sobre todo
+por E/S, porque la generación de archivos bloquea el bucle de eventos.
+
+Variables de entorno:
+    GUNICORN_WORKER_CLASS  gthread (por defecto), gevent o sync
+    WEB_CONCURRENCY        Procesos; por defecto CPUs + 1 (entre 2 y 8)
+    WEB_THREADS            Hilos por proceso (gthread); por defecto 4, limitado
+                           por las conexiones a la base de datos por proceso
+    GUNICORN_WORKER_CONNECTIONS  Conexiones por proceso con gevent
+    GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS, PORT
+
+WEB_CONCURRENCY y WEB_THREADS se escriben de vuelta en el entorno antes de
+cargar la aplicación, así config.py dimensiona el pool de conexiones con los
+mismos valores (ver app/utils/database.py).
+"""
+
+from dotenv import load_dotenv
+import multiprocessing
+import os
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+load_dotenv(os.path.join(basedir, '.env'))
+
+
+def _env_int(name, default=0):
+    return int(os.environ.get(name) or default)
+
+
+def _db_connections_per_process(workers, threads):
+    """Conexiones que el pool permitirá a cada proceso (mismas reglas que pool_limits)"""
+
+    job_workers = _env_int('JOB_WORKERS', 2)
+    pool_size = _env_int('DB_POOL_SIZE') or threads + job_workers
+    max_overflow = _env_int('DB_MAX_OVERFLOW', 2)
+    capacity = pool_size + max_overflow
+
+    budget = _env_int('DB_MAX_CONNECTIONS')
+    if budget:
+        capacity = min(capacity, max(1, budget // workers))
+
+    # Los hilos de trabajos en segundo plano comparten el mismo pool
+    return max(1, capacity - job_workers)
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+if worker_class == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        worker_class = 'gthread'
+
+workers = _env_int('WEB_CONCURRENCY') or max(2, min(multiprocessing.cpu_count() + 1, 8))
+
+if worker_class == 'gthread':
+    threads = _env_int('WEB_THREADS') or 4
+    # El pool automático crece con WEB_THREADS; con un pool fijo o un límite
+    # de conexiones, más hilos que conexiones solo produce esperas en el pool
+    if _env_int('DB_POOL_SIZE') or _env_int('DB_MAX_CONNECTIONS'):
+        threads = min(threads, _db_connections_per_process(workers, threads))
+else:
+    threads = 1
+
+if worker_class == 'gevent':
+    worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+    # Las greenlets comparten el pool; sin DB_POOL_SIZE se le da un tamaño razonable
+    os.environ.setdefault('DB_POOL_SIZE', '10')
+
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['WEB_THREADS'] = str(threads)
+
+bind = f"0.0.0.0:{os.environ.get('PORT') or 8000}"
+
+# Importa la aplicación (pandas, numpy, openpyxl, reportlab) una sola vez en
+# el proceso maestro; los workers comparten esas páginas de memoria
+preload_app = True
+
+# Exportaciones largas: más margen que los 30 s por defecto
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = 30
+keepalive = 5
+
+# Reinicio periódico de workers (0 = desactivado: los trabajos en segundo
+# plano corren en hilos del worker y se perderían)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS')
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+# Latidos de los workers en memoria (evita bloqueos en discos lentos de contenedores)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def post_fork(server, worker):
+    """Cada worker abre sus propias conexiones; las heredadas del maestro no se usan"""
+
+    from app import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def when_ready(server):
+    server.log.info(
+        'Perfil: %s, %s workers x %s hilos%s',
+        worker_class, workers, threads,
+        f', {worker_connections} conexiones' if worker_class == 'gevent' else ''
+    )
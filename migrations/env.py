@@ -45,6 +45,21 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Objetos de búsqueda creados con SQL directo por la migración b17ef9f02fa6;
+# no están en los modelos y autogenerate no debe proponer eliminarlos
+FTS_TABLE = 'students_search'
+UNMANAGED_INDEXES = {'ix_students_search_text_trgm'}
+
+
+def include_name(name, type_, parent_names):
+    if type_ == 'table':
+        # La tabla FTS5 y sus tablas internas (_data, _idx, _docsize, _config)
+        return name != FTS_TABLE and not name.startswith(f'{FTS_TABLE}_')
+    if type_ == 'index':
+        return name not in UNMANAGED_INDEXES
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +80,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -93,6 +109,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_name", include_name)
 
     connectable = get_engine()
 
@@ -0,0 +1,57 @@
+"""Grade fact table indexes
+
+Revision ID: e1414afb9cf5
+Revises: 226acf47a52d
+Create Date: 2026-10-18 09:45:12.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1414afb9cf5'
+down_revision = '226acf47a52d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Eliminar duplicados antes de crear las restricciones únicas,
+    # conservando la fila más reciente de cada combinación
+    op.execute(
+        'DELETE FROM student_grades WHERE id NOT IN ('
+        'SELECT MAX(id) FROM student_grades GROUP BY student_id, grade_type_id)'
+    )
+    op.execute(
+        'DELETE FROM final_grades WHERE id NOT IN ('
+        'SELECT MAX(id) FROM final_grades GROUP BY student_id, subject_id, period_id)'
+    )
+
+    with op.batch_alter_table('grade_types', schema=None) as batch_op:
+        batch_op.create_index('ix_grade_types_subject_period_section', ['subject_id', 'period_id', 'section_id'], unique=False)
+
+    with op.batch_alter_table('student_grades', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_student_grades_student_grade_type', ['student_id', 'grade_type_id'])
+        batch_op.create_index('ix_student_grades_student_subject_period', ['student_id', 'subject_id', 'period_id'], unique=False)
+        batch_op.create_index('ix_student_grades_grade_type_student', ['grade_type_id', 'student_id'], unique=False)
+        batch_op.create_index('ix_student_grades_subject_period', ['subject_id', 'period_id'], unique=False)
+
+    with op.batch_alter_table('final_grades', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_final_grades_student_subject_period', ['student_id', 'subject_id', 'period_id'])
+        batch_op.create_index('ix_final_grades_period_subject', ['period_id', 'subject_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('final_grades', schema=None) as batch_op:
+        batch_op.drop_index('ix_final_grades_period_subject')
+        batch_op.drop_constraint('uq_final_grades_student_subject_period', type_='unique')
+
+    with op.batch_alter_table('student_grades', schema=None) as batch_op:
+        batch_op.drop_index('ix_student_grades_subject_period')
+        batch_op.drop_index('ix_student_grades_grade_type_student')
+        batch_op.drop_index('ix_student_grades_student_subject_period')
+        batch_op.drop_constraint('uq_student_grades_student_grade_type', type_='unique')
+
+    with op.batch_alter_table('grade_types', schema=None) as batch_op:
+        batch_op.drop_index('ix_grade_types_subject_period_section')
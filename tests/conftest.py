@@ -0,0 +1,23 @@
+import pytest
+
+from app import create_app, db
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    JOBS_RUN_INLINE = True
+    REPORT_CACHE_MAX_MB = 0
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
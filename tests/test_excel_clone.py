@@ -0,0 +1,94 @@
+from copy import copy
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import MergedCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Border, Font, Side
+from PIL import Image as PILImage
+import pytest
+
+from app.utils.excel import clone_workbook
+
+
+@pytest.fixture
+def template(tmp_path):
+    """Plantilla con un título combinado con borde, un dato y una imagen"""
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Reporte'
+
+    thin = Side(style='thin')
+    ws['A1'] = 'Boletín'
+    ws['A1'].font = Font(bold=True, size=14)
+    ws['A1'].border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    ws.merge_cells('A1:C2')
+    ws['A4'] = 'Nombre'
+    ws['B4'] = 12.5
+    ws['B4'].number_format = '0.00'
+
+    png = BytesIO()
+    PILImage.new('RGB', (4, 4), 'red').save(png, format='png')
+    ws.add_image(Image(BytesIO(png.getvalue())), 'E1')
+
+    path = tmp_path / 'plantilla.xlsx'
+    wb.save(path)
+    return load_workbook(path)
+
+
+def _save(wb):
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _snapshot(ws):
+    """Tipo, valor y formato de cada celda de la hoja"""
+
+    return {
+        coordinate: (type(cell), cell.value, copy(cell.font), copy(cell.border), cell.number_format)
+        for coordinate, cell in (
+            (cell.coordinate, cell)
+            for row in ws.iter_rows(min_row=1, max_row=4, max_col=3)
+            for cell in row
+        )
+    }
+
+
+def test_clone_keeps_values_styles_and_merges(template):
+    source = template.active
+    clone = clone_workbook(template).active
+
+    assert [str(rng) for rng in clone.merged_cells.ranges] == ['A1:C2']
+    assert all(rng.ws is clone for rng in clone.merged_cells.ranges)
+    assert isinstance(clone['B1'], MergedCell)
+    assert _snapshot(clone) == _snapshot(source)
+
+
+def test_filling_clones_leaves_cached_source_unchanged(template):
+    source = template.active
+    before = _snapshot(source)
+
+    for student in ('Ana', 'Luis', 'María'):
+        wb = clone_workbook(template)
+        ws = wb.active
+
+        with pytest.raises(AttributeError):
+            ws['B1'].value = 'dentro de la combinación'
+
+        ws['A4'] = student
+        ws.unmerge_cells('A1:C2')
+        ws['B1'] = 'libre'
+
+        # Cada copia tiene su propia imagen: guardarla no cierra la de la plantilla
+        assert _save(wb)
+
+    assert [str(rng) for rng in source.merged_cells.ranges] == ['A1:C2']
+    assert all(rng.ws is source for rng in source.merged_cells.ranges)
+    assert isinstance(source['B1'], MergedCell)
+    assert _snapshot(source) == before
+
+    # La imagen del libro en caché sigue intacta
+    assert len(source._images) == 1
+    assert _save(template)
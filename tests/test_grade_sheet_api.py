@@ -0,0 +1,101 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models.academic import AcademicYear, Period, Grade, Section, Subject, Student, Teacher
+from app.models.grades import GradeType, StudentGrade
+from app.models.users import User
+from app.services import grade_entry_service
+
+
+@pytest.fixture
+def grade_type(app):
+    """Evaluación de una sección con dos estudiantes"""
+
+    year = AcademicYear(name='2025', start_date=date(2025, 1, 1), end_date=date(2025, 12, 31), is_active=True)
+    grade = Grade(name='1ro', level='Secundaria')
+    subject = Subject(name='Matemática', code='MAT')
+    user = User(email='profesor@example.com', first_name='Ana', last_name='Pérez', role='teacher', identification_number='1')
+    user.set_password('clave')
+    db.session.add_all([year, grade, subject, user])
+    db.session.flush()
+
+    period = Period(name='Lapso 1', start_date=date(2025, 1, 1), end_date=date(2025, 4, 1), academic_year_id=year.id)
+    section = Section(name='A', grade_id=grade.id)
+    teacher = Teacher(user_id=user.id, identification_number='1')
+    db.session.add_all([period, section, teacher])
+    db.session.flush()
+
+    db.session.add_all([
+        Student(first_name='Luis', last_name='Gómez', student_id='V00001', section_id=section.id),
+        Student(first_name='María', last_name='Rojas', student_id='V00002', section_id=section.id),
+    ])
+    grade_type = GradeType(
+        name='Examen 1', weight=1, subject_id=subject.id, period_id=period.id,
+        teacher_id=teacher.id, section_id=section.id
+    )
+    db.session.add(grade_type)
+    db.session.commit()
+    return grade_type
+
+
+def _post(app, grade_type_id, grades):
+    return app.test_client().post(f'/admin/api/evaluations/{grade_type_id}/grades', json={'grades': grades})
+
+
+def _student_ids():
+    return [student.id for student in Student.query.order_by(Student.id)]
+
+
+def test_valid_sheet_is_saved(app, grade_type):
+    first, second = _student_ids()
+
+    response = _post(app, grade_type.id, [
+        {'student_id': first, 'value': 85},
+        {'student_id': second, 'value': 'NP'},
+    ])
+
+    assert response.status_code == 200
+    assert response.get_json()['created'] == 2
+    assert StudentGrade.query.count() == 2
+
+
+def test_invalid_rows_are_a_client_error(app, grade_type):
+    first, second = _student_ids()
+
+    response = _post(app, grade_type.id, [
+        {'student_id': first, 'value': 85},
+        {'student_id': second, 'value': 150},
+        {'student_id': second, 'value': 'nan'},
+        'no es una fila',
+    ])
+
+    body = response.get_json()
+    assert response.status_code == 422
+    assert body['database_error'] is False
+    assert body['errors'] == [
+        'Fila 2: la calificación debe estar entre 0 y 100',
+        'Fila 3: datos inválidos',
+        'Fila 4: datos inválidos',
+    ]
+    # Las filas válidas se guardan
+    assert body['created'] == 1
+
+
+def test_database_failure_is_a_server_error(app, grade_type, monkeypatch):
+    first, _ = _student_ids()
+
+    def fail(*args, **kwargs):
+        raise OperationalError('INSERT', {}, Exception('base de datos no disponible'))
+
+    monkeypatch.setattr(grade_entry_service, 'bulk_upsert', fail)
+
+    response = _post(app, grade_type.id, [{'student_id': first, 'value': 85}])
+
+    body = response.get_json()
+    assert response.status_code == 500
+    assert body['success'] is False
+    assert body['database_error'] is True
+    assert StudentGrade.query.count() == 0
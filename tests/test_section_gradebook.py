@@ -0,0 +1,89 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app import db
+from app.models.academic import AcademicYear, Period, Grade, Section, Subject, Student, Teacher, TeacherAssignment
+from app.models.grades import FinalGrade
+from app.models.users import User
+from app.services.section_gradebook import SectionGradebook
+from app.services.template_processor import TemplateProcessor
+
+# Calificaciones finales por estudiante en (Matemática, Física); None = sin calificación
+GRADES = {
+    'En el límite': (70, 70),
+    'Bajo el límite': (69.98, 70),
+    'Con un cero': (100, 0),
+    'Solo ceros': (0, 0),
+    'Una sin nota': (80, None),
+    'Sin notas': (None, None),
+}
+
+
+@pytest.fixture
+def section_period(app):
+    """Sección con dos asignaturas y un estudiante por caso de GRADES"""
+
+    year = AcademicYear(name='2025', start_date=date(2025, 1, 1), end_date=date(2025, 12, 31), is_active=True)
+    grade = Grade(name='1ro', level='Secundaria')
+    db.session.add_all([year, grade])
+    db.session.flush()
+
+    period = Period(name='Lapso 1', start_date=date(2025, 1, 1), end_date=date(2025, 4, 1), academic_year_id=year.id)
+    section = Section(name='A', grade_id=grade.id)
+    subjects = [Subject(name='Matemática', code='MAT'), Subject(name='Física', code='FIS')]
+    user = User(email='profesor@example.com', first_name='Ana', last_name='Pérez', role='teacher', identification_number='1')
+    user.set_password('clave')
+    db.session.add_all([period, section, user, *subjects])
+    db.session.flush()
+
+    teacher = Teacher(user_id=user.id, identification_number='1')
+    db.session.add(teacher)
+    db.session.flush()
+
+    for subject in subjects:
+        db.session.add(TeacherAssignment(
+            teacher_id=teacher.id, subject_id=subject.id, section_id=section.id, academic_year_id=year.id
+        ))
+
+    for number, (last_name, values) in enumerate(GRADES.items()):
+        student = Student(first_name='Estudiante', last_name=last_name, student_id=f'V{number:05d}', section_id=section.id)
+        db.session.add(student)
+        db.session.flush()
+
+        for subject, value in zip(subjects, values):
+            if value is not None:
+                db.session.add(FinalGrade(student_id=student.id, subject_id=subject.id, period_id=period.id, value=value))
+
+    db.session.commit()
+    return section, period
+
+
+def _cell_value(gradebook, data_type):
+    context = TemplateProcessor.build_section_context(None, gradebook)
+    cell = SimpleNamespace(data_type=data_type, default_value=None)
+    return TemplateProcessor(None)._get_cell_value(cell, context)
+
+
+def test_passing_count_uses_passing_grade_and_counts_zero_grades(section_period):
+    gradebook = SectionGradebook.load(*section_period)
+
+    # Aprueban: promedio 70 exacto y 80 (la asignatura sin nota no cuenta).
+    # Un 0 (NP) es una nota: 100 y 0 promedian 50 y reprueba.
+    assert gradebook.passing_grade == 70
+    assert gradebook.students_passing == 2
+    assert gradebook.students_failing == 3
+    assert gradebook.students_with_grades == 5
+
+    assert _cell_value(gradebook, 'estudiantes_aprobados') == 2
+    # Los estudiantes sin ninguna nota también cuentan como no aprobados
+    assert _cell_value(gradebook, 'estudiantes_reprobados') == 4
+
+
+def test_passing_count_follows_configured_passing_grade(app, section_period):
+    app.config['PASSING_GRADE'] = 50
+    gradebook = SectionGradebook.load(*section_period)
+
+    assert gradebook.students_passing == 4
+    assert _cell_value(gradebook, 'estudiantes_aprobados') == 4